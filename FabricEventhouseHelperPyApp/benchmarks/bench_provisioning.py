@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Provisioning benchmark against the in-process fake Kusto backend.
+
+Synthesises entity type definitions and YAML mappings at increasing sizes and runs
+setup_tables_from_input in each provisioning mode, recording end-to-end time,
+mapping-resolution time, request and command counts and peak memory. Results are
+written as JSON so runs can be compared for regressions.
+
+    python benchmarks/bench_provisioning.py --sizes 10 100 1000 --output results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager  # noqa: E402
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient  # noqa: E402
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import CommandScheduler  # noqa: E402
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+MODES = ["serial", "parallel", "batched", "incremental"]
+DATABASE = "benchmark"
+CLUSTER_URL = "https://benchmark.kusto.invalid"
+
+VALUE_TYPES = ["Number", "String", "Boolean", "DateTime", "Object"]
+
+
+def synthesize_definitions(count: int, properties: int = 8, timeseries: int = 4) -> List[Dict[str, Any]]:
+    """Build `count` entity type definitions with a mix of value types."""
+    return [{
+        "Namespace": "Bench",
+        "Name": f"Entity{index:05d}",
+        "TypeReference": f"bench.example.org/Types;i={index}",
+        "Properties": [{"name": f"prop{p}", "valueType": VALUE_TYPES[p % len(VALUE_TYPES)]}
+                       for p in range(properties)],
+        "TimeseriesProperties": [{"name": f"ts{t}", "valueType": "Number"} for t in range(timeseries)]
+    } for index in range(count)]
+
+
+def write_inputs(directory: str, size: int, unmapped_factor: float) -> Dict[str, str]:
+    """Write the definitions file (mapped plus unmapped entities) and the YAML mappings."""
+    definitions = synthesize_definitions(size + int(size * unmapped_factor))
+    definitions_file = os.path.join(directory, f"definitions_{size}.json")
+    with open(definitions_file, 'w') as f:
+        json.dump(definitions, f)
+
+    yaml_file = os.path.join(directory, f"mappings_{size}.yaml")
+    with open(yaml_file, 'w') as f:
+        yaml.safe_dump({"type_mappings": [{
+            "typeRef": entity["TypeReference"], "namespace": entity["Namespace"], "entity_name": entity["Name"]
+        } for entity in definitions[:size]]}, f)
+    return {"definitions_file": definitions_file, "yaml_file": yaml_file}
+
+
+class BenchmarkManager(EventhouseManager):
+    """EventhouseManager bound to a FakeKustoClient instead of authenticating."""
+
+    def __init__(self, fake_client: FakeKustoClient, retry_base_delay: float = 0.01, **options):
+        super().__init__(CLUSTER_URL, DATABASE, definitions_cache=False, **options)
+        # Per-table INFO logging (and throttling warnings) would dominate the measurements
+        self.logger.setLevel(logging.ERROR)
+        self.fake_client = fake_client
+        # Backoff scaled to the simulated latency rather than to the service's
+        self.scheduler = CommandScheduler(max_concurrency=self.max_parallel, max_retries=20,
+                                          base_delay=retry_base_delay, logger=self.logger, seed=0)
+
+    def authenticate(self) -> bool:
+        self.client = self.fake_client
+        return True
+
+
+def mode_options(mode: str, max_parallel: int) -> Dict[str, Any]:
+    """Manager options for a provisioning mode."""
+    return {
+        "serial": {},
+        "parallel": {"max_parallel": max_parallel},
+        "batched": {"batch": True},
+        "incremental": {"incremental": True, "batch": True},
+    }[mode]
+
+
+def measure_mapping_resolution(inputs: Dict[str, str]) -> Dict[str, Any]:
+    """Time and trace loading the mappings, the referenced definitions and resolving them."""
+    manager = BenchmarkManager(FakeKustoClient())
+    tracemalloc.start()
+    start = time.perf_counter()
+    mappings = manager._load_yaml_mappings(inputs["yaml_file"])
+    catalog = manager._load_entity_catalog(inputs["definitions_file"], mappings)
+    entity_mappings = manager._create_entity_mappings_from_input(mappings, catalog)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mapping_seconds": seconds, "mapping_peak_memory_bytes": peak, "entity_mappings": len(entity_mappings)}
+
+
+def run_provisioning(inputs: Dict[str, str], mode: str, latency: float, max_parallel: int,
+                     trace_memory: bool, throttle_rate: float = 0.0) -> Dict[str, Any]:
+    """Run one end-to-end provisioning and collect its metrics."""
+    client = FakeKustoClient(latency=latency, throttle_rate=throttle_rate, seed=0)
+    if mode == "incremental":
+        # Measure the re-run against an already provisioned database
+        BenchmarkManager(client, batch=True, definitions_file=inputs["definitions_file"]) \
+            .setup_tables_from_input(yaml_file=inputs["yaml_file"])
+        client.requests.clear()
+        client.command_count = 0
+        client.throttled_count = 0
+
+    manager = BenchmarkManager(client, definitions_file=inputs["definitions_file"],
+                               **mode_options(mode, max_parallel))
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    success = manager.setup_tables_from_input(yaml_file=inputs["yaml_file"])
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "success": success,
+        "seconds": seconds,
+        "requests": len(client.requests),
+        "commands": client.command_count,
+        "max_concurrency": client.max_concurrency,
+        "throttled": client.throttled_count,
+        "retries": manager.scheduler.stats()["retries"],
+        "lowest_concurrency_limit": manager.scheduler.stats()["lowest_concurrency_limit"],
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_benchmarks(sizes: List[int], modes: List[str], latency: float, max_parallel: int,
+                   unmapped_factor: float, trace_memory: bool, throttle_rate: float = 0.0) -> List[Dict[str, Any]]:
+    """Run every mode at every size and return one result per (size, mode)."""
+    results = []
+    directory = tempfile.mkdtemp(prefix="eventhouse-bench-")
+    try:
+        for size in sizes:
+            inputs = write_inputs(directory, size, unmapped_factor)
+            mapping = measure_mapping_resolution(inputs)
+            for mode in modes:
+                result = {"entities": size, "mode": mode, **mapping,
+                          **run_provisioning(inputs, mode, latency, max_parallel, trace_memory, throttle_rate)}
+                results.append(result)
+                print(f"{size:>6} {mode:<12} {result['seconds']:>9.3f}s  mapping {result['mapping_seconds']:>7.3f}s  "
+                      f"{result['requests']:>6} requests  {result['commands']:>6} commands  "
+                      f"{result['retries']:>5} retries"
+                      f"{'' if result['success'] else '  FAILED'}", flush=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Eventhouse provisioning against a fake Kusto backend.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Numbers of mapped entity types (default: 10 100 1000 10000)")
+    parser.add_argument("--modes", nargs='+', choices=MODES, default=MODES, help="Provisioning modes to run")
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="Simulated round-trip time per request in seconds (default: 0.001)")
+    parser.add_argument("--max-parallel", type=int, default=8, help="Workers for the parallel mode (default: 8)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Probability that a request is throttled and has to be retried (default: 0)")
+    parser.add_argument("--unmapped-factor", type=float, default=1.0,
+                        help="Unmapped definitions in the definitions file per mapped one (default: 1.0)")
+    parser.add_argument("--no-memory", dest="trace_memory", action="store_false",
+                        help="Skip tracing peak memory of the provisioning runs (tracing slows them down)")
+    parser.add_argument("--output", default="provisioning-benchmark.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.modes, args.latency, args.max_parallel,
+                             args.unmapped_factor, args.trace_memory, args.throttle_rate)
+    report = {
+        "benchmark": "provisioning",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"latency": args.latency, "max_parallel": args.max_parallel, "throttle_rate": args.throttle_rate,
+                   "unmapped_factor": args.unmapped_factor, "trace_memory": args.trace_memory},
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0 if all(result["success"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+
+"""
+asyncio variant of the EventhouseManager.
+
+AsyncEventhouseManager exposes the provisioning methods of EventhouseManager as
+coroutines on top of the asyncio Kusto client, so setups of many databases can run
+concurrently on one event loop. Mapping resolution, command compilation and the
+provisioning flows (see flows.py) are inherited unchanged: the methods that talk to
+the cluster are coroutines, and the flows are run with run_flow_async, which awaits
+them and runs parallel steps as tasks.
+
+The asyncio Kusto client requires aiohttp:
+    pip install "fabriceventhousehelperpyapp[async]"
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from azure.kusto.data import KustoConnectionStringBuilder
+
+from digitaloperations.fabriceventhousehelperpyapp.auth import get_shared_credential
+from digitaloperations.fabriceventhousehelperpyapp.backfill import DEFAULT_SLICE
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    AIO_RAW_DATA_TABLE,
+    KIND_FUNCTION,
+    KIND_POLICY,
+    KIND_TABLE,
+    KIND_TRANSFORM,
+    MOVE_DATA_BY_TYPE_FUNCTION,
+    ROUTED_DATA_TABLE,
+    KustoCommand,
+    build_create_table_command,
+    build_move_data_by_type_function_command,
+    build_update_policy_command,
+)
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    SHOW_DATABASE_SCHEMA_COMMAND,
+    SHOW_UPDATE_POLICIES_COMMAND,
+    DatabaseSnapshot,
+)
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import (
+    MSG_CLIENT_NOT_AUTH,
+    EventhouseManager,
+)
+from digitaloperations.fabriceventhousehelperpyapp.flows import run_flow_async
+from digitaloperations.fabriceventhousehelperpyapp.latest_values import (
+    compile_latest_values_function_commands,
+    compile_latest_view_commands,
+)
+from digitaloperations.fabriceventhousehelperpyapp.metrics import KIND_CATALOG, OUTCOME_SUCCEEDED
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping
+from digitaloperations.fabriceventhousehelperpyapp.plan import ProvisioningPlan
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import classify_error
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import compile_table_policy_commands, parse_timespan
+from digitaloperations.fabriceventhousehelperpyapp.transforms import (
+    build_specialized_function_command,
+    build_specialized_function_name,
+)
+
+
+class AsyncEventhouseManager(EventhouseManager):
+    """
+    Manages Fabric Eventhouse operations with the asyncio Kusto client.
+
+    Use it as an async context manager, or await close(), to release the client.
+    Entity tables are provisioned concurrently, up to max_parallel at a time.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        """Initialize the manager; accepts the arguments of EventhouseManager."""
+        super().__init__(*args, **kwargs)
+        self._owns_client = False
+
+    async def __aenter__(self):
+        """Async context manager entry"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit - closes the client and the log file"""
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the client created by authenticate() and the log file handler."""
+        if self.client is not None and self._owns_client:
+            await self.client.close()
+        self.client = None
+        self._owns_client = False
+        self.close_log_file()
+
+    async def authenticate(self) -> bool:
+        """
+        Create the asyncio Kusto client for the cluster.
+
+        A client assigned to `client` beforehand (e.g. one shared by several managers
+        on the same event loop) is used as is and not closed by this manager.
+
+        Returns:
+            bool: True if a client is available, False otherwise
+        """
+        if self.client is not None:
+            return True
+
+        try:
+            from azure.kusto.data.aio import KustoClient as AsyncKustoClient
+        except ImportError as e:
+            self.logger.error(f"The asyncio Kusto client is not available: {e}. "
+                              "Install it with: pip install \"fabriceventhousehelperpyapp[async]\"")
+            return False
+
+        if self.token_cache:
+            auth_methods = [("cached credential", lambda: KustoConnectionStringBuilder.with_azure_token_credential(
+                self.cluster_url, get_shared_credential()))]
+        else:
+            auth_methods = self._connection_string_builders()
+
+        for method_name, kcsb_builder in auth_methods:
+            try:
+                self.logger.info(f"Attempting {method_name} authentication to cluster: {self.cluster_url}")
+                self.client = AsyncKustoClient(kcsb_builder())
+                self._owns_client = True
+                self.logger.info(f"Created asyncio client for cluster using {method_name}.")
+                return True
+            except Exception as e:
+                self.logger.warning(f"{method_name} authentication failed: {str(e)}")
+                self._log_detailed_error(f"{method_name} Authentication", e)
+
+        self.logger.error("All authentication methods failed.")
+        return False
+
+    async def _execute_request(self, text: str, kind: str, target: str, request: Callable[[], Any]) -> Any:
+        """Send a request through the scheduler and record its metrics (see EventhouseManager._execute_mgmt)."""
+        attempts = 0
+
+        def send():
+            nonlocal attempts
+            attempts += 1
+            return request()
+
+        start_ns, start = time.time_ns(), time.perf_counter()
+        outcome = OUTCOME_SUCCEEDED
+        try:
+            return await self.scheduler.run_async(send, text.split("\n", 1)[0][:80])
+        except Exception as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            self._record_command(text, kind, target, start_ns, time.perf_counter() - start, attempts, outcome)
+
+    async def create_table(self, table_name: str, schema: str) -> bool:
+        """
+        Create a table in the database.
+
+        Args:
+            table_name: Name of the table to create
+            schema: Table schema definition
+
+        Returns:
+            bool: True if table created successfully, False otherwise
+        """
+        if not self._validate_create_table(table_name, schema):
+            return False
+
+        create_cmd = build_create_table_command(table_name, schema)
+
+        try:
+            self.logger.info(f"Creating table: {table_name}")
+            self.logger.debug(f"Executing command: {create_cmd}")
+            result = await self._execute_mgmt(create_cmd, KIND_TABLE, table_name)
+            self.logger.info(f"Table {table_name} created successfully.")
+            self.logger.debug(f"Create table result: {result}")
+            return True
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during table creation: {e}")
+                raise e
+            self._log_detailed_error(f"Creating table {table_name}", e)
+            return False
+
+    async def set_update_policy(self, table_name: str, type_ref: str, query: Optional[str] = None,
+                                source: str = AIO_RAW_DATA_TABLE) -> bool:
+        """
+        Set update policy for a table.
+
+        Args:
+            table_name: Name of the table
+            type_ref: Type reference for the update policy
+            query: Optional policy query; defaults to MoveDataByType for the type reference
+            source: Table the update policy is triggered by
+
+        Returns:
+            bool: True if policy set successfully, False otherwise
+        """
+        if not self._validate_update_policy(table_name, type_ref):
+            return False
+
+        update_cmd = build_update_policy_command(table_name, type_ref, query, source)
+
+        try:
+            self.logger.info(f"Setting update policy for table: {table_name}")
+            self.logger.debug(f"Executing command: {update_cmd}")
+            result = await self._execute_mgmt(update_cmd, KIND_POLICY, table_name)
+            self.logger.info(f"Update policy set successfully for table {table_name}.")
+            self.logger.debug(f"Update policy result: {result}")
+            return True
+        except Exception as e:
+            self._log_detailed_error(f"Setting update policy for table {table_name}", e)
+            return False
+
+    async def create_kusto_function(self) -> bool:
+        """
+        Create the MoveDataByType function in the database.
+
+        Returns:
+            bool: True if function created successfully, False otherwise
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+
+        function_cmd = build_move_data_by_type_function_command(self.routing)
+
+        try:
+            self.logger.info("Creating MoveDataByType function")
+            self.logger.debug(f"Executing command: {function_cmd}")
+            result = await self._execute_mgmt(function_cmd, KIND_FUNCTION, MOVE_DATA_BY_TYPE_FUNCTION)
+            self.logger.info("MoveDataByType function created successfully.")
+            self.logger.debug(f"Create function result: {result}")
+            return True
+        except Exception as e:
+            self._log_detailed_error("Creating MoveDataByType function", e)
+            return False
+
+    async def setup_routing(self, entity_mappings: List[EntityMapping]) -> bool:
+        """
+        Create the AIORoutedData staging table, the RouteRawData function and its update policy.
+
+        Args:
+            entity_mappings: Entity mappings whose type references are routed
+
+        Returns:
+            bool: True if the routing stage was set up successfully, False otherwise
+        """
+        self.logger.info(f"Setting up type routing into {ROUTED_DATA_TABLE}")
+        for command in self._routing_commands(entity_mappings):
+            if not await self.execute_command(command):
+                return False
+        return True
+
+    async def set_ingestion_policies(self, table_name: str) -> bool:
+        """
+        Set the streaming and batching policies of the ingestion profile on a table.
+
+        Args:
+            table_name: Name of the table
+
+        Returns:
+            bool: True if all policies were set (or no profile is configured), False otherwise
+        """
+        commands = self._ingestion_policy_commands(table_name)
+        if commands:
+            self.logger.info(f"Applying ingestion profile '{self.ingestion_profile}' to table {table_name}")
+        return all([await self.execute_command(command) for command in commands])
+
+    async def set_table_policies(self, mapping: EntityMapping) -> bool:
+        """
+        Set the caching and partitioning policies configured for an entity table.
+
+        Args:
+            mapping: Entity mapping
+
+        Returns:
+            bool: True if all policies were set (or none are configured), False otherwise
+        """
+        commands = compile_table_policy_commands(mapping.table_name, mapping.fields, mapping.policies)
+        return all([await self.execute_command(command) for command in commands])
+
+    async def create_latest_view(self, mapping: EntityMapping) -> bool:
+        """
+        Create the last-known-value view of an entity table, if its mapping declares one.
+
+        Args:
+            mapping: Entity mapping
+
+        Returns:
+            bool: True if the view was created (or none is declared), False otherwise
+        """
+        return all([await self.execute_command(command) for command in compile_latest_view_commands(mapping)])
+
+    async def create_latest_values_function(self, entity_mappings: List[EntityMapping]) -> bool:
+        """
+        Create the LatestValues function over the last-known-value views of the mappings.
+
+        Args:
+            entity_mappings: List of entity mappings
+
+        Returns:
+            bool: True if the function was created (or no mapping declares a view), False otherwise
+        """
+        commands = compile_latest_values_function_commands(entity_mappings)
+        return all([await self.execute_command(command) for command in commands])
+
+    async def create_specialized_function(self, table_name: str, body: str) -> bool:
+        """
+        Create the specialised transform function for an entity table.
+
+        Args:
+            table_name: Name of the entity table
+            body: Function body from build_specialized_function_body()
+
+        Returns:
+            bool: True if function created successfully, False otherwise
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+
+        function_name = build_specialized_function_name(table_name)
+        function_cmd = build_specialized_function_command(table_name, body)
+
+        try:
+            self.logger.info(f"Creating {function_name} function")
+            self.logger.debug(f"Executing command: {function_cmd}")
+            result = await self._execute_mgmt(function_cmd, KIND_TRANSFORM, table_name)
+            self.logger.info(f"{function_name} function created successfully.")
+            self.logger.debug(f"Create function result: {result}")
+            return True
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during function creation: {e}")
+                raise e
+            self._log_detailed_error(f"Creating {function_name} function", e)
+            return False
+
+    async def process_entity_mappings(self, entity_mappings: List[EntityMapping],
+                                      max_parallel: Optional[int] = None) -> Dict[str, bool]:
+        """
+        Process a list of entity mappings to create tables and set update policies.
+
+        Up to max_parallel tables are provisioned concurrently as tasks on the running
+        event loop; each table still gets its update policy only after it has been created.
+
+        Args:
+            entity_mappings: List of entity mappings
+            max_parallel: Override for the manager's max_parallel setting
+
+        Returns:
+            dict: Results of processing each mapping {table_name: success_status}
+        """
+        return await run_flow_async(self._entity_mappings_flow(entity_mappings, max_parallel))
+
+    async def execute_database_scripts(self, commands: List[KustoCommand]) -> List[bool]:
+        """
+        Execute commands as one or more `.execute database script` payloads.
+
+        Args:
+            commands: Commands in execution order
+
+        Returns:
+            list: Success status of each command, in the same order as commands
+        """
+        return await run_flow_async(self._database_scripts_flow(commands))
+
+    async def execute_command(self, command: KustoCommand) -> bool:
+        """
+        Execute a single compiled management command.
+
+        Args:
+            command: The command to execute
+
+        Returns:
+            bool: True if the command succeeded, False otherwise
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+
+        try:
+            self.logger.info(f"Executing {command.kind} command on {command.target}")
+            self.logger.debug(f"Executing command: {command.text}")
+            result = await self._execute_mgmt(command.text, command.kind, command.target)
+            self.logger.debug(f"Command result: {result}")
+            return self._table_script_completed(command, result)
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during {command.kind} command on {command.target}: {e}")
+                raise e
+            self._log_detailed_error(f"Executing {command.kind} command on {command.target}", e)
+            return False
+
+    async def fetch_database_snapshot(self, entity_mappings: Optional[List[EntityMapping]] = None
+                                      ) -> Optional[DatabaseSnapshot]:
+        """
+        Fetch the tables, functions and update policies currently defined in the database.
+
+        The table policies the provisioning sets are fetched as well (see
+        EventhouseManager.fetch_database_snapshot).
+
+        Returns:
+            DatabaseSnapshot: The snapshot, or None if it could not be fetched
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return None
+
+        try:
+            self.logger.info("Fetching database catalog snapshot")
+            table_policy_commands = self._table_policy_catalog_commands(entity_mappings or [])
+            catalog_commands = [SHOW_DATABASE_SCHEMA_COMMAND, SHOW_UPDATE_POLICIES_COMMAND,
+                                *table_policy_commands.values()]
+            results = await asyncio.gather(*(self._execute_mgmt(command, KIND_CATALOG, self.database)
+                                             for command in catalog_commands))
+            schema_rows, policy_rows, *table_policy_rows = (list(result.primary_results[0]) for result in results)
+            snapshot = DatabaseSnapshot.from_results(self.database, schema_rows, policy_rows,
+                                                     **dict(zip(table_policy_commands, table_policy_rows)))
+            self.logger.info(f"Catalog snapshot has {len(snapshot.tables)} tables, "
+                             f"{len(snapshot.functions)} functions and {len(snapshot.update_policies)} update policies")
+            return snapshot
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error while fetching database catalog: {e}")
+                raise e
+            self._log_detailed_error("Fetching database catalog snapshot", e)
+            return None
+
+    async def apply_plan(self, plan: ProvisioningPlan) -> bool:
+        """Provision the database from a precompiled plan (see EventhouseManager.apply_plan)."""
+        self._use_plan_options(plan)
+        return await run_flow_async(self._setup_flow(plan.entity_mappings, plan.commands))
+
+    async def setup_tables_from_input(self, type_mappings: Optional[List[str]] = None,
+                                      yaml_file: Optional[str] = None) -> bool:
+        """Setup tables based on command line arguments or YAML file input."""
+        self.logger.info("🚀 Starting table setup from input...")
+
+        # Parsing the mappings and definitions is CPU-bound; keep it off the event loop
+        with self.metrics.phase("resolve_mappings"):
+            entity_mappings = await asyncio.get_running_loop().run_in_executor(
+                None, self.resolve_entity_mappings, type_mappings, yaml_file)
+        if entity_mappings is None:
+            return False
+        return await run_flow_async(self._setup_flow(entity_mappings))
+
+    async def backfill_from_input(self, type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+                                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                  slice_size: timedelta = parse_timespan(DEFAULT_SLICE),
+                                  checkpoint_file: Optional[str] = None) -> bool:
+        """Backfill the entity tables of the input mappings from AIORawData (see EventhouseManager.backfill)."""
+        self.logger.info("🚀 Starting backfill from input...")
+
+        with self.metrics.phase("resolve_mappings"):
+            entity_mappings = await asyncio.get_running_loop().run_in_executor(
+                None, self.resolve_entity_mappings, type_mappings, yaml_file)
+        if entity_mappings is None:
+            return False
+        return await run_flow_async(self._backfill_setup_flow(entity_mappings, start, end, slice_size,
+                                                              checkpoint_file))
+
+    async def backfill(self, entity_mappings: List[EntityMapping], start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, slice_size: timedelta = parse_timespan(DEFAULT_SLICE),
+                       checkpoint_file: Optional[str] = None) -> bool:
+        """
+        Append the transformed raw data of the past to provisioned entity tables.
+
+        Up to max_parallel slices are appended concurrently as tasks on the running
+        event loop (see EventhouseManager.backfill).
+
+        Returns:
+            bool: True if every slice of every table was appended
+        """
+        return await run_flow_async(self._backfill_flow(entity_mappings, start, end, slice_size, checkpoint_file))
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+"""
+Credentials with a persistent token cache, and Kusto clients shared per cluster.
+
+Tokens are only acquired when the first command is sent. Azure CLI tokens are cached
+so that `az` is not invoked on every run, and device code sign-ins are remembered
+through an authentication record so that later runs refresh silently. Cached tokens
+are only written to disk when the platform can encrypt them (DPAPI, Keychain or
+libsecret); otherwise they are kept in memory for the lifetime of the process.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+
+from digitaloperations.fabriceventhousehelperpyapp.entity_catalog import default_cache_dir
+
+
+AUTH_AZURE_CLI = "Azure CLI"
+AUTH_DEVICE_CODE = "Device Code"
+
+TOKEN_CACHE_NAME = "fabriceventhousehelperpyapp"
+TOKEN_CACHE_FILE = "token_cache.bin"
+AUTHENTICATION_RECORD_FILE = "authentication_record.json"
+# Cached tokens are refreshed this long before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+AZURE_CLI_PROFILE_FILE = "azureProfile.json"
+
+logger = logging.getLogger(__name__)
+
+
+def build_token_persistence(path: str) -> Optional[Any]:
+    """
+    Build encrypted on-disk persistence for a token cache.
+
+    Returns:
+        The msal-extensions persistence, or None if the platform cannot encrypt it
+    """
+    try:
+        from msal_extensions import build_encrypted_persistence
+        return build_encrypted_persistence(path)
+    except Exception as e:
+        logger.debug(f"Encrypted token cache unavailable, caching tokens in memory only: {e}")
+        return None
+
+
+def azure_cli_account() -> Optional[str]:
+    """
+    Identify the account the Azure CLI is signed in with, without invoking `az`.
+
+    Returns:
+        "<user>|<tenant id>" of the default subscription in the CLI profile, or None
+        if nobody is signed in or the profile cannot be read
+    """
+    config_dir = os.environ.get("AZURE_CONFIG_DIR") or os.path.join(os.path.expanduser("~"), ".azure")
+    try:
+        with open(os.path.join(config_dir, AZURE_CLI_PROFILE_FILE), 'r', encoding='utf-8-sig') as f:
+            subscriptions = json.load(f).get("subscriptions") or []
+    except (OSError, ValueError, AttributeError) as e:
+        logger.debug(f"Could not read the Azure CLI profile: {e}")
+        return None
+    for subscription in subscriptions:
+        if isinstance(subscription, dict) and subscription.get("isDefault"):
+            user = (subscription.get("user") or {}).get("name")
+            tenant_id = subscription.get("tenantId")
+            return f"{user}|{tenant_id}" if user and tenant_id else None
+    return None
+
+
+class CachingTokenCredential:
+    """
+    Token credential that caches the tokens of another credential.
+
+    Tokens are reused until shortly before they expire, from memory and, when
+    persistence is given, from an encrypted file shared by later runs. Tokens are
+    cached per signed-in account, so after `az login` or `az account set` the
+    tokens of the previous account are not reused.
+    """
+
+    def __init__(self, credential: Any, persistence: Optional[Any] = None,
+                 account: Optional[Callable[[], Optional[str]]] = None):
+        """
+        Initialize the credential.
+
+        Args:
+            credential: Credential whose tokens are cached, e.g. AzureCliCredential
+            persistence: Optional msal-extensions persistence for the cache
+            account: Returns the account the credential is signed in with, e.g.
+                azure_cli_account; persisted tokens are not used while it returns None
+        """
+        self.credential = credential
+        self.persistence = persistence
+        self.account = account
+        self._tokens: Dict[str, AccessToken] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        """Merge tokens persisted by earlier runs into the in-memory cache."""
+        if self.persistence is None:
+            return
+        try:
+            stored = json.loads(self.persistence.load() or "{}")
+        except Exception as e:
+            logger.debug(f"Could not read token cache: {e}")
+            return
+        for key, entry in stored.items():
+            if isinstance(entry, dict) and key not in self._tokens:
+                self._tokens[key] = AccessToken(entry.get("token", ""), int(entry.get("expires_on", 0)))
+
+    def _save(self) -> None:
+        """Persist the unexpired tokens."""
+        if self.persistence is None:
+            return
+        now = time.time()
+        try:
+            self.persistence.save(json.dumps({
+                key: {"token": token.token, "expires_on": token.expires_on}
+                for key, token in self._tokens.items() if token.expires_on > now
+            }))
+        except Exception as e:
+            logger.debug(f"Could not write token cache: {e}")
+
+    def get_token(self, *scopes: str, claims: Optional[str] = None, tenant_id: Optional[str] = None,
+                  **kwargs: Any) -> AccessToken:
+        """Return a cached token for the scopes, acquiring a new one when needed."""
+        if claims:
+            # Claims challenges always need a fresh token
+            return self.credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+        with self._lock:
+            account = self.account() if self.account is not None else ""
+            key = f"{account or ''}|{tenant_id or ''}|{' '.join(sorted(scopes))}"
+            token = self._tokens.get(key)
+            if token is None and account is not None:
+                # Without a known account the persisted tokens could belong to anyone
+                self._load()
+                token = self._tokens.get(key)
+            if token is not None and token.expires_on - TOKEN_REFRESH_MARGIN_SECONDS > time.time():
+                return token
+
+            if tenant_id:
+                kwargs["tenant_id"] = tenant_id
+            token = self.credential.get_token(*scopes, **kwargs)
+            self._tokens[key] = token
+            if account is not None:
+                self._save()
+            return token
+
+
+class DeviceCodeSignInCredential:
+    """
+    Device code credential that remembers the signed-in account.
+
+    The first sign-in stores an authentication record next to the persistent MSAL
+    token cache, so later runs refresh tokens without prompting again.
+    """
+
+    def __init__(self, record_path: Optional[str] = None, credential_factory: Optional[Callable[..., Any]] = None):
+        """
+        Initialize the credential.
+
+        Args:
+            record_path: Authentication record file; None disables persistence
+            credential_factory: Factory for the underlying DeviceCodeCredential
+        """
+        from azure.identity import AuthenticationRecord, DeviceCodeCredential, TokenCachePersistenceOptions
+
+        factory = credential_factory or DeviceCodeCredential
+        self.record_path = record_path
+        options = {}
+        record = None
+        if record_path:
+            options["cache_persistence_options"] = TokenCachePersistenceOptions(name=TOKEN_CACHE_NAME)
+            try:
+                with open(record_path, 'r', encoding='utf-8') as f:
+                    record = AuthenticationRecord.deserialize(f.read())
+                options["authentication_record"] = record
+            except (OSError, ValueError, KeyError):
+                record = None
+        self.credential = factory(**options)
+        self._needs_record = bool(record_path) and record is None
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Sign in on first use (saving the authentication record), then return a token."""
+        with self._lock:
+            if self._needs_record:
+                record = self.credential.authenticate(scopes=list(scopes))
+                self._save_record(record)
+                self._needs_record = False
+        return self.credential.get_token(*scopes, **kwargs)
+
+    def _save_record(self, record: Any) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.record_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.record_path), suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(record.serialize())
+            os.replace(temp_path, self.record_path)
+        except OSError as e:
+            logger.debug(f"Could not save authentication record: {e}")
+
+
+class FallbackTokenCredential:
+    """
+    Tries credentials in order and sticks with the first one that returns a token.
+    """
+
+    def __init__(self, credentials: List[Tuple[str, Any]]):
+        """
+        Initialize the credential.
+
+        Args:
+            credentials: (method name, credential) pairs in the order they are tried
+        """
+        self.credentials = credentials
+        self.method: Optional[str] = None
+        self._credential = None
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Return a token from the credential that worked before, or the first one that works."""
+        if self._credential is not None:
+            return self._credential.get_token(*scopes, **kwargs)
+
+        # One thread runs the fallback chain; the others wait and reuse the credential it picked
+        with self._lock:
+            if self._credential is not None:
+                return self._credential.get_token(*scopes, **kwargs)
+
+            errors = []
+            for method, credential in self.credentials:
+                try:
+                    logger.info(f"Acquiring token using {method} authentication")
+                    token = credential.get_token(*scopes, **kwargs)
+                except Exception as e:
+                    logger.warning(f"{method} authentication failed: {e}")
+                    errors.append(f"{method}: {e}")
+                    continue
+                logger.info(f"Successfully authenticated using {method}.")
+                self.method, self._credential = method, credential
+                return token
+            raise ClientAuthenticationError("All authentication methods failed. " + "; ".join(errors))
+
+    def close(self) -> None:
+        """Keep the credentials open; they are shared by every client of the process."""
+        pass
+
+
+def build_credential(token_cache: bool = True, cache_dir: Optional[str] = None) -> FallbackTokenCredential:
+    """
+    Build the credential used for Kusto clients: Azure CLI first, then device code.
+
+    Args:
+        token_cache: Persist tokens and the device code sign-in across runs
+        cache_dir: Directory for the token cache and authentication record
+    """
+    from azure.identity import AzureCliCredential
+
+    cache_dir = cache_dir or default_cache_dir()
+    persistence = build_token_persistence(os.path.join(cache_dir, TOKEN_CACHE_FILE)) if token_cache else None
+    # Without encryption the MSAL cache would be stored in plain text, so the sign-in is not persisted either
+    record_path = os.path.join(cache_dir, AUTHENTICATION_RECORD_FILE) if persistence is not None else None
+    return FallbackTokenCredential([
+        (AUTH_AZURE_CLI, CachingTokenCredential(AzureCliCredential(), persistence, azure_cli_account)),
+        (AUTH_DEVICE_CODE, DeviceCodeSignInCredential(record_path)),
+    ])
+
+
+_clients: Dict[Tuple[str, ...], Any] = {}
+_clients_lock = threading.Lock()
+# Serialises client creation without holding _clients_lock, which factories may need
+_create_lock = threading.Lock()
+_credential: Optional[FallbackTokenCredential] = None
+
+
+def get_shared_credential() -> FallbackTokenCredential:
+    """Return the credential shared by all clients of the process, building it on first use."""
+    global _credential
+    with _clients_lock:
+        if _credential is None:
+            _credential = build_credential()
+        return _credential
+
+
+def _client_key(cluster_url: str, *options: Any) -> Tuple[str, ...]:
+    return (cluster_url.strip().rstrip("/").lower(),) + tuple(str(option) for option in options)
+
+
+def get_shared_client(cluster_url: str, factory: Callable[[], Any], *options: Any) -> Any:
+    """
+    Return the Kusto client shared by all managers of a cluster, creating it with factory.
+
+    Args:
+        cluster_url: Cluster URL; trailing slashes and case are ignored
+        factory: Creates the client when none is cached yet
+        options: Additional values that must match for a client to be shared
+    """
+    key = _client_key(cluster_url, *options)
+    with _clients_lock:
+        client = _clients.get(key)
+    if client is not None:
+        return client
+    with _create_lock:
+        with _clients_lock:
+            client = _clients.get(key)
+        if client is None:
+            client = factory()
+            with _clients_lock:
+                _clients[key] = client
+        return client
+
+
+def has_shared_client(cluster_url: str, *options: Any) -> bool:
+    """Check whether a client for the cluster is already cached."""
+    with _clients_lock:
+        return _client_key(cluster_url, *options) in _clients
+
+
+def clear_client_cache() -> None:
+    """Forget all shared clients and the shared credential."""
+    global _credential
+    with _clients_lock:
+        _clients.clear()
+        _credential = None
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+"""
+Backfill of entity tables from the raw data already in AIORawData.
+
+An update policy only transforms the rows ingested after it was set, so the table
+of a type that has been streaming for months starts empty. A backfill replays the
+MoveDataByType transform of the type over the raw rows of an ingestion time range,
+one `.set-or-append` command per table and time slice:
+
+    .set-or-append Test_Pump with (tags='["ingest-by:backfill:..."]', ingestIfNotExists='["backfill:..."]') <|
+    AIORawData
+    | where ingestion_time() >= datetime(2024-05-01T00:00:00Z) and ingestion_time() < datetime(2024-05-02T00:00:00Z)
+    | where type endswith "..."
+    ...
+    | project <the columns of Test_Pump>
+
+MoveDataByType itself reads the whole of AIORawData, so each slice inlines the same
+pipeline with the time filter applied first. Slice boundaries are multiples of the
+slice size, and every slice is tagged: a slice sent again after a lost response is
+not appended twice.
+
+The range of each table and every completed slice are appended to a checkpoint
+file as the backfill runs; a rerun with the same checkpoint skips the completed
+slices. By default a range starts at the first raw row and stops at the first row
+the table's update policy delivered (or now, for an empty table), so the backfill
+does not duplicate the rows the policy already transformed.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    AIO_RAW_DATA_TABLE,
+    KIND_BACKFILL,
+    KustoCommand,
+    build_move_data_query,
+    build_raw_data_source,
+)
+from digitaloperations.fabriceventhousehelperpyapp.flows import Flow, Parallel, run_flow
+from digitaloperations.fabriceventhousehelperpyapp.local_transform import parse_kusto_datetime
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping
+from digitaloperations.fabriceventhousehelperpyapp.transforms import (
+    build_conforming_query,
+    quote_identifier,
+    quote_string,
+)
+
+
+DEFAULT_SLICE = "1d"
+CHECKPOINT_VERSION = 1
+TAG_PREFIX = "backfill"
+# Column of the union of entity tables naming the table a row comes from
+ENTITY_TABLE_COLUMN = "EntityTable"
+
+RAW_DATA_START_QUERY = f"{AIO_RAW_DATA_TABLE}\n| summarize Start = min(ingestion_time())"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillError(ValueError):
+    """Raised when a backfill range or checkpoint file is invalid"""
+    pass
+
+
+class BackfillSlice(NamedTuple):
+    """An ingestion time range of the raw data replayed into one entity table."""
+    table_name: str
+    start: datetime
+    end: datetime
+
+    @property
+    def key(self) -> str:
+        """Identifies the slice in the checkpoint file and in the extent tags of its rows."""
+        return f"{TAG_PREFIX}:{self.table_name}:{format_kusto_datetime(self.start)}:{format_kusto_datetime(self.end)}"
+
+
+class BackfillResult(NamedTuple):
+    """Outcome of a backfill run."""
+    tables: Dict[str, bool]
+    slices: int
+    resumed: int
+    failed: int
+    rows: int
+    seconds: float
+
+
+def format_kusto_datetime(value: datetime) -> str:
+    """Format a datetime as the UTC ISO 8601 text of a KQL datetime() literal."""
+    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds" if value.microsecond else "seconds") + "Z"
+
+
+def default_checkpoint_path(database: str) -> str:
+    """Checkpoint file used when none is given: one per database, in the working directory."""
+    return f"backfill-{database}.checkpoint.jsonl"
+
+
+def build_first_ingestion_query(table_names: List[str]) -> str:
+    """Query of the earliest ingestion time in each of the given tables; empty tables have no row."""
+    tables = ", ".join(quote_identifier(name) for name in table_names)
+    return (f"union withsource={ENTITY_TABLE_COLUMN} {tables}\n"
+            f"| summarize Start = min(ingestion_time()) by {ENTITY_TABLE_COLUMN}")
+
+
+def split_range(start: datetime, end: datetime, slice_size: timedelta) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) at the multiples of slice_size since the Unix epoch.
+
+    Aligned boundaries keep the slices of a table the same from one run to the next
+    for the same range; only the first and last slice can be shorter.
+    """
+    if slice_size <= timedelta(0):
+        raise BackfillError(f"Backfill slice must be positive: {slice_size}")
+    slices = []
+    boundary = _EPOCH + (start - _EPOCH) // slice_size * slice_size
+    while boundary < end:
+        next_boundary = boundary + slice_size
+        slices.append((max(start, boundary), min(end, next_boundary)))
+        boundary = next_boundary
+    return slices
+
+
+def plan_backfill_slices(ranges: Dict[str, Tuple[datetime, datetime]],
+                         slice_size: timedelta) -> List[BackfillSlice]:
+    """Slices of every table, oldest first; slices of the same period of different tables are adjacent."""
+    slices = [BackfillSlice(table_name, slice_start, slice_end)
+              for table_name, (start, end) in ranges.items()
+              for slice_start, slice_end in split_range(start, end, slice_size)]
+    return sorted(slices, key=lambda backfill_slice: backfill_slice.start)
+
+
+def build_backfill_query(mapping: EntityMapping, start: datetime, end: datetime) -> str:
+    """Build the MoveDataByType transform of the raw rows of a type ingested in [start, end)."""
+    time_filter = (f"ingestion_time() >= datetime({format_kusto_datetime(start)}) "
+                   f"and ingestion_time() < datetime({format_kusto_datetime(end)})")
+    source = build_raw_data_source(quote_string(mapping.type_ref), time_filter)
+    return build_conforming_query(build_move_data_query(source), mapping.fields)
+
+
+def build_backfill_command(mapping: EntityMapping, backfill_slice: BackfillSlice) -> KustoCommand:
+    """
+    Build the command appending one slice to its table.
+
+    The rows are tagged with the slice key, and ingestIfNotExists skips the append
+    when the table already holds rows tagged with it.
+    """
+    tags = json.dumps([f"ingest-by:{backfill_slice.key}"])
+    if_not_exists = json.dumps([backfill_slice.key])
+    query = build_backfill_query(mapping, backfill_slice.start, backfill_slice.end)
+    return KustoCommand(KIND_BACKFILL, mapping.table_name,
+                        f".set-or-append {quote_identifier(mapping.table_name)} "
+                        f"with (tags='{tags}', ingestIfNotExists='{if_not_exists}') <|\n{query}")
+
+
+def count_appended_rows(result: Any) -> int:
+    """Sum the RowCount of the extents reported by a .set-or-append command."""
+    rows = list(result.primary_results[0]) if result.primary_results else []
+    try:
+        return sum(int(row["RowCount"] or 0) for row in rows)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return 0
+
+
+class BackfillCheckpoint:
+    """
+    Append-only record of the table ranges and completed slices of a backfill.
+
+    The file holds JSON lines: a header naming the database, then one line per
+    table range and one per completed slice. Each line is written as soon as it is
+    known, so an interrupted run loses at most the slices still in flight.
+    """
+
+    def __init__(self, path: str, database: str):
+        self.path = path
+        self.database = database
+        self.ranges: Dict[str, Tuple[datetime, datetime]] = {}
+        self.completed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, database: str) -> "BackfillCheckpoint":
+        """
+        Load a checkpoint file, or start an empty checkpoint if it does not exist.
+
+        A truncated last line, left by an interrupted write, is dropped.
+
+        Raises:
+            OSError: If the file cannot be read or repaired
+            BackfillError: If the file is not a backfill checkpoint of the database
+        """
+        checkpoint = cls(path, database)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return checkpoint
+
+        records = []
+        for number, line in enumerate(lines, 1):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                if number < len(lines):
+                    raise BackfillError(f"Invalid line {number} in backfill checkpoint {path}")
+                checkpoint._rewrite(lines[:-1])
+        if not records:
+            return checkpoint
+
+        header = records[0]
+        if not isinstance(header, dict) or header.get("version") != CHECKPOINT_VERSION:
+            raise BackfillError(f"{path} is not a version {CHECKPOINT_VERSION} backfill checkpoint")
+        if header.get("database") != database:
+            raise BackfillError(f"Backfill checkpoint {path} belongs to database {header.get('database')!r}")
+        for record in records[1:]:
+            if "table" in record:
+                checkpoint.ranges[record["table"]] = (parse_kusto_datetime(record["start"]),
+                                                      parse_kusto_datetime(record["end"]))
+            elif "slice" in record:
+                checkpoint.completed[record["slice"]] = record.get("rows", 0)
+        return checkpoint
+
+    def add_range(self, table_name: str, start: datetime, end: datetime) -> None:
+        """Record the ingestion time range backfilled into a table."""
+        self._append({"table": table_name, "start": format_kusto_datetime(start), "end": format_kusto_datetime(end)})
+        self.ranges[table_name] = (start, end)
+
+    def mark_completed(self, backfill_slice: BackfillSlice, rows: int) -> None:
+        """Record a slice as appended."""
+        self._append({"slice": backfill_slice.key, "rows": rows})
+        self.completed[backfill_slice.key] = rows
+
+    def is_completed(self, backfill_slice: BackfillSlice) -> bool:
+        """Check whether a slice was appended by this or an earlier run."""
+        return backfill_slice.key in self.completed
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Append a line to the file, writing the header first if the file is new."""
+        with self._lock:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if new:
+                    f.write(json.dumps({"version": CHECKPOINT_VERSION, "database": self.database}) + "\n")
+                f.write(json.dumps(record) + "\n")
+
+    def _rewrite(self, lines: List[str]) -> None:
+        """Replace the file with the given lines."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(line + "\n" for line in lines)
+        os.replace(temp_path, self.path)
+
+
+def run_backfill(slices: List[BackfillSlice], append_slice: Callable[[BackfillSlice], Optional[int]],
+                 checkpoint: BackfillCheckpoint, max_parallel: int = 1,
+                 log: Optional[logging.Logger] = None) -> BackfillResult:
+    """
+    Append the slices not completed yet on up to max_parallel threads, logging progress.
+
+    Args:
+        slices: Slices to backfill, in the order they are started
+        append_slice: Appends a slice and returns the number of rows appended, or None
+            if it failed; exceptions it raises (authentication errors) abort the run
+        checkpoint: Checkpoint the completed slices are recorded in
+        max_parallel: Number of slices appended concurrently
+        log: Logger of the progress messages
+    """
+    return run_flow(backfill_flow(slices, append_slice, checkpoint, max_parallel, log), "backfill")
+
+
+def backfill_flow(slices: List[BackfillSlice], append_slice: Callable[[BackfillSlice], Any],
+                  checkpoint: BackfillCheckpoint, max_parallel: int = 1,
+                  log: Optional[logging.Logger] = None) -> Flow:
+    """
+    Flow of run_backfill() (see flows.py).
+
+    append_slice may also return a coroutine or a flow, which the runner awaits or
+    runs, so the asyncio manager appends the slices as tasks.
+    """
+    log = log or logger
+    tables = {backfill_slice.table_name: True for backfill_slice in slices}
+    pending = [backfill_slice for backfill_slice in slices if not checkpoint.is_completed(backfill_slice)]
+    resumed = len(slices) - len(pending)
+    if resumed:
+        log.info(f"Resuming from {checkpoint.path}: {resumed}/{len(slices)} slices already appended")
+
+    lock = threading.Lock()
+    progress = {"done": 0, "failed": 0, "rows": 0}
+    start = time.perf_counter()
+
+    def run(backfill_slice: BackfillSlice) -> Flow:
+        rows = yield partial(append_slice, backfill_slice)
+        if rows is not None:
+            checkpoint.mark_completed(backfill_slice, rows)
+        with lock:
+            progress["done"] += 1
+            if rows is None:
+                progress["failed"] += 1
+                tables[backfill_slice.table_name] = False
+            else:
+                progress["rows"] += rows
+            done, total_rows = progress["done"], progress["rows"]
+        elapsed = time.perf_counter() - start
+        remaining = elapsed / done * (len(pending) - done)
+        outcome = "failed" if rows is None else f"{rows} rows"
+        log.info(f"Backfill {done}/{len(pending)} ({done / len(pending):.0%}): {backfill_slice.table_name} "
+                 f"{format_kusto_datetime(backfill_slice.start)} to {format_kusto_datetime(backfill_slice.end)} "
+                 f"{outcome}; {total_rows} rows in {elapsed:.0f}s, about {remaining:.0f}s left")
+
+    yield Parallel([run(backfill_slice) for backfill_slice in pending], min(max_parallel, len(pending)))
+    return BackfillResult(tables, len(slices), resumed, progress["failed"], progress["rows"],
+                          time.perf_counter() - start)
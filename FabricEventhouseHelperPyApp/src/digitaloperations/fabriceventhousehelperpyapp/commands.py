@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""
+Builders for the Kusto management commands issued by the EventhouseManager.
+
+Keeping the command text in one place lets the same commands be executed one at a
+time or compiled into `.execute database script` payloads.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+AIO_RAW_DATA_TABLE = "AIORawData"
+AIO_RAW_DATA_SCHEMA = (
+    "['key']: string, value: string, topic: string, ['partition']: int, "
+    "offset: long, timestamp: datetime, timestampType: int, headers: dynamic, "
+    "['id']: string, source: string, ['type']: string, subject: string, "
+    "['time']: string, ['data']: string"
+)
+# Staging table written once per ingestion by the routing stage (see routing.py)
+ROUTED_DATA_TABLE = "AIORoutedData"
+MOVE_DATA_BY_TYPE_FUNCTION = "MoveDataByType"
+MOVE_DATA_BY_TYPE_PARAMETERS = "typeRef:string, targetTable:string"
+
+# Command kinds
+KIND_TABLE = "table"
+KIND_FUNCTION = "function"
+KIND_POLICY = "policy"
+# Functions that feed one table; outcomes count towards that table, not MoveDataByType
+KIND_TRANSFORM = "transform"
+# Materialized views over a table (and functions over them); outcomes count towards that table
+KIND_VIEW = "view"
+# Commands on one table sent as a single script that stops at its first failure
+KIND_TABLE_SCRIPT = "table_script"
+# Appends of historical raw data to a table (see backfill.py)
+KIND_BACKFILL = "backfill"
+
+# Entities the entity tables depend on; commands on them run before all others
+SHARED_TARGETS = (AIO_RAW_DATA_TABLE, ROUTED_DATA_TABLE, MOVE_DATA_BY_TYPE_FUNCTION)
+
+# Kusto rejects very large requests, so scripts are split well below that limit
+DEFAULT_MAX_SCRIPT_BYTES = 512 * 1024
+SCRIPT_HEADER = ".execute database script with (ContinueOnErrors=true) <|"
+TABLE_SCRIPT_HEADER = ".execute database script with (ContinueOnErrors=false) <|"
+
+# Outcome reported in the Result column of `.execute database script`
+SCRIPT_RESULT_COMPLETED = "Completed"
+
+
+class KustoCommand(NamedTuple):
+    """A single management command and the database entity it applies to."""
+    kind: str
+    target: str
+    text: str
+
+
+def build_create_table_command(table_name: str, schema: str) -> str:
+    """Build the `.create table` command for a table and its schema."""
+    return f".create table {table_name} ({schema})"
+
+
+def build_alter_merge_table_command(table_name: str, columns: str) -> str:
+    """Build the `.alter-merge table` command that adds columns to an existing table."""
+    return f".alter-merge table {table_name} ({columns})"
+
+
+def build_create_merge_table_command(table_name: str, schema: str) -> str:
+    """
+    Build the `.create-merge table` command for a table and its schema.
+
+    It creates a missing table and appends the columns an existing table lacks;
+    existing columns are never dropped or retyped.
+    """
+    return f".create-merge table {table_name} ({schema})"
+
+
+def build_update_policy_query(table_name: str, type_ref: str) -> str:
+    """Build the update policy query that moves a type's raw data into its entity table."""
+    return f'{MOVE_DATA_BY_TYPE_FUNCTION}("{type_ref}", "{table_name}")'
+
+
+def build_update_policy(table_name: str, type_ref: str, query: Optional[str] = None,
+                        source: str = AIO_RAW_DATA_TABLE) -> List[Dict[str, Any]]:
+    """
+    Build the update policy object for an entity table.
+
+    The query defaults to MoveDataByType for the table's type reference.
+    """
+    return [{
+        "IsEnabled": True,
+        "Source": source,
+        "Query": query or build_update_policy_query(table_name, type_ref),
+        "IsTransactional": False
+    }]
+
+
+def build_update_policy_command(table_name: str, type_ref: str, query: Optional[str] = None,
+                                source: str = AIO_RAW_DATA_TABLE) -> str:
+    """Build the `.alter table policy update` command that feeds a table from AIORawData (or another source)."""
+    policy = json.dumps(build_update_policy(table_name, type_ref, query, source), separators=(',', ':'))
+    # Single quotes must be doubled inside a verbatim string literal
+    policy = policy.replace("'", "''")
+    return f".alter table {table_name} policy update @'{policy}'"
+
+
+def build_move_data_by_type_function_body(routed: bool = False) -> str:
+    """
+    Build the body of the MoveDataByType function.
+
+    With routed=True the function reads the routing staging table, which already
+    carries an exact TypeRef and the Identifier, instead of scanning AIORawData.
+    """
+    if routed:
+        source = f"""{ROUTED_DATA_TABLE}
+    | where TypeRef == typeRef"""
+    else:
+        source = build_raw_data_source("typeRef")
+    return f"""{{
+    {build_move_data_query(source)}
+}}"""
+
+
+def build_raw_data_source(type_ref: str, time_filter: Optional[str] = None) -> str:
+    """
+    Build the AIORawData rows of a type, with their Identifier, as read by MoveDataByType.
+
+    Args:
+        type_ref: KQL expression of the type reference (a parameter name or a string literal)
+        time_filter: Optional predicate applied before the type filter, e.g. on ingestion_time()
+    """
+    source = AIO_RAW_DATA_TABLE
+    if time_filter:
+        source += f"""
+    | where {time_filter}"""
+    return f"""{source}
+    | where type endswith {type_ref}
+    | extend Identifier = tostring(split(subject, "/")[0])"""
+
+
+def build_move_data_query(source: str) -> str:
+    """Build the MoveDataByType pivot of the raw rows of one type into entity table rows."""
+    return f"""{source}
+    | extend Prefix = strcat_array(array_slice(split(subject, "/"), 1, -1), "_")
+    | extend fixedJson = strcat(substring(data, 0, strlen(data) - 3), substring(data, strlen(data) - 2))
+    | project Identifier, Prefix, fixedJson, data
+    | extend ParsedData = parse_json(data)
+    | extend keys = bag_keys(ParsedData)
+    | where keys != ""
+    | mv-expand telemetryName = keys
+    | extend fieldDetails = ParsedData[tostring(telemetryName)]
+    | extend telemetryValue = fieldDetails["Value"], Timestamp = todatetime(fieldDetails["ServerTimestamp"])
+    | project Identifier, Timestamp, tostring(telemetryName), telemetryValue
+    | summarize bag = make_bag(pack(tostring(telemetryName), telemetryValue)) by Identifier, Timestamp
+    | evaluate bag_unpack(bag)"""
+
+
+def build_move_data_by_type_function_command(routed: bool = False) -> str:
+    """Build the command that creates (or updates) the MoveDataByType function."""
+    return (f".create-or-alter function {MOVE_DATA_BY_TYPE_FUNCTION}({MOVE_DATA_BY_TYPE_PARAMETERS})\n"
+            f"{build_move_data_by_type_function_body(routed)}")
+
+
+def build_database_script(commands: Iterable[KustoCommand]) -> str:
+    """
+    Build a single `.execute database script` payload for a list of commands.
+
+    ContinueOnErrors is enabled so that the result table reports an outcome for
+    every command instead of stopping at the first failure.
+    """
+    return SCRIPT_HEADER + "\n" + "\n\n".join(command.text for command in commands)
+
+
+def build_table_script_command(table_name: str, commands: Iterable[KustoCommand]) -> KustoCommand:
+    """
+    Combine commands on one table into a single script command.
+
+    The script stops at the first failing command, so later commands (e.g. an update
+    policy that relies on new columns) are never applied without the earlier ones.
+    """
+    return KustoCommand(KIND_TABLE_SCRIPT, table_name,
+                        TABLE_SCRIPT_HEADER + "\n" + "\n\n".join(command.text for command in commands))
+
+
+def chunk_commands(commands: List[KustoCommand], max_script_bytes: int = DEFAULT_MAX_SCRIPT_BYTES) -> List[List[KustoCommand]]:
+    """
+    Split commands into ordered chunks whose database script stays below max_script_bytes.
+
+    A command larger than the limit on its own is placed in a chunk by itself, and so
+    is every table script, as scripts cannot be nested.
+    """
+    chunks = []
+    current = []
+    current_size = len(SCRIPT_HEADER.encode('utf-8'))
+
+    for command in commands:
+        # Account for the blank line that separates commands in the script
+        command_size = len(command.text.encode('utf-8')) + 2
+        standalone = command.kind == KIND_TABLE_SCRIPT
+        if current and (standalone or current_size + command_size > max_script_bytes):
+            chunks.append(current)
+            current = []
+            current_size = len(SCRIPT_HEADER.encode('utf-8'))
+        current.append(command)
+        current_size += command_size
+        if standalone:
+            chunks.append(current)
+            current = []
+            current_size = len(SCRIPT_HEADER.encode('utf-8'))
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def group_commands_by_target(commands: List[KustoCommand]) -> Tuple[List[int], List[List[int]]]:
+    """
+    Split compiled commands into a leading serial part and independent per-target groups.
+
+    Returns:
+        tuple: (indices of the commands up to the last one on a SHARED_TARGETS entity,
+        [indices of each remaining target's commands, in order])
+    """
+    shared_end = max((index + 1 for index, command in enumerate(commands) if command.target in SHARED_TARGETS),
+                     default=0)
+    groups: Dict[str, List[int]] = {}
+    for index in range(shared_end, len(commands)):
+        groups.setdefault(commands[index].target, []).append(index)
+    return list(range(shared_end)), list(groups.values())
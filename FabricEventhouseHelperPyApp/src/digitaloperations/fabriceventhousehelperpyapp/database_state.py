@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""
+Snapshot of the tables, functions, materialized views and table policies that exist in a database.
+
+The snapshot is built from `.show database schema as json` and
+`.show table * policy update` (plus the commands of the other table policies that
+are provisioned) so the desired provisioning state can be diffed against the
+database without issuing one command per table.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+SHOW_DATABASE_SCHEMA_COMMAND = ".show database schema as json"
+SHOW_UPDATE_POLICIES_COMMAND = ".show table * policy update"
+SHOW_STREAMING_INGESTION_POLICIES_COMMAND = ".show table * policy streamingingestion"
+SHOW_INGESTION_BATCHING_POLICIES_COMMAND = ".show table * policy ingestionbatching"
+SHOW_CACHING_POLICIES_COMMAND = ".show table * policy caching"
+SHOW_PARTITIONING_POLICIES_COMMAND = ".show table * policy partitioning"
+SHOW_RETENTION_POLICIES_COMMAND = ".show table * policy retention"
+
+# Kusto reports the canonical name for type aliases used in schemas
+KUSTO_TYPE_ALIASES = {
+    "boolean": "bool",
+    "double": "real",
+    "date": "datetime",
+    "time": "timespan",
+    "int32": "int",
+    "int64": "long",
+    "uniqueid": "guid",
+}
+
+# Update policy properties that are compared when diffing
+UPDATE_POLICY_KEYS = ("IsEnabled", "Source", "Query", "IsTransactional")
+# Ingestion batching policy properties that are compared when diffing
+INGESTION_BATCHING_POLICY_KEYS = ("MaximumBatchingTimeSpan", "MaximumNumberOfItems", "MaximumRawDataSizeMB")
+
+
+def normalize_kusto_type(kusto_type: str) -> str:
+    """Normalize a Kusto type name to the canonical name reported by the service."""
+    kusto_type = kusto_type.strip().lower()
+    return KUSTO_TYPE_ALIASES.get(kusto_type, kusto_type)
+
+
+def normalize_column_name(name: str) -> str:
+    """Strip bracket quoting (e.g. ['key']) from a column name."""
+    name = name.strip()
+    match = re.fullmatch(r"\[\s*(['\"])(.*)\1\s*\]", name)
+    return match.group(2) if match else name
+
+
+def parse_schema(schema: str) -> List[Tuple[str, str, str]]:
+    """
+    Parse a table schema such as "['key']: string, value: string".
+
+    Returns:
+        list: (column_name, kusto_type, column_spec) tuples in schema order
+    """
+    columns = []
+    for spec in schema.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        name, _, kusto_type = spec.rpartition(":")
+        columns.append((normalize_column_name(name), normalize_kusto_type(kusto_type), spec))
+    return columns
+
+
+def normalize_kql(text: str) -> str:
+    """Collapse whitespace so that formatting differences do not count as changes."""
+    return " ".join(text.split())
+
+
+def parse_table_policy_rows(rows: List[Any]) -> Dict[str, Any]:
+    """
+    Parse the rows of a `.show table * policy <kind>` command.
+
+    Returns:
+        dict: {table_name: policy} for the tables that have the policy set
+    """
+    policies = {}
+    for row in rows:
+        # EntityName looks like "[database].[table]"
+        table_name = row["EntityName"].rsplit(".", 1)[-1].strip("[]")
+        policy = row["Policy"]
+        if isinstance(policy, str):
+            policy = json.loads(policy) if policy and policy != "null" else None
+        if policy:
+            policies[table_name] = policy
+    return policies
+
+
+class DatabaseSnapshot:
+    """
+    The tables, functions, materialized views and table policies defined in a database at one point in time.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, Dict[str, str]]] = None,
+                 functions: Optional[Dict[str, str]] = None,
+                 update_policies: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 streaming_ingestion_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 ingestion_batching_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 caching_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 partitioning_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 materialized_views: Optional[Dict[str, Dict[str, str]]] = None,
+                 retention_policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Initialize the snapshot.
+
+        Args:
+            tables: {table_name: {column_name: kusto_type}}
+            functions: {function_name: body}
+            update_policies: {table_name: update policy list}
+            streaming_ingestion_policies: {table_name: streaming ingestion policy}
+            ingestion_batching_policies: {table_name: ingestion batching policy}
+            caching_policies: {table_name: caching policy}
+            partitioning_policies: {table_name: partitioning policy}
+            materialized_views: {view_name: {"SourceTable": ..., "Query": ...}}
+            retention_policies: {table_name: retention policy}
+        """
+        self.tables = tables or {}
+        self.functions = functions or {}
+        self.update_policies = update_policies or {}
+        self.streaming_ingestion_policies = streaming_ingestion_policies or {}
+        self.ingestion_batching_policies = ingestion_batching_policies or {}
+        self.caching_policies = caching_policies or {}
+        self.partitioning_policies = partitioning_policies or {}
+        self.materialized_views = materialized_views or {}
+        self.retention_policies = retention_policies or {}
+
+    @classmethod
+    def from_results(cls, database: str, schema_rows: List[Any], policy_rows: List[Any],
+                     streaming_rows: Optional[List[Any]] = None,
+                     batching_rows: Optional[List[Any]] = None, caching_rows: Optional[List[Any]] = None,
+                     partitioning_rows: Optional[List[Any]] = None,
+                     retention_rows: Optional[List[Any]] = None) -> "DatabaseSnapshot":
+        """
+        Build a snapshot from the primary results of the catalog commands.
+
+        Args:
+            database: Database name, used to locate the database in the schema JSON
+            schema_rows: Rows of `.show database schema as json`
+            policy_rows: Rows of `.show table * policy update`
+            streaming_rows: Rows of `.show table * policy streamingingestion`, if fetched
+            batching_rows: Rows of `.show table * policy ingestionbatching`, if fetched
+            caching_rows: Rows of `.show table * policy caching`, if fetched
+            partitioning_rows: Rows of `.show table * policy partitioning`, if fetched
+            retention_rows: Rows of `.show table * policy retention`, if fetched
+        """
+        tables = {}
+        functions = {}
+        materialized_views = {}
+        if schema_rows:
+            schema = json.loads(schema_rows[0]["DatabaseSchema"])
+            databases = schema.get("Databases", {})
+            # The schema is keyed by database name; fall back to the only entry if names differ in case
+            db_schema = databases.get(database) or next(iter(databases.values()), {})
+            for table_name, table in (db_schema.get("Tables") or {}).items():
+                tables[table_name] = {
+                    column["Name"]: normalize_kusto_type(column.get("CslType", "string"))
+                    for column in table.get("OrderedColumns", [])
+                }
+            for function_name, function in (db_schema.get("Functions") or {}).items():
+                functions[function_name] = function.get("Body", "")
+            for view_name, view in (db_schema.get("MaterializedViews") or {}).items():
+                materialized_views[view_name] = {"SourceTable": view.get("SourceTable", ""),
+                                                 "Query": view.get("Query", "")}
+
+        return cls(tables, functions, parse_table_policy_rows(policy_rows),
+                   parse_table_policy_rows(streaming_rows or []), parse_table_policy_rows(batching_rows or []),
+                   parse_table_policy_rows(caching_rows or []), parse_table_policy_rows(partitioning_rows or []),
+                   materialized_views, parse_table_policy_rows(retention_rows or []))
+
+    def diff_table(self, table_name: str, schema: str) -> Tuple[List[str], List[str]]:
+        """
+        Compare the desired schema of a table with the snapshot.
+
+        Returns:
+            tuple: (column specs missing from the table, descriptions of type conflicts).
+            Both are empty when the table is up to date; callers check table existence
+            separately with has_table().
+        """
+        existing = self.tables.get(table_name, {})
+        missing = []
+        conflicts = []
+        for column_name, kusto_type, spec in parse_schema(schema):
+            existing_type = existing.get(column_name)
+            if existing_type is None:
+                missing.append(spec)
+            elif existing_type != kusto_type:
+                conflicts.append(f"{column_name}: existing {existing_type}, desired {kusto_type}")
+        return missing, conflicts
+
+    def has_table(self, table_name: str) -> bool:
+        """Check whether a table exists in the snapshot."""
+        return table_name in self.tables
+
+    def function_matches(self, function_name: str, body: str) -> bool:
+        """Check whether a function exists with the given body."""
+        existing = self.functions.get(function_name)
+        return existing is not None and normalize_kql(existing) == normalize_kql(body)
+
+    def update_policy_matches(self, table_name: str, policy: List[Dict[str, Any]]) -> bool:
+        """Check whether a table's update policy matches the desired policy."""
+        existing = self.update_policies.get(table_name)
+        if not existing or len(existing) != len(policy):
+            return False
+        for current, desired in zip(existing, policy):
+            for key in UPDATE_POLICY_KEYS:
+                current_value = current.get(key)
+                desired_value = desired.get(key)
+                if key == "Query":
+                    current_value = normalize_kql(current_value or "")
+                    desired_value = normalize_kql(desired_value or "")
+                if current_value != desired_value:
+                    return False
+        return True
+
+    def streaming_ingestion_matches(self, table_name: str, enabled: bool) -> bool:
+        """
+        Check whether a table's streaming ingestion policy is set as desired.
+
+        A table without its own policy does not match either way, because it inherits
+        the database policy.
+        """
+        policy = self.streaming_ingestion_policies.get(table_name)
+        return policy is not None and bool(policy.get("IsEnabled")) == enabled
+
+    def ingestion_batching_matches(self, table_name: str, policy: Dict[str, Any]) -> bool:
+        """Check whether a table's ingestion batching policy matches the desired policy."""
+        existing = self.ingestion_batching_policies.get(table_name)
+        return existing is not None and all(existing.get(key) == policy.get(key)
+                                            for key in INGESTION_BATCHING_POLICY_KEYS)
+
+    def has_materialized_view(self, view_name: str) -> bool:
+        """Check whether a materialized view exists in the snapshot."""
+        return view_name in self.materialized_views
+
+    def materialized_view_matches(self, view_name: str, source_table: str, query: str) -> bool:
+        """Check whether a materialized view exists over source_table with the given query."""
+        view = self.materialized_views.get(view_name)
+        return (view is not None and view["SourceTable"] == source_table
+                and normalize_kql(view["Query"].strip().strip("{}")) == normalize_kql(query))
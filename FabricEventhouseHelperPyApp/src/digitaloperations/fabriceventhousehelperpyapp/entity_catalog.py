@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""
+Indexed catalog of the entity types defined in EntityTypeDefinitions.json.
+
+Entities are compiled once into their Kusto column specs and indexed by
+(Namespace, Name) and by TypeReference, so resolving a mapping is a dictionary
+lookup. A compiled catalog can be cached on disk and reused for as long as the
+definitions file does not change. A cached catalog may hold only the entities
+earlier runs selected (complete is False); it then serves the mappings whose
+entities it holds by name, and the others are selected from the file again.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pickle
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - ijson is installed with azure-kusto-data
+    ijson = None
+
+from digitaloperations.fabriceventhousehelperpyapp.models import Column, TypeMapping
+
+
+DEFAULT_IDENTIFIER_COLUMN = Column("Identifier", "string")
+DEFAULT_TIMESTAMP_COLUMN = Column("Timestamp", "datetime")
+
+# Entity value types mapped to Kusto data types; anything else becomes a string
+KUSTO_TYPE_MAPPING = {
+    "Number": "double",
+    "Boolean": "boolean",
+    "String": "string",
+    "Object": "dynamic",
+    "DateTime": "datetime"
+}
+
+# Bump when the pickled layout changes so stale caches are rebuilt
+# Version 2 stores the columns of an entry as Column tuples, version 3 whether the
+# catalog holds the whole file
+CACHE_VERSION = 3
+CACHE_DIR_ENV_VAR = "FABRIC_EVENTHOUSE_HELPER_CACHE_DIR"
+
+logger = logging.getLogger(__name__)
+
+# Errors raised for malformed JSON by the streaming and the fallback parser
+DEFINITIONS_DECODE_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson else ())
+
+
+class DefinitionsFormatError(ValueError):
+    """Raised when the entity definitions file does not contain a JSON array"""
+    pass
+
+
+def iter_entity_definitions(f: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Stream entity definitions from a file containing a JSON array.
+
+    With ijson installed only one entity is materialised at a time; otherwise the
+    whole file is parsed with the json module.
+
+    Args:
+        f: File object opened in binary mode
+
+    Raises:
+        TypeError: If f is a text stream, which ijson would have to re-encode
+    """
+    if isinstance(f.read(0), str):
+        raise TypeError("Entity definitions must be read from a file opened in binary mode")
+    if ijson is None:
+        data = json.load(f)
+        if not isinstance(data, list):
+            raise DefinitionsFormatError("Entity definitions must be a JSON array")
+        yield from data
+        return
+
+    events = ijson.parse(f, use_float=True)
+    first = next(events, None)
+    if first is None or first[1] != 'start_array':
+        raise DefinitionsFormatError("Entity definitions must be a JSON array")
+    yield from ijson.items(itertools.chain([first], events), 'item')
+
+
+def select_entity_definitions(definitions: Iterable[Dict[str, Any]],
+                              type_mappings: Dict[str, TypeMapping]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield only the entity definitions referenced by a set of type mappings.
+
+    Entities are selected by (Namespace, Name) or TypeReference. Iteration stops as
+    soon as every mapping has been matched by name, so the rest of the file is never
+    parsed.
+
+    Args:
+        definitions: Entity definitions, typically from iter_entity_definitions()
+        type_mappings: {typeRef: TypeMapping}
+    """
+    names = {(mapping.namespace, mapping.entity_name) for mapping in type_mappings.values()}
+    type_refs = set(type_mappings)
+    remaining = set(names)
+    if not remaining:
+        return
+
+    for entity in definitions:
+        key = (entity.get('Namespace', ''), entity.get('Name', ''))
+        if key in names or entity.get('TypeReference') in type_refs:
+            yield entity
+            remaining.discard(key)
+            if not remaining:
+                return
+
+
+def get_kusto_data_type(value_type: str) -> str:
+    """Convert EntityTypeDefinitions value type to Kusto data type."""
+    return KUSTO_TYPE_MAPPING.get(value_type, "string")
+
+
+def compile_entity_columns(entity: Dict[str, Any]) -> Tuple[Column, ...]:
+    """
+    Compile an entity definition into its table columns.
+
+    Properties come first, then TimeseriesProperties, followed by Identifier and
+    Timestamp unless the entity already defines them.
+    """
+    columns = []
+    for prop in list(entity.get('Properties') or []) + list(entity.get('TimeseriesProperties') or []):
+        columns.append(Column(prop.get('name', 'Unknown'), get_kusto_data_type(prop.get('valueType', 'String'))))
+
+    # Add Identifier and Timestamp only if not already present
+    names = {column.name for column in columns}
+    for column in (DEFAULT_IDENTIFIER_COLUMN, DEFAULT_TIMESTAMP_COLUMN):
+        if column.name not in names:
+            columns.append(column)
+    return tuple(columns)
+
+
+def default_cache_dir() -> str:
+    """Directory used for compiled catalogs unless overridden."""
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return os.environ[CACHE_DIR_ENV_VAR]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "fabriceventhousehelperpyapp")
+
+
+def _file_sha256(path: str) -> str:
+    """Hash a file in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(json_file_path: str, cache_dir: str) -> str:
+    """Cache file for a definitions file, keyed by its absolute path."""
+    key = hashlib.sha256(os.path.abspath(json_file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"entity_catalog_{key}.pickle")
+
+
+class CatalogEntry(NamedTuple):
+    """A compiled entity type definition."""
+    namespace: str
+    name: str
+    type_reference: Optional[str]
+    columns: Tuple[Column, ...]
+
+
+class EntityCatalog:
+    """
+    Entity type definitions indexed by (Namespace, Name) and by TypeReference.
+    """
+
+    def __init__(self, entities: Iterable[Dict[str, Any]] = (), complete: bool = False):
+        """
+        Initialize the catalog.
+
+        Args:
+            entities: Raw entity definitions as found in EntityTypeDefinitions.json
+            complete: The entities are the whole definitions file, not a selection
+        """
+        self.complete = complete
+        self._by_name: Dict[Tuple[str, str], CatalogEntry] = {}
+        self._by_type_ref: Dict[str, CatalogEntry] = {}
+        # Entities share most of their columns, so equal columns are stored once
+        self._columns: Dict[Column, Column] = {}
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity: Dict[str, Any]) -> CatalogEntry:
+        """Compile an entity definition and add it to the indexes."""
+        entry = CatalogEntry(
+            namespace=entity.get('Namespace', ''),
+            name=entity.get('Name', ''),
+            type_reference=entity.get('TypeReference') or None,
+            columns=compile_entity_columns(entity)
+        )
+        self.add_entry(entry)
+        return entry
+
+    def add_entry(self, entry: CatalogEntry) -> None:
+        """Add a compiled entry; the first definition of a name wins, as with a linear scan."""
+        entry = entry._replace(columns=tuple(self._columns.setdefault(column, column) for column in entry.columns))
+        self._by_name.setdefault((entry.namespace, entry.name), entry)
+        if entry.type_reference:
+            self._by_type_ref.setdefault(entry.type_reference, entry)
+
+    def find(self, namespace: str, name: str, type_ref: Optional[str] = None) -> Optional[CatalogEntry]:
+        """
+        Find an entity by namespace and name, falling back to its TypeReference.
+
+        Returns:
+            CatalogEntry: The matching entry, or None if there is no match
+        """
+        entry = self._by_name.get((namespace, name))
+        if entry is None and type_ref:
+            entry = self._by_type_ref.get(type_ref)
+        return entry
+
+    def covers(self, type_mappings: Dict[str, TypeMapping]) -> bool:
+        """
+        Whether the catalog resolves the mappings as the whole file would.
+
+        A selection only does for mappings whose entities it holds by name: one found by
+        TypeReference alone may have a definition of that name elsewhere in the file.
+        """
+        return self.complete or all((mapping.namespace, mapping.entity_name) in self._by_name
+                                    for mapping in type_mappings.values())
+
+    def select(self, type_mappings: Dict[str, TypeMapping]) -> "EntityCatalog":
+        """Catalog of only the entries the mappings resolve to."""
+        catalog = EntityCatalog()
+        for type_ref, mapping in type_mappings.items():
+            entry = self.find(mapping.namespace, mapping.entity_name, type_ref)
+            if entry is not None:
+                catalog.add_entry(entry)
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def __iter__(self) -> Iterator[CatalogEntry]:
+        return iter(self._by_name.values())
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._by_name
+
+    @classmethod
+    def load_cached(cls, json_file_path: str, cache_dir: Optional[str] = None) -> Optional["EntityCatalog"]:
+        """
+        Load the compiled catalog for a definitions file from the on-disk cache.
+
+        The cache is valid when the file size and modification time match; if only the
+        modification time changed, the content hash decides.
+
+        Returns:
+            EntityCatalog: The cached catalog, or None if there is no valid cache
+        """
+        cache_path = _cache_path(json_file_path, cache_dir or default_cache_dir())
+        try:
+            stat = os.stat(json_file_path)
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            return None
+
+        if not isinstance(cached, dict) or cached.get("version") != CACHE_VERSION:
+            return None
+        if cached.get("size") != stat.st_size:
+            return None
+        if cached.get("mtime_ns") != stat.st_mtime_ns:
+            try:
+                if _file_sha256(json_file_path) != cached.get("sha256"):
+                    return None
+            except OSError:
+                return None
+
+        catalog = cls(complete=cached.get("complete") is True)
+        for entry in cached.get("entries", []):
+            catalog.add_entry(CatalogEntry(*entry))
+        return catalog
+
+    def save_cache(self, json_file_path: str, cache_dir: Optional[str] = None) -> bool:
+        """
+        Write the compiled catalog to the on-disk cache.
+
+        Returns:
+            bool: True if the cache was written, False otherwise
+        """
+        cache_dir = cache_dir or default_cache_dir()
+        try:
+            stat = os.stat(json_file_path)
+            payload = {
+                "version": CACHE_VERSION,
+                "source": os.path.abspath(json_file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": _file_sha256(json_file_path),
+                "complete": self.complete,
+                "entries": [tuple(entry) for entry in self._all_entries()]
+            }
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file first so concurrent runs never read a partial cache
+            fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, _cache_path(json_file_path, cache_dir))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            return True
+        except OSError as e:
+            logger.debug(f"Could not write entity catalog cache for {json_file_path}: {e}")
+            return False
+
+    def _all_entries(self) -> List[CatalogEntry]:
+        """All entries, including those only reachable by TypeReference."""
+        entries = list(self._by_name.values())
+        seen = {id(entry) for entry in entries}
+        entries.extend(entry for entry in self._by_type_ref.values() if id(entry) not in seen)
+        return entries
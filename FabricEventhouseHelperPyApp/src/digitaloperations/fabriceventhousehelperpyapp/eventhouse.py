@@ -3,11 +3,138 @@
 import json
 import logging
 import os
-import yaml
-from typing import List, Optional, Dict, Any
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
 from azure.kusto.data.exceptions import KustoServiceError
 
+from digitaloperations.fabriceventhousehelperpyapp.auth import (
+    AUTH_AZURE_CLI,
+    AUTH_DEVICE_CODE,
+    get_shared_client,
+    get_shared_credential,
+)
+from digitaloperations.fabriceventhousehelperpyapp.backfill import (
+    DEFAULT_SLICE,
+    ENTITY_TABLE_COLUMN,
+    RAW_DATA_START_QUERY,
+    BackfillCheckpoint,
+    BackfillError,
+    BackfillSlice,
+    backfill_flow,
+    build_backfill_command,
+    build_first_ingestion_query,
+    count_appended_rows,
+    default_checkpoint_path,
+    plan_backfill_slices,
+)
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    AIO_RAW_DATA_SCHEMA,
+    AIO_RAW_DATA_TABLE,
+    DEFAULT_MAX_SCRIPT_BYTES,
+    KIND_FUNCTION,
+    KIND_POLICY,
+    KIND_TABLE,
+    KIND_TABLE_SCRIPT,
+    KIND_TRANSFORM,
+    MOVE_DATA_BY_TYPE_FUNCTION,
+    ROUTED_DATA_TABLE,
+    SCRIPT_RESULT_COMPLETED,
+    KustoCommand,
+    build_alter_merge_table_command,
+    build_create_merge_table_command,
+    build_create_table_command,
+    build_database_script,
+    build_move_data_by_type_function_body,
+    build_move_data_by_type_function_command,
+    build_table_script_command,
+    build_update_policy,
+    build_update_policy_command,
+    build_update_policy_query,
+    chunk_commands,
+    group_commands_by_target,
+)
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    SHOW_CACHING_POLICIES_COMMAND,
+    SHOW_DATABASE_SCHEMA_COMMAND,
+    SHOW_INGESTION_BATCHING_POLICIES_COMMAND,
+    SHOW_PARTITIONING_POLICIES_COMMAND,
+    SHOW_RETENTION_POLICIES_COMMAND,
+    SHOW_STREAMING_INGESTION_POLICIES_COMMAND,
+    SHOW_UPDATE_POLICIES_COMMAND,
+    DatabaseSnapshot,
+)
+from digitaloperations.fabriceventhousehelperpyapp.entity_catalog import (
+    DEFINITIONS_DECODE_ERRORS,
+    DefinitionsFormatError,
+    EntityCatalog,
+    get_kusto_data_type,
+    iter_entity_definitions,
+    select_entity_definitions,
+)
+from digitaloperations.fabriceventhousehelperpyapp.flows import Flow, Parallel, run_flow
+from digitaloperations.fabriceventhousehelperpyapp.ingestion_profiles import (
+    compile_ingestion_policy_commands,
+    get_ingestion_profile,
+)
+from digitaloperations.fabriceventhousehelperpyapp.latest_values import (
+    LATEST_VALUES_FUNCTION,
+    compile_latest_values_function_commands,
+    compile_latest_view_commands,
+    latest_value_tables,
+    parse_latest_values,
+)
+from digitaloperations.fabriceventhousehelperpyapp.local_transform import parse_kusto_datetime
+from digitaloperations.fabriceventhousehelperpyapp.metrics import (
+    KIND_CATALOG,
+    KIND_QUERY,
+    KIND_SCRIPT,
+    OUTCOME_SUCCEEDED,
+    CommandMetric,
+    MetricsRecorder,
+)
+from digitaloperations.fabriceventhousehelperpyapp.mapping_files import expand_mapping_paths, load_yaml_files
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, TypeMapping, parse_columns
+from digitaloperations.fabriceventhousehelperpyapp.plan import (
+    PLAN_FILE_HASH_LENGTH,
+    PLAN_OPTIONS,
+    ProvisioningPlan,
+)
+from digitaloperations.fabriceventhousehelperpyapp.routing import (
+    ROUTE_RAW_DATA_FUNCTION,
+    ROUTED_DATA_SCHEMA,
+    build_routing_function_body,
+    build_routing_function_command,
+    build_routing_retention_policy_command,
+    build_routing_update_policy,
+    build_routing_update_policy_query,
+    build_type_ref_expression,
+    compile_routing_commands,
+    routing_retention_policy_matches,
+)
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import (
+    DEFAULT_MAX_PARALLEL,
+    DEFAULT_MAX_RETRIES,
+    CommandScheduler,
+    classify_error,
+)
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import (
+    TablePolicies,
+    compile_table_policy_commands,
+    parse_table_policies,
+    parse_timespan,
+)
+from digitaloperations.fabriceventhousehelperpyapp.transforms import (
+    build_conforming_query,
+    build_specialized_function_body,
+    build_specialized_function_command,
+    build_specialized_function_name,
+    build_specialized_update_policy_query,
+    quote_identifier,
+)
+
 
 # Custom exceptions
 class AuthenticationError(Exception):
@@ -21,15 +148,7 @@ class AzureCliAuthenticationError(AuthenticationError):
 
 
 # Constants
-DEFAULT_IDENTIFIER_FIELD = "Identifier:string"
-DEFAULT_TIMESTAMP_FIELD = "Timestamp:datetime"
-AIO_RAW_DATA_TABLE = "AIORawData"
-AIO_RAW_DATA_SCHEMA = (
-    "['key']: string, value: string, topic: string, ['partition']: int, "
-    "offset: long, timestamp: datetime, timestampType: int, headers: dynamic, "
-    "['id']: string, source: string, ['type']: string, subject: string, "
-    "['time']: string, ['data']: string"
-)
+ENTITY_TYPE_DEFINITIONS_FILE = os.path.join(os.path.dirname(__file__), 'EntityTypeDefinitions.json')
 
 # Error messages
 MSG_CLIENT_NOT_AUTH = "Client not authenticated. Call authenticate() first."
@@ -41,7 +160,14 @@ class EventhouseManager:
     A class to manage Fabric Eventhouse operations including table creation and update policies.
     """
     
-    def __init__(self, cluster_url: str, database: str, log_file: Optional[str] = None, verbose: bool = False):
+    def __init__(self, cluster_url: str, database: str, log_file: Optional[str] = None, verbose: bool = False,
+                 max_parallel: int = DEFAULT_MAX_PARALLEL, batch: bool = False,
+                 max_script_bytes: int = DEFAULT_MAX_SCRIPT_BYTES, incremental: bool = False,
+                 definitions_cache: bool = True, definitions_cache_dir: Optional[str] = None,
+                 specialized_transforms: bool = False, routing: bool = False,
+                 type_ref_expression: Optional[str] = None, definitions_file: Optional[str] = None,
+                 token_cache: bool = True, max_retries: int = DEFAULT_MAX_RETRIES,
+                 ingestion_profile: Optional[str] = None, evolve: bool = False):
         """
         Initialize the EventhouseManager.
         
@@ -50,15 +176,61 @@ class EventhouseManager:
             database: The database name
             log_file: Optional log file path. If None, logs to console.
             verbose: Enable debug-level logging
+            max_parallel: Maximum number of entity tables provisioned concurrently (1 = serial)
+            batch: Provision everything through `.execute database script` payloads
+            max_script_bytes: Maximum size of a single database script in batch mode
+            incremental: Diff against a catalog snapshot and only issue commands for changes
+            definitions_cache: Reuse the compiled entity catalog cached on disk
+            definitions_cache_dir: Directory for the compiled entity catalog cache
+            specialized_transforms: Feed each entity table through a generated per-table
+                transform function instead of the generic MoveDataByType function
+            routing: Resolve each raw message's type reference once at ingestion into the
+                AIORoutedData staging table and feed the entity tables from there
+            type_ref_expression: KQL expression that extracts the exact type reference
+                from an AIORawData row; defaults to matching the mapped type references
+            definitions_file: Entity type definitions to use instead of the packaged
+                EntityTypeDefinitions.json
+            token_cache: Authenticate lazily through a cached credential and share one
+                KustoClient per cluster; False builds a new Azure CLI client per manager
+            max_retries: Retries per management command for throttled and transient errors
+            ingestion_profile: Name of the ingestion profile (see ingestion_profiles.py) whose
+                streaming and batching policies are set on every provisioned table
+            evolve: Evolve existing entity tables in place (implies incremental): new
+                columns are merged in, any column type conflict stops the run before a
+                change is applied, and the transform and update policy of each evolved
+                table are regenerated for its new columns in the same request
         """
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        if ingestion_profile is not None:
+            get_ingestion_profile(ingestion_profile)
+        
         self.cluster_url = cluster_url
         self.database = database
+        self.max_parallel = max_parallel
+        self.batch = batch
+        self.max_script_bytes = max_script_bytes
+        self.incremental = incremental or evolve
+        self.evolve = evolve
+        self.definitions_cache = definitions_cache
+        self.definitions_cache_dir = definitions_cache_dir
+        self.specialized_transforms = specialized_transforms
+        self.routing = routing
+        self.type_ref_expression = type_ref_expression
+        self.ingestion_profile = ingestion_profile
+        self.definitions_file = definitions_file or ENTITY_TYPE_DEFINITIONS_FILE
+        self.token_cache = token_cache
         self.client = None
+        # {table_name: success_status} of the last setup, plan apply or backfill
+        self.table_results: Dict[str, bool] = {}
         
         # Configure logging
         self.logger = logging.getLogger(__name__)
         # Set logger level based on verbose parameter
         self.logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        # Retries and adaptive concurrency for every management command
+        self.scheduler = CommandScheduler(max_concurrency=max_parallel, max_retries=max_retries, logger=self.logger)
+        self.metrics = MetricsRecorder(database)
         self.file_handler = None
         
         # Add file handler if log_file is specified
@@ -135,20 +307,33 @@ class EventhouseManager:
             # Log all attributes of the exception for debugging
             self.logger.debug(f"Exception attributes: {[attr for attr in dir(error) if not attr.startswith('_')]}")
     
+    @staticmethod
+    def _is_authentication_error(error: Exception) -> bool:
+        """Check whether an exception raised by the Kusto client is an authentication failure."""
+        return "KustoAuthenticationError" in str(type(error)) or "authentication" in str(error).lower()
+    
+    def _connection_string_builders(self) -> List[Tuple[str, Any]]:
+        """Authentication methods tried in order when the token cache is disabled."""
+        return [
+            (AUTH_AZURE_CLI, lambda: KustoConnectionStringBuilder.with_az_cli_authentication(self.cluster_url)),
+            (AUTH_DEVICE_CODE, lambda: KustoConnectionStringBuilder.with_aad_device_authentication(self.cluster_url))
+        ]
+    
     def authenticate(self) -> bool:
         """
         Authenticate to the Kusto cluster using AAD authentication.
-        Tries multiple authentication methods in order.
+        
+        With the token cache enabled the client is shared by all managers targeting the
+        same cluster and tokens are acquired when the first command is sent (Azure CLI,
+        then Device Code). Otherwise tries multiple authentication methods in order.
         
         Returns:
             bool: True if authentication successful, False otherwise
         """
-        auth_methods = [
-            ("Azure CLI", lambda: KustoConnectionStringBuilder.with_az_cli_authentication(self.cluster_url)),
-            ("Device Code", lambda: KustoConnectionStringBuilder.with_aad_device_authentication(self.cluster_url))
-        ]
+        if self.token_cache:
+            return self._authenticate_with_cached_credential()
         
-        for method_name, kcsb_builder in auth_methods:
+        for method_name, kcsb_builder in self._connection_string_builders():
             try:
                 self.logger.info(f"Attempting {method_name} authentication to cluster: {self.cluster_url}")
                 kcsb = kcsb_builder()
@@ -163,17 +348,78 @@ class EventhouseManager:
         self.logger.error("All authentication methods failed.")
         return False
     
-    def create_table(self, table_name: str, schema: str) -> bool:
+    def _authenticate_with_cached_credential(self) -> bool:
         """
-        Create a table in the database.
+        Attach the shared client of the cluster, creating it with a cached credential.
         
-        Args:
-            table_name: Name of the table to create
-            schema: Table schema definition
-            
         Returns:
-            bool: True if table created successfully, False otherwise
+            bool: True if a client is available, False otherwise
         """
+        created = []
+        
+        def create_client():
+            created.append(True)
+            return KustoClient(KustoConnectionStringBuilder.with_azure_token_credential(self.cluster_url, credential))
+        
+        try:
+            credential = get_shared_credential()
+            self.client = get_shared_client(self.cluster_url, create_client)
+        except Exception as e:
+            self.logger.error(f"Failed to create client for cluster {self.cluster_url}: {str(e)}")
+            self._log_detailed_error("Authentication", e)
+            return False
+        if not created:
+            self.logger.info(f"Reusing authenticated client for cluster: {self.cluster_url}")
+            return True
+        self.logger.info(f"Created client for cluster: {self.cluster_url} "
+                         f"(tokens are acquired on the first command via {AUTH_AZURE_CLI}, then {AUTH_DEVICE_CODE})")
+        return True
+    
+    def _execute_mgmt(self, command: str, kind: str, target: str) -> Any:
+        """
+        Send a management command through the scheduler and record its metrics.
+        
+        Throttled and transient failures are retried; the error of the last attempt,
+        or any permanent or authentication error, is raised to the caller.
+        
+        Args:
+            command: Command text
+            kind: Command kind reported in the metrics
+            target: Table (or other object) the command applies to
+        """
+        return self._execute_request(command, kind, target, lambda: self.client.execute_mgmt(self.database, command))
+    
+    def _execute_query(self, query: str, target: str) -> Any:
+        """Run a query through the scheduler, with the retries and metrics of management commands."""
+        return self._execute_request(query, KIND_QUERY, target, lambda: self.client.execute(self.database, query))
+    
+    def _execute_request(self, text: str, kind: str, target: str, request: Callable[[], Any]) -> Any:
+        """Send a request through the scheduler and record its metrics."""
+        attempts = 0
+        
+        def send():
+            nonlocal attempts
+            attempts += 1
+            return request()
+        
+        start_ns, start = time.time_ns(), time.perf_counter()
+        outcome = OUTCOME_SUCCEEDED
+        try:
+            return self.scheduler.run(send, text.split("\n", 1)[0][:80])
+        except Exception as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            self._record_command(text, kind, target, start_ns, time.perf_counter() - start, attempts, outcome)
+    
+    def _record_command(self, command: str, kind: str, target: str, start_ns: int, latency: float,
+                        attempts: int, outcome: str) -> None:
+        """Record the metrics of a management command."""
+        self.metrics.record(CommandMetric(kind, target, start_ns, latency, attempts,
+                                          len(command.encode('utf-8')) * attempts, outcome))
+    
+    def _validate_create_table(self, table_name: str, schema: str) -> bool:
+        """Check that the client is authenticated and the table definition is usable."""
         if not self.client:
             self.logger.error(MSG_CLIENT_NOT_AUTH)
             return False
@@ -186,59 +432,83 @@ class EventhouseManager:
         if not schema or not schema.strip():
             self.logger.error("Table schema cannot be empty")
             return False
+        return True
+    
+    def _validate_update_policy(self, table_name: str, type_ref: str) -> bool:
+        """Check that the client is authenticated and the update policy target is usable."""
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+        
+        # Input validation
+        if not table_name or not table_name.strip():
+            self.logger.error("Table name cannot be empty")
+            return False
+        
+        if not type_ref or not type_ref.strip():
+            self.logger.error("Type reference cannot be empty")
+            return False
             
-        create_cmd = f".create table {table_name} ({schema})"
+        if not table_name.isidentifier():
+            self.logger.error(MSG_INVALID_TABLE_NAME)
+            return False
+        return True
+    
+    def create_table(self, table_name: str, schema: str) -> bool:
+        """
+        Create a table in the database.
+        
+        Args:
+            table_name: Name of the table to create
+            schema: Table schema definition
+            
+        Returns:
+            bool: True if table created successfully, False otherwise
+        """
+        if not self._validate_create_table(table_name, schema):
+            return False
+            
+        create_cmd = build_create_table_command(table_name, schema)
         
         try:
             self.logger.info(f"Creating table: {table_name}")
             self.logger.debug(f"Executing command: {create_cmd}")
-            result = self.client.execute_mgmt(self.database, create_cmd)
+            result = self._execute_mgmt(create_cmd, KIND_TABLE, table_name)
             self.logger.info(f"Table {table_name} created successfully.")
             self.logger.debug(f"Create table result: {result}")
             return True
         except Exception as e:
             # Check if this is a KustoAuthenticationError and re-raise it
-            if "KustoAuthenticationError" in str(type(e)) or "authentication" in str(e).lower():
+            if self._is_authentication_error(e):
                 self.logger.error(f"Authentication error during table creation: {e}")
                 raise e  # Re-raise authentication errors so they can be handled at main level
             else:
                 self._log_detailed_error(f"Creating table {table_name}", e)
                 return False
     
-    def set_update_policy(self, table_name: str, type_ref: str) -> bool:
+    def set_update_policy(self, table_name: str, type_ref: str, query: Optional[str] = None,
+                          source: str = AIO_RAW_DATA_TABLE) -> bool:
         """
         Set update policy for a table.
         
         Args:
             table_name: Name of the table
             type_ref: Type reference for the update policy
+            query: Optional policy query; defaults to MoveDataByType for the type reference
+            source: Table the update policy is triggered by
             
         Returns:
             bool: True if policy set successfully, False otherwise
         """
-        if not self.client:
-            self.logger.error(MSG_CLIENT_NOT_AUTH)
-            return False
-        
-        # Input validation
-        if not table_name or not table_name.strip():
-            self.logger.error("Table name cannot be empty")
-            return False
-        
-        if not type_ref or not type_ref.strip():
-            self.logger.error("Type reference cannot be empty")
-            return False
-            
-        if not table_name.isidentifier():
-            self.logger.error(MSG_INVALID_TABLE_NAME)
+        if not self._validate_update_policy(table_name, type_ref):
             return False
 
-        update_cmd = f""".alter table {table_name} policy update @'[{{"IsEnabled":true,"Source":"{AIO_RAW_DATA_TABLE}","Query":"MoveDataByType(\\\"{type_ref}\\\", \\\"{table_name}\\\")","IsTransactional":false}}]'"""
+        update_cmd = build_update_policy_command(table_name, type_ref, query, source)
         
         try:
             self.logger.info(f"Setting update policy for table: {table_name}")
             self.logger.debug(f"Executing command: {update_cmd}")
-            result = self.client.execute_mgmt(self.database, update_cmd)
+            result = self._execute_mgmt(update_cmd, KIND_POLICY, table_name)
             self.logger.info(f"Update policy set successfully for table {table_name}.")
             self.logger.debug(f"Update policy result: {result}")
             return True
@@ -260,29 +530,12 @@ class EventhouseManager:
             self.logger.error(MSG_CLIENT_NOT_AUTH)
             return False
 
-        function_cmd = """.create-or-alter function MoveDataByType(typeRef:string, targetTable:string)
-{
-    AIORawData
-    | where type endswith typeRef
-    | extend Identifier = tostring(split(subject, "/")[0])
-    | extend Prefix = strcat_array(array_slice(split(subject, "/"), 1, -1), "_")
-    | extend fixedJson = strcat(substring(data, 0, strlen(data) - 3), substring(data, strlen(data) - 2))
-    | project Identifier, Prefix, fixedJson, data
-    | extend ParsedData = parse_json(data)
-    | extend keys = bag_keys(ParsedData)
-    | where keys != ""
-    | mv-expand telemetryName = keys
-    | extend fieldDetails = ParsedData[tostring(telemetryName)]
-    | extend telemetryValue = fieldDetails["Value"], Timestamp = todatetime(fieldDetails["ServerTimestamp"])
-    | project Identifier, Timestamp, tostring(telemetryName), telemetryValue
-    | summarize bag = make_bag(pack(tostring(telemetryName), telemetryValue)) by Identifier, Timestamp
-    | evaluate bag_unpack(bag)
-}"""
+        function_cmd = build_move_data_by_type_function_command(self.routing)
 
         try:
             self.logger.info("Creating MoveDataByType function")
             self.logger.debug(f"Executing command: {function_cmd}")
-            result = self.client.execute_mgmt(self.database, function_cmd)
+            result = self._execute_mgmt(function_cmd, KIND_FUNCTION, MOVE_DATA_BY_TYPE_FUNCTION)
             self.logger.info("MoveDataByType function created successfully.")
             self.logger.debug(f"Create function result: {result}")
             return True
@@ -293,69 +546,761 @@ class EventhouseManager:
             self._log_detailed_error("Creating MoveDataByType function", e)
             return False
     
-    def process_entity_mappings(self, entity_mappings: List[Dict[str, Any]]) -> Dict[str, bool]:
+    @property
+    def _policy_source(self) -> str:
+        """Source table of the entity update policies."""
+        return ROUTED_DATA_TABLE if self.routing else AIO_RAW_DATA_TABLE
+    
+    def _type_ref_expression(self, entity_mappings: List[EntityMapping]) -> str:
+        """Expression the routing stage uses to resolve the type reference of a raw message."""
+        return self.type_ref_expression or build_type_ref_expression(mapping.type_ref for mapping in entity_mappings)
+    
+    def setup_routing(self, entity_mappings: List[EntityMapping]) -> bool:
+        """
+        Create the AIORoutedData staging table, the RouteRawData function and its update policy.
+        
+        Args:
+            entity_mappings: Entity mappings whose type references are routed
+            
+        Returns:
+            bool: True if the routing stage was set up successfully, False otherwise
+        """
+        self.logger.info(f"Setting up type routing into {ROUTED_DATA_TABLE}")
+        for command in self._routing_commands(entity_mappings):
+            if not self.execute_command(command):
+                return False
+        return True
+    
+    def _routing_commands(self, entity_mappings: List[EntityMapping]) -> List[KustoCommand]:
+        """Routing stage commands, with the ingestion policies of the staging table after its creation."""
+        commands = compile_routing_commands((mapping.type_ref for mapping in entity_mappings),
+                                            self.type_ref_expression)
+        return commands[:1] + self._ingestion_policy_commands(ROUTED_DATA_TABLE) + commands[1:]
+    
+    def _ingestion_policy_commands(self, table_name: str) -> List[KustoCommand]:
+        """Streaming and batching policy commands of the ingestion profile, if one is set."""
+        if not self.ingestion_profile:
+            return []
+        return compile_ingestion_policy_commands(table_name, self.ingestion_profile)
+    
+    def _ingestion_policy_changes(self, table_name: str, snapshot: DatabaseSnapshot) -> List[KustoCommand]:
+        """Ingestion policy commands for the policies of a table that differ from the snapshot."""
+        commands = self._ingestion_policy_commands(table_name)
+        if not commands:
+            return []
+        profile = get_ingestion_profile(self.ingestion_profile)
+        streaming, batching = commands
+        changes = []
+        if not snapshot.streaming_ingestion_matches(table_name, profile.streaming):
+            changes.append(streaming)
+        if not snapshot.ingestion_batching_matches(table_name, profile.batching_policy()):
+            changes.append(batching)
+        return changes
+    
+    def set_ingestion_policies(self, table_name: str) -> bool:
+        """
+        Set the streaming and batching policies of the ingestion profile on a table.
+        
+        Args:
+            table_name: Name of the table
+            
+        Returns:
+            bool: True if all policies were set (or no profile is configured), False otherwise
+        """
+        commands = self._ingestion_policy_commands(table_name)
+        if commands:
+            self.logger.info(f"Applying ingestion profile '{self.ingestion_profile}' to table {table_name}")
+        return all([self.execute_command(command) for command in commands])
+    
+    def _specialized_function_body(self, mapping: EntityMapping) -> Optional[str]:
+        """Body of the specialised transform for a mapping, or None if it uses MoveDataByType."""
+        if not self.specialized_transforms:
+            return None
+        return build_specialized_function_body(mapping.type_ref, mapping.fields, self.routing)
+    
+    def create_specialized_function(self, table_name: str, body: str) -> bool:
+        """
+        Create the specialised transform function for an entity table.
+        
+        Args:
+            table_name: Name of the entity table
+            body: Function body from build_specialized_function_body()
+            
+        Returns:
+            bool: True if function created successfully, False otherwise
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+        
+        function_name = build_specialized_function_name(table_name)
+        function_cmd = build_specialized_function_command(table_name, body)
+        
+        try:
+            self.logger.info(f"Creating {function_name} function")
+            self.logger.debug(f"Executing command: {function_cmd}")
+            result = self._execute_mgmt(function_cmd, KIND_TRANSFORM, table_name)
+            self.logger.info(f"{function_name} function created successfully.")
+            self.logger.debug(f"Create function result: {result}")
+            return True
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during function creation: {e}")
+                raise e
+            self._log_detailed_error(f"Creating {function_name} function", e)
+            return False
+    
+    def set_table_policies(self, mapping: EntityMapping) -> bool:
+        """
+        Set the caching and partitioning policies configured for an entity table.
+        
+        Args:
+            mapping: Entity mapping
+            
+        Returns:
+            bool: True if all policies were set (or none are configured), False otherwise
+        """
+        commands = compile_table_policy_commands(mapping.table_name, mapping.fields, mapping.policies)
+        return all([self.execute_command(command) for command in commands])
+    
+    def create_latest_view(self, mapping: EntityMapping) -> bool:
+        """
+        Create the last-known-value view of an entity table, if its mapping declares one.
+        
+        Args:
+            mapping: Entity mapping
+            
+        Returns:
+            bool: True if the view was created (or none is declared), False otherwise
+        """
+        return all([self.execute_command(command) for command in compile_latest_view_commands(mapping)])
+    
+    def create_latest_values_function(self, entity_mappings: List[EntityMapping]) -> bool:
+        """
+        Create the LatestValues function over the last-known-value views of the mappings.
+        
+        Args:
+            entity_mappings: Entity mappings
+            
+        Returns:
+            bool: True if the function was created (or no mapping declares a view), False otherwise
+        """
+        commands = compile_latest_values_function_commands(entity_mappings)
+        return all([self.execute_command(command) for command in commands])
+    
+    def _entity_mapping_flow(self, mapping: EntityMapping) -> Flow:
+        """
+        Create the table for a single entity mapping and set its update policy.
+        
+        The update policy is only set once the table exists, so this ordering is
+        preserved regardless of how many mappings are processed concurrently.
+        
+        Args:
+            mapping: Entity mapping
+            
+        Returns:
+            Flow: Flow returning True if both the table and its update policy were created
+        """
+        table_name = mapping.table_name
+        
+        # Create table
+        if not (yield partial(self.create_table, table_name, mapping.schema)):
+            return False
+        ingestion_policies_set = yield partial(self.set_ingestion_policies, table_name)
+        table_policies_set = yield partial(self.set_table_policies, mapping)
+        
+        # Use the specialised transform when it can be created, MoveDataByType otherwise
+        query = None
+        body = self._specialized_function_body(mapping)
+        if body:
+            if (yield partial(self.create_specialized_function, table_name, body)):
+                query = build_specialized_update_policy_query(table_name)
+            else:
+                self.logger.warning(f"Falling back to MoveDataByType for table {table_name}")
+        
+        # Set update policy for all entity mappings (AIORawData is created separately)
+        update_policy_set = yield partial(self.set_update_policy, table_name, mapping.type_ref, query,
+                                          self._policy_source)
+        latest_view_created = yield partial(self.create_latest_view, mapping)
+        return update_policy_set and ingestion_policies_set and table_policies_set and latest_view_created
+    
+    def process_entity_mappings(self, entity_mappings: List[EntityMapping],
+                                max_parallel: Optional[int] = None) -> Dict[str, bool]:
         """
         Process a list of entity mappings to create tables and set update policies.
         
+        Independent tables are provisioned concurrently on a bounded thread pool when
+        max_parallel is greater than 1; each table still gets its update policy only
+        after it has been created.
+        
         Args:
-            entity_mappings: List of entity mapping dictionaries
+            entity_mappings: Entity mappings
+            max_parallel: Override for the manager's max_parallel setting
             
         Returns:
             dict: Results of processing each mapping {table_name: success_status}
         """
-        results = {}
+        return run_flow(self._entity_mappings_flow(entity_mappings, max_parallel))
+    
+    def _entity_mappings_flow(self, entity_mappings: List[EntityMapping],
+                              max_parallel: Optional[int] = None) -> Flow:
+        """Flow of process_entity_mappings()."""
+        workers = min(max_parallel or self.max_parallel, len(entity_mappings))
+        self.scheduler.limiter.expand(workers)
+        if workers > 1:
+            self.logger.info(f"Provisioning {len(entity_mappings)} tables with up to {workers} parallel workers")
         
-        for mapping in entity_mappings:
-            table_name = mapping["displayName"]
-            type_ref = mapping["typeRef"]
-            fields = mapping["fields"]
+        outcomes = yield Parallel([self._entity_mapping_flow(mapping) for mapping in entity_mappings], workers)
+        # Outcomes keep input order, so the results dict matches the serial mode
+        return {mapping.table_name: outcome for mapping, outcome in zip(entity_mappings, outcomes)}
+    
+    def compile_provisioning_commands(self, entity_mappings: List[EntityMapping]) -> List[KustoCommand]:
+        """
+        Compile the full provisioning set into an ordered list of management commands.
+        
+        The AIORawData table, the routing stage (when enabled) and the MoveDataByType
+        function come first, followed by each entity table, its specialised transform
+        function (when enabled), its update policy and its last-known-value view (when
+        its mapping declares one). Each table's ingestion policies (with an ingestion
+        profile) and its caching and partitioning policies (when its mapping configures
+        them) follow its creation. The LatestValues function over the views comes last.
+        
+        Args:
+            entity_mappings: Entity mappings
             
-            # Build schema
-            schema = ", ".join(fields)
-            full_schema = schema
+        Returns:
+            list: Commands in execution order
+        """
+        commands = [
+            KustoCommand(KIND_TABLE, AIO_RAW_DATA_TABLE,
+                         build_create_table_command(AIO_RAW_DATA_TABLE, AIO_RAW_DATA_SCHEMA)),
+        ]
+        commands.extend(self._ingestion_policy_commands(AIO_RAW_DATA_TABLE))
+        if self.routing:
+            commands.extend(self._routing_commands(entity_mappings))
+        commands.append(KustoCommand(KIND_FUNCTION, MOVE_DATA_BY_TYPE_FUNCTION,
+                                     build_move_data_by_type_function_command(self.routing)))
+        for mapping in entity_mappings:
+            table_name = mapping.table_name
+            commands.append(KustoCommand(KIND_TABLE, table_name,
+                                         build_create_table_command(table_name, mapping.schema)))
+            commands.extend(self._ingestion_policy_commands(table_name))
+            commands.extend(compile_table_policy_commands(table_name, mapping.fields, mapping.policies))
+            query = None
+            body = self._specialized_function_body(mapping)
+            if body:
+                commands.append(KustoCommand(KIND_TRANSFORM, table_name,
+                                             build_specialized_function_command(table_name, body)))
+                query = build_specialized_update_policy_query(table_name)
+            commands.append(KustoCommand(KIND_POLICY, table_name,
+                                         build_update_policy_command(table_name, mapping.type_ref, query,
+                                                                     self._policy_source)))
+            commands.extend(compile_latest_view_commands(mapping))
+        commands.extend(compile_latest_values_function_commands(entity_mappings))
+        return commands
+    
+    def execute_database_scripts(self, commands: List[KustoCommand]) -> List[bool]:
+        """
+        Execute commands as one or more `.execute database script` payloads.
+        
+        Commands are split into chunks of at most max_script_bytes and the chunks are
+        executed in order.
+        
+        Args:
+            commands: Commands in execution order
             
-            # Create table
-            table_created = self.create_table(table_name, full_schema)
-            if not table_created:
-                results[table_name] = False
+        Returns:
+            list: Success status of each command, in the same order as commands
+        """
+        return run_flow(self._database_scripts_flow(commands))
+    
+    def _database_scripts_flow(self, commands: List[KustoCommand]) -> Flow:
+        """Flow of execute_database_scripts()."""
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return [False] * len(commands)
+        
+        outcomes = []
+        chunks = chunk_commands(commands, self.max_script_bytes)
+        for index, chunk in enumerate(chunks, 1):
+            if chunk[0].kind == KIND_TABLE_SCRIPT:
+                outcomes.append((yield partial(self.execute_command, chunk[0])))
+                continue
+            script = build_database_script(chunk)
+            try:
+                self.logger.info(f"Executing database script {index}/{len(chunks)} "
+                                 f"({len(chunk)} commands, {len(script.encode('utf-8'))} bytes)")
+                self.logger.debug(f"Executing command: {script}")
+                result = yield partial(self._execute_mgmt, script, KIND_SCRIPT, f"{len(chunk)} commands")
+                outcomes.extend(self._parse_script_results(chunk, result))
+            except Exception as e:
+                if self._is_authentication_error(e):
+                    self.logger.error(f"Authentication error during database script execution: {e}")
+                    raise e
+                self._log_detailed_error(f"Executing database script {index}/{len(chunks)}", e)
+                outcomes.extend([False] * len(chunk))
+        
+        return outcomes
+    
+    def _parse_script_results(self, commands: List[KustoCommand], result: Any) -> List[bool]:
+        """
+        Map the result table of `.execute database script` back onto the executed commands.
+        
+        The result table has one row per command, in script order, with Result and
+        Reason columns.
+        """
+        rows = list(result.primary_results[0]) if result.primary_results else []
+        if len(rows) != len(commands):
+            self.logger.warning(f"Database script returned {len(rows)} results for {len(commands)} commands")
+        
+        outcomes = []
+        for index, command in enumerate(commands):
+            if index >= len(rows):
+                self.logger.error(f"No script result for {command.kind} command on {command.target}")
+                outcomes.append(False)
                 continue
             
-            # Set update policy for all entity mappings (AIORawData is created separately)
-            policy_set = self.set_update_policy(table_name, type_ref)
-            results[table_name] = policy_set
+            row = rows[index]
+            status = row["Result"]
+            if status == SCRIPT_RESULT_COMPLETED:
+                self.logger.debug(f"{command.kind} command on {command.target} completed")
+                outcomes.append(True)
+            else:
+                self.logger.error(f"{command.kind} command on {command.target} {str(status).lower()}: {row['Reason']}")
+                outcomes.append(False)
+        return outcomes
+    
+    def execute_command(self, command: KustoCommand) -> bool:
+        """
+        Execute a single compiled management command.
+        
+        Args:
+            command: The command to execute
+            
+        Returns:
+            bool: True if the command succeeded, False otherwise
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
         
-        return results
+        try:
+            self.logger.info(f"Executing {command.kind} command on {command.target}")
+            self.logger.debug(f"Executing command: {command.text}")
+            result = self._execute_mgmt(command.text, command.kind, command.target)
+            self.logger.debug(f"Command result: {result}")
+            return self._table_script_completed(command, result)
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during {command.kind} command on {command.target}: {e}")
+                raise e
+            self._log_detailed_error(f"Executing {command.kind} command on {command.target}", e)
+            return False
+    
+    def _table_script_completed(self, command: KustoCommand, result: Any) -> bool:
+        """
+        Check the result table of a table script; other commands succeed when they do not raise.
+        
+        A table script stops at its first failing command and reports the later ones as skipped.
+        """
+        if command.kind != KIND_TABLE_SCRIPT:
+            return True
+        rows = list(result.primary_results[0]) if result.primary_results else []
+        failed = [row for row in rows if row["Result"] != SCRIPT_RESULT_COMPLETED]
+        for row in failed:
+            self.logger.error(f"{row['CommandType']} on {command.target} {str(row['Result']).lower()}: {row['Reason']}")
+        return bool(rows) and not failed
+    
+    def _run_commands_flow(self, commands: List[KustoCommand]) -> Flow:
+        """
+        Execute commands as database scripts in batch mode, otherwise one at a time.
+        
+        Once the commands on AIORawData, the routing stage and MoveDataByType have run,
+        the commands of different entity tables run on up to max_parallel workers.
+        
+        Returns:
+            Flow: Flow returning the success status of each command, in order
+        """
+        if self.batch:
+            return (yield from self._database_scripts_flow(commands))
+        
+        leading, groups = group_commands_by_target(commands)
+        workers = min(self.max_parallel, len(groups))
+        if workers <= 1:
+            return (yield Parallel([partial(self.execute_command, command) for command in commands], 1))
+        
+        outcomes = yield Parallel([partial(self.execute_command, commands[index]) for index in leading], 1)
+        outcomes.extend([False] * (len(commands) - len(leading)))
+        
+        self.scheduler.limiter.expand(workers)
+        group_outcomes = yield Parallel([
+            Parallel([partial(self.execute_command, commands[index]) for index in indices], 1)
+            for indices in groups
+        ], workers)
+        for indices, group in zip(groups, group_outcomes):
+            for index, outcome in zip(indices, group):
+                outcomes[index] = outcome
+        return outcomes
+    
+    def _provision_commands_flow(self, commands: List[KustoCommand],
+                                 tables: Optional[List[str]] = None) -> Flow:
+        """
+        Execute compiled provisioning commands and fold the outcomes into per-table results.
+        
+        Args:
+            commands: Commands in execution order
+            tables: Tables to report even if no command targets them (they count as successful)
+            
+        Returns:
+            Flow: Flow returning ({table_name: success_status}, function_created)
+        """
+        outcomes = (yield from self._run_commands_flow(commands)) if commands else []
+        return self._fold_outcomes(commands, outcomes, tables)
+    
+    @staticmethod
+    def _fold_outcomes(commands: List[KustoCommand], outcomes: List[bool],
+                       tables: Optional[List[str]] = None) -> Tuple[Dict[str, bool], bool]:
+        """Fold per-command outcomes into ({table_name: success_status}, function_created)."""
+        results = {table_name: True for table_name in tables or []}
+        function_created = True
+        for command, succeeded in zip(commands, outcomes):
+            if command.kind == KIND_FUNCTION:
+                function_created = function_created and succeeded
+            else:
+                # A table only counts as provisioned when its update policy was also set
+                results[command.target] = results.get(command.target, True) and succeeded
+        return results, function_created
+    
+    def fetch_database_snapshot(self, entity_mappings: Optional[List[EntityMapping]] = None
+                                ) -> Optional[DatabaseSnapshot]:
+        """
+        Fetch the tables, functions and update policies currently defined in the database.
+        
+        The table policies the provisioning sets (ingestion policies with an ingestion
+        profile, caching and partitioning policies when a mapping configures them) are
+        fetched as well.
+        
+        Args:
+            entity_mappings: Entity mappings being provisioned
+        
+        Returns:
+            DatabaseSnapshot: The snapshot, or None if it could not be fetched
+        """
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return None
+        
+        try:
+            self.logger.info("Fetching database catalog snapshot")
+            self.logger.debug(f"Executing command: {SHOW_DATABASE_SCHEMA_COMMAND}")
+            schema_result = self._execute_mgmt(SHOW_DATABASE_SCHEMA_COMMAND, KIND_CATALOG, self.database)
+            self.logger.debug(f"Executing command: {SHOW_UPDATE_POLICIES_COMMAND}")
+            policy_result = self._execute_mgmt(SHOW_UPDATE_POLICIES_COMMAND, KIND_CATALOG, self.database)
+            table_policy_rows = {}
+            for name, command in self._table_policy_catalog_commands(entity_mappings or []).items():
+                self.logger.debug(f"Executing command: {command}")
+                table_policy_rows[name] = list(
+                    self._execute_mgmt(command, KIND_CATALOG, self.database).primary_results[0])
+            snapshot = DatabaseSnapshot.from_results(
+                self.database,
+                list(schema_result.primary_results[0]),
+                list(policy_result.primary_results[0]),
+                **table_policy_rows
+            )
+            self.logger.info(f"Catalog snapshot has {len(snapshot.tables)} tables, "
+                             f"{len(snapshot.functions)} functions and {len(snapshot.update_policies)} update policies")
+            return snapshot
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error while fetching database catalog: {e}")
+                raise e
+            self._log_detailed_error("Fetching database catalog snapshot", e)
+            return None
+    
+    def _table_policy_catalog_commands(self, entity_mappings: List[EntityMapping]) -> Dict[str, str]:
+        """
+        Catalog commands of the table policies the provisioning sets.
+        
+        Returns:
+            dict: {DatabaseSnapshot.from_results() argument: command}
+        """
+        commands = {}
+        if self.ingestion_profile:
+            commands["streaming_rows"] = SHOW_STREAMING_INGESTION_POLICIES_COMMAND
+            commands["batching_rows"] = SHOW_INGESTION_BATCHING_POLICIES_COMMAND
+        policies = [mapping.policies or TablePolicies() for mapping in entity_mappings]
+        if any(policy.hot_cache for policy in policies):
+            commands["caching_rows"] = SHOW_CACHING_POLICIES_COMMAND
+        if any(policy.partitioning for policy in policies):
+            commands["partitioning_rows"] = SHOW_PARTITIONING_POLICIES_COMMAND
+        if self.routing:
+            commands["retention_rows"] = SHOW_RETENTION_POLICIES_COMMAND
+        return commands
+    
+    def compile_incremental_commands(self, entity_mappings: List[EntityMapping],
+                                     snapshot: DatabaseSnapshot) -> Tuple[List[KustoCommand], Dict[str, List[str]]]:
+        """
+        Compile only the commands needed to bring the database in line with the mappings.
+        
+        Missing tables are created, missing columns are added with `.alter-merge table`
+        and functions, last-known-value views and update, ingestion, caching,
+        partitioning and retention policies are only (re)applied when they differ from
+        the snapshot.
+        Tables whose existing columns have a different type are reported as conflicts
+        and left untouched. In evolution mode entity tables are compiled by
+        _compile_table_evolution().
+        
+        Args:
+            entity_mappings: Entity mappings
+            snapshot: Catalog snapshot of the database
+            
+        Returns:
+            tuple: (commands in execution order, {table_name: [conflict descriptions]})
+        """
+        commands = []
+        conflicts = {}
+        
+        def add_table_commands(table_name: str, schema: str) -> bool:
+            if not snapshot.has_table(table_name):
+                commands.append(KustoCommand(KIND_TABLE, table_name, build_create_table_command(table_name, schema)))
+            else:
+                missing, type_conflicts = snapshot.diff_table(table_name, schema)
+                if type_conflicts:
+                    conflicts[table_name] = type_conflicts
+                    return False
+                if missing:
+                    commands.append(KustoCommand(KIND_TABLE, table_name,
+                                                 build_alter_merge_table_command(table_name, ", ".join(missing))))
+            commands.extend(self._ingestion_policy_changes(table_name, snapshot))
+            return True
+        
+        add_table_commands(AIO_RAW_DATA_TABLE, AIO_RAW_DATA_SCHEMA)
+        
+        if self.routing and add_table_commands(ROUTED_DATA_TABLE, ROUTED_DATA_SCHEMA):
+            if not routing_retention_policy_matches(snapshot.retention_policies.get(ROUTED_DATA_TABLE)):
+                commands.append(KustoCommand(KIND_POLICY, ROUTED_DATA_TABLE,
+                                             build_routing_retention_policy_command()))
+            expression = self._type_ref_expression(entity_mappings)
+            if not snapshot.function_matches(ROUTE_RAW_DATA_FUNCTION, build_routing_function_body(expression)):
+                commands.append(KustoCommand(KIND_TRANSFORM, ROUTED_DATA_TABLE,
+                                             build_routing_function_command(expression)))
+            if not snapshot.update_policy_matches(ROUTED_DATA_TABLE, build_routing_update_policy()):
+                commands.append(KustoCommand(KIND_POLICY, ROUTED_DATA_TABLE,
+                                             build_update_policy_command(ROUTED_DATA_TABLE, "",
+                                                                         build_routing_update_policy_query())))
+        
+        if not snapshot.function_matches(MOVE_DATA_BY_TYPE_FUNCTION, build_move_data_by_type_function_body(self.routing)):
+            commands.append(KustoCommand(KIND_FUNCTION, MOVE_DATA_BY_TYPE_FUNCTION,
+                                         build_move_data_by_type_function_command(self.routing)))
+        
+        for mapping in entity_mappings:
+            table_name = mapping.table_name
+            type_ref = mapping.type_ref
+            if self.evolve:
+                table_commands, type_conflicts = self._compile_table_evolution(mapping, snapshot)
+                if type_conflicts:
+                    conflicts[table_name] = type_conflicts
+                commands.extend(table_commands)
+                continue
+            if not add_table_commands(table_name, mapping.schema):
+                continue
+            commands.extend(compile_table_policy_commands(table_name, mapping.fields, mapping.policies,
+                                                          snapshot))
+            query = None
+            body = self._specialized_function_body(mapping)
+            if body:
+                if not snapshot.function_matches(build_specialized_function_name(table_name), body):
+                    commands.append(KustoCommand(KIND_TRANSFORM, table_name,
+                                                 build_specialized_function_command(table_name, body)))
+                query = build_specialized_update_policy_query(table_name)
+            source = self._policy_source
+            if not snapshot.update_policy_matches(table_name, build_update_policy(table_name, type_ref, query, source)):
+                commands.append(KustoCommand(KIND_POLICY, table_name,
+                                             build_update_policy_command(table_name, type_ref, query, source)))
+            commands.extend(compile_latest_view_commands(mapping, snapshot))
+        commands.extend(compile_latest_values_function_commands(entity_mappings, snapshot))
+        
+        return commands, conflicts
+    
+    def _compile_table_evolution(self, mapping: EntityMapping,
+                                 snapshot: DatabaseSnapshot) -> Tuple[List[KustoCommand], List[str]]:
+        """
+        Compile the changes of an entity table in evolution mode.
+        
+        New columns are merged into an existing table with `.create-merge table`, which
+        appends them to the table's columns. The transform and the update policy are
+        compiled for the resulting column order, and the output of MoveDataByType is
+        projected onto it, so the update policy keeps matching the table. For a table
+        that gains columns, the merge, the transform and the update policy are sent as
+        one table script, so the policy is never changed without the columns it needs.
+        
+        Returns:
+            tuple: (commands in execution order, descriptions of column type conflicts)
+        """
+        table_name = mapping.table_name
+        type_ref = mapping.type_ref
+        schema = mapping.schema
+        schema_commands = []
+        if not snapshot.has_table(table_name):
+            columns = list(mapping.fields)
+            schema_commands.append(KustoCommand(KIND_TABLE, table_name, build_create_table_command(table_name, schema)))
+        else:
+            missing, type_conflicts = snapshot.diff_table(table_name, schema)
+            if type_conflicts:
+                return [], type_conflicts
+            columns = [f"{quote_identifier(name)}:{kusto_type}"
+                       for name, kusto_type in snapshot.tables[table_name].items()] + missing
+            if missing:
+                self.logger.info(f"Evolving table {table_name}: adding {', '.join(missing)}")
+                schema_commands.append(KustoCommand(KIND_TABLE, table_name,
+                                                    build_create_merge_table_command(table_name, schema)))
+        
+        feed_commands = []
+        body = self._specialized_function_body(mapping._replace(columns=parse_columns(columns)))
+        if body:
+            if not snapshot.function_matches(build_specialized_function_name(table_name), body):
+                feed_commands.append(KustoCommand(KIND_TRANSFORM, table_name,
+                                                  build_specialized_function_command(table_name, body)))
+            query = build_specialized_update_policy_query(table_name)
+        else:
+            query = build_conforming_query(build_update_policy_query(table_name, type_ref), columns)
+        source = self._policy_source
+        if not snapshot.update_policy_matches(table_name, build_update_policy(table_name, type_ref, query, source)):
+            feed_commands.append(KustoCommand(KIND_POLICY, table_name,
+                                              build_update_policy_command(table_name, type_ref, query, source)))
+        
+        if schema_commands and snapshot.has_table(table_name):
+            commands = [build_table_script_command(table_name, schema_commands + feed_commands)]
+        else:
+            commands = schema_commands + feed_commands
+        return (commands + self._ingestion_policy_changes(table_name, snapshot)
+                + compile_table_policy_commands(table_name, mapping.fields, mapping.policies, snapshot)
+                + compile_latest_view_commands(mapping, snapshot)), []
+    
+    def _provision_incremental_flow(self, entity_mappings: List[EntityMapping]) -> Flow:
+        """
+        Provision only what differs from the current database catalog.
+        
+        Returns:
+            Flow: Flow returning ({table_name: success_status}, function_created), or
+            None if the catalog snapshot could not be fetched or evolution found type conflicts
+        """
+        snapshot = yield partial(self.fetch_database_snapshot, entity_mappings)
+        if snapshot is None:
+            self.logger.error("Failed to fetch the database catalog. Cannot compute changes.")
+            return None
+        
+        commands, conflicts, tables = self._plan_incremental(entity_mappings, snapshot)
+        if not self._evolution_can_proceed(conflicts):
+            return None
+        results, function_created = yield from self._provision_commands_flow(commands, tables)
+        for table_name in conflicts:
+            results[table_name] = False
+        return results, function_created
+    
+    def _evolution_can_proceed(self, conflicts: Dict[str, List[str]]) -> bool:
+        """In evolution mode, column type conflicts stop the run before any change is applied."""
+        if self.evolve and conflicts:
+            # Applying the other changes would leave the tables on different definition versions
+            self.logger.error(f"Schema evolution stopped: {len(conflicts)} tables have column type conflicts. "
+                              f"No changes were applied.")
+            return False
+        return True
+    
+    def _plan_incremental(self, entity_mappings: List[EntityMapping],
+                          snapshot: DatabaseSnapshot) -> Tuple[List[KustoCommand], Dict[str, List[str]], List[str]]:
+        """Compile and log the incremental changes; also returns the tables to report."""
+        commands, conflicts = self.compile_incremental_commands(entity_mappings, snapshot)
+        for table_name, table_conflicts in conflicts.items():
+            self.logger.error(f"Column type conflicts in existing table {table_name}: {'; '.join(table_conflicts)}")
+        
+        tables = [AIO_RAW_DATA_TABLE] + ([ROUTED_DATA_TABLE] if self.routing else [])
+        tables += [mapping.table_name for mapping in entity_mappings]
+        if latest_value_tables(entity_mappings):
+            tables.append(LATEST_VALUES_FUNCTION)
+        if commands:
+            self.logger.info(f"{len(commands)} changes to apply")
+        else:
+            self.logger.info("Database is up to date, no changes to apply")
+        return commands, conflicts, tables
     
     def _get_kusto_data_type(self, value_type: str) -> str:
         """Convert EntityTypeDefinitions value type to Kusto data type."""
-        type_mapping = {
-            "Number": "double",
-            "Boolean": "boolean",
-            "String": "string",
-            "Object": "dynamic",
-            "DateTime": "datetime"
-        }
-        return type_mapping.get(value_type, "string")
-    
-    def _load_entity_type_definitions(self, json_file_path: str) -> list:
-        """Load entity type definitions from JSON file."""
+        return get_kusto_data_type(value_type)
+    
+    def _load_entity_type_definitions(self, json_file_path: str, type_mappings: Optional[Dict[str, TypeMapping]] = None) -> list:
+        """
+        Load entity type definitions from JSON file.
+        
+        The file is parsed incrementally. When type_mappings is given only the entities
+        they reference are materialised and parsing stops once all of them were found.
+        
+        Args:
+            json_file_path: Path to EntityTypeDefinitions.json
+            type_mappings: Optional {typeRef: TypeMapping} filter
+        """
         try:
-            with open(json_file_path, 'r') as f:
-                data = json.load(f)
-                self.logger.info(f"Loaded entity type definitions from {json_file_path}")
-                if isinstance(data, list):
-                    return data
+            with open(json_file_path, 'rb') as f:
+                definitions = iter_entity_definitions(f)
+                if type_mappings is not None:
+                    definitions = select_entity_definitions(definitions, type_mappings)
+                data = list(definitions)
+                if type_mappings is not None:
+                    self.logger.info(f"Loaded {len(data)} referenced entity type definitions from {json_file_path}")
                 else:
-                    self.logger.error(f"Unexpected data format in {json_file_path}")
-                    return []
+                    self.logger.info(f"Loaded entity type definitions from {json_file_path}")
+                return data
         except FileNotFoundError:
             self.logger.error(f"EntityTypeDefinitions.json not found at {json_file_path}")
             return []
-        except json.JSONDecodeError as e:
+        except DefinitionsFormatError:
+            self.logger.error(f"Unexpected data format in {json_file_path}")
+            return []
+        except DEFINITIONS_DECODE_ERRORS as e:
             self.logger.error(f"Invalid JSON in {json_file_path}: {e}")
             return []
     
-    def _parse_type_mappings(self, type_mappings: List[str]) -> dict:
+    def _load_entity_catalog(self, json_file_path: str, type_mappings: Optional[Dict[str, TypeMapping]] = None) -> EntityCatalog:
+        """
+        Load the indexed entity catalog.
+        
+        Only the entities referenced by type_mappings are loaded, selectively from the
+        file (see _load_entity_type_definitions). With the definitions cache enabled
+        the entities selected by earlier runs are kept in the compiled catalog on disk
+        while the file is unchanged, so a run whose entities are all cached parses
+        nothing; a cache miss selects the run's entities from the file and adds them
+        to the cache. Without type_mappings the whole file is loaded (and cached).
+        
+        Args:
+            json_file_path: Path to EntityTypeDefinitions.json
+            type_mappings: Optional {typeRef: TypeMapping} filter
+            
+        Returns:
+            EntityCatalog: The catalog (empty if the definitions could not be loaded)
+        """
+        if not self.definitions_cache:
+            return EntityCatalog(self._load_entity_type_definitions(json_file_path, type_mappings),
+                                 complete=type_mappings is None)
+        
+        catalog = EntityCatalog.load_cached(json_file_path, self.definitions_cache_dir)
+        if catalog is not None and (catalog.complete if type_mappings is None else catalog.covers(type_mappings)):
+            if type_mappings is not None:
+                catalog = catalog.select(type_mappings)
+            self.logger.info(f"Loaded {len(catalog)} entity type definitions from cache")
+            return catalog
+        
+        definitions = self._load_entity_type_definitions(json_file_path, type_mappings)
+        if not definitions:
+            return EntityCatalog()
+        if type_mappings is None or catalog is None:
+            catalog = EntityCatalog(complete=type_mappings is None)
+        for entity in definitions:
+            catalog.add(entity)
+        if catalog.save_cache(json_file_path, self.definitions_cache_dir):
+            self.logger.debug(f"Cached compiled entity catalog for {json_file_path}")
+        return catalog if type_mappings is None else catalog.select(type_mappings)
+    
+    def _parse_type_mappings(self, type_mappings: List[str]) -> Dict[str, TypeMapping]:
         """Parse command line type mappings in JSON format with typeRef, namespace, and entity_name."""
         mappings = {}
         for mapping in type_mappings:
@@ -369,8 +1314,10 @@ class EventhouseManager:
                     
                     if type_ref and namespace and entity_name:
                         # Map the typeRef to {namespace, entity_name}
-                        mappings[type_ref] = {'namespace': namespace, 'entity_name': entity_name}
-                        self.logger.info(f"Loaded structured mapping: {type_ref} -> {namespace}.{entity_name}")
+                        type_mapping = self._type_mapping(type_ref, namespace, entity_name, mapping_dict)
+                        if type_mapping:
+                            mappings[type_ref] = type_mapping
+                            self.logger.info(f"Loaded structured mapping: {type_ref} -> {namespace}.{entity_name}")
                     else:
                         missing_fields = []
                         if not type_ref:
@@ -386,165 +1333,342 @@ class EventhouseManager:
                 self.logger.error(f"Invalid JSON in type mapping '{mapping}': {e}")
         return mappings
     
-    def _load_yaml_mappings(self, yaml_file: str) -> dict:
-        """Load type mappings from YAML file."""
+    def _type_mapping(self, type_ref: str, namespace: str, entity_name: str, mapping: Dict[str, Any],
+                      policy_defaults: Optional[TablePolicies] = None,
+                      latest_values_default: bool = False) -> Optional[TypeMapping]:
+        """
+        Build the TypeMapping of an input mapping.
+        
+        Returns:
+            TypeMapping: The mapping, or None if the mapping's table policies or views are invalid
+        """
         try:
-            with open(yaml_file, 'r') as f:
-                data = yaml.safe_load(f)
-                if isinstance(data, dict) and 'type_mappings' in data:
-                    type_mappings = data['type_mappings']
-                    
-                    # Handle list format: [{"typeRef": "...", "namespace": "...", "entity_name": "..."}]
-                    if isinstance(type_mappings, list):
-                        mappings = {}
-                        for mapping in type_mappings:
-                            if isinstance(mapping, dict):
-                                type_ref = mapping.get('typeRef')
-                                namespace = mapping.get('namespace')
-                                entity_name = mapping.get('entity_name')
-                                
-                                if type_ref and namespace and entity_name:
-                                    # Map the typeRef to {namespace, entity_name}
-                                    mappings[type_ref] = {'namespace': namespace, 'entity_name': entity_name}
-                                    self.logger.info(f"Loaded mapping: {type_ref} -> {namespace}.{entity_name}")
-                                else:
-                                    missing_fields = []
-                                    if not type_ref:
-                                        missing_fields.append("typeRef")
-                                    if not namespace:
-                                        missing_fields.append("namespace")
-                                    if not entity_name:
-                                        missing_fields.append("entity_name")
-                                    self.logger.warning(f"Invalid mapping in YAML: missing {', '.join(missing_fields)} in mapping with typeRef='{type_ref}', namespace='{namespace}', entity_name='{entity_name}'")
-                            else:
-                                self.logger.warning(f"Invalid mapping format in YAML: {mapping}")
-                        return mappings
-                    else:
-                        self.logger.error(f"YAML file {yaml_file} 'type_mappings' must be a list")
-                        return {}
-                else:
-                    self.logger.error(f"YAML file {yaml_file} does not contain 'type_mappings' key")
-                    return {}
-        except FileNotFoundError:
-            self.logger.error(f"YAML file not found: {yaml_file}")
+            policies = parse_table_policies(mapping, policy_defaults)
+            latest_values = parse_latest_values(mapping.get('latest_values', latest_values_default))
+        except (ValueError, TypeError) as e:
+            self.logger.warning(f"Invalid table settings in mapping with typeRef='{type_ref}': {e}")
+            return None
+        return TypeMapping(type_ref, namespace, entity_name, policies, latest_values)
+    
+    def _load_yaml_mappings(self, yaml_file: str) -> Dict[str, TypeMapping]:
+        """
+        Load type mappings from a YAML file, a directory of YAML files or a glob pattern.
+        
+        The files are loaded concurrently and merged in sorted path order. The load
+        fails if any file is invalid or if a typeRef is mapped differently twice.
+        """
+        paths = expand_mapping_paths(yaml_file)
+        if not paths:
+            self.logger.error(f"No YAML mapping files found for {yaml_file}")
             return {}
-        except yaml.YAMLError as e:
-            self.logger.error(f"Invalid YAML in {yaml_file}: {e}")
+        
+        mappings = {}
+        sources = {}
+        duplicates = []
+        for mapping_file in load_yaml_files(paths):
+            if mapping_file.error:
+                self.logger.error(mapping_file.error)
+                return {}
+            file_mappings = self._parse_yaml_mappings(mapping_file.path, mapping_file.data)
+            if file_mappings is None:
+                return {}
+            for type_mapping in file_mappings:
+                type_ref = type_mapping.type_ref
+                existing = mappings.get(type_ref)
+                if existing is None:
+                    mappings[type_ref] = type_mapping
+                    sources[type_ref] = mapping_file.path
+                elif existing != type_mapping:
+                    duplicates.append(f"'{type_ref}' in {mapping_file.path} (first mapped in {sources[type_ref]})")
+        
+        if duplicates:
+            self.logger.error(f"Conflicting mappings of the same typeRef: {'; '.join(duplicates)}")
             return {}
+        if len(paths) > 1:
+            self.logger.info(f"Loaded {len(mappings)} type mappings from {len(paths)} YAML files")
+        return mappings
     
-    def _create_entity_mappings_from_input(self, type_mappings: dict, entity_definitions: list) -> List[Dict[str, Any]]:
-        """Create entity mappings using input type mappings and EntityTypeDefinitions."""
+    def _parse_yaml_mappings(self, yaml_file: str, data: Any) -> Optional[List[TypeMapping]]:
+        """
+        Parse the type mappings of one YAML mapping file.
+        
+        Returns:
+            list: The valid mappings in file order, or None if the file is not a mapping file
+        """
+        if not isinstance(data, dict) or 'type_mappings' not in data:
+            self.logger.error(f"YAML file {yaml_file} does not contain 'type_mappings' key")
+            return None
+        type_mappings = data['type_mappings']
+        if not isinstance(type_mappings, list):
+            self.logger.error(f"YAML file {yaml_file} 'type_mappings' must be a list")
+            return None
+        
+        # Caching and partitioning defaults for every entity table
+        try:
+            policy_defaults = parse_table_policies(data.get('table_policies') or {})
+        except (ValueError, TypeError) as e:
+            self.logger.error(f"Invalid table_policies in YAML file {yaml_file}: {e}")
+            return None
+        # Last-known-value views for every entity table
+        try:
+            latest_values_default = parse_latest_values(data.get('latest_values', False))
+        except ValueError as e:
+            self.logger.error(f"Invalid latest_values in YAML file {yaml_file}: {e}")
+            return None
+        
+        # List format: [{"typeRef": "...", "namespace": "...", "entity_name": "..."}]
+        mappings = []
+        for mapping in type_mappings:
+            if isinstance(mapping, dict):
+                type_ref = mapping.get('typeRef')
+                namespace = mapping.get('namespace')
+                entity_name = mapping.get('entity_name')
+                
+                if type_ref and namespace and entity_name:
+                    # Map the typeRef to {namespace, entity_name}
+                    type_mapping = self._type_mapping(type_ref, namespace, entity_name, mapping,
+                                                      policy_defaults, latest_values_default)
+                    if type_mapping:
+                        mappings.append(type_mapping)
+                        self.logger.debug(f"Loaded mapping: {type_ref} -> {namespace}.{entity_name}")
+                else:
+                    missing_fields = []
+                    if not type_ref:
+                        missing_fields.append("typeRef")
+                    if not namespace:
+                        missing_fields.append("namespace")
+                    if not entity_name:
+                        missing_fields.append("entity_name")
+                    self.logger.warning(f"Invalid mapping in YAML: missing {', '.join(missing_fields)} in mapping with typeRef='{type_ref}', namespace='{namespace}', entity_name='{entity_name}'")
+            else:
+                self.logger.warning(f"Invalid mapping format in YAML: {mapping}")
+        return mappings
+    
+    def _create_entity_mappings_from_input(self, type_mappings: Dict[str, TypeMapping],
+                                           entity_definitions) -> List[EntityMapping]:
+        """
+        Create entity mappings using input type mappings and EntityTypeDefinitions.
+        
+        Args:
+            type_mappings: {typeRef: TypeMapping}
+            entity_definitions: EntityCatalog, or a list of raw entity definitions
+        """
+        if isinstance(entity_definitions, EntityCatalog):
+            catalog = entity_definitions
+        else:
+            catalog = EntityCatalog(entity_definitions)
         entity_mappings = []
         
         # Process input mappings
-        for type_ref, mapping_info in type_mappings.items():
-            namespace = mapping_info['namespace']
-            entity_name = mapping_info['entity_name']
-            table_name = f"{namespace}_{entity_name}"  # Use underscore instead of dot for Kusto compatibility
-            
-            # Find matching entity definition
-            entity_def = None
-            
-            for entity in entity_definitions:
-                # Try to match by namespace and name if TypeReference not present
-                entity_namespace = entity.get('Namespace', '')
-                entity_name_def = entity.get('Name', '')
-                if entity_namespace == namespace and entity_name_def == entity_name:
-                    entity_def = entity
-                    break
-            
-            if not entity_def:
+        for type_ref, type_mapping in type_mappings.items():
+            # Match by namespace and name, falling back to the TypeReference
+            entry = catalog.find(type_mapping.namespace, type_mapping.entity_name, type_ref)
+            if not entry:
                 self.logger.warning(f"No entity definition found for typeRef: '{type_ref}'")
                 continue
             
-            # Build fields from entity definition
-            fields = []
-            
-            # Add Properties
-            for prop in entity_def.get('Properties', []):
-                column_name = prop.get('name', 'Unknown')
-                value_type = prop.get('valueType', 'String')
-                kusto_type = self._get_kusto_data_type(value_type)
-                fields.append(f"{column_name}:{kusto_type}")
-            
-            # Add TimeseriesProperties
-            for ts_prop in entity_def.get('TimeseriesProperties', []):
-                column_name = ts_prop.get('name', 'Unknown')
-                value_type = ts_prop.get('valueType', 'String')
-                kusto_type = self._get_kusto_data_type(value_type)
-                fields.append(f"{column_name}:{kusto_type}")
-            
-            # Add Identifier and Timestamp only if not already present
-            # Check if Identifier is already in the fields
-            has_identifier = any('Identifier:' in field for field in fields)
-            has_timestamp = any('Timestamp:' in field for field in fields)
-                
-            if not has_identifier:
-                fields.append(DEFAULT_IDENTIFIER_FIELD)
-            if not has_timestamp:
-                fields.append(DEFAULT_TIMESTAMP_FIELD)
-            
-            entity_mappings.append({
-                "entityType": table_name,
-                "typeRef": type_ref,
-                "displayName": table_name,
-                "fields": fields
-            })
+            # The columns are shared with the catalog entry
+            entity_mappings.append(EntityMapping(type_ref, type_mapping.table_name, entry.columns,
+                                                 type_mapping.policies, type_mapping.latest_values))
         
         return entity_mappings
     
-    def setup_tables_from_input(self, type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None) -> bool:
-        """Setup tables based on command line arguments or YAML file input."""
-        self.logger.info("🚀 Starting table setup from input...")
+    def resolve_entity_mappings(self, type_mappings: Optional[List[str]] = None,
+                                yaml_file: Optional[str] = None) -> Optional[List[EntityMapping]]:
+        """
+        Resolve command line and YAML type mappings into entity mappings.
         
-        # Authenticate first
-        if not self.authenticate():
-            return False
+        Command line mappings override the YAML mappings of the same typeRef.
+        This does not touch the database, so it needs no authentication.
         
-        # Load EntityTypeDefinitions.json
-        json_file_path = os.path.join(os.path.dirname(__file__), 'EntityTypeDefinitions.json')
-        entity_definitions = self._load_entity_type_definitions(json_file_path)
-        
-        if not entity_definitions:
-            self.logger.error("Failed to load entity type definitions")
-            return False
+        Returns:
+            list: Entity mappings, or None if the input or the definitions could not be loaded
+        """
+        if not yaml_file and not type_mappings:
+            self.logger.error("No input provided. Please specify either --type-mappings or --yaml-file")
+            return None
         
         # Get type mappings from input
         mappings = {}
         if yaml_file:
             mappings = self._load_yaml_mappings(yaml_file)
-        elif type_mappings:
-            mappings = self._parse_type_mappings(type_mappings)
-        else:
-            self.logger.error("No input provided. Please specify either --type-mappings or --yaml-file")
-            return False
+            if not mappings:
+                self.logger.error("No valid type mappings found in input")
+                return None
+        if type_mappings:
+            overrides = self._parse_type_mappings(type_mappings)
+            for type_ref in overrides:
+                if type_ref in mappings:
+                    self.logger.info(f"Command line mapping overrides the YAML mapping of {type_ref}")
+            mappings.update(overrides)
         
         if not mappings:
             self.logger.error("No valid type mappings found in input")
+            return None
+        
+        # Load EntityTypeDefinitions.json
+        entity_definitions = self._load_entity_catalog(self.definitions_file, mappings)
+        
+        if not entity_definitions:
+            self.logger.error("Failed to load entity type definitions")
+            return None
+        
+        return self._create_entity_mappings_from_input(mappings, entity_definitions)
+    
+    def compile_plan(self, type_mappings: Optional[List[str]] = None,
+                     yaml_file: Optional[str] = None) -> Optional[ProvisioningPlan]:
+        """
+        Resolve the input mappings and compile the provisioning commands into a plan.
+        
+        This does not touch the database, so it needs no authentication.
+        
+        Returns:
+            ProvisioningPlan: The plan, or None if the mappings could not be resolved
+        """
+        entity_mappings = self.resolve_entity_mappings(type_mappings, yaml_file)
+        if entity_mappings is None:
+            return None
+        
+        commands = self.compile_provisioning_commands(entity_mappings)
+        options = {name: getattr(self, name) for name in PLAN_OPTIONS}
+        plan = ProvisioningPlan(entity_mappings, commands, options)
+        self.logger.info(f"Compiled plan {plan.content_hash[:PLAN_FILE_HASH_LENGTH]} with "
+                         f"{len(entity_mappings)} entity tables and {len(commands)} commands")
+        return plan
+    
+    def apply_plan(self, plan: ProvisioningPlan) -> bool:
+        """
+        Provision the database from a precompiled plan.
+        
+        The plan's options replace the manager's routing, specialized transform and
+        type reference settings. Its commands are executed in order (as database
+        scripts in batch mode); in incremental mode only the differences between the
+        plan's mappings and the database catalog are applied.
+        
+        Args:
+            plan: The plan to apply
+            
+        Returns:
+            bool: True if every table and the MoveDataByType function were provisioned
+        """
+        self._use_plan_options(plan)
+        return run_flow(self._setup_flow(plan.entity_mappings, plan.commands))
+    
+    def _use_plan_options(self, plan: ProvisioningPlan) -> None:
+        """Log the plan being applied and adopt the options it was compiled with."""
+        self.logger.info(f"🚀 Applying plan {plan.content_hash[:PLAN_FILE_HASH_LENGTH]} "
+                         f"({len(plan.tables)} entity tables, {len(plan.commands)} commands)...")
+        for name, value in plan.options.items():
+            if getattr(self, name) != value:
+                self.logger.info(f"Using {name}={value!r} from the plan")
+            setattr(self, name, value)
+    
+    def setup_tables_from_input(self, type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None) -> bool:
+        """Setup tables based on command line arguments or YAML file input."""
+        self.logger.info("🚀 Starting table setup from input...")
+        
+        # Resolve mappings before authenticating, so invalid input never costs a sign-in
+        with self.metrics.phase("resolve_mappings"):
+            entity_mappings = self.resolve_entity_mappings(type_mappings, yaml_file)
+        if entity_mappings is None:
+            return False
+        return run_flow(self._setup_flow(entity_mappings))
+    
+    def _setup_flow(self, entity_mappings: List[EntityMapping],
+                    commands: Optional[List[KustoCommand]] = None) -> Flow:
+        """Authenticate, provision and report the results (see setup_tables_from_input() and apply_plan())."""
+        with self.metrics.phase("authenticate"):
+            authenticated = yield self.authenticate
+        if not authenticated:
             return False
         
-        # Step 1: Create AIORawData table first (required for MoveDataByType function)
-        self.logger.info(f"Creating {AIO_RAW_DATA_TABLE} table first...")
-        aio_table_created = self.create_table(AIO_RAW_DATA_TABLE, AIO_RAW_DATA_SCHEMA)
-        if not aio_table_created:
-            self.logger.error(f"Failed to create {AIO_RAW_DATA_TABLE} table. Cannot proceed.")
+        with self.metrics.phase("provision"):
+            outcome = yield from self._provision_flow(entity_mappings, commands)
+        if outcome is None:
             return False
+        return self._report_setup_results(*outcome)
+    
+    def _provision_flow(self, entity_mappings: List[EntityMapping],
+                        commands: Optional[List[KustoCommand]] = None) -> Flow:
+        """
+        Provision the raw table, routing, MoveDataByType and the entity tables.
         
-        # Step 2: Create MoveDataByType function (now that AIORawData exists)
-        function_created = self.create_kusto_function()
-        if not function_created:
-            self.logger.error("Failed to create MoveDataByType function. Continuing with table creation...")
+        Args:
+            entity_mappings: Entity mappings
+            commands: Precompiled provisioning commands to execute instead of the
+                table-by-table steps (ignored in incremental mode)
         
-        # Step 3: Create entity mappings and process remaining tables
-        entity_mappings = self._create_entity_mappings_from_input(mappings, entity_definitions)
-        results = self.process_entity_mappings(entity_mappings)
+        Returns:
+            Flow: Flow returning ({table_name: success_status}, function_created), or
+            None if the setup had to stop early
+        """
+        if self.incremental or self.batch or commands is not None:
+            if self.incremental:
+                outcome = yield from self._provision_incremental_flow(entity_mappings)
+                if outcome is None:
+                    return None
+                all_results, function_created = outcome
+            else:
+                if commands is None:
+                    commands = self.compile_provisioning_commands(entity_mappings)
+                    self.logger.info(f"Compiled {len(commands)} provisioning commands for batched execution")
+                all_results, function_created = yield from self._provision_commands_flow(commands)
+            
+            if not all_results.get(AIO_RAW_DATA_TABLE):
+                self.logger.error(f"Failed to create {AIO_RAW_DATA_TABLE} table.")
+                return None
+            if self.routing and not all_results.get(ROUTED_DATA_TABLE):
+                self.logger.error("Failed to set up type routing. Entity tables will not receive data.")
+            if not function_created:
+                self.logger.error("Failed to create MoveDataByType function.")
+        else:
+            # Step 1: Create AIORawData table first (required for MoveDataByType function)
+            self.logger.info(f"Creating {AIO_RAW_DATA_TABLE} table first...")
+            aio_table_created = yield partial(self.create_table, AIO_RAW_DATA_TABLE, AIO_RAW_DATA_SCHEMA)
+            if not aio_table_created:
+                self.logger.error(f"Failed to create {AIO_RAW_DATA_TABLE} table. Cannot proceed.")
+                return None
+            # Data still flows without the ingestion policies, only with the default latency
+            aio_table_created = yield partial(self.set_ingestion_policies, AIO_RAW_DATA_TABLE)
+            
+            # Step 1b: Route raw data by type into the staging table the entity policies read
+            routing_result = {}
+            if self.routing:
+                routing_result[ROUTED_DATA_TABLE] = yield partial(self.setup_routing, entity_mappings)
+                if not routing_result[ROUTED_DATA_TABLE]:
+                    self.logger.error("Failed to set up type routing. Cannot proceed.")
+                    return None
+            
+            # Step 2: Create MoveDataByType function (now that AIORawData exists)
+            function_created = yield self.create_kusto_function
+            if not function_created:
+                self.logger.error("Failed to create MoveDataByType function. Continuing with table creation...")
+            
+            # Step 3: Process entity tables
+            results = yield partial(self.process_entity_mappings, entity_mappings)
+            
+            # Step 4: Look up the latest values across types through the entity tables' views
+            if latest_value_tables(entity_mappings):
+                results[LATEST_VALUES_FUNCTION] = yield partial(self.create_latest_values_function, entity_mappings)
+            
+            # Combine results with AIORawData result
+            aio_result = {AIO_RAW_DATA_TABLE: aio_table_created}
+            all_results = {**aio_result, **routing_result, **results}
         
-        # Combine results with AIORawData result
-        aio_result = {"AIORawData": aio_table_created}
-        all_results = {**aio_result, **results}
+        return all_results, function_created
+    
+    def _report_setup_results(self, all_results: Dict[str, bool], function_created: bool) -> bool:
+        """Log the outcome of a setup run and return whether it fully succeeded."""
+        self.table_results = dict(all_results)
         success_count = sum(1 for success in all_results.values() if success)
         total_count = len(all_results)
         
+        stats = self.scheduler.stats()
+        if stats["retries"]:
+            self.logger.info(f"🔁 Retried {stats['retries']} times over {stats['commands']} commands "
+                             f"({stats['errors']['throttled']} throttled, {stats['errors']['transient']} transient); "
+                             f"concurrency went down to {stats['lowest_concurrency_limit']}")
+        
         # Include function creation in overall success assessment
         if function_created:
             self.logger.info("✅ MoveDataByType function created successfully.")
@@ -554,3 +1678,159 @@ class EventhouseManager:
             self.logger.warning("⚠️ MoveDataByType function creation failed.")
             self.logger.info(f"✅ Script execution completed. {success_count}/{total_count} tables processed successfully.")
             return False  # Overall failure if function creation failed
+    
+    def backfill_from_input(self, type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            slice_size: timedelta = parse_timespan(DEFAULT_SLICE),
+                            checkpoint_file: Optional[str] = None) -> bool:
+        """Backfill the entity tables of the input mappings from AIORawData (see backfill())."""
+        self.logger.info("🚀 Starting backfill from input...")
+        
+        with self.metrics.phase("resolve_mappings"):
+            entity_mappings = self.resolve_entity_mappings(type_mappings, yaml_file)
+        if entity_mappings is None:
+            return False
+        return run_flow(self._backfill_setup_flow(entity_mappings, start, end, slice_size, checkpoint_file))
+    
+    def _backfill_setup_flow(self, entity_mappings: List[EntityMapping], start: Optional[datetime],
+                             end: Optional[datetime], slice_size: timedelta, checkpoint_file: Optional[str]) -> Flow:
+        """Authenticate and backfill (see backfill_from_input())."""
+        with self.metrics.phase("authenticate"):
+            authenticated = yield self.authenticate
+        if not authenticated:
+            return False
+        
+        with self.metrics.phase("backfill"):
+            return (yield from self._backfill_flow(entity_mappings, start, end, slice_size, checkpoint_file))
+    
+    def backfill(self, entity_mappings: List[EntityMapping], start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, slice_size: timedelta = parse_timespan(DEFAULT_SLICE),
+                 checkpoint_file: Optional[str] = None) -> bool:
+        """
+        Append the transformed raw data of the past to provisioned entity tables.
+        
+        The ingestion time range of each table is fixed on the first run and kept in
+        the checkpoint file, which later runs resume from (see backfill.py).
+        
+        Args:
+            entity_mappings: Entity mappings of the tables to backfill
+            start: Earliest ingestion time to replay; defaults to the first raw row
+            end: Ingestion time to stop at (exclusive); defaults to the first row the
+                table's update policy delivered, or now for an empty table
+            slice_size: Ingestion time span appended by one command
+            checkpoint_file: Checkpoint file; defaults to one per database in the
+                working directory
+            
+        Returns:
+            bool: True if every slice of every table was appended
+        """
+        return run_flow(self._backfill_flow(entity_mappings, start, end, slice_size, checkpoint_file))
+    
+    def _backfill_flow(self, entity_mappings: List[EntityMapping], start: Optional[datetime],
+                       end: Optional[datetime], slice_size: timedelta, checkpoint_file: Optional[str]) -> Flow:
+        """Flow of backfill()."""
+        if not self.client:
+            self.logger.error(MSG_CLIENT_NOT_AUTH)
+            return False
+        if start and end and start >= end:
+            self.logger.error(f"Backfill start {start} is not before its end {end}")
+            return False
+        
+        checkpoint_file = checkpoint_file or default_checkpoint_path(self.database)
+        try:
+            checkpoint = BackfillCheckpoint.load(checkpoint_file, self.database)
+        except (OSError, BackfillError) as e:
+            self.logger.error(f"Cannot use backfill checkpoint {checkpoint_file}: {e}")
+            return False
+        
+        mappings = {mapping.table_name: mapping for mapping in entity_mappings}
+        resumed = [name for name in mappings if name in checkpoint.ranges]
+        if resumed:
+            self.logger.info(f"Using the ranges of {len(resumed)} tables recorded in {checkpoint_file}")
+        new_tables = [mappings[name] for name in mappings if name not in checkpoint.ranges]
+        if new_tables:
+            ranges = yield from self._backfill_ranges_flow(new_tables, start, end)
+            if ranges is None:
+                return False
+            try:
+                for table_name, (table_start, table_end) in ranges.items():
+                    checkpoint.add_range(table_name, table_start, table_end)
+            except OSError as e:
+                self.logger.error(f"Cannot write backfill checkpoint {checkpoint_file}: {e}")
+                return False
+        
+        slices = plan_backfill_slices({name: checkpoint.ranges[name] for name in mappings
+                                       if name in checkpoint.ranges}, slice_size)
+        self.logger.info(f"Backfilling {len(mappings)} tables in {len(slices)} slices of {slice_size} "
+                         f"(up to {self.max_parallel} at a time, checkpoint {checkpoint_file})")
+        
+        def append_slice(backfill_slice: BackfillSlice) -> Flow:
+            return self._backfill_slice_flow(mappings[backfill_slice.table_name], backfill_slice)
+        
+        result = yield from backfill_flow(slices, append_slice, checkpoint, self.max_parallel, self.logger)
+        
+        self.table_results = {name: result.tables.get(name, True) for name in mappings}
+        failed = [name for name, success in self.table_results.items() if not success]
+        self.logger.info(f"✅ Backfill appended {result.rows} rows in {result.seconds:.1f}s "
+                         f"({result.slices - result.resumed - result.failed} slices appended, "
+                         f"{result.resumed} already done, {result.failed} failed)")
+        if failed:
+            self.logger.error(f"Backfill incomplete for {', '.join(failed)}; rerun with the same checkpoint to retry")
+        return not failed
+    
+    def _backfill_ranges_flow(self, entity_mappings: List[EntityMapping], start: Optional[datetime],
+                              end: Optional[datetime]) -> Flow:
+        """
+        Resolve the ingestion time range to replay into each table.
+        
+        Returns:
+            Flow: Flow returning {table_name: (start, end)}, empty if AIORawData has
+            no rows, or None if a range could not be queried
+        """
+        try:
+            if start is None:
+                rows = yield from self._query_rows_flow(RAW_DATA_START_QUERY, AIO_RAW_DATA_TABLE)
+                start = parse_kusto_datetime(rows[0]["Start"]) if rows else None
+                if start is None:
+                    self.logger.warning(f"{AIO_RAW_DATA_TABLE} has no rows to backfill")
+                    return {}
+            first_rows = {}
+            if end is None:
+                query = build_first_ingestion_query([mapping.table_name for mapping in entity_mappings])
+                rows = yield from self._query_rows_flow(query, self.database)
+                first_rows = {row[ENTITY_TABLE_COLUMN]: parse_kusto_datetime(row["Start"]) for row in rows}
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error while resolving the backfill range: {e}")
+                raise e
+            self._log_detailed_error("Resolving the backfill range (are the entity tables provisioned?)", e)
+            return None
+        
+        now = datetime.now(timezone.utc)
+        return {mapping.table_name: (start, end or first_rows.get(mapping.table_name) or now)
+                for mapping in entity_mappings}
+    
+    def _query_rows_flow(self, query: str, target: str) -> Flow:
+        """Flow returning the rows of the primary result of a query."""
+        result = yield partial(self._execute_query, query, target)
+        return list(result.primary_results[0]) if result.primary_results else []
+    
+    def _backfill_slice_flow(self, mapping: EntityMapping, backfill_slice: BackfillSlice) -> Flow:
+        """
+        Append one slice to its table.
+        
+        Returns:
+            Flow: Flow returning the number of rows appended, or None if the command failed
+        """
+        command = build_backfill_command(mapping, backfill_slice)
+        try:
+            self.logger.debug(f"Executing command: {command.text}")
+            result = yield partial(self._execute_mgmt, command.text, command.kind, command.target)
+            return count_appended_rows(result)
+        except Exception as e:
+            if self._is_authentication_error(e):
+                self.logger.error(f"Authentication error during backfill of {mapping.table_name}: {e}")
+                raise e
+            self._log_detailed_error(f"Backfilling {mapping.table_name} from {backfill_slice.start} "
+                                     f"to {backfill_slice.end}", e)
+            return None
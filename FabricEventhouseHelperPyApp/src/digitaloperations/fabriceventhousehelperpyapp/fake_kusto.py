@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+
+"""
+In-process stand-in for the Kusto client used by the EventhouseManager.
+
+FakeKustoClient implements the `execute_mgmt`/`execute` surface of KustoClient and
+applies the management commands generated by this package to an in-memory catalog
+of tables, functions, materialized views and table policies, and records the
+queries appended to tables by `.set-or-append` and the rows of queued ingestion
+(see FakeIngestSink). Latency, throttling and failures can be
+injected so provisioning behaviour and throughput can be measured without a live
+Eventhouse, both from the test suite and from benchmarks.
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Union
+
+from azure.kusto.data.exceptions import KustoServiceError, KustoThrottlingError
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import SCRIPT_RESULT_COMPLETED
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    SHOW_CACHING_POLICIES_COMMAND,
+    SHOW_DATABASE_SCHEMA_COMMAND,
+    SHOW_INGESTION_BATCHING_POLICIES_COMMAND,
+    SHOW_PARTITIONING_POLICIES_COMMAND,
+    SHOW_RETENTION_POLICIES_COMMAND,
+    SHOW_STREAMING_INGESTION_POLICIES_COMMAND,
+    SHOW_UPDATE_POLICIES_COMMAND,
+    normalize_column_name,
+    parse_schema,
+)
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import format_timespan, parse_timespan
+
+
+SCRIPT_RESULT_FAILED = "Failed"
+SCRIPT_RESULT_SKIPPED = "Skipped"
+
+_CREATE_TABLE = re.compile(r"^\.create\s+table\s+(\S+?)\s*\((.*)\)$", re.DOTALL)
+_ALTER_MERGE_TABLE = re.compile(r"^\.alter-merge\s+table\s+(\S+?)\s*\((.*)\)$", re.DOTALL)
+_CREATE_MERGE_TABLE = re.compile(r"^\.create-merge\s+table\s+(\S+?)\s*\((.*)\)$", re.DOTALL)
+_CREATE_FUNCTION = re.compile(
+    r"^\.create-or-alter\s+function\s+(?:with\s*\((.*?)\)\s*)?(\w+)\s*\(([^)]*)\)\s*(\{.*\})$", re.DOTALL)
+_ALTER_UPDATE_POLICY = re.compile(r"^\.alter\s+table\s+(\S+)\s+policy\s+update\s+@'(.*)'$", re.DOTALL)
+_ALTER_STREAMING_POLICY = re.compile(r"^\.alter\s+table\s+(\S+)\s+policy\s+streamingingestion\s+(enable|disable)$")
+_ALTER_BATCHING_POLICY = re.compile(r"^\.alter\s+table\s+(\S+)\s+policy\s+ingestionbatching\s+@'(.*)'$", re.DOTALL)
+_ALTER_CACHING_POLICY = re.compile(r"^\.alter\s+table\s+(\S+)\s+policy\s+caching\s+hot\s*=\s*(\S+)$")
+_ALTER_PARTITIONING_POLICY = re.compile(r"^\.alter\s+table\s+(\S+)\s+policy\s+partitioning\s+@'(.*)'$", re.DOTALL)
+_ALTER_MERGE_RETENTION_POLICY = re.compile(r"^\.alter-merge\s+table\s+(\S+)\s+policy\s+retention"
+                                           r"(?:\s+softdelete\s*=\s*(\S+))?(?:\s+recoverability\s*=\s*(enabled|disabled))?$")
+_CREATE_MATERIALIZED_VIEW = re.compile(
+    r"^\.create\s+(ifnotexists\s+)?materialized-view\s+(?:with\s*\((.*?)\)\s*)?(\w+)\s+on\s+table\s+(\w+)\s*\{(.*)\}$",
+    re.DOTALL)
+_ALTER_MATERIALIZED_VIEW = re.compile(
+    r"^\.alter\s+materialized-view\s+(?:with\s*\((.*?)\)\s*)?(\w+)\s+on\s+table\s+(\w+)\s*\{(.*)\}$", re.DOTALL)
+_SET_OR_APPEND = re.compile(r"^\.set-or-append\s+(\S+?)\s+(?:with\s*\((.*?)\)\s*)?<\|(.*)$", re.DOTALL)
+_EXECUTE_SCRIPT = re.compile(r"^\.execute\s+database\s+script\s*(?:with\s*\((.*?)\))?\s*<\|(.*)$", re.DOTALL)
+_PROPERTY = re.compile(r"(\w+)\s*=\s*(\"[^\"]*\"|'[^']*'|[^,\s)]+)")
+# Leading function call of an update policy query, e.g. MoveDataByType("ref", "table")
+_QUERY_FUNCTION = re.compile(r"^\s*(\w+)\s*\(")
+
+
+class FakeKustoResponse:
+    """Response with the `primary_results` attribute read by the EventhouseManager."""
+
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None):
+        self.primary_results = [rows or []]
+
+    def __repr__(self) -> str:
+        return f"FakeKustoResponse({len(self.primary_results[0])} rows)"
+
+
+class FakeDatabase:
+    """
+    In-memory catalog of one database.
+
+    Attributes:
+        tables: {table_name: {column_name: kusto_type}} in column order
+        functions: {function_name: {"Body": ..., "Folder": ..., "Parameters": ...}}
+        update_policies: {table_name: update policy list}
+        streaming_ingestion_policies: {table_name: streaming ingestion policy}
+        ingestion_batching_policies: {table_name: ingestion batching policy}
+        caching_policies: {table_name: caching policy}
+        partitioning_policies: {table_name: partitioning policy}
+        retention_policies: {table_name: retention policy}
+        materialized_views: {view_name: {"SourceTable": ..., "Query": ..., "AutoUpdateSchema": ...}}
+        extents: {table_name: [{"ExtentId": ..., "Tags": [...], "Query": ...}]} of the
+            appends; their rows are not computed
+        ingested_rows: {table_name: [{column_name: CSV text or None}]} of queued ingestion
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tables: Dict[str, Dict[str, str]] = {}
+        self.functions: Dict[str, Dict[str, str]] = {}
+        self.update_policies: Dict[str, List[Dict[str, Any]]] = {}
+        self.streaming_ingestion_policies: Dict[str, Dict[str, Any]] = {}
+        self.ingestion_batching_policies: Dict[str, Dict[str, Any]] = {}
+        self.caching_policies: Dict[str, Dict[str, Any]] = {}
+        self.partitioning_policies: Dict[str, Dict[str, Any]] = {}
+        self.retention_policies: Dict[str, Dict[str, Any]] = {}
+        self.materialized_views: Dict[str, Dict[str, Any]] = {}
+        self.extents: Dict[str, List[Dict[str, Any]]] = {}
+        self.ingested_rows: Dict[str, List[Dict[str, Optional[str]]]] = {}
+
+    def schema_json(self) -> str:
+        """Render the catalog the way `.show database schema as json` does."""
+        return json.dumps({"Databases": {self.name: {
+            "Name": self.name,
+            "Tables": {
+                table_name: {"Name": table_name, "OrderedColumns": [
+                    {"Name": column, "CslType": kusto_type} for column, kusto_type in columns.items()
+                ]} for table_name, columns in self.tables.items()
+            },
+            "Functions": {
+                function_name: {"Name": function_name, "InputParameters": function["Parameters"],
+                                "Body": function["Body"], "Folder": function["Folder"]}
+                for function_name, function in self.functions.items()
+            },
+            "MaterializedViews": {
+                view_name: {"Name": view_name, **view} for view_name, view in self.materialized_views.items()
+            }
+        }}})
+
+
+def _parse_properties(text: Optional[str]) -> Dict[str, str]:
+    """Parse `with (...)` properties such as folder="x" or ContinueOnErrors=true."""
+    return {name: value.strip("\"'") for name, value in _PROPERTY.findall(text or "")}
+
+
+def _service_error(message: str) -> KustoServiceError:
+    """Build the error the service would return for a rejected command."""
+    return KustoServiceError(message)
+
+
+class FakeKustoClient:
+    """
+    Thread-safe in-memory Kusto client.
+
+    Every request first waits for the configured latency, may then be throttled or
+    fail, and is otherwise applied to the catalog of its database. Commands inside an
+    `.execute database script` are applied one by one and reported per command, as
+    the service does.
+    """
+
+    def __init__(self, latency: Union[float, Callable[[str], float]] = 0.0, throttle_rate: float = 0.0,
+                 failure_rate: float = 0.0, fail_commands: Optional[Dict[str, Any]] = None,
+                 seed: Optional[int] = None):
+        """
+        Initialize the client.
+
+        Args:
+            latency: Seconds each request takes, or a callable returning them for a command
+            throttle_rate: Probability that a request is rejected with KustoThrottlingError
+            failure_rate: Probability that a request fails with a transient KustoServiceError
+            fail_commands: {regex: error message or exception}; matching commands always fail
+            seed: Seed for the random throttling and failures
+        """
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.fail_commands: List[Tuple[Pattern, Any]] = [
+            (re.compile(pattern, re.DOTALL), error) for pattern, error in (fail_commands or {}).items()
+        ]
+        self.databases: Dict[str, FakeDatabase] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.command_count = 0
+        self.throttled_count = 0
+        self.max_concurrency = 0
+        self._active = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def database(self, name: str) -> FakeDatabase:
+        """Catalog of a database, created on first use."""
+        with self._lock:
+            return self._database(name)
+
+    def _database(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(name)
+        return self.databases[name]
+
+    def execute_mgmt(self, database: str, query: str, properties: Any = None) -> FakeKustoResponse:
+        """Execute a management command."""
+        query, latency = self._begin_request(database, query)
+        try:
+            if latency:
+                time.sleep(latency)
+            return self._complete_request(database, query)
+        finally:
+            self._end_request()
+
+    def execute(self, database: str, query: str, properties: Any = None) -> FakeKustoResponse:
+        """Execute a query; management commands are dispatched as KustoClient does."""
+        if query.lstrip().startswith("."):
+            return self.execute_mgmt(database, query, properties)
+        return FakeKustoResponse()
+
+    def ingest_csv(self, database: str, table_name: str, payload: bytes, compressed: bool = True,
+                   tag: Optional[str] = None) -> int:
+        """
+        Ingest CSV rows into a table, in table column order, and return their number.
+
+        The request is recorded as `.ingest into table <table>` and is subject to the
+        latency, throttling and failures of commands. Unlike queued ingestion, the rows
+        are visible at once. With a tag, the rows are recorded as an extent tagged
+        `ingest-by:<tag>` and, as with ingestIfNotExists, skipped (returning 0) when
+        an extent of the table already has that tag.
+        """
+        command, latency = self._begin_request(database, f".ingest into table {table_name}")
+        try:
+            if latency:
+                time.sleep(latency)
+            return self._complete_request(
+                database, command, lambda db, text: self._ingest_csv(db, text, table_name, payload, compressed, tag))
+        finally:
+            self._end_request()
+
+    def close(self) -> None:
+        """Nothing to release; present for parity with KustoClient."""
+        pass
+
+    def _begin_request(self, database: str, query: str) -> Tuple[str, float]:
+        """Record a request and return the normalized command and its latency."""
+        query = query.strip()
+        with self._lock:
+            self.requests.append((database, query))
+            self._active += 1
+            self.max_concurrency = max(self.max_concurrency, self._active)
+        return query, self.latency(query) if callable(self.latency) else self.latency
+
+    def _complete_request(self, database: str, query: str,
+                          apply: Optional[Callable[[FakeDatabase, str], Any]] = None) -> Any:
+        """Throttle, fail or apply a request (with apply, if given) once its latency has elapsed."""
+        with self._lock:
+            if self.throttle_rate and self._random.random() < self.throttle_rate:
+                self.throttled_count += 1
+                raise KustoThrottlingError("Request was throttled: too many requests")
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                raise _service_error("Service temporarily unavailable")
+            return (apply or self._apply)(self._database(database), query)
+
+    def _end_request(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _apply(self, db: FakeDatabase, command: str) -> FakeKustoResponse:
+        """Apply one request to a database catalog; called with the lock held."""
+        script = _EXECUTE_SCRIPT.match(command)
+        if script:
+            return FakeKustoResponse(self._execute_script(db, script.group(1), script.group(2)))
+        return FakeKustoResponse(self._execute_command(db, command))
+
+    def _execute_script(self, db: FakeDatabase, options: Optional[str], body: str) -> List[Dict[str, Any]]:
+        """Apply the commands of a database script and report the outcome of each."""
+        continue_on_errors = _parse_properties(options).get("ContinueOnErrors", "false").lower() == "true"
+        rows = []
+        failed = False
+        for index, command in enumerate(c.strip() for c in re.split(r"\n\s*\n", body) if c.strip()):
+            row = {"OperationId": str(index), "CommandType": " ".join(command.split(None, 2)[:2]),
+                   "CommandText": command, "Result": SCRIPT_RESULT_COMPLETED, "Reason": ""}
+            if failed:
+                row["Result"] = SCRIPT_RESULT_SKIPPED
+            else:
+                try:
+                    self._execute_command(db, command)
+                except KustoServiceError as e:
+                    row["Result"] = SCRIPT_RESULT_FAILED
+                    row["Reason"] = str(e)
+                    failed = not continue_on_errors
+            rows.append(row)
+        return rows
+
+    def _execute_command(self, db: FakeDatabase, command: str) -> List[Dict[str, Any]]:
+        """Apply a single management command; called with the lock held."""
+        self.command_count += 1
+        self._raise_injected_failure(command)
+
+        if command == SHOW_DATABASE_SCHEMA_COMMAND:
+            return [{"DatabaseSchema": db.schema_json()}]
+        if command == SHOW_UPDATE_POLICIES_COMMAND:
+            return self._policy_rows(db, "TableUpdatePolicy", db.update_policies)
+        if command == SHOW_STREAMING_INGESTION_POLICIES_COMMAND:
+            return self._policy_rows(db, "StreamingIngestionPolicy", db.streaming_ingestion_policies)
+        if command == SHOW_INGESTION_BATCHING_POLICIES_COMMAND:
+            return self._policy_rows(db, "IngestionBatchingPolicy", db.ingestion_batching_policies)
+        if command == SHOW_CACHING_POLICIES_COMMAND:
+            return self._policy_rows(db, "CachingPolicy", db.caching_policies)
+        if command == SHOW_PARTITIONING_POLICIES_COMMAND:
+            return self._policy_rows(db, "PartitioningPolicy", db.partitioning_policies)
+        if command == SHOW_RETENTION_POLICIES_COMMAND:
+            return self._policy_rows(db, "RetentionPolicy", db.retention_policies)
+
+        match = _CREATE_TABLE.match(command)
+        if match:
+            return self._create_table(db, normalize_column_name(match.group(1)), match.group(2))
+        match = _ALTER_MERGE_TABLE.match(command)
+        if match:
+            return self._alter_merge_table(db, normalize_column_name(match.group(1)), match.group(2))
+        match = _CREATE_MERGE_TABLE.match(command)
+        if match:
+            table_name = normalize_column_name(match.group(1))
+            if table_name not in db.tables:
+                return self._create_table(db, table_name, match.group(2))
+            return self._alter_merge_table(db, table_name, match.group(2))
+        match = _CREATE_FUNCTION.match(command)
+        if match:
+            properties, name, parameters, body = match.groups()
+            db.functions[name] = {"Body": body, "Folder": _parse_properties(properties).get("folder", ""),
+                                  "Parameters": parameters}
+            return [{"Name": name, "Parameters": f"({parameters})", "Body": body}]
+        match = _ALTER_UPDATE_POLICY.match(command)
+        if match:
+            return self._alter_update_policy(db, normalize_column_name(match.group(1)),
+                                             match.group(2).replace("''", "'"))
+        match = _ALTER_STREAMING_POLICY.match(command)
+        if match:
+            return self._alter_table_policy(db, normalize_column_name(match.group(1)), "StreamingIngestionPolicy",
+                                            db.streaming_ingestion_policies,
+                                            {"IsEnabled": match.group(2) == "enable", "HintAllocatedRate": None})
+        match = _ALTER_BATCHING_POLICY.match(command)
+        if match:
+            try:
+                policy = json.loads(match.group(2).replace("''", "'"))
+            except json.JSONDecodeError as e:
+                raise _service_error(f"Invalid ingestion batching policy: {e}")
+            return self._alter_table_policy(db, normalize_column_name(match.group(1)), "IngestionBatchingPolicy",
+                                            db.ingestion_batching_policies, policy)
+        match = _ALTER_CACHING_POLICY.match(command)
+        if match:
+            try:
+                hot_span = {"Value": format_timespan(parse_timespan(match.group(2)))}
+            except ValueError as e:
+                raise _service_error(f"Invalid caching policy: {e}")
+            return self._alter_table_policy(db, normalize_column_name(match.group(1)), "CachingPolicy",
+                                            db.caching_policies, {"DataHotSpan": hot_span, "IndexHotSpan": hot_span})
+        match = _ALTER_PARTITIONING_POLICY.match(command)
+        if match:
+            return self._alter_partitioning_policy(db, normalize_column_name(match.group(1)),
+                                                   match.group(2).replace("''", "'"))
+        match = _ALTER_MERGE_RETENTION_POLICY.match(command)
+        if match:
+            table_name, soft_delete, recoverability = match.groups()
+            table_name = normalize_column_name(table_name)
+            policy = dict(db.retention_policies.get(table_name)
+                          or {"SoftDeletePeriod": "36500.00:00:00", "Recoverability": "Enabled"})
+            if soft_delete:
+                try:
+                    policy["SoftDeletePeriod"] = format_timespan(parse_timespan(soft_delete, allow_zero=True))
+                except ValueError as e:
+                    raise _service_error(f"Invalid retention policy: {e}")
+            if recoverability:
+                policy["Recoverability"] = recoverability.capitalize()
+            return self._alter_table_policy(db, table_name, "RetentionPolicy", db.retention_policies, policy)
+        match = _CREATE_MATERIALIZED_VIEW.match(command)
+        if match:
+            if_not_exists, properties, name, source, query = match.groups()
+            if name in db.materialized_views and if_not_exists:
+                return [{"Name": name, **db.materialized_views[name]}]
+            return self._create_materialized_view(db, name, source, query, _parse_properties(properties))
+        match = _ALTER_MATERIALIZED_VIEW.match(command)
+        if match:
+            properties, name, source, query = match.groups()
+            if name not in db.materialized_views:
+                raise _service_error(f"Materialized view '{name}' was not found")
+            return self._create_materialized_view(db, name, source, query, _parse_properties(properties))
+        match = _SET_OR_APPEND.match(command)
+        if match:
+            return self._set_or_append(db, normalize_column_name(match.group(1)), _parse_properties(match.group(2)),
+                                       match.group(3).strip())
+
+        raise _service_error(f"Syntax error: unsupported command: {command.splitlines()[0]}")
+
+    def _raise_injected_failure(self, command: str) -> None:
+        """Raise the error of the first fail_commands pattern the command matches."""
+        for pattern, error in self.fail_commands:
+            if pattern.search(command):
+                if isinstance(error, BaseException):
+                    raise error
+                raise _service_error(str(error))
+
+    def _ingest_csv(self, db: FakeDatabase, command: str, table_name: str, payload: bytes,
+                    compressed: bool, tag: Optional[str] = None) -> int:
+        """Append the rows of a CSV payload to a table; called with the lock held."""
+        self.command_count += 1
+        self._raise_injected_failure(command)
+        columns = db.tables.get(table_name)
+        if columns is None:
+            raise _service_error(f"Table '{table_name}' was not found")
+        try:
+            text = (gzip.decompress(payload) if compressed else payload).decode("utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            raise _service_error(f"Invalid ingestion data: {e}")
+        rows = list(csv.reader(io.StringIO(text, newline="")))
+        for number, row in enumerate(rows, 1):
+            if len(row) != len(columns):
+                raise _service_error(f"Stream_WrongNumberOfFields: record {number} has {len(row)} fields, "
+                                     f"table '{table_name}' has {len(columns)} columns")
+        if tag is not None:
+            extents = db.extents.setdefault(table_name, [])
+            if any(f"ingest-by:{tag}" in extent["Tags"] for extent in extents):
+                return 0
+            extents.append({"ExtentId": f"{table_name}-{len(extents)}", "Tags": [f"ingest-by:{tag}"],
+                            "Query": command})
+        db.ingested_rows.setdefault(table_name, []).extend(
+            {name: value or None for name, value in zip(columns, row)} for row in rows)
+        return len(rows)
+
+    @staticmethod
+    def _policy_rows(db: FakeDatabase, policy_name: str, policies: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Render a policy of every table the way `.show table * policy <kind>` does."""
+        return [{
+            "PolicyName": policy_name,
+            "EntityName": f"[{db.name}].[{table_name}]",
+            "Policy": json.dumps(policies[table_name]) if table_name in policies else "null",
+            "ChildEntities": None,
+            "EntityType": "Table"
+        } for table_name in db.tables]
+
+    @staticmethod
+    def _table_rows(table_name: str, columns: Dict[str, str]) -> List[Dict[str, Any]]:
+        schema = ", ".join(f"{column}:{kusto_type}" for column, kusto_type in columns.items())
+        return [{"TableName": table_name, "Schema": schema}]
+
+    def _create_table(self, db: FakeDatabase, table_name: str, schema: str) -> List[Dict[str, Any]]:
+        columns = {name: kusto_type for name, kusto_type, _ in parse_schema(schema)}
+        existing = db.tables.get(table_name)
+        if existing is not None and existing != columns:
+            raise _service_error(f"Table '{table_name}' already exists with a different schema")
+        db.tables[table_name] = columns
+        return self._table_rows(table_name, columns)
+
+    def _alter_merge_table(self, db: FakeDatabase, table_name: str, schema: str) -> List[Dict[str, Any]]:
+        columns = db.tables.get(table_name)
+        if columns is None:
+            raise _service_error(f"Table '{table_name}' was not found")
+        for name, kusto_type, _ in parse_schema(schema):
+            if columns.get(name, kusto_type) != kusto_type:
+                raise _service_error(f"Column '{name}' of table '{table_name}' already exists with type "
+                                     f"'{columns[name]}'")
+        for name, kusto_type, _ in parse_schema(schema):
+            columns.setdefault(name, kusto_type)
+        return self._table_rows(table_name, columns)
+
+    def _alter_update_policy(self, db: FakeDatabase, table_name: str, policy_json: str) -> List[Dict[str, Any]]:
+        if table_name not in db.tables:
+            raise _service_error(f"Table '{table_name}' was not found")
+        try:
+            policy = json.loads(policy_json)
+        except json.JSONDecodeError as e:
+            raise _service_error(f"Invalid update policy: {e}")
+        for entry in policy:
+            if entry.get("Source") not in db.tables:
+                raise _service_error(f"Update policy source table '{entry.get('Source')}' was not found")
+            function = _QUERY_FUNCTION.match(entry.get("Query") or "")
+            if function and function.group(1) not in db.functions:
+                raise _service_error(f"Update policy query references unknown function '{function.group(1)}'")
+        db.update_policies[table_name] = policy
+        return [{"PolicyName": "TableUpdatePolicy", "EntityName": f"[{db.name}].[{table_name}]",
+                 "Policy": json.dumps(policy)}]
+
+    @staticmethod
+    def _alter_table_policy(db: FakeDatabase, table_name: str, policy_name: str, policies: Dict[str, Any],
+                            policy: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if table_name not in db.tables:
+            raise _service_error(f"Table '{table_name}' was not found")
+        policies[table_name] = policy
+        return [{"PolicyName": policy_name, "EntityName": f"[{db.name}].[{table_name}]",
+                 "Policy": json.dumps(policy)}]
+
+    def _alter_partitioning_policy(self, db: FakeDatabase, table_name: str,
+                                   policy_json: str) -> List[Dict[str, Any]]:
+        try:
+            policy = json.loads(policy_json)
+        except json.JSONDecodeError as e:
+            raise _service_error(f"Invalid partitioning policy: {e}")
+        columns = db.tables.get(table_name, {})
+        for key in policy.get("PartitionKeys") or []:
+            expected_type = {"Hash": "string", "UniformRange": "datetime"}.get(key.get("Kind"))
+            if expected_type is None:
+                raise _service_error(f"Invalid partitioning policy: unknown partition key kind '{key.get('Kind')}'")
+            if table_name in db.tables and columns.get(key.get("ColumnName")) != expected_type:
+                raise _service_error(f"Partition key column '{key.get('ColumnName')}' must be a {expected_type} "
+                                     f"column of table '{table_name}'")
+        return self._alter_table_policy(db, table_name, "PartitioningPolicy", db.partitioning_policies, policy)
+
+
+    @staticmethod
+    def _create_materialized_view(db: FakeDatabase, name: str, source: str, query: str,
+                                  properties: Dict[str, str]) -> List[Dict[str, Any]]:
+        if source not in db.tables:
+            raise _service_error(f"Materialized view source table '{source}' was not found")
+        if name in db.tables:
+            raise _service_error(f"A table named '{name}' already exists")
+        existing = db.materialized_views.get(name)
+        if existing is not None and existing["SourceTable"] != source:
+            raise _service_error(f"The source table of materialized view '{name}' cannot be changed")
+        auto_update_schema = properties.get("autoUpdateSchema", "false").lower() == "true"
+        db.materialized_views[name] = {"SourceTable": source, "Query": query.strip(),
+                                       "AutoUpdateSchema": existing["AutoUpdateSchema"] if existing
+                                       else auto_update_schema}
+        return [{"Name": name, **db.materialized_views[name]}]
+
+    @staticmethod
+    def _set_or_append(db: FakeDatabase, table_name: str, properties: Dict[str, str],
+                       query: str) -> List[Dict[str, Any]]:
+        """
+        Record an append as an extent with its tags.
+
+        The fake cannot derive a schema from the query, so the table must exist. As in
+        Kusto, ingestIfNotExists skips the append when an extent already has one of
+        its ingest-by tags.
+        """
+        if table_name not in db.tables:
+            raise _service_error(f"Table '{table_name}' was not found")
+        try:
+            tags = json.loads(properties.get("tags", "[]"))
+            if_not_exists = json.loads(properties.get("ingestIfNotExists", "[]"))
+        except json.JSONDecodeError as e:
+            raise _service_error(f"Invalid .set-or-append properties: {e}")
+        extents = db.extents.setdefault(table_name, [])
+        ingested = {tag for extent in extents for tag in extent["Tags"]}
+        if any(f"ingest-by:{tag}" in ingested for tag in if_not_exists):
+            return []
+        extent = {"ExtentId": f"{table_name}-{len(extents)}", "Tags": tags, "Query": query}
+        extents.append(extent)
+        return [{"ExtentId": extent["ExtentId"], "OriginalSize": 0, "ExtentSize": 0, "ColumnSize": 0,
+                 "IndexSize": 0, "RowCount": 0}]
+
+
+class AsyncFakeKustoClient(FakeKustoClient):
+    """
+    FakeKustoClient with the coroutine surface of the asyncio KustoClient.
+
+    Latency is awaited with asyncio.sleep, so concurrent requests overlap on a single
+    event loop as they do against the service.
+    """
+
+    async def execute_mgmt(self, database: str, query: str, properties: Any = None) -> FakeKustoResponse:
+        """Execute a management command."""
+        query, latency = self._begin_request(database, query)
+        try:
+            await asyncio.sleep(latency or 0)
+            return self._complete_request(database, query)
+        finally:
+            self._end_request()
+
+    async def execute(self, database: str, query: str, properties: Any = None) -> FakeKustoResponse:
+        """Execute a query; management commands are dispatched as KustoClient does."""
+        if query.lstrip().startswith("."):
+            return await self.execute_mgmt(database, query, properties)
+        return FakeKustoResponse()
+
+    async def close(self) -> None:
+        """Nothing to release; present for parity with KustoClient."""
+        pass
+
+
+class FakeIngestSink:
+    """Ingestion sink (see ingest.py) that ingests chunks into a FakeKustoClient database."""
+
+    def __init__(self, client: FakeKustoClient, database: str):
+        self.client = client
+        self.database = database
+
+    def __call__(self, table_name: str, chunk: Any) -> None:
+        self.client.ingest_csv(self.database, table_name, chunk.payload, tag=chunk.key)
+
+    def close(self) -> None:
+        pass
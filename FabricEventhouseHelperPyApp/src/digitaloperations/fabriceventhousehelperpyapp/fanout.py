@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Provisioning of many databases, possibly on several clusters, in one run.
+
+A targets file lists cluster/database pairs. The provisioning plan is compiled once
+and applied to the targets concurrently on a thread pool. Managers of the same
+cluster share its Kusto client and the process-wide cached credential (see auth.py),
+so each cluster is signed in to once, and they share one CommandScheduler, so
+throttling by a cluster slows down every database provisioned on it. The outcome of
+every target is collected into a consolidated report.
+
+Targets file (YAML or JSON):
+
+    targets:
+      - cluster: https://plant-a.kusto.fabric.microsoft.com
+        database: PlantA
+      - cluster: https://plant-b.kusto.fabric.microsoft.com
+        database: PlantB
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import CommandScheduler
+
+
+DEFAULT_PARALLEL_TARGETS = 4
+REPORT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class TargetsFormatError(ValueError):
+    """Raised when a targets file does not contain a valid list of cluster/database pairs"""
+    pass
+
+
+class Target(NamedTuple):
+    """A database to provision."""
+    cluster: str
+    database: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.cluster.rstrip('/')}/{self.database}"
+
+
+class TargetResult(NamedTuple):
+    """Outcome of provisioning one target."""
+    cluster: str
+    database: str
+    success: bool
+    seconds: float
+    tables_succeeded: int
+    tables_total: int
+    commands: int
+    retries: int
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self._asdict(), "seconds": round(self.seconds, 3)}
+
+
+def cluster_key(cluster_url: str) -> str:
+    """Cluster URL without case and trailing slashes, as used to share clients."""
+    return cluster_url.strip().rstrip("/").lower()
+
+
+def parse_targets(data: Any) -> List[Target]:
+    """
+    Validate the parsed content of a targets file.
+
+    Raises:
+        TargetsFormatError: If the content is not a non-empty list of unique
+        {cluster, database} entries, optionally under a 'targets' key
+    """
+    if isinstance(data, dict):
+        data = data.get("targets")
+    if not isinstance(data, list) or not data:
+        raise TargetsFormatError("Targets file must contain a non-empty 'targets' list")
+
+    targets = []
+    seen = set()
+    for index, entry in enumerate(data, 1):
+        if not isinstance(entry, dict) or not entry.get("cluster") or not entry.get("database"):
+            raise TargetsFormatError(f"Target {index} must have 'cluster' and 'database': {entry}")
+        target = Target(str(entry["cluster"]).strip(), str(entry["database"]).strip())
+        key = (cluster_key(target.cluster), target.database)
+        if key in seen:
+            raise TargetsFormatError(f"Duplicate target: {target.name}")
+        seen.add(key)
+        targets.append(target)
+    return targets
+
+
+def load_targets(path: str) -> List[Target]:
+    """
+    Load the targets from a YAML or JSON file.
+
+    Raises:
+        OSError: If the file cannot be read
+        TargetsFormatError: If the file is not a valid targets file
+    """
+    import yaml
+
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            data = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise TargetsFormatError(f"Invalid YAML in targets file {path}: {e}")
+    return parse_targets(data)
+
+
+def run_fanout(targets: List[Target], provision: Callable[[Any], bool], manager_factory: Callable[[Target], Any],
+               parallel_targets: int = DEFAULT_PARALLEL_TARGETS) -> List[TargetResult]:
+    """
+    Provision targets concurrently.
+
+    Args:
+        targets: Databases to provision
+        provision: Provisions one database with a manager, e.g. lambda m: m.apply_plan(plan)
+        manager_factory: Creates the EventhouseManager of a target
+        parallel_targets: Maximum number of targets provisioned at the same time
+
+    Returns:
+        list: Result of each target, in the order of targets
+    """
+    if parallel_targets < 1:
+        raise ValueError("parallel_targets must be at least 1")
+    workers = min(parallel_targets, len(targets))
+
+    # Databases on the same cluster share its throttling budget
+    targets_per_cluster: Dict[str, int] = {}
+    for target in targets:
+        targets_per_cluster[cluster_key(target.cluster)] = targets_per_cluster.get(cluster_key(target.cluster), 0) + 1
+    schedulers: Dict[str, CommandScheduler] = {}
+
+    def create_manager(target: Target) -> Any:
+        manager = manager_factory(target)
+        key = cluster_key(target.cluster)
+        if key not in schedulers:
+            concurrent_targets = min(workers, targets_per_cluster[key])
+            schedulers[key] = CommandScheduler(max_concurrency=manager.max_parallel * concurrent_targets,
+                                               max_retries=manager.scheduler.max_retries, logger=manager.logger)
+        manager.scheduler = schedulers[key]
+        return manager
+
+    def run_target(target: Target, manager: Any) -> TargetResult:
+        start = time.perf_counter()
+        error = None
+        logger.info(f"▶️  Provisioning {target.name}")
+        try:
+            success = bool(provision(manager))
+        except Exception as e:
+            logger.error(f"Provisioning {target.name} failed: {e}")
+            success, error = False, str(e)
+        finally:
+            manager.close_log_file()
+        results = manager.table_results
+        commands = list(manager.metrics.commands)
+        result = TargetResult(target.cluster, target.database, success, time.perf_counter() - start,
+                              sum(1 for ok in results.values() if ok), len(results), len(commands),
+                              sum(metric.attempts - 1 for metric in commands), error)
+        logger.info(f"{'✅' if success else '❌'} {target.name} finished in {result.seconds:.1f}s")
+        return result
+
+    # Managers are created up front, so shared schedulers are set up without locking
+    managers = [create_manager(target) for target in targets]
+    logger.info(f"Provisioning {len(targets)} targets on {len(targets_per_cluster)} clusters "
+                f"with up to {workers} at a time")
+    if workers <= 1:
+        return [run_target(target, manager) for target, manager in zip(targets, managers)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as executor:
+        futures = [executor.submit(run_target, target, manager) for target, manager in zip(targets, managers)]
+        return [future.result() for future in futures]
+
+
+def build_fanout_report(results: List[TargetResult], wall_seconds: float, **context: Any) -> Dict[str, Any]:
+    """
+    Build the consolidated report of a fan-out run.
+
+    Args:
+        results: Result of each target
+        wall_seconds: Duration of the whole run
+        context: Additional top-level fields, e.g. the plan hash
+
+    Returns:
+        dict: Counts of succeeded and failed targets and the per-target results
+    """
+    return {
+        "version": REPORT_VERSION,
+        **context,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "wall_seconds": round(wall_seconds, 3),
+        "targets": len(results),
+        "succeeded": sum(1 for result in results if result.success),
+        "failed": sum(1 for result in results if not result.success),
+        "results": [result.to_dict() for result in results],
+    }
+
+
+def write_fanout_report(path: str, report: Dict[str, Any]) -> None:
+    """Write a consolidated report as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def format_fanout_summary(results: List[TargetResult]) -> List[str]:
+    """One line per target for the console summary."""
+    lines = []
+    for result in results:
+        status = "✅" if result.success else "❌"
+        line = (f"{status} {Target(result.cluster, result.database).name}: "
+                f"{result.tables_succeeded}/{result.tables_total} tables, {result.commands} commands, "
+                f"{result.retries} retries, {result.seconds:.1f}s")
+        if result.error:
+            line += f" ({result.error})"
+        lines.append(line)
+    return lines
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Provisioning flows shared by the synchronous and the asyncio managers.
+
+A flow is a generator that yields the steps it needs executed and is sent back
+their results, so one control flow drives both EventhouseManager, which runs the
+steps on the calling thread, and AsyncEventhouseManager, which awaits them on the
+event loop:
+
+    def flow():
+        created = yield partial(manager.create_table, name, schema)
+        outcomes = yield Parallel([partial(manager.execute_command, c) for c in commands], 4)
+        return created and all(outcomes)
+
+A step is one of:
+    a callable   called without arguments; a flow it returns is run to completion
+                 and run_flow_async awaits what it returns when that is awaitable,
+                 so the managers' coroutine methods fit
+    a flow       run to completion, e.g. one item of a Parallel step
+    Parallel     its steps run concurrently, on a thread pool or as tasks
+
+An error raised by a step is raised inside the flow at the yield, so flows handle
+errors with ordinary try/except.
+"""
+
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator, List, NamedTuple, Union
+
+Flow = Generator[Any, Any, Any]
+Step = Union[Callable[[], Any], Flow, "Parallel"]
+
+
+class Parallel(NamedTuple):
+    """Step running its steps concurrently, up to workers at a time; its result lists theirs in order."""
+    steps: List[Step]
+    workers: int
+
+
+def run_flow(flow: Flow, thread_name_prefix: str = "eventhouse") -> Any:
+    """
+    Run a flow on the calling thread and return its result.
+
+    The steps of a Parallel step run on a thread pool named after thread_name_prefix.
+    """
+    send, value = flow.send, None
+    while True:
+        try:
+            step = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            send, value = flow.send, _run_step(step, thread_name_prefix)
+        except BaseException as e:
+            send, value = flow.throw, e
+
+
+def _run_step(step: Step, thread_name_prefix: str) -> Any:
+    if isinstance(step, Parallel):
+        return _run_parallel(step, thread_name_prefix)
+    result = step if inspect.isgenerator(step) else step()
+    return run_flow(result, thread_name_prefix) if inspect.isgenerator(result) else result
+
+
+def _run_parallel(step: Parallel, thread_name_prefix: str) -> List[Any]:
+    if step.workers <= 1:
+        return [_run_step(item, thread_name_prefix) for item in step.steps]
+    with ThreadPoolExecutor(max_workers=step.workers, thread_name_prefix=thread_name_prefix) as executor:
+        futures = [executor.submit(_run_step, item, thread_name_prefix) for item in step.steps]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            # Authentication errors (and Ctrl+C) abort the whole run
+            for future in futures:
+                future.cancel()
+            raise
+
+
+async def run_flow_async(flow: Flow) -> Any:
+    """Run a flow on the running event loop and return its result."""
+    send, value = flow.send, None
+    while True:
+        try:
+            step = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            send, value = flow.send, await _run_step_async(step)
+        except BaseException as e:
+            send, value = flow.throw, e
+
+
+async def _run_step_async(step: Step) -> Any:
+    if isinstance(step, Parallel):
+        return await _run_parallel_async(step)
+    result = step if inspect.isgenerator(step) else step()
+    if inspect.isgenerator(result):
+        return await run_flow_async(result)
+    return await result if inspect.isawaitable(result) else result
+
+
+async def _run_parallel_async(step: Parallel) -> List[Any]:
+    import asyncio
+
+    if step.workers <= 1:
+        return [await _run_step_async(item) for item in step.steps]
+    semaphore = asyncio.Semaphore(step.workers)
+
+    async def run(item: Step) -> Any:
+        async with semaphore:
+            return await _run_step_async(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in step.steps]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        # Authentication errors (and cancellation) abort the whole run
+        for task in tasks:
+            task.cancel()
+        raise
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+
+"""
+Bulk ingestion of captured raw data files into AIORawData.
+
+Loads Eventstream dumps for plant commissioning and replay tests, so the update
+policies of the entity tables run on them as on live data:
+
+    file ─► records ─► chunks of AIORawData rows ─► gzip CSV ─► sink
+
+Files are JSON Lines, CSV with a header row or Parquet (requires pyarrow); JSON
+Lines and CSV files may be gzip-compressed (.gz). Each record is mapped onto the
+columns of AIORawData by name: other fields are ignored, missing columns are left
+empty, objects in string columns are stored as JSON text and values that do not
+convert to their column type are left empty.
+
+Files are read in chunks of rows; the rows are written as CSV in table column
+order, so no ingestion mapping is needed, then compressed and handed to a sink on
+a pool of workers, with retries of throttled and transient errors. Only a few
+chunks per worker are held in memory, so files of any size stream through.
+
+Queued ingestion is not idempotent, so each chunk carries a tag made of its file
+name, position and a digest of its rows (IngestChunk.key); the queued sink
+ingests it only if no extent has that tag yet, as backfill does with its slices,
+so a retried upload or a rerun over the same files does not duplicate rows.
+
+A sink is a callable taking (table_name, chunk):
+    QueuedIngestSink   submits chunks through Kusto queued ingestion (azure-kusto-ingest)
+    DirectorySink      writes chunks to a directory as .csv.gz files
+    FakeIngestSink     appends chunks to a FakeKustoClient database (fake_kusto.py)
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import AIO_RAW_DATA_SCHEMA, AIO_RAW_DATA_TABLE
+from digitaloperations.fabriceventhousehelperpyapp.database_state import parse_schema
+from digitaloperations.fabriceventhousehelperpyapp.local_transform import parse_kusto_datetime
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import (
+    DEFAULT_MAX_RETRIES,
+    ERROR_AUTH,
+    CommandScheduler,
+    classify_error,
+)
+
+
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_INGEST_WORKERS = 4
+DEFAULT_COMPRESSION_LEVEL = 6
+# Chunks read ahead of the workers, per worker
+CHUNKS_PER_WORKER = 2
+# Prefix of the ingest-by tags of ingested chunks
+INGEST_TAG_PREFIX = "ingest"
+
+# (column_name, kusto_type) of AIORawData in table column order
+RAW_DATA_COLUMNS = [(name, kusto_type) for name, kusto_type, _ in parse_schema(AIO_RAW_DATA_SCHEMA)]
+
+Row = List[Optional[str]]
+IngestSink = Callable[[str, "IngestChunk"], None]
+
+logger = logging.getLogger(__name__)
+
+
+class IngestChunk(NamedTuple):
+    """Rows of one file, compressed as CSV in table column order."""
+    source: str
+    index: int
+    rows: int
+    raw_size: int
+    payload: bytes
+    digest: str
+
+    @property
+    def name(self) -> str:
+        """Name of the chunk, unique within a run: the file name and the chunk position."""
+        return f"{os.path.basename(self.source)}-{self.index:05d}"
+
+    @property
+    def key(self) -> str:
+        """Stable ingest-by tag of the chunk: its name and the digest of its rows."""
+        return f"{INGEST_TAG_PREFIX}:{self.name}:{self.digest}"
+
+
+class IngestStats:
+    """Counters collected while ingesting."""
+
+    def __init__(self):
+        self.files = 0
+        self.records = 0
+        self.invalid_records = 0
+        self.rows = 0
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "records": self.records,
+            "invalid_records": self.invalid_records,
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "failed_chunks": self.failed_chunks,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "seconds": self.seconds,
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+def _format_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return _format_datetime(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _format_datetime(value: datetime) -> str:
+    value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def _format_value(value: Any, kusto_type: str) -> Optional[str]:
+    """Convert a field to the CSV text of a column, or None when it does not convert."""
+    if value is None:
+        return None
+    if kusto_type in ("int", "long"):
+        if isinstance(value, bool):
+            return None
+        try:
+            return str(int(value)) if isinstance(value, int) else str(int(str(value).strip()))
+        except ValueError:
+            return None
+    if kusto_type == "datetime":
+        parsed = parse_kusto_datetime(value)
+        return _format_datetime(parsed) if parsed else None
+    return _format_text(value)
+
+
+def map_raw_record(record: Dict[str, Any]) -> Row:
+    """Map a record onto the AIORawData columns, in table column order."""
+    return [_format_value(record.get(name), kusto_type) for name, kusto_type in RAW_DATA_COLUMNS]
+
+
+def serialize_rows(rows: List[Row]) -> bytes:
+    """Write rows as CSV; None becomes an empty field, which Kusto ingests as null."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _open_text(path: str):
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _read_jsonl_records(path: str, stats: IngestStats) -> Iterator[Dict[str, Any]]:
+    with _open_text(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                stats.invalid_records += 1
+                logger.debug(f"Skipping line {number} of {path}: not a JSON object")
+                continue
+            yield record
+
+
+def _read_csv_records(path: str, stats: IngestStats) -> Iterator[Dict[str, Any]]:
+    with _open_text(path) as f:
+        for record in csv.DictReader(f):
+            # Empty fields are missing values, not empty strings
+            yield {name: value for name, value in record.items() if value != ""}
+
+
+def _read_parquet_records(path: str, chunk_rows: int) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow. Install it with: pip install pyarrow")
+    parquet_file = pq.ParquetFile(path)
+    columns = [name for name, _ in RAW_DATA_COLUMNS if name in parquet_file.schema_arrow.names]
+    for record_batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield from record_batch.to_pylist()
+
+
+def read_raw_records(path: str, stats: IngestStats, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Read the records of a .parquet or .csv file, or of JSON Lines otherwise (any of them .gz except Parquet)."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".parquet"):
+        return _read_parquet_records(path, chunk_rows)
+    if name.endswith(".csv"):
+        return _read_csv_records(path, stats)
+    return _read_jsonl_records(path, stats)
+
+
+def read_raw_chunks(path: str, stats: IngestStats,
+                    chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Tuple[int, List[Row]]]:
+    """Read a file as (index, rows) chunks of at most chunk_rows AIORawData rows."""
+    rows: List[Row] = []
+    index = 0
+    for record in read_raw_records(path, stats, chunk_rows):
+        rows.append(map_raw_record(record))
+        if len(rows) >= chunk_rows:
+            yield index, rows
+            index += 1
+            rows = []
+    if rows:
+        yield index, rows
+
+
+def build_chunk(source: str, index: int, rows: List[Row],
+                compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> IngestChunk:
+    """Serialize and compress the rows of a chunk."""
+    data = serialize_rows(rows)
+    return IngestChunk(source, index, len(rows), len(data), gzip.compress(data, compresslevel=compression_level),
+                       hashlib.sha256(data).hexdigest()[:16])
+
+
+def ingestion_uri(cluster_url: str) -> str:
+    """Ingestion endpoint of a cluster: its query URI with the ingest- host prefix."""
+    scheme, separator, host = cluster_url.rstrip("/").partition("://")
+    if not separator:
+        scheme, host = "https", scheme
+    return f"{scheme}://{host if host.startswith('ingest-') else 'ingest-' + host}"
+
+
+class QueuedIngestSink:
+    """
+    Sink that submits chunks through Kusto queued ingestion (requires azure-kusto-ingest).
+
+    The service ingests queued data asynchronously, so a submitted chunk may take a
+    few minutes to appear in the table. Each chunk is tagged `ingest-by:<chunk key>`
+    and ingested only if no extent of the table has that tag, so submitting it again
+    after a failed attempt does not duplicate its rows.
+    """
+
+    def __init__(self, cluster_url: str, database: str, client: Optional[Any] = None,
+                 ingest_uri: Optional[str] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            cluster_url: Query URI of the cluster
+            database: Database name
+            client: Queued ingestion client to use instead of one signed in with the
+                shared credential
+            ingest_uri: Ingestion URI; defaults to the query URI with the ingest- prefix
+        """
+        try:
+            from azure.kusto.ingest import QueuedIngestClient
+        except ImportError:
+            raise ImportError("Queued ingestion requires azure-kusto-ingest. "
+                              "Install it with: pip install azure-kusto-ingest")
+        self.database = database
+        self.ingest_uri = ingest_uri or ingestion_uri(cluster_url)
+        self._owns_client = client is None
+        if client is None:
+            from azure.kusto.data import KustoConnectionStringBuilder
+            from digitaloperations.fabriceventhousehelperpyapp.auth import get_shared_credential
+
+            kcsb = KustoConnectionStringBuilder.with_azure_token_credential(self.ingest_uri, get_shared_credential())
+            client = QueuedIngestClient(kcsb)
+        self.client = client
+
+    def __call__(self, table_name: str, chunk: IngestChunk) -> None:
+        from azure.kusto.data.data_format import DataFormat
+        from azure.kusto.ingest import IngestionProperties, StreamDescriptor
+
+        properties = IngestionProperties(database=self.database, table=table_name, data_format=DataFormat.CSV,
+                                         ingest_by_tags=[chunk.key], ingest_if_not_exists=[chunk.key])
+        descriptor = StreamDescriptor(io.BytesIO(chunk.payload), is_compressed=True,
+                                      stream_name=f"{chunk.name}.csv.gz")
+        self.client.ingest_from_stream(descriptor, ingestion_properties=properties)
+
+    def close(self) -> None:
+        if self._owns_client:
+            self.client.close()
+
+
+class DirectorySink:
+    """Sink that writes each chunk to `<output_dir>/<table>/<chunk>.csv.gz`."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+
+    def __call__(self, table_name: str, chunk: IngestChunk) -> None:
+        directory = os.path.join(self.output_dir, table_name)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{chunk.name}.csv.gz"), 'wb') as f:
+            f.write(chunk.payload)
+
+    def close(self) -> None:
+        pass
+
+
+def run_ingest(paths: Iterable[str], sink: IngestSink, table_name: str = AIO_RAW_DATA_TABLE,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS, max_parallel: int = DEFAULT_INGEST_WORKERS,
+               compression_level: int = DEFAULT_COMPRESSION_LEVEL, scheduler: Optional[CommandScheduler] = None,
+               log: Optional[logging.Logger] = None) -> IngestStats:
+    """
+    Read, compress and submit the rows of raw data files.
+
+    Failed chunks are logged and counted and the run goes on; an authentication
+    error stops it and is raised once the chunks in flight have finished.
+
+    Args:
+        paths: Raw data files, ingested in order
+        sink: Receives (table_name, chunk) for every chunk, raising on failure
+        table_name: Table the chunks are ingested into
+        chunk_rows: Rows per chunk
+        max_parallel: Number of chunks compressed and submitted concurrently
+        compression_level: gzip compression level (1 fastest to 9 smallest)
+        scheduler: Scheduler retrying throttled and transient sink errors; by default one
+            with max_parallel slots and the default retries
+        log: Logger of the progress messages
+
+    Returns:
+        IngestStats: Counters and throughput of the run
+    """
+    log = log or logger
+    scheduler = scheduler or CommandScheduler(max_concurrency=max_parallel, max_retries=DEFAULT_MAX_RETRIES,
+                                              logger=log)
+    stats = IngestStats()
+    lock = threading.Lock()
+    read_ahead = threading.BoundedSemaphore(max_parallel * CHUNKS_PER_WORKER)
+    aborted: List[BaseException] = []
+    start = time.perf_counter()
+
+    def ingest_chunk(source: str, index: int, rows: List[Row]) -> None:
+        try:
+            chunk = build_chunk(source, index, rows, compression_level)
+            try:
+                scheduler.run(lambda: sink(table_name, chunk), f"ingest {chunk.name}")
+            except Exception as e:
+                if classify_error(e) == ERROR_AUTH:
+                    aborted.append(e)
+                    return
+                log.error(f"Failed to ingest {chunk.name} ({chunk.rows} rows) into {table_name}: {e}")
+                with lock:
+                    stats.failed_chunks += 1
+                return
+            with lock:
+                stats.chunks += 1
+                stats.rows += chunk.rows
+                stats.raw_bytes += chunk.raw_size
+                stats.compressed_bytes += len(chunk.payload)
+                done, total_rows = stats.chunks, stats.rows
+                ratio = stats.compressed_bytes / stats.raw_bytes
+            elapsed = time.perf_counter() - start
+            log.info(f"Ingested {chunk.name}: {chunk.rows} rows, {len(chunk.payload) / 1024:,.0f} KiB; "
+                     f"{done} chunks, {total_rows} rows ({total_rows / elapsed:,.0f} rows/s), "
+                     f"compressed to {ratio:.0%}")
+        finally:
+            read_ahead.release()
+
+    executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="ingest")
+    try:
+        for path in paths:
+            if aborted:
+                break
+            stats.files += 1
+            log.info(f"Reading {path}")
+            for index, rows in read_raw_chunks(path, stats, chunk_rows):
+                read_ahead.acquire()
+                if aborted:
+                    read_ahead.release()
+                    break
+                stats.records += len(rows)
+                executor.submit(ingest_chunk, path, index, rows)
+        executor.shutdown(wait=True)
+    except BaseException:
+        # Unreadable files (and Ctrl+C) stop the run; chunks not started yet are dropped
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    stats.seconds = time.perf_counter() - start
+    if aborted:
+        raise aborted[0]
+    return stats
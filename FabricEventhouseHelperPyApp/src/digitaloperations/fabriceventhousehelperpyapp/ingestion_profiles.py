@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Ingestion latency profiles for the tables created by the EventhouseManager.
+
+Without table policies, data queued into AIORawData waits for the default ingestion
+batching (up to five minutes) before it is committed and the update policies run. A
+profile sets the streaming ingestion policy and the ingestion batching policy of
+every provisioned table, trading throughput for latency:
+
+    realtime  streaming ingestion, queued data sealed after 10 seconds
+    balanced  no streaming, queued data sealed after 30 seconds
+    bulk      no streaming, large batches sealed after 5 minutes
+
+Update policies run as part of the ingestion into AIORawData, so its policies decide
+how soon the entity tables receive data. The entity tables get the same policies so
+that data ingested into them directly (e.g. backfills) behaves the same way.
+"""
+
+import json
+from typing import Any, Dict, List, NamedTuple
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import KIND_POLICY, KustoCommand
+
+
+class IngestionProfile(NamedTuple):
+    """Streaming and batching settings applied to every provisioned table."""
+    streaming: bool
+    # MaximumBatchingTimeSpan as a Kusto timespan; the service minimum is 10 seconds
+    batching_time_span: str
+    max_items: int
+    max_raw_size_mb: int
+
+    def batching_policy(self) -> Dict[str, Any]:
+        """Ingestion batching policy object of the profile."""
+        return {
+            "MaximumBatchingTimeSpan": self.batching_time_span,
+            "MaximumNumberOfItems": self.max_items,
+            "MaximumRawDataSizeMB": self.max_raw_size_mb,
+        }
+
+
+INGESTION_PROFILES = {
+    "realtime": IngestionProfile(streaming=True, batching_time_span="00:00:10", max_items=500, max_raw_size_mb=1024),
+    "balanced": IngestionProfile(streaming=False, batching_time_span="00:00:30", max_items=500, max_raw_size_mb=1024),
+    "bulk": IngestionProfile(streaming=False, batching_time_span="00:05:00", max_items=1000, max_raw_size_mb=4096),
+}
+
+
+def get_ingestion_profile(name: str) -> IngestionProfile:
+    """
+    Look up a profile by name.
+
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    try:
+        return INGESTION_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown ingestion profile '{name}'; expected one of {', '.join(INGESTION_PROFILES)}")
+
+
+def build_streaming_ingestion_policy_command(table_name: str, enabled: bool) -> str:
+    """Build the command that enables or disables streaming ingestion on a table."""
+    return f".alter table {table_name} policy streamingingestion {'enable' if enabled else 'disable'}"
+
+
+def build_ingestion_batching_policy_command(table_name: str, policy: Dict[str, Any]) -> str:
+    """Build the `.alter table policy ingestionbatching` command for a table."""
+    return f".alter table {table_name} policy ingestionbatching @'{json.dumps(policy, separators=(',', ':'))}'"
+
+
+def compile_ingestion_policy_commands(table_name: str, profile_name: str) -> List[KustoCommand]:
+    """
+    Compile the commands that apply a profile to a table.
+
+    Returns:
+        list: The streaming ingestion policy and the ingestion batching policy commands
+    """
+    profile = get_ingestion_profile(profile_name)
+    return [
+        KustoCommand(KIND_POLICY, table_name, build_streaming_ingestion_policy_command(table_name, profile.streaming)),
+        KustoCommand(KIND_POLICY, table_name,
+                     build_ingestion_batching_policy_command(table_name, profile.batching_policy())),
+    ]
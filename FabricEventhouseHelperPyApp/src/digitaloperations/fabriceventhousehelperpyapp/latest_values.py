@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+Last-known-value materialized views of the entity tables.
+
+Asking for the current values of a machine against an entity table is an
+`arg_max(Timestamp, *) by Identifier` over the table's full history. A materialized
+view `<table>_Latest` keeps that aggregation up to date as data is ingested, so the
+lookup becomes a point read:
+
+    Pumps_PumpType_Latest | where Identifier == "pump-7"
+
+A materialized view has a single source table and the entity tables have different
+schemas, so the lookup across types is the LatestValues() function, which unions the
+views and packs each row's values into a property bag:
+
+    LatestValues("pump-7")
+
+The views are declared in the YAML mappings file, as a default for every entity
+table and per mapping:
+
+    latest_values: true
+    type_mappings:
+      - typeRef: "..."
+        namespace: "..."
+        entity_name: "..."
+        latest_values: false
+"""
+
+from typing import Any, List, Optional
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import KIND_VIEW, KustoCommand
+from digitaloperations.fabriceventhousehelperpyapp.database_state import DatabaseSnapshot
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping
+from digitaloperations.fabriceventhousehelperpyapp.transforms import IDENTIFIER_COLUMN, TIMESTAMP_COLUMN
+
+
+LATEST_VIEW_SUFFIX = "_Latest"
+LATEST_VALUES_FUNCTION = "LatestValues"
+LATEST_VALUES_FOLDER = "LatestValues"
+# Column of LatestValues() naming the entity table a row comes from
+ENTITY_TABLE_COLUMN = "EntityTable"
+
+
+def parse_latest_values(value: Any) -> bool:
+    """
+    Validate the latest_values setting of a mapping.
+
+    Raises:
+        ValueError: If the value is not a boolean
+    """
+    if not isinstance(value, bool):
+        raise ValueError(f"latest_values must be true or false: {value!r}")
+    return value
+
+
+def build_latest_view_name(table_name: str) -> str:
+    """Name of the last-known-value view of an entity table."""
+    return f"{table_name}{LATEST_VIEW_SUFFIX}"
+
+
+def has_latest_value_columns(mapping: EntityMapping) -> bool:
+    """Check whether a table has the Identifier and Timestamp columns the view aggregates on."""
+    columns = {column.name for column in mapping.columns}
+    return IDENTIFIER_COLUMN in columns and TIMESTAMP_COLUMN in columns
+
+
+def build_latest_view_query(table_name: str) -> str:
+    """Build the query of the last-known-value view of an entity table."""
+    return f"{table_name} | summarize arg_max({TIMESTAMP_COLUMN}, *) by {IDENTIFIER_COLUMN}"
+
+
+def build_create_latest_view_command(table_name: str) -> str:
+    """
+    Build the command that creates the last-known-value view of an entity table.
+
+    The view is backfilled from the rows already in the table, and its schema follows
+    columns later added to the table.
+    """
+    return (f".create ifnotexists materialized-view with (backfill=true, autoUpdateSchema=true) "
+            f"{build_latest_view_name(table_name)} on table {table_name}\n"
+            f"{{\n    {build_latest_view_query(table_name)}\n}}")
+
+
+def build_alter_latest_view_command(table_name: str) -> str:
+    """Build the command that changes the query of an existing last-known-value view."""
+    return (f".alter materialized-view {build_latest_view_name(table_name)} on table {table_name}\n"
+            f"{{\n    {build_latest_view_query(table_name)}\n}}")
+
+
+def build_latest_values_function_body(table_names: List[str]) -> str:
+    """
+    Build the body of the LatestValues function over the views of the given tables.
+
+    Each row holds the entity table, the Identifier, the Timestamp of the latest
+    row and the other (non-empty) columns of that row as a property bag.
+    """
+    views = ", ".join(build_latest_view_name(table_name) for table_name in table_names)
+    return f"""{{
+    union withsource={ENTITY_TABLE_COLUMN} {views}
+    | where isempty(identifier) or {IDENTIFIER_COLUMN} == identifier
+    | project {ENTITY_TABLE_COLUMN} = substring({ENTITY_TABLE_COLUMN}, 0, strlen({ENTITY_TABLE_COLUMN}) - {len(LATEST_VIEW_SUFFIX)}),
+        {IDENTIFIER_COLUMN}, {TIMESTAMP_COLUMN},
+        Values = bag_remove_keys(pack_all(true), dynamic(["{ENTITY_TABLE_COLUMN}", "{IDENTIFIER_COLUMN}", "{TIMESTAMP_COLUMN}"]))
+}}"""
+
+
+def build_latest_values_function_command(table_names: List[str]) -> str:
+    """
+    Build the command that creates (or updates) the LatestValues function.
+
+    Validation is skipped so that the function can be created before (or while) the
+    views it unions are.
+    """
+    return (f'.create-or-alter function with (folder="{LATEST_VALUES_FOLDER}", skipvalidation="true") '
+            f'{LATEST_VALUES_FUNCTION}(identifier:string="")\n{build_latest_values_function_body(table_names)}')
+
+
+def latest_value_tables(entity_mappings: List[EntityMapping]) -> List[str]:
+    """Entity tables whose mappings declare a last-known-value view, in mapping order."""
+    return [mapping.table_name for mapping in entity_mappings
+            if mapping.latest_values and has_latest_value_columns(mapping)]
+
+
+def compile_latest_view_commands(mapping: EntityMapping,
+                                 snapshot: Optional[DatabaseSnapshot] = None) -> List[KustoCommand]:
+    """
+    Compile the command that maintains the last-known-value view of an entity table.
+
+    Args:
+        mapping: Entity mapping
+        snapshot: Catalog snapshot; an existing view with the same query is left alone
+            and one with a different query is altered
+
+    Returns:
+        list: The view command, if the mapping declares a view that needs one
+    """
+    table_name = mapping.table_name
+    if table_name not in latest_value_tables([mapping]):
+        return []
+    view_name = build_latest_view_name(table_name)
+    if snapshot is None or not snapshot.has_materialized_view(view_name):
+        return [KustoCommand(KIND_VIEW, table_name, build_create_latest_view_command(table_name))]
+    if not snapshot.materialized_view_matches(view_name, table_name, build_latest_view_query(table_name)):
+        return [KustoCommand(KIND_VIEW, table_name, build_alter_latest_view_command(table_name))]
+    return []
+
+
+def compile_latest_values_function_commands(entity_mappings: List[EntityMapping],
+                                            snapshot: Optional[DatabaseSnapshot] = None) -> List[KustoCommand]:
+    """
+    Compile the command that maintains the LatestValues function.
+
+    Returns:
+        list: The function command, if any mapping declares a view and the function
+        differs from the snapshot (when one is given)
+    """
+    table_names = latest_value_tables(entity_mappings)
+    if not table_names:
+        return []
+    body = build_latest_values_function_body(table_names)
+    if snapshot and snapshot.function_matches(LATEST_VALUES_FUNCTION, body):
+        return []
+    return [KustoCommand(KIND_VIEW, LATEST_VALUES_FUNCTION, build_latest_values_function_command(table_names))]
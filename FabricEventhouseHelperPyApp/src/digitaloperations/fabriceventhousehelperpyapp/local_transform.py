@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+
+"""
+Local replica of the MoveDataByType transform.
+
+Reproduces what the entity update policies do to AIORawData records:
+
+    where type endswith typeRef
+    | extend Identifier = tostring(split(subject, "/")[0])
+    | mv-expand the keys of parse_json(data)
+    | extend telemetryValue = field["Value"], Timestamp = todatetime(field["ServerTimestamp"])
+    | summarize make_bag(pack(name, value)) by Identifier, Timestamp
+    | evaluate bag_unpack(bag)
+
+Records are read in column batches from JSONL or Parquet files (Parquet needs
+pyarrow). Each record's data is parsed once, even when several entity tables
+consume its type, and output is produced per entity table in table column order
+with the table's column types applied. This lets entity table output be checked
+and transform throughput measured without pushing data into Fabric.
+"""
+
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from digitaloperations.fabriceventhousehelperpyapp.database_state import parse_schema
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping
+
+
+DEFAULT_BATCH_SIZE = 100_000
+# AIORawData columns read by the transform
+RAW_COLUMNS = ("type", "subject", "data")
+
+IDENTIFIER_COLUMN = "Identifier"
+TIMESTAMP_COLUMN = "Timestamp"
+
+_DATETIME = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d+))?)?)?\s*(Z|[+-]\d{2}:?\d{2})?$",
+    re.IGNORECASE)
+
+Batch = Dict[str, List[Any]]
+
+_MISSING = object()
+
+
+def parse_kusto_datetime(value: Any) -> Optional[datetime]:
+    """
+    Convert a value the way todatetime() does, returning None when it is not a date.
+
+    Fractions beyond microseconds (Kusto keeps 100ns ticks) are truncated.
+    """
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not isinstance(value, str):
+        return None
+    match = _DATETIME.match(value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    try:
+        result = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                          int((fraction or "0")[:6].ljust(6, "0")), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    if offset and offset.upper() != "Z":
+        sign = 1 if offset[0] == "+" else -1
+        digits = offset[1:].replace(":", "")
+        result -= sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    return result
+
+
+def _to_string(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    return str(value)
+
+
+def _to_real(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_long(value: Any) -> Optional[int]:
+    real = _to_real(value)
+    return int(real) if real is not None and real == real and abs(real) != float("inf") else None
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return None
+
+
+# Python equivalent of the Kusto conversion for each (normalized) column type
+CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "string": _to_string,
+    "real": _to_real,
+    "decimal": _to_real,
+    "long": _to_long,
+    "int": _to_long,
+    "bool": _to_bool,
+    "datetime": parse_kusto_datetime,
+    "dynamic": lambda value: value,
+}
+
+
+def _convert(value: Any, kusto_type: str) -> Any:
+    """Convert a telemetry value to a column type; failed conversions become None."""
+    return CONVERTERS.get(kusto_type, _to_string)(value)
+
+
+class EntityTableSpec:
+    """Output columns of one entity table and the type reference that feeds it."""
+
+    def __init__(self, table_name: str, type_ref: str, fields: Iterable[str]):
+        self.table_name = table_name
+        self.type_ref = type_ref
+        self.columns: List[Tuple[str, str]] = [(name, kusto_type) for name, kusto_type, _ in
+                                               parse_schema(", ".join(fields))]
+        self.column_names = {name for name, _ in self.columns}
+
+    @classmethod
+    def from_mapping(cls, mapping: EntityMapping) -> "EntityTableSpec":
+        """Build the spec from an entity mapping as produced by the EventhouseManager."""
+        return cls(mapping.table_name, mapping.type_ref, mapping.fields)
+
+
+class TransformStats:
+    """Counters collected while transforming."""
+
+    def __init__(self):
+        self.raw_rows = 0
+        self.matched_rows = 0
+        self.invalid_rows = 0
+        self.output_rows: Dict[str, int] = {}
+        self.unknown_columns: Dict[str, set] = {}
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.raw_rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "raw_rows": self.raw_rows,
+            "matched_rows": self.matched_rows,
+            "invalid_rows": self.invalid_rows,
+            "output_rows": dict(self.output_rows),
+            "unknown_columns": {table: sorted(columns) for table, columns in self.unknown_columns.items()},
+            "seconds": self.seconds,
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+class LocalTransform:
+    """
+    Applies the MoveDataByType transform of a set of entity tables to raw record batches.
+    """
+
+    def __init__(self, entity_mappings: Iterable[EntityMapping]):
+        """
+        Initialize the transform.
+
+        Args:
+            entity_mappings: Entity mappings
+        """
+        self.tables = [EntityTableSpec.from_mapping(mapping) for mapping in entity_mappings]
+        # Tables fed by each distinct raw `type` value, filled on first sight
+        self._tables_by_type: Dict[Any, List[EntityTableSpec]] = {}
+        self._timestamps: Dict[Any, Optional[datetime]] = {}
+
+    def _tables_for_type(self, raw_type: Any) -> List[EntityTableSpec]:
+        """Tables whose type reference the raw type ends with (endswith is case-insensitive in Kusto)."""
+        tables = self._tables_by_type.get(raw_type)
+        if tables is None:
+            lowered = raw_type.lower() if isinstance(raw_type, str) else None
+            tables = [spec for spec in self.tables
+                      if lowered is not None and lowered.endswith(spec.type_ref.lower())]
+            self._tables_by_type[raw_type] = tables
+        return tables
+
+    def _timestamp(self, value: Any) -> Optional[datetime]:
+        """todatetime() with a cache, since messages share few distinct timestamps."""
+        timestamp = self._timestamps.get(value, _MISSING)
+        if timestamp is _MISSING:
+            if len(self._timestamps) > 1_000_000:
+                self._timestamps.clear()
+            timestamp = self._timestamps[value] = parse_kusto_datetime(value)
+        return timestamp
+
+    def transform_batch(self, batch: Batch, stats: Optional[TransformStats] = None) -> Dict[str, Batch]:
+        """
+        Transform one batch of raw records.
+
+        Args:
+            batch: Columns of AIORawData records; only type, subject and data are read
+            stats: Optional counters to update
+
+        Returns:
+            dict: {table_name: output columns in table column order}, for tables with output
+        """
+        stats = stats if stats is not None else TransformStats()
+        types, subjects, data = (batch.get(column) or [] for column in RAW_COLUMNS)
+        stats.raw_rows += len(types)
+
+        # Bags per table, keyed by Identifier and the raw ServerTimestamp; timestamps
+        # are only parsed once per group, when the groups are merged below
+        groups: Dict[str, Dict[Tuple[Any, Any], Dict[str, Any]]] = {spec.table_name: {} for spec in self.tables}
+        for raw_type, subject, payload in zip(types, subjects, data):
+            tables = self._tables_for_type(raw_type)
+            if not tables:
+                continue
+            stats.matched_rows += 1
+            try:
+                parsed = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+            except ValueError:
+                parsed = None
+            if not isinstance(parsed, dict) or not parsed:
+                stats.invalid_rows += 1
+                continue
+
+            identifier = _to_string(subject.split("/")[0]) if isinstance(subject, str) else None
+            table_groups = [groups[spec.table_name] for spec in tables]
+            for name, details in parsed.items():
+                if details.__class__ is dict:
+                    value = details.get("Value")
+                    raw_timestamp = details.get("ServerTimestamp")
+                    if raw_timestamp is not None and raw_timestamp.__class__ is not str:
+                        raw_timestamp = repr(raw_timestamp)
+                else:
+                    value = raw_timestamp = None
+                key = (identifier, raw_timestamp)
+                for table_group in table_groups:
+                    bag = table_group.get(key)
+                    if bag is None:
+                        bag = table_group[key] = {}
+                    if bag.get(name) is None:
+                        bag[name] = value
+
+        outputs = {}
+        for spec in self.tables:
+            # summarize make_bag(...) by Identifier, Timestamp; the first non-null value of a key wins
+            merged: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+            for (identifier, raw_timestamp), bag in groups[spec.table_name].items():
+                target = merged.setdefault((identifier, self._timestamp(raw_timestamp)), {})
+                if not target:
+                    target.update(bag)
+                    continue
+                for name, value in bag.items():
+                    if target.get(name) is None:
+                        target[name] = value
+            if not merged:
+                continue
+
+            columns: Batch = {name: [] for name, _ in spec.columns}
+            unknown = stats.unknown_columns.setdefault(spec.table_name, set())
+            for (identifier, timestamp), bag in merged.items():
+                unknown.update(name for name in bag
+                               if name not in spec.column_names or name in (IDENTIFIER_COLUMN, TIMESTAMP_COLUMN))
+                # Identifier and Timestamp are the group keys, as in the summarize
+                for name, kusto_type in spec.columns:
+                    if name == IDENTIFIER_COLUMN:
+                        columns[name].append(_convert(identifier, kusto_type))
+                    elif name == TIMESTAMP_COLUMN:
+                        columns[name].append(timestamp if kusto_type == "datetime" else _convert(timestamp, kusto_type))
+                    else:
+                        columns[name].append(_convert(bag.get(name), kusto_type))
+            if not unknown:
+                del stats.unknown_columns[spec.table_name]
+            outputs[spec.table_name] = columns
+            stats.output_rows[spec.table_name] = stats.output_rows.get(spec.table_name, 0) + len(merged)
+        return outputs
+
+    def run(self, batches: Iterable[Batch],
+            sink: Optional[Callable[[str, Batch], None]] = None) -> TransformStats:
+        """
+        Transform a stream of raw batches.
+
+        Args:
+            batches: Raw record batches, e.g. from read_raw_batches()
+            sink: Optional callable receiving (table_name, output columns) for every batch
+
+        Returns:
+            TransformStats: Counters and throughput of the run
+        """
+        stats = TransformStats()
+        start = time.perf_counter()
+        for batch in batches:
+            for table_name, columns in self.transform_batch(batch, stats).items():
+                if sink:
+                    sink(table_name, columns)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+
+def read_jsonl_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Batch]:
+    """Read AIORawData records from a JSON Lines file in column batches."""
+    batch: Batch = {column: [] for column in RAW_COLUMNS}
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for column in RAW_COLUMNS:
+                batch[column].append(record.get(column))
+            if len(batch["type"]) >= batch_size:
+                yield batch
+                batch = {column: [] for column in RAW_COLUMNS}
+    if batch["type"]:
+        yield batch
+
+
+def read_parquet_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Batch]:
+    """Read AIORawData records from a Parquet file in column batches (requires pyarrow)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow. Install it with: pip install pyarrow")
+    parquet_file = pq.ParquetFile(path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(RAW_COLUMNS)):
+        yield record_batch.to_pydict()
+
+
+def read_raw_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Batch]:
+    """Read raw records from a .parquet file, or from JSON Lines otherwise."""
+    if path.lower().endswith(".parquet"):
+        return read_parquet_batches(path, batch_size)
+    return read_jsonl_batches(path, batch_size)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonlTableWriter:
+    """Sink that appends transformed rows to one `<table>.jsonl` file per entity table."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self._files: Dict[str, Any] = {}
+
+    def __call__(self, table_name: str, columns: Batch) -> None:
+        f = self._files.get(table_name)
+        if f is None:
+            f = self._files[table_name] = open(os.path.join(self.output_dir, f"{table_name}.jsonl"), 'w',
+                                               encoding='utf-8')
+        names = list(columns)
+        for values in zip(*columns.values()):
+            f.write(json.dumps(dict(zip(names, values)), default=_json_default) + "\n")
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
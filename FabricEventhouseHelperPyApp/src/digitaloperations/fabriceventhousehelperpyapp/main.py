@@ -3,10 +3,34 @@
 import argparse
 import logging
 import sys
-from typing import Optional, List
+import time
+from datetime import datetime, timedelta
+from typing import Optional, List, TYPE_CHECKING
 
-from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
-from azure.kusto.data.exceptions import KustoAuthenticationError
+# Only lightweight modules are imported here so that --help and argument errors stay
+# fast; the Azure SDK and YAML parser are imported by the command that needs them.
+from digitaloperations.fabriceventhousehelperpyapp.backfill import DEFAULT_SLICE, default_checkpoint_path
+from digitaloperations.fabriceventhousehelperpyapp.commands import AIO_RAW_DATA_TABLE
+from digitaloperations.fabriceventhousehelperpyapp.fanout import (
+    DEFAULT_PARALLEL_TARGETS, TargetsFormatError, build_fanout_report, format_fanout_summary, load_targets,
+    run_fanout, write_fanout_report
+)
+from digitaloperations.fabriceventhousehelperpyapp.ingest import (
+    DEFAULT_CHUNK_ROWS, DEFAULT_COMPRESSION_LEVEL, DEFAULT_INGEST_WORKERS, DirectorySink, QueuedIngestSink, run_ingest
+)
+from digitaloperations.fabriceventhousehelperpyapp.ingestion_profiles import INGESTION_PROFILES
+from digitaloperations.fabriceventhousehelperpyapp.metrics import OpenTelemetrySpanExporter
+from digitaloperations.fabriceventhousehelperpyapp.plan import PlanError, ProvisioningPlan
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import (
+    DEFAULT_MAX_PARALLEL, DEFAULT_MAX_RETRIES, CommandScheduler
+)
+from digitaloperations.fabriceventhousehelperpyapp.local_transform import (
+    DEFAULT_BATCH_SIZE, JsonlTableWriter, LocalTransform, parse_kusto_datetime, read_raw_batches
+)
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import parse_timespan
+
+if TYPE_CHECKING:
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
 
 # Configure logging
 logging.basicConfig(
@@ -17,12 +41,38 @@ logging.basicConfig(
 
 def setup_eventhouse(database_name: str, cluster_name: str, log_file: Optional[str],
                      type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
-                     verbose: bool = False) -> bool:
-    """Setup the Fabric Eventhouse with tables and functions."""
+                     verbose: bool = False, max_parallel: int = DEFAULT_MAX_PARALLEL,
+                     batch: bool = False, incremental: bool = False, evolve: bool = False,
+                     definitions_cache: bool = True, specialized_transforms: bool = False,
+                     routing: bool = False, type_ref_expression: Optional[str] = None,
+                     token_cache: bool = True, max_retries: int = DEFAULT_MAX_RETRIES,
+                     metrics_out: Optional[str] = None, otel_spans: bool = False,
+                     plan_file: Optional[str] = None, ingestion_profile: Optional[str] = None) -> bool:
+    """Setup the Fabric Eventhouse with tables and functions, from input mappings or a plan file."""
+    from azure.kusto.data.exceptions import KustoAuthenticationError
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+    
     logging.info("Setting up Fabric Eventhouse...")
     logging.info(f"Database: {database_name}")
     logging.info(f"Cluster: {cluster_name}")
     logging.info(f"Log file: {log_file}")
+    logging.info(f"Max parallel: {max_parallel}")
+    logging.info(f"Batch mode: {batch}")
+    logging.info(f"Incremental mode: {incremental}")
+    logging.info(f"Schema evolution: {evolve}")
+    logging.info(f"Definitions cache: {definitions_cache}")
+    logging.info(f"Specialized transforms: {specialized_transforms}")
+    logging.info(f"Type routing: {routing}")
+    if type_ref_expression:
+        logging.info(f"Type reference expression: {type_ref_expression}")
+    if ingestion_profile:
+        logging.info(f"Ingestion profile: {ingestion_profile}")
+    logging.info(f"Token cache: {token_cache}")
+    logging.info(f"Max retries: {max_retries}")
+    if metrics_out:
+        logging.info(f"Metrics report: {metrics_out}")
+    if plan_file:
+        logging.info(f"Plan file: {plan_file}")
     
     # Input validation
     if not database_name or not database_name.strip():
@@ -33,13 +83,38 @@ def setup_eventhouse(database_name: str, cluster_name: str, log_file: Optional[s
         print("❌ Error: Cluster name cannot be empty")
         return False
     
+    plan = None
+    if plan_file:
+        try:
+            plan = ProvisioningPlan.load(plan_file)
+        except (OSError, PlanError) as e:
+            logging.error(f"Failed to load plan {plan_file}: {e}")
+            print(f"❌ Error: Cannot load plan {plan_file}: {e}")
+            return False
+    
     # Create the EventhouseManager and run setup
     manager = None
+    success = False
     try:
-        manager = EventhouseManager(cluster_name, database_name, log_file, verbose)
+        manager = EventhouseManager(cluster_name, database_name, log_file, verbose, max_parallel=max_parallel,
+                                    batch=batch, incremental=incremental, evolve=evolve,
+                                    definitions_cache=definitions_cache,
+                                    specialized_transforms=specialized_transforms,
+                                    routing=routing, type_ref_expression=type_ref_expression,
+                                    token_cache=token_cache, max_retries=max_retries,
+                                    ingestion_profile=ingestion_profile)
+        if otel_spans:
+            try:
+                manager.metrics.exporters.append(OpenTelemetrySpanExporter())
+            except ImportError:
+                logging.warning("opentelemetry-api is not installed; command spans will not be exported. "
+                                "Install it with: pip install opentelemetry-api")
         
         # Require explicit input - no default setup
-        if type_mappings or yaml_file:
+        if plan is not None:
+            print(f"Applying plan {plan_file}...")
+            success = manager.apply_plan(plan)
+        elif type_mappings or yaml_file:
             print("Using dynamic input for table setup...")
             success = manager.setup_tables_from_input(type_mappings, yaml_file)
         else:
@@ -102,10 +177,471 @@ def setup_eventhouse(database_name: str, cluster_name: str, log_file: Optional[s
         return False
     finally:
         # Ensure proper cleanup
+        if manager:
+            if metrics_out:
+                _write_metrics_report(manager, metrics_out, cluster_name, success)
+            manager.close_log_file()
+
+
+def _write_metrics_report(manager: "EventhouseManager", path: str, cluster_name: str, success: bool) -> None:
+    """Write the run report of a setup, including failed ones."""
+    try:
+        manager.metrics.write(path, cluster=cluster_name, success=success, options={
+            "max_parallel": manager.max_parallel,
+            "batch": manager.batch,
+            "incremental": manager.incremental,
+            "evolve": manager.evolve,
+            "routing": manager.routing,
+            "ingestion_profile": manager.ingestion_profile,
+            "max_retries": manager.scheduler.max_retries,
+        }, scheduler=manager.scheduler.stats())
+        print(f"📊 Metrics report written to {path}")
+    except OSError as e:
+        logging.error(f"Failed to write metrics report to {path}: {e}")
+
+
+def write_plan(out: Optional[str], log_file: Optional[str] = None,
+               type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+               verbose: bool = False, definitions_cache: bool = True, specialized_transforms: bool = False,
+               routing: bool = False, type_ref_expression: Optional[str] = None,
+               ingestion_profile: Optional[str] = None) -> bool:
+    """Compile the provisioning commands for the input mappings into a plan file, offline."""
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+    
+    logging.info("Compiling provisioning plan...")
+    logging.info(f"Output: {out or 'current directory'}")
+    
+    manager = None
+    try:
+        # Mapping resolution and command compilation do not connect to a cluster
+        manager = EventhouseManager("local", "local", log_file, verbose, definitions_cache=definitions_cache,
+                                    specialized_transforms=specialized_transforms, routing=routing,
+                                    type_ref_expression=type_ref_expression, ingestion_profile=ingestion_profile)
+        plan = manager.compile_plan(type_mappings, yaml_file)
+        if plan is None:
+            print("❌ No entity mappings could be resolved from the input")
+            return False
+        
+        path = plan.write(out)
+        print(f"✅ Wrote plan {path} ({len(plan.tables)} entity tables, {len(plan.commands)} commands)")
+        print(f"   Content hash: {plan.content_hash}")
+        return True
+    except OSError as e:
+        logging.error(f"Failed to write plan: {e}")
+        print(f"❌ Failed to write plan: {e}")
+        return False
+    finally:
+        if manager:
+            manager.close_log_file()
+
+
+def setup_targets(targets_file: str, log_file: Optional[str] = None,
+                  type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+                  verbose: bool = False, plan_file: Optional[str] = None,
+                  parallel_targets: int = DEFAULT_PARALLEL_TARGETS, report: Optional[str] = None,
+                  max_parallel: int = DEFAULT_MAX_PARALLEL, batch: bool = False, incremental: bool = False,
+                  evolve: bool = False, definitions_cache: bool = True, specialized_transforms: bool = False,
+                  routing: bool = False, type_ref_expression: Optional[str] = None,
+                  token_cache: bool = True, max_retries: int = DEFAULT_MAX_RETRIES,
+                  ingestion_profile: Optional[str] = None) -> bool:
+    """Provision every database of a targets file concurrently from one compiled plan."""
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+    
+    logging.info("Setting up Fabric Eventhouse targets...")
+    logging.info(f"Targets file: {targets_file}")
+    logging.info(f"Parallel targets: {parallel_targets}")
+    
+    try:
+        targets = load_targets(targets_file)
+    except (OSError, TargetsFormatError) as e:
+        logging.error(f"Failed to load targets {targets_file}: {e}")
+        print(f"❌ Error: Cannot load targets {targets_file}: {e}")
+        return False
+    
+    start = time.perf_counter()
+    # Compiles the plan and holds the log file that all target managers write to
+    manager = None
+    try:
+        manager = EventhouseManager("local", "local", log_file, verbose, definitions_cache=definitions_cache,
+                                    specialized_transforms=specialized_transforms, routing=routing,
+                                    type_ref_expression=type_ref_expression, ingestion_profile=ingestion_profile)
+        if plan_file:
+            try:
+                plan = ProvisioningPlan.load(plan_file)
+            except (OSError, PlanError) as e:
+                logging.error(f"Failed to load plan {plan_file}: {e}")
+                print(f"❌ Error: Cannot load plan {plan_file}: {e}")
+                return False
+        elif type_mappings or yaml_file:
+            plan = manager.compile_plan(type_mappings, yaml_file)
+            if plan is None:
+                print("❌ No entity mappings could be resolved from the input")
+                return False
+        else:
+            print("❌ Error: No input provided. Please specify --plan, --type-mappings or --yaml-file")
+            return False
+        
+        def create_manager(target):
+            return EventhouseManager(target.cluster, target.database, None, verbose, max_parallel=max_parallel,
+                                     batch=batch, incremental=incremental, evolve=evolve,
+                                     token_cache=token_cache, max_retries=max_retries)
+        
+        print(f"Provisioning {len(targets)} targets with plan {plan.content_hash[:12]}...")
+        results = run_fanout(targets, lambda target_manager: target_manager.apply_plan(plan), create_manager,
+                             parallel_targets)
+        
+        for line in format_fanout_summary(results):
+            print(line)
+        failed = sum(1 for result in results if not result.success)
+        if report:
+            try:
+                write_fanout_report(report, build_fanout_report(results, time.perf_counter() - start,
+                                                                plan=plan.content_hash))
+                print(f"📊 Target report written to {report}")
+            except OSError as e:
+                logging.error(f"Failed to write target report to {report}: {e}")
+        
+        if failed:
+            print(f"❌ {failed}/{len(results)} targets failed!")
+            print("💡 Check the log file for detailed error information.")
+            return False
+        print(f"✅ All {len(results)} targets provisioned successfully!")
+        return True
+    except KeyboardInterrupt:
+        print("\n⚠️  Operation cancelled by user.")
+        return False
+    finally:
+        if manager:
+            manager.close_log_file()
+
+
+def run_local_transform(input_files: List[str], log_file: Optional[str] = None,
+                        type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+                        output_dir: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                        verbose: bool = False) -> bool:
+    """Apply the MoveDataByType transform locally to raw AIORawData records."""
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+    
+    logging.info("Running local transform...")
+    logging.info(f"Input files: {', '.join(input_files)}")
+    logging.info(f"Output directory: {output_dir}")
+    
+    manager = None
+    writer = None
+    try:
+        # Mapping resolution does not connect to a cluster
+        manager = EventhouseManager("local", "local", log_file, verbose)
+        entity_mappings = manager.resolve_entity_mappings(type_mappings, yaml_file)
+        if not entity_mappings:
+            print("❌ No entity mappings could be resolved from the input")
+            return False
+        
+        transform = LocalTransform(entity_mappings)
+        writer = JsonlTableWriter(output_dir) if output_dir else None
+        batches = (batch for path in input_files for batch in read_raw_batches(path, batch_size))
+        stats = transform.run(batches, writer)
+        
+        print(f"✅ Transformed {stats.raw_rows} raw rows ({stats.matched_rows} matched, "
+              f"{stats.invalid_rows} without telemetry) in {stats.seconds:.2f}s "
+              f"({stats.rows_per_second:,.0f} rows/s)")
+        for table_name, rows in stats.output_rows.items():
+            print(f"   {table_name}: {rows} rows")
+        for table_name, columns in stats.unknown_columns.items():
+            print(f"⚠️  {table_name}: telemetry keys not in the table schema: {', '.join(sorted(columns))}")
+        return True
+    except (OSError, ValueError, ImportError) as e:
+        logging.error(f"Local transform failed: {e}")
+        print(f"❌ Local transform failed: {e}")
+        return False
+    finally:
+        if writer:
+            writer.close()
         if manager:
             manager.close_log_file()
 
 
+def backfill_eventhouse(database_name: str, cluster_name: str, log_file: Optional[str] = None,
+                        type_mappings: Optional[List[str]] = None, yaml_file: Optional[str] = None,
+                        verbose: bool = False, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        slice_size: timedelta = parse_timespan(DEFAULT_SLICE), checkpoint: Optional[str] = None,
+                        max_parallel: int = DEFAULT_MAX_PARALLEL, token_cache: bool = True,
+                        max_retries: int = DEFAULT_MAX_RETRIES, metrics_out: Optional[str] = None) -> bool:
+    """Backfill provisioned entity tables from the raw data already in AIORawData."""
+    from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+    
+    checkpoint = checkpoint or default_checkpoint_path(database_name)
+    logging.info("Backfilling entity tables...")
+    logging.info(f"Database: {database_name}")
+    logging.info(f"Cluster: {cluster_name}")
+    logging.info(f"Range: {start or 'first raw row'} to {end or 'first row of each table'}")
+    logging.info(f"Slice: {slice_size}")
+    logging.info(f"Checkpoint: {checkpoint}")
+    logging.info(f"Max parallel: {max_parallel}")
+    
+    if not type_mappings and not yaml_file:
+        print("❌ Error: No input provided. Please specify either --type-mappings or --yaml-file")
+        return False
+    
+    manager = None
+    success = False
+    try:
+        manager = EventhouseManager(cluster_name, database_name, log_file, verbose, max_parallel=max_parallel,
+                                    token_cache=token_cache, max_retries=max_retries)
+        success = manager.backfill_from_input(type_mappings, yaml_file, start, end, slice_size, checkpoint)
+        if success:
+            print("✅ Backfill completed successfully!")
+        else:
+            print("❌ Backfill failed!")
+            print(f"💡 Check the log for details; rerun with --checkpoint {checkpoint} to resume.")
+        return success
+    except KeyboardInterrupt:
+        print(f"\n⚠️  Operation cancelled by user. Rerun with --checkpoint {checkpoint} to resume.")
+        return False
+    except Exception as e:
+        logging.error(f"Error during backfill: {e}")
+        print(f"❌ Backfill failed with error: {e}")
+        print("💡 Check the log file for detailed error information.")
+        return False
+    finally:
+        if manager:
+            if metrics_out:
+                _write_metrics_report(manager, metrics_out, cluster_name, success)
+            manager.close_log_file()
+
+
+def ingest_raw_data(input_files: List[str], cluster_name: Optional[str] = None,
+                    database_name: Optional[str] = None, output_dir: Optional[str] = None,
+                    table_name: str = AIO_RAW_DATA_TABLE, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    max_parallel: int = DEFAULT_INGEST_WORKERS,
+                    compression_level: int = DEFAULT_COMPRESSION_LEVEL, ingest_uri: Optional[str] = None,
+                    max_retries: int = DEFAULT_MAX_RETRIES) -> bool:
+    """Load local raw data files into AIORawData through queued ingestion, or write the chunks to a directory."""
+    logging.info("Ingesting raw data...")
+    logging.info(f"Input files: {', '.join(input_files)}")
+    logging.info(f"Table: {table_name}")
+    logging.info(f"Chunk rows: {chunk_rows}")
+    logging.info(f"Max parallel: {max_parallel}")
+    
+    if output_dir:
+        logging.info(f"Output directory: {output_dir}")
+    elif not cluster_name or not database_name:
+        print("❌ Error: Specify --cluster and --database, or --output-dir to write the chunks locally")
+        return False
+    
+    sink = None
+    try:
+        sink = DirectorySink(output_dir) if output_dir else QueuedIngestSink(cluster_name, database_name,
+                                                                             ingest_uri=ingest_uri)
+        scheduler = CommandScheduler(max_concurrency=max_parallel, max_retries=max_retries)
+        stats = run_ingest(input_files, sink, table_name, chunk_rows, max_parallel, compression_level, scheduler)
+        
+        compressed = f", compressed to {stats.compressed_bytes / stats.raw_bytes:.0%}" if stats.raw_bytes else ""
+        print(f"✅ Submitted {stats.rows} rows from {stats.files} files in {stats.chunks} chunks "
+              f"in {stats.seconds:.2f}s ({stats.rows_per_second:,.0f} rows/s{compressed})")
+        if stats.invalid_records:
+            print(f"⚠️  Skipped {stats.invalid_records} records that are not JSON objects")
+        if stats.failed_chunks:
+            print(f"❌ {stats.failed_chunks} chunks failed; check the log for details")
+            return False
+        if not output_dir:
+            print("💡 Queued ingestion is asynchronous; rows appear in the table within a few minutes.")
+        return True
+    except KeyboardInterrupt:
+        print("\n⚠️  Operation cancelled by user.")
+        return False
+    except Exception as e:
+        logging.error(f"Ingestion failed: {e}")
+        print(f"❌ Ingestion failed: {e}")
+        return False
+    finally:
+        if sink:
+            sink.close()
+
+
+def _non_negative_int(value: str) -> int:
+    """argparse type for options that require an integer >= 0."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer value: '{value}'")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"value cannot be negative, got {number}")
+    return number
+
+
+def _positive_int(value: str) -> int:
+    """argparse type for options that require an integer >= 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"value must be at least 1, got {number}")
+    return number
+
+
+def _datetime(value: str) -> datetime:
+    """argparse type for ISO 8601 date and time options; times without an offset are UTC."""
+    parsed = parse_kusto_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"invalid date and time: '{value}'")
+    return parsed
+
+
+def _timespan(value: str) -> timedelta:
+    """argparse type for timespan options such as 1d, 6h or 30m."""
+    try:
+        return parse_timespan(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _add_target_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the commands that connect to a database."""
+    parser.add_argument(
+        "--cluster",
+        type=str,
+        help="Eventhouse Query URI",
+        required=True
+    )
+    parser.add_argument(
+        "--database",
+        type=str,
+        help="Database name",
+        required=True
+    )
+    _add_logging_arguments(parser)
+
+
+def _add_logging_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments that control the log output."""
+    parser.add_argument(
+        "--log-file",
+        type=str,
+        help="Log file path (optional)",
+        default=None
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output"
+    )
+
+
+def _add_mapping_source_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments that select the entity types."""
+    parser.add_argument(
+        "--type-mappings",
+        type=str,
+        nargs='+',
+        help="List of structured mappings in JSON format: '{\"typeRef\":\"...\",\"namespace\":\"...\",\"entity_name\":\"...\"}'",
+        default=None
+    )
+    parser.add_argument(
+        "--yaml-file",
+        type=str,
+        help="YAML mapping file, directory of YAML files or quoted glob pattern (--type-mappings override its mappings)",
+        default=None
+    )
+
+
+def _add_mapping_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments that select the entity types and shape the generated KQL."""
+    _add_mapping_source_arguments(parser)
+    parser.add_argument(
+        "--no-definitions-cache",
+        dest="definitions_cache",
+        action="store_false",
+        help="Always re-parse EntityTypeDefinitions.json instead of reusing the compiled catalog cache"
+    )
+    parser.add_argument(
+        "--specialized-transforms",
+        action="store_true",
+        help="Generate a typed transform function per entity table instead of using the generic MoveDataByType"
+    )
+    parser.add_argument(
+        "--routing",
+        action="store_true",
+        help="Resolve each raw message's type once at ingestion into a staging table that the entity tables read. "
+             "Without --type-ref-expression every row is still matched against each mapped type; pass an "
+             "expression that extracts the type reference to make routing cost independent of the mappings"
+    )
+    parser.add_argument(
+        "--type-ref-expression",
+        type=str,
+        help="KQL expression over AIORawData that extracts the exact type reference of a message (used with --routing)",
+        default=None
+    )
+    parser.add_argument(
+        "--ingestion-profile",
+        choices=list(INGESTION_PROFILES),
+        help="Set streaming ingestion and ingestion batching policies on the tables: realtime (streaming, "
+             "10s batches), balanced (30s batches) or bulk (5 minute batches); default: leave the policies unset",
+        default=None
+    )
+
+
+def _add_scheduler_arguments(parser: argparse.ArgumentParser,
+                             parallel_help: str = "Maximum number of entity tables provisioned concurrently") -> None:
+    """Arguments that control the concurrency, retries and authentication of management commands."""
+    parser.add_argument(
+        "--max-parallel",
+        type=_positive_int,
+        help=f"{parallel_help} (default: 1, serial)",
+        default=DEFAULT_MAX_PARALLEL
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=_non_negative_int,
+        help=f"Retries per management command after throttling or transient errors (default: {DEFAULT_MAX_RETRIES}, 0 disables retries)",
+        default=DEFAULT_MAX_RETRIES
+    )
+    parser.add_argument(
+        "--no-token-cache",
+        dest="token_cache",
+        action="store_false",
+        help="Authenticate with a fresh Azure CLI / device code client instead of the cached, shared credential"
+    )
+
+
+def _add_metrics_arguments(parser: argparse.ArgumentParser, spans: bool = True) -> None:
+    """Arguments that report the management commands of a run."""
+    parser.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help="Write a JSON run report with per-command latencies, retries and phase timings to PATH"
+    )
+    if spans:
+        parser.add_argument(
+            "--otel-spans",
+            action="store_true",
+            help="Export each management command as an OpenTelemetry span (requires opentelemetry-api)"
+        )
+
+
+def _add_execution_arguments(parser: argparse.ArgumentParser, metrics: bool = True) -> None:
+    """Arguments that control how provisioning commands are executed (and, with metrics, reported)."""
+    _add_scheduler_arguments(parser)
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Provision all tables, functions and policies through a few batched database scripts"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Compare against the existing database catalog and only apply missing tables, columns, functions and policies"
+    )
+    parser.add_argument(
+        "--evolve",
+        action="store_true",
+        help="Evolve existing entity tables in place (implies --incremental): merge new columns, stop on column "
+             "type conflicts before any change and regenerate the affected update policies with the new columns"
+    )
+    if metrics:
+        _add_metrics_arguments(parser)
+
+
 def main():
     try:
         parser = argparse.ArgumentParser(
@@ -117,38 +653,192 @@ def main():
         
         # Eventhouse setup command
         eventhouse_parser = subparsers.add_parser('setup-eventhouse', help='Setup Fabric Eventhouse')
-        eventhouse_parser.add_argument(
-            "--cluster",
+        _add_target_arguments(eventhouse_parser)
+        _add_mapping_arguments(eventhouse_parser)
+        _add_execution_arguments(eventhouse_parser)
+        
+        # Offline plan compilation
+        plan_parser = subparsers.add_parser(
+            'plan', help='Resolve mappings and compile the provisioning commands into a plan file, without a cluster')
+        _add_mapping_arguments(plan_parser)
+        plan_parser.add_argument(
+            "--out",
             type=str,
-            help="Eventhouse Query URI",
+            help="Plan file to write, or a directory for the default eventhouse-plan-<hash>.json name (default: current directory)",
+            default=None
+        )
+        _add_logging_arguments(plan_parser)
+        
+        # Plan execution command
+        apply_parser = subparsers.add_parser('apply', help='Provision a Fabric Eventhouse from a precompiled plan file')
+        apply_parser.add_argument(
+            "--plan",
+            type=str,
+            help="Plan file written by the plan command",
             required=True
         )
-        eventhouse_parser.add_argument(
-            "--database",
+        _add_target_arguments(apply_parser)
+        _add_execution_arguments(apply_parser)
+        
+        # Multi-database fan-out
+        fanout_parser = subparsers.add_parser(
+            'fanout', help='Provision every cluster/database pair of a targets file concurrently')
+        fanout_parser.add_argument(
+            "--targets",
             type=str,
-            help="Database name",
+            help="YAML or JSON file with a 'targets' list of {cluster, database} entries",
             required=True
         )
-        eventhouse_parser.add_argument(
-            "--type-mappings",
+        fanout_parser.add_argument(
+            "--plan",
+            type=str,
+            help="Plan file to apply to every target instead of --type-mappings/--yaml-file",
+            default=None
+        )
+        _add_mapping_arguments(fanout_parser)
+        _add_execution_arguments(fanout_parser, metrics=False)
+        fanout_parser.add_argument(
+            "--parallel-targets",
+            type=_positive_int,
+            help=f"Maximum number of targets provisioned at the same time (default: {DEFAULT_PARALLEL_TARGETS})",
+            default=DEFAULT_PARALLEL_TARGETS
+        )
+        fanout_parser.add_argument(
+            "--report",
+            metavar="PATH",
+            help="Write the consolidated per-target results as JSON to PATH"
+        )
+        _add_logging_arguments(fanout_parser)
+        
+        # Local transform command
+        transform_parser = subparsers.add_parser(
+            'transform-local', help='Apply the MoveDataByType transform to local raw data files')
+        transform_parser.add_argument(
+            "--input",
             type=str,
             nargs='+',
-            help="List of structured mappings in JSON format: '{\"typeRef\":\"...\",\"namespace\":\"...\",\"entity_name\":\"...\"}'",
+            help="AIORawData records as JSON Lines (.jsonl) or Parquet (.parquet, requires pyarrow) files",
+            required=True
+        )
+        _add_mapping_source_arguments(transform_parser)
+        transform_parser.add_argument(
+            "--output-dir",
+            type=str,
+            help="Write one <table>.jsonl file per entity table to this directory (optional)",
+            default=None
+        )
+        transform_parser.add_argument(
+            "--batch-size",
+            type=_positive_int,
+            help=f"Raw records processed per batch (default: {DEFAULT_BATCH_SIZE})",
+            default=DEFAULT_BATCH_SIZE
+        )
+        _add_logging_arguments(transform_parser)
+        
+        # Backfill command
+        backfill_parser = subparsers.add_parser(
+            'backfill', help='Append the raw data already in AIORawData to provisioned entity tables')
+        _add_target_arguments(backfill_parser)
+        _add_mapping_source_arguments(backfill_parser)
+        backfill_parser.add_argument(
+            "--start",
+            type=_datetime,
+            help="Earliest ingestion time to replay, e.g. 2024-05-01 or 2024-05-01T06:00:00Z (default: first raw row)",
             default=None
         )
-        eventhouse_parser.add_argument(
-            "--yaml-file",
+        backfill_parser.add_argument(
+            "--end",
+            type=_datetime,
+            help="Ingestion time to stop at, exclusive (default: the first row each table received "
+                 "through its update policy, or now for an empty table)",
+            default=None
+        )
+        backfill_parser.add_argument(
+            "--slice",
+            dest="slice_size",
+            metavar="TIMESPAN",
+            type=_timespan,
+            help=f"Ingestion time span appended by one command (default: {DEFAULT_SLICE})",
+            default=parse_timespan(DEFAULT_SLICE)
+        )
+        backfill_parser.add_argument(
+            "--checkpoint",
+            metavar="PATH",
+            help="File recording the ranges and completed slices; a rerun with it resumes the backfill "
+                 "(default: backfill-<database>.checkpoint.jsonl)",
+            default=None
+        )
+        _add_scheduler_arguments(backfill_parser, "Maximum number of slices appended concurrently")
+        _add_metrics_arguments(backfill_parser, spans=False)
+        
+        # Bulk ingestion command
+        ingest_parser = subparsers.add_parser(
+            'ingest', help='Load captured raw data files into AIORawData through queued ingestion')
+        ingest_parser.add_argument(
+            "--input",
             type=str,
-            help="Path to YAML file containing type mappings",
+            nargs='+',
+            help="Raw data records as JSON Lines, CSV with a header row (both optionally .gz) "
+                 "or Parquet (.parquet, requires pyarrow) files",
+            required=True
+        )
+        ingest_parser.add_argument(
+            "--cluster",
+            type=str,
+            help="Eventhouse Query URI (required unless --output-dir is given)",
+            default=None
+        )
+        ingest_parser.add_argument(
+            "--database",
+            type=str,
+            help="Database name (required unless --output-dir is given)",
+            default=None
+        )
+        ingest_parser.add_argument(
+            "--ingest-uri",
+            type=str,
+            help="Ingestion URI (default: the Query URI with the ingest- host prefix)",
             default=None
         )
-        eventhouse_parser.add_argument(
-            "--log-file",
+        ingest_parser.add_argument(
+            "--output-dir",
             type=str,
-            help="Log file path (optional)",
+            help="Write the compressed CSV chunks to this directory instead of ingesting them",
             default=None
         )
-        eventhouse_parser.add_argument(
+        ingest_parser.add_argument(
+            "--table",
+            type=str,
+            help=f"Table to ingest into (default: {AIO_RAW_DATA_TABLE})",
+            default=AIO_RAW_DATA_TABLE
+        )
+        ingest_parser.add_argument(
+            "--chunk-rows",
+            type=_positive_int,
+            help=f"Rows per ingested chunk (default: {DEFAULT_CHUNK_ROWS})",
+            default=DEFAULT_CHUNK_ROWS
+        )
+        ingest_parser.add_argument(
+            "--max-parallel",
+            type=_positive_int,
+            help=f"Chunks compressed and submitted concurrently (default: {DEFAULT_INGEST_WORKERS})",
+            default=DEFAULT_INGEST_WORKERS
+        )
+        ingest_parser.add_argument(
+            "--compression-level",
+            type=int,
+            choices=range(1, 10),
+            metavar="{1..9}",
+            help=f"gzip compression level, 1 fastest to 9 smallest (default: {DEFAULT_COMPRESSION_LEVEL})",
+            default=DEFAULT_COMPRESSION_LEVEL
+        )
+        ingest_parser.add_argument(
+            "--max-retries",
+            type=_non_negative_int,
+            help=f"Retries per chunk after throttling or transient errors (default: {DEFAULT_MAX_RETRIES})",
+            default=DEFAULT_MAX_RETRIES
+        )
+        ingest_parser.add_argument(
             "--verbose",
             action="store_true",
             help="Enable verbose output"
@@ -162,12 +852,106 @@ def main():
             if hasattr(args, 'verbose') and args.verbose:
                 logging.getLogger().setLevel(logging.DEBUG)
             
-            success = setup_eventhouse(args.database, args.cluster, args.log_file, args.type_mappings, args.yaml_file, args.verbose)
+            success = setup_eventhouse(args.database, args.cluster, args.log_file, args.type_mappings, args.yaml_file, args.verbose,
+                                       max_parallel=args.max_parallel, batch=args.batch,
+                                       incremental=args.incremental,
+                                       evolve=args.evolve,
+                                       definitions_cache=args.definitions_cache,
+                                       specialized_transforms=args.specialized_transforms,
+                                       routing=args.routing,
+                                       type_ref_expression=args.type_ref_expression,
+                                       token_cache=args.token_cache,
+                                       max_retries=args.max_retries,
+                                       metrics_out=args.metrics_out,
+                                       otel_spans=args.otel_spans,
+                                       ingestion_profile=args.ingestion_profile)
             if not success:
                 logging.error("Eventhouse setup failed.")
                 sys.exit(1)
             else:
                 logging.info("Eventhouse setup completed successfully.")
+        
+        elif args.command == 'plan':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = write_plan(args.out, args.log_file, args.type_mappings, args.yaml_file, args.verbose,
+                                 definitions_cache=args.definitions_cache,
+                                 specialized_transforms=args.specialized_transforms,
+                                 routing=args.routing,
+                                 type_ref_expression=args.type_ref_expression,
+                                 ingestion_profile=args.ingestion_profile)
+            if not success:
+                sys.exit(1)
+        
+        elif args.command == 'apply':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = setup_eventhouse(args.database, args.cluster, args.log_file, verbose=args.verbose,
+                                       max_parallel=args.max_parallel, batch=args.batch,
+                                       incremental=args.incremental,
+                                       evolve=args.evolve,
+                                       token_cache=args.token_cache,
+                                       max_retries=args.max_retries,
+                                       metrics_out=args.metrics_out,
+                                       otel_spans=args.otel_spans,
+                                       plan_file=args.plan)
+            if not success:
+                logging.error("Plan apply failed.")
+                sys.exit(1)
+        
+        elif args.command == 'fanout':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = setup_targets(args.targets, args.log_file, args.type_mappings, args.yaml_file, args.verbose,
+                                    plan_file=args.plan, parallel_targets=args.parallel_targets,
+                                    report=args.report, max_parallel=args.max_parallel, batch=args.batch,
+                                    incremental=args.incremental,
+                                    evolve=args.evolve,
+                                    definitions_cache=args.definitions_cache,
+                                    specialized_transforms=args.specialized_transforms,
+                                    routing=args.routing,
+                                    type_ref_expression=args.type_ref_expression,
+                                    token_cache=args.token_cache,
+                                    max_retries=args.max_retries,
+                                    ingestion_profile=args.ingestion_profile)
+            if not success:
+                sys.exit(1)
+        
+        elif args.command == 'transform-local':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = run_local_transform(args.input, args.log_file, args.type_mappings, args.yaml_file,
+                                          output_dir=args.output_dir, batch_size=args.batch_size,
+                                          verbose=args.verbose)
+            if not success:
+                sys.exit(1)
+        
+        elif args.command == 'backfill':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = backfill_eventhouse(args.database, args.cluster, args.log_file, args.type_mappings,
+                                          args.yaml_file, args.verbose, start=args.start, end=args.end,
+                                          slice_size=args.slice_size, checkpoint=args.checkpoint,
+                                          max_parallel=args.max_parallel, token_cache=args.token_cache,
+                                          max_retries=args.max_retries, metrics_out=args.metrics_out)
+            if not success:
+                sys.exit(1)
+        
+        elif args.command == 'ingest':
+            if args.verbose:
+                logging.getLogger().setLevel(logging.DEBUG)
+            
+            success = ingest_raw_data(args.input, args.cluster, args.database, output_dir=args.output_dir,
+                                      table_name=args.table, chunk_rows=args.chunk_rows,
+                                      max_parallel=args.max_parallel, compression_level=args.compression_level,
+                                      ingest_uri=args.ingest_uri, max_retries=args.max_retries)
+            if not success:
+                sys.exit(1)
                 
         else:
             # No command specified, show help
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Timing metrics for management commands and the machine-readable run report.
+
+The managers record every management command they send (kind, target table,
+latency including retries, attempts, bytes sent and outcome) in a MetricsRecorder.
+The recorder aggregates them into latency histograms and percentiles per command
+kind, times the phases of a setup run, and can forward each command as a span to
+OpenTelemetry when it is installed.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+# Command kinds that exist only in metrics (see commands.py for the others)
+KIND_SCRIPT = "script"
+KIND_CATALOG = "catalog"
+KIND_QUERY = "query"
+
+OUTCOME_SUCCEEDED = "succeeded"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PERCENTILES = (50, 90, 99)
+REPORT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class CommandMetric(NamedTuple):
+    """Measurements of one management command, including its retries."""
+
+    kind: str
+    target: str
+    start_time_ns: int
+    latency_seconds: float
+    attempts: int
+    bytes_sent: int
+    outcome: str
+
+    @property
+    def end_time_ns(self) -> int:
+        return self.start_time_ns + int(self.latency_seconds * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "target": self.target,
+            "started_at": datetime.fromtimestamp(self.start_time_ns / 1e9, timezone.utc).isoformat(),
+            "latency_seconds": round(self.latency_seconds, 6),
+            "retries": self.attempts - 1,
+            "bytes_sent": self.bytes_sent,
+            "outcome": self.outcome,
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, Any]:
+    """Count, mean, min/max, percentiles and cumulative histogram buckets of latencies."""
+    values = sorted(latencies)
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    for value in values:
+        counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    buckets, cumulative = [], 0
+    for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], counts):
+        cumulative += count
+        buckets.append({"le": bound, "count": cumulative})
+    summary = {
+        "count": len(values),
+        "sum": round(sum(values), 6),
+        "mean": round(sum(values) / len(values), 6) if values else None,
+        "min": values[0] if values else None,
+        "max": values[-1] if values else None,
+    }
+    summary.update({f"p{pct}": percentile(values, pct) for pct in PERCENTILES})
+    summary["buckets"] = buckets
+    return summary
+
+
+class OpenTelemetrySpanExporter:
+    """
+    Sends each recorded command as a span to an OpenTelemetry tracer.
+
+    Spans go to the tracer provider configured in the process, e.g. by running the
+    CLI under `opentelemetry-instrument`; without one they are dropped.
+    """
+
+    def __init__(self, tracer: Any = None):
+        """
+        Initialize the exporter.
+
+        Args:
+            tracer: Tracer to use; defaults to the global OpenTelemetry tracer
+
+        Raises:
+            ImportError: If no tracer is given and opentelemetry-api is not installed
+        """
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer("fabriceventhousehelperpyapp")
+        self.tracer = tracer
+
+    def export(self, metric: CommandMetric, database: str) -> None:
+        span = self.tracer.start_span(f"kusto.mgmt {metric.kind}", start_time=metric.start_time_ns, attributes={
+            "db.system": "kusto",
+            "db.name": database,
+            "eventhouse.command.kind": metric.kind,
+            "eventhouse.command.target": metric.target,
+            "eventhouse.command.retries": metric.attempts - 1,
+            "eventhouse.command.bytes_sent": metric.bytes_sent,
+            "eventhouse.command.outcome": metric.outcome,
+        })
+        if metric.outcome != OUTCOME_SUCCEEDED:
+            span.set_attribute("error.type", metric.outcome)
+        span.end(end_time=metric.end_time_ns)
+
+
+class MetricsRecorder:
+    """Thread-safe collector of command metrics and phase timings for one manager."""
+
+    def __init__(self, database: str = "", exporters: Optional[List[Any]] = None):
+        """
+        Initialize the recorder.
+
+        Args:
+            database: Database the commands are sent to, reported with spans
+            exporters: Objects with an export(metric, database) method called per command
+        """
+        self.database = database
+        self.exporters = list(exporters or [])
+        self.commands: List[CommandMetric] = []
+        self.phases: Dict[str, float] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, metric: CommandMetric) -> None:
+        """Record a command and forward it to the exporters."""
+        with self._lock:
+            self.commands.append(metric)
+        for exporter in self.exporters:
+            try:
+                exporter.export(metric, self.database)
+            except Exception as e:
+                logger.debug(f"Failed to export command metric: {e}")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the run; repeated phases accumulate."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self, **context: Any) -> Dict[str, Any]:
+        """
+        Build the run report.
+
+        Args:
+            context: Additional top-level fields, e.g. cluster, options and success
+
+        Returns:
+            dict: Wall time, phase timings, totals, per-kind latency summaries and
+            the individual commands
+        """
+        with self._lock:
+            commands = list(self.commands)
+            phases = dict(self.phases)
+        by_kind: Dict[str, List[CommandMetric]] = {}
+        for metric in commands:
+            by_kind.setdefault(metric.kind, []).append(metric)
+
+        def totals(metrics: List[CommandMetric]) -> Dict[str, Any]:
+            return {
+                "commands": len(metrics),
+                "failed": sum(1 for m in metrics if m.outcome != OUTCOME_SUCCEEDED),
+                "retries": sum(m.attempts - 1 for m in metrics),
+                "bytes_sent": sum(m.bytes_sent for m in metrics),
+            }
+
+        return {
+            "version": REPORT_VERSION,
+            "database": self.database,
+            **context,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.perf_counter() - self._start, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in phases.items()},
+            "totals": {**totals(commands), "latency": summarize_latencies([m.latency_seconds for m in commands])},
+            "by_kind": {
+                kind: {**totals(metrics), "latency": summarize_latencies([m.latency_seconds for m in metrics])}
+                for kind, metrics in sorted(by_kind.items())
+            },
+            "commands": [metric.to_dict() for metric in commands],
+        }
+
+    def write(self, path: str, **context: Any) -> None:
+        """Write the run report as JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(**context), f, indent=2)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Typed model of the type mappings, entity mappings and their columns.
+
+The records are immutable named tuples: they carry no per-instance __dict__, so
+large mapping sets stay small in memory, and they are hashable, so duplicate
+mappings collapse in a set and a mapping set can be used as a cache key. Entity
+mappings share the column tuples of the entity catalog instead of copying them.
+
+Plan files and the public dictionary form of a mapping are converted with
+to_dict() and from_dict():
+
+    {"entityType": "...", "typeRef": "...", "displayName": "...", "fields": ["name:type", ...],
+     ["policies": {...}], ["latest_values": true]}
+"""
+
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from digitaloperations.fabriceventhousehelperpyapp.database_state import normalize_column_name
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import TablePolicies
+from digitaloperations.fabriceventhousehelperpyapp.transforms import quote_identifier
+
+
+class Column(NamedTuple):
+    """A column of an entity table, with its type as declared (e.g. double, not real)."""
+    name: str
+    kusto_type: str
+
+    @classmethod
+    def parse(cls, spec: str) -> "Column":
+        """
+        Parse a "name:type" column spec; the name may be quoted as ['name'].
+
+        Raises:
+            ValueError: If the spec has no name or no type
+        """
+        name, _, kusto_type = spec.rpartition(":")
+        name = normalize_column_name(name)
+        kusto_type = kusto_type.strip()
+        if not name or not kusto_type:
+            raise ValueError(f"Invalid column spec: {spec!r}")
+        return cls(name, kusto_type)
+
+    @property
+    def spec(self) -> str:
+        """The "name:type" spec used in table schemas."""
+        return f"{quote_identifier(self.name)}:{self.kusto_type}"
+
+
+def parse_columns(fields: Iterable[str]) -> Tuple[Column, ...]:
+    """Parse column specs into columns, in order."""
+    return tuple(Column.parse(spec) for spec in fields)
+
+
+class TypeMapping(NamedTuple):
+    """An input mapping of a type reference onto an entity definition."""
+    type_ref: str
+    namespace: str
+    entity_name: str
+    policies: Optional[TablePolicies] = None
+    latest_values: bool = False
+
+    @property
+    def table_name(self) -> str:
+        """Name of the entity table; an underscore instead of a dot keeps it a plain Kusto name."""
+        return f"{self.namespace}_{self.entity_name}"
+
+
+class EntityMapping(NamedTuple):
+    """An entity table, the type reference that feeds it and its columns."""
+    type_ref: str
+    table_name: str
+    columns: Tuple[Column, ...]
+    policies: Optional[TablePolicies] = None
+    latest_values: bool = False
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """Column specs of the table, in column order."""
+        return tuple(column.spec for column in self.columns)
+
+    @property
+    def schema(self) -> str:
+        """Schema of the table for `.create table`."""
+        return ", ".join(self.fields)
+
+    def column_type(self, name: str) -> Optional[str]:
+        """Declared type of a column, or None if the table has no such column."""
+        for column in self.columns:
+            if column.name == name:
+                return column.kusto_type
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The mapping in its dictionary form, as stored in plan files."""
+        data = {
+            "entityType": self.table_name,
+            "typeRef": self.type_ref,
+            "displayName": self.table_name,
+            "fields": list(self.fields),
+        }
+        if self.policies:
+            data["policies"] = self.policies.to_dict()
+        if self.latest_values:
+            data["latest_values"] = True
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EntityMapping":
+        """
+        Build a mapping from its dictionary form.
+
+        Raises:
+            KeyError: If displayName, typeRef or fields is missing
+            ValueError: If a column spec is invalid
+        """
+        policies = data.get("policies")
+        return cls(data["typeRef"], data["displayName"], parse_columns(data["fields"]),
+                   TablePolicies.from_dict(policies) if policies else None, bool(data.get("latest_values")))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Precompiled provisioning plans.
+
+A plan holds the resolved entity mappings, the options that shape the generated
+KQL and the provisioning commands in execution order. It is compiled offline by
+the `plan` command and executed by `apply --plan`, so definitions are parsed and
+mappings resolved once (e.g. in CI) and the same artifact is applied to every
+target database.
+
+Plan files are JSON. Their content hash (SHA-256 over the canonical JSON of
+everything except the hash and the creation time) is stored in the file and checked
+before a plan is applied, and names the file by default.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import KustoCommand
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping
+
+
+# Version 2 added the ingestion_profile option
+PLAN_VERSION = 2
+DEFAULT_PLAN_FILE_TEMPLATE = "eventhouse-plan-{hash}.json"
+# Hex digits of the content hash used in default plan file names
+PLAN_FILE_HASH_LENGTH = 12
+
+# Manager options the plan's commands depend on
+PLAN_OPTIONS = ("routing", "specialized_transforms", "type_ref_expression", "ingestion_profile")
+
+
+class PlanError(ValueError):
+    """Raised when a plan file cannot be read or fails its integrity check"""
+    pass
+
+
+class ProvisioningPlan:
+    """Entity mappings, options and compiled commands of one provisioning run."""
+
+    def __init__(self, entity_mappings: List[EntityMapping], commands: List[KustoCommand],
+                 options: Dict[str, Any], created_at: Optional[str] = None):
+        """
+        Initialize the plan.
+
+        Args:
+            entity_mappings: Resolved entity mappings
+            commands: Provisioning commands in execution order
+            options: Values of PLAN_OPTIONS the commands were compiled with
+            created_at: ISO timestamp of the compilation; defaults to now
+        """
+        self.entity_mappings = entity_mappings
+        self.commands = commands
+        self.options = {name: options.get(name) for name in PLAN_OPTIONS}
+        self.created_at = created_at or datetime.now(timezone.utc).isoformat()
+        self.content_hash = compute_plan_hash(self._content())
+
+    def _content(self) -> Dict[str, Any]:
+        return {
+            "version": PLAN_VERSION,
+            "options": self.options,
+            "entity_mappings": [mapping.to_dict() for mapping in self.entity_mappings],
+            "commands": [command._asdict() for command in self.commands],
+        }
+
+    @property
+    def tables(self) -> List[str]:
+        """Entity tables provisioned by the plan."""
+        return [mapping.table_name for mapping in self.entity_mappings]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self._content(), "hash": self.content_hash, "created_at": self.created_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProvisioningPlan":
+        """
+        Rebuild a plan and verify its content hash.
+
+        Raises:
+            PlanError: If the plan has an unsupported version, is malformed or its
+            content does not match its hash
+        """
+        if not isinstance(data, dict) or data.get("version") != PLAN_VERSION:
+            raise PlanError(f"Unsupported plan version: {data.get('version') if isinstance(data, dict) else None}")
+        try:
+            commands = [KustoCommand(c["kind"], c["target"], c["text"]) for c in data["commands"]]
+            entity_mappings = [EntityMapping.from_dict(mapping) for mapping in data["entity_mappings"]]
+            plan = cls(entity_mappings, commands, data["options"], data.get("created_at"))
+        except (KeyError, TypeError, ValueError) as e:
+            raise PlanError(f"Malformed plan: {e}")
+        if plan.content_hash != data.get("hash"):
+            raise PlanError(f"Plan content does not match its hash {data.get('hash')}; "
+                            "the file was modified after it was compiled")
+        return plan
+
+    def default_path(self, directory: str = ".") -> str:
+        """Content-hashed file name of the plan in a directory."""
+        return os.path.join(directory, DEFAULT_PLAN_FILE_TEMPLATE.format(hash=self.content_hash[:PLAN_FILE_HASH_LENGTH]))
+
+    def write(self, path: Optional[str] = None) -> str:
+        """
+        Write the plan atomically.
+
+        Args:
+            path: Output file, or a directory for the content-hashed default name;
+                defaults to the current directory
+
+        Returns:
+            str: Path of the written plan file
+        """
+        if path is None or os.path.isdir(path):
+            path = self.default_path(path or ".")
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, indent=2)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ProvisioningPlan":
+        """
+        Read and verify a plan file.
+
+        Raises:
+            OSError: If the file cannot be read
+            PlanError: If the file is not a valid plan
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise PlanError(f"Invalid JSON in plan file {path}: {e}")
+        return cls.from_dict(data)
+
+
+def compute_plan_hash(content: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON encoding of the plan content."""
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
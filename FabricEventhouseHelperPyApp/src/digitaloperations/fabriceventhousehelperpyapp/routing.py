@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Builders for the ingestion-time type routing stage.
+
+Without routing every entity table has its own update policy on AIORawData, and each
+of them runs `where type endswith typeRef` over every ingested batch. With routing a
+single update policy on AIORawData resolves the exact type reference (and the
+Identifier) of each message once, writing them to the AIORoutedData staging table;
+the entity update policies read that table and filter on `TypeRef == typeRef`.
+
+AIORoutedData is only a hop between update policies, so its retention policy deletes
+rows as soon as they are ingested instead of storing every message a second time.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    AIO_RAW_DATA_TABLE,
+    KIND_POLICY,
+    KIND_TABLE,
+    KIND_TRANSFORM,
+    ROUTED_DATA_TABLE,
+    KustoCommand,
+    build_create_table_command,
+    build_update_policy,
+    build_update_policy_command,
+)
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import parse_timespan
+from digitaloperations.fabriceventhousehelperpyapp.transforms import quote_string
+
+
+ROUTE_RAW_DATA_FUNCTION = "RouteRawData"
+ROUTED_DATA_SCHEMA = "TypeRef: string, Identifier: string, subject: string, ['data']: string"
+# Routed rows are consumed by the update policies of the same ingestion, so none are kept
+ROUTED_DATA_SOFT_DELETE = "0d"
+# Default of a type reference expression that yields every matching reference
+_NO_TYPE_REFS = "dynamic([])"
+
+
+def build_type_ref_expression(type_refs: Iterable[str]) -> str:
+    """
+    Build the KQL expression that resolves the type reference of a raw message.
+
+    Each type reference is matched with `endswith`, as MoveDataByType does, inside a
+    single case() evaluated once per row. Messages of unmapped types resolve to an
+    empty string. When a reference is a suffix of another, a message of the longer
+    one matches both, and without routing it is moved into the tables of both; the
+    case() then tests longer references first and yields the array of every
+    reference the message matches, which the routing function expands into one row
+    per reference.
+    """
+    refs = sorted(set(type_refs), key=lambda ref: (-len(ref), ref))
+    if not refs:
+        return '""'
+    # endswith is case-insensitive, so suffixes are compared in lower case
+    matches = {ref: [other for other in refs if ref.lower().endswith(other.lower())] for ref in refs}
+    if all(len(matched) == 1 for matched in matches.values()):
+        branches = "".join(f"\n        type endswith {quote_string(ref)}, {quote_string(ref)}," for ref in refs)
+        return f'case({branches}\n        "")'
+    branches = "".join(f"\n        type endswith {quote_string(ref)}, "
+                       f"dynamic([{', '.join(quote_string(other) for other in matched)}]),"
+                       for ref, matched in matches.items())
+    return f'case({branches}\n        {_NO_TYPE_REFS})'
+
+
+def _fans_out(type_ref_expression: str) -> bool:
+    """Check whether a type reference expression yields an array of references."""
+    return type_ref_expression.startswith("case(") and type_ref_expression.endswith(f"{_NO_TYPE_REFS})")
+
+
+def build_routing_function_body(type_ref_expression: str) -> str:
+    """Build the body of the RouteRawData function."""
+    if _fans_out(type_ref_expression):
+        return f"""{{
+    {AIO_RAW_DATA_TABLE}
+    | project TypeRef = {type_ref_expression}, Identifier = tostring(split(subject, "/")[0]), subject, data
+    | mv-expand TypeRef to typeof(string)
+    | where isnotempty(TypeRef)
+}}"""
+    return f"""{{
+    {AIO_RAW_DATA_TABLE}
+    | project TypeRef = tostring({type_ref_expression}), Identifier = tostring(split(subject, "/")[0]), subject, data
+    | where isnotempty(TypeRef)
+}}"""
+
+
+def build_routing_function_command(type_ref_expression: str) -> str:
+    """Build the command that creates (or updates) the RouteRawData function."""
+    return f".create-or-alter function {ROUTE_RAW_DATA_FUNCTION}()\n{build_routing_function_body(type_ref_expression)}"
+
+
+def build_routing_update_policy_query() -> str:
+    """Build the update policy query that feeds AIORoutedData."""
+    return f"{ROUTE_RAW_DATA_FUNCTION}()"
+
+
+def build_routing_update_policy() -> list:
+    """Build the update policy object of the AIORoutedData staging table."""
+    return build_update_policy(ROUTED_DATA_TABLE, "", build_routing_update_policy_query())
+
+
+def build_routing_retention_policy_command() -> str:
+    """Build the command that stops AIORoutedData from keeping (or recovering) routed rows."""
+    return (f".alter-merge table {ROUTED_DATA_TABLE} policy retention "
+            f"softdelete = {ROUTED_DATA_SOFT_DELETE} recoverability = disabled")
+
+
+def routing_retention_policy_matches(existing: Optional[Dict[str, Any]]) -> bool:
+    """Check whether a retention policy object deletes rows at once, with recoverability disabled."""
+    existing = existing or {}
+    try:
+        soft_delete = parse_timespan(existing.get("SoftDeletePeriod"), allow_zero=True)
+    except ValueError:
+        return False
+    return (soft_delete == parse_timespan(ROUTED_DATA_SOFT_DELETE, allow_zero=True)
+            and str(existing.get("Recoverability", "")).lower() == "disabled")
+
+
+def compile_routing_commands(type_refs: Iterable[str],
+                             type_ref_expression: Optional[str] = None) -> List[KustoCommand]:
+    """
+    Compile the commands that set up the routing stage.
+
+    Args:
+        type_refs: Mapped type references, used when no expression is given
+        type_ref_expression: KQL expression over AIORawData that yields the exact
+            type reference of a message, for type formats where it can be extracted
+
+    Returns:
+        list: The staging table, its retention policy, the routing function and its update policy
+    """
+    expression = type_ref_expression or build_type_ref_expression(type_refs)
+    return [
+        KustoCommand(KIND_TABLE, ROUTED_DATA_TABLE, build_create_table_command(ROUTED_DATA_TABLE, ROUTED_DATA_SCHEMA)),
+        KustoCommand(KIND_POLICY, ROUTED_DATA_TABLE, build_routing_retention_policy_command()),
+        KustoCommand(KIND_TRANSFORM, ROUTED_DATA_TABLE, build_routing_function_command(expression)),
+        KustoCommand(KIND_POLICY, ROUTED_DATA_TABLE,
+                     build_update_policy_command(ROUTED_DATA_TABLE, "", build_routing_update_policy_query())),
+    ]
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+"""
+Retries and adaptive concurrency for management commands.
+
+Every management command the managers send goes through a CommandScheduler. Failures
+are classified as throttled, transient, permanent or authentication errors. Throttled
+and transient failures are retried with jittered exponential backoff, while the others
+are raised at once. Concurrency is adjusted additively up and multiplicatively down
+(AIMD): each throttling response halves the number of commands in flight, and the
+limit grows back by one after a full window of successful commands.
+
+The CLI reads the defaults below while parsing arguments, so this module does not
+import the Kusto SDK or asyncio until they are needed.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+ERROR_THROTTLED = "throttled"
+ERROR_TRANSIENT = "transient"
+ERROR_PERMANENT = "permanent"
+ERROR_AUTH = "auth"
+RETRYABLE_ERRORS = (ERROR_THROTTLED, ERROR_TRANSIENT)
+
+DEFAULT_MAX_PARALLEL = 1
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Service responses that are worth retrying
+_TRANSIENT_STATUS_CODES = {408, 500, 502, 503, 504}
+_THROTTLING_MARKERS = ("throttl", "too many requests")
+_TRANSIENT_MARKERS = ("temporarily unavailable", "service unavailable", "timed out", "timeout",
+                     "connection reset", "connection aborted")
+
+T = TypeVar("T")
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status code of the response attached to an error, if any."""
+    candidates = [getattr(error, "http_response", None)] + [arg for arg in getattr(error, "args", ())[1:]]
+    for response in candidates:
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by the service through a Retry-After header, if any."""
+    candidates = [getattr(error, "http_response", None)] + [arg for arg in getattr(error, "args", ())[1:]]
+    for response in candidates:
+        headers = getattr(response, "headers", None)
+        if not headers:
+            continue
+        try:
+            return max(0.0, float(headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify an error raised while executing a management command.
+
+    Returns:
+        str: ERROR_THROTTLED, ERROR_TRANSIENT, ERROR_PERMANENT or ERROR_AUTH
+    """
+    from azure.kusto.data.exceptions import (
+        KustoApiError,
+        KustoAuthenticationError,
+        KustoNetworkError,
+        KustoServiceError,
+        KustoThrottlingError,
+    )
+
+    message = str(error).lower()
+    # Same test the managers use to re-raise authentication errors
+    if isinstance(error, KustoAuthenticationError) or "KustoAuthenticationError" in str(type(error)) \
+            or "authentication" in message:
+        return ERROR_AUTH
+
+    status = _status_code(error)
+    if status in (401, 403):
+        return ERROR_AUTH
+    if isinstance(error, KustoThrottlingError) or status == 429 or any(m in message for m in _THROTTLING_MARKERS):
+        return ERROR_THROTTLED
+
+    if isinstance(error, (KustoNetworkError, ConnectionError, TimeoutError)) or status in _TRANSIENT_STATUS_CODES:
+        return ERROR_TRANSIENT
+    if isinstance(error, KustoApiError) and error.get_api_error().permanent is False:
+        return ERROR_TRANSIENT
+    if isinstance(error, KustoServiceError) and any(m in message for m in _TRANSIENT_MARKERS):
+        return ERROR_TRANSIENT
+    return ERROR_PERMANENT
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on the number of commands in flight, usable from threads and coroutines.
+
+    Each acquisition returns the generation of the limit it was granted under. A
+    throttling response only shrinks the limit if its request was started under the
+    current generation, so one burst of throttled requests halves the limit once.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_limit: Upper bound and initial value of the limit
+            min_limit: Lower bound of the limit
+        """
+        if max_limit < 1 or min_limit < 1 or min_limit > max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= max_limit")
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.lowest_limit = max_limit
+        self._generation = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+        self._async_waiters: List[Tuple["asyncio.AbstractEventLoop", "asyncio.Future"]] = []
+
+    def expand(self, max_limit: int) -> None:
+        """Raise the upper bound (and the limit by as much) if max_limit is higher."""
+        with self._condition:
+            if max_limit > self.max_limit:
+                self.limit += max_limit - self.max_limit
+                self.max_limit = max_limit
+                self._wake()
+
+    def acquire(self) -> int:
+        """Wait for a free slot and return the generation it was granted under."""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            return self._generation
+
+    async def acquire_async(self) -> int:
+        """Coroutine version of acquire()."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return self._generation
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self) -> None:
+        """Free a slot."""
+        with self._condition:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self) -> None:
+        """Grow the limit by one after a full window of successful commands."""
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._wake()
+
+    def on_throttled(self, generation: int) -> bool:
+        """
+        Halve the limit in response to a throttling error.
+
+        Returns:
+            bool: True if the limit was reduced
+        """
+        with self._condition:
+            self._successes = 0
+            if generation != self._generation or self.limit <= self.min_limit:
+                return False
+            self.limit = max(self.min_limit, self.limit // 2)
+            self.lowest_limit = min(self.lowest_limit, self.limit)
+            self._generation += 1
+            return True
+
+    def _wake(self) -> None:
+        """Wake threads and coroutines waiting for a slot; called with the lock held."""
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+
+
+def _resolve(waiter: "asyncio.Future") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class CommandScheduler:
+    """
+    Runs management commands with retries and adaptive concurrency.
+
+    Throttled and transient failures are retried up to max_retries times, waiting a
+    random delay of up to base_delay * 2**attempt (capped at max_delay) or the
+    service's Retry-After, whichever is longer. Permanent and authentication errors
+    are raised immediately.
+    """
+
+    def __init__(self, max_concurrency: int = 1, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                 logger: Optional[logging.Logger] = None, seed: Optional[int] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of commands in flight
+            max_retries: Retries per command for throttled and transient errors (0 disables them)
+            base_delay: Backoff delay of the first retry, in seconds
+            max_delay: Upper bound of a single backoff delay, in seconds
+            logger: Logger for retries and concurrency changes
+            seed: Seed for the backoff jitter
+            sleep: Function used to wait between retries
+        """
+        if max_retries < 0:
+            raise ValueError("max_retries cannot be negative")
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.logger = logger or logging.getLogger(__name__)
+        self.sleep = sleep
+        self.commands = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {category: 0 for category in
+                                       (ERROR_THROTTLED, ERROR_TRANSIENT, ERROR_PERMANENT, ERROR_AUTH)}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def backoff_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Jittered exponential delay before retry number attempt + 1."""
+        with self._lock:
+            delay = self._random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error) if error is not None else None
+        return max(delay, min(retry_after, self.max_delay)) if retry_after is not None else delay
+
+    def run(self, operation: Callable[[], T], description: str = "command") -> T:
+        """
+        Run an operation, retrying it on throttled and transient errors.
+
+        Args:
+            operation: Sends the command and returns its result
+            description: Short description of the command for log messages
+
+        Returns:
+            The result of the operation
+        """
+        with self._lock:
+            self.commands += 1
+        attempt = 0
+        while True:
+            generation = self.limiter.acquire()
+            try:
+                # The slot is released even when the caller is interrupted or cancelled
+                try:
+                    result = operation()
+                finally:
+                    self.limiter.release()
+            except Exception as e:
+                delay = self._on_error(e, attempt, generation, description)
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    async def run_async(self, operation: Callable[[], Awaitable[T]], description: str = "command") -> T:
+        """Coroutine version of run() for operations that return awaitables."""
+        import asyncio
+
+        with self._lock:
+            self.commands += 1
+        attempt = 0
+        while True:
+            generation = await self.limiter.acquire_async()
+            try:
+                # The slot is released even when the caller is interrupted or cancelled
+                try:
+                    result = await operation()
+                finally:
+                    self.limiter.release()
+            except Exception as e:
+                delay = self._on_error(e, attempt, generation, description)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    def _on_error(self, error: Exception, attempt: int, generation: int, description: str) -> float:
+        """Record a failed attempt; return the delay before retrying or raise the error."""
+        category = classify_error(error)
+        with self._lock:
+            self.errors[category] += 1
+        if category == ERROR_THROTTLED and self.limiter.on_throttled(generation):
+            self.logger.warning(f"Throttled by the service; reducing concurrency to {self.limiter.limit}")
+        if category not in RETRYABLE_ERRORS or attempt >= self.max_retries:
+            raise error
+        delay = self.backoff_delay(attempt, error)
+        with self._lock:
+            self.retries += 1
+        self.logger.info(f"{category.capitalize()} error on {description} "
+                         f"(attempt {attempt + 1}/{self.max_retries + 1}), retrying in {delay:.1f}s: {error}")
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the commands run so far."""
+        with self._lock:
+            return {
+                "commands": self.commands,
+                "retries": self.retries,
+                "errors": dict(self.errors),
+                "concurrency_limit": self.limiter.limit,
+                "lowest_concurrency_limit": self.limiter.lowest_limit,
+            }
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+"""
+Caching and partitioning policies of the entity tables.
+
+Queries on entity tables usually select one machine (Identifier) over a recent time
+window. A caching policy keeps that window in the hot cache, and a partitioning
+policy that hashes Identifier and splits Timestamp into uniform ranges lets such
+queries skip the extents of other machines and periods.
+
+The policies are configured in the YAML mappings file, as defaults for every entity
+table and per mapping:
+
+    table_policies:
+      hot_cache: 31d
+      partitioning: true
+    type_mappings:
+      - typeRef: "..."
+        namespace: "..."
+        entity_name: "..."
+        hot_cache: 7d
+        partitioning:
+          max_partition_count: 256
+          range_size: 12h
+"""
+
+import json
+import re
+from datetime import timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import KIND_POLICY, KustoCommand
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    DatabaseSnapshot,
+    normalize_column_name,
+    parse_schema,
+)
+
+
+HASH_PARTITION_COLUMN = "Identifier"
+RANGE_PARTITION_COLUMN = "Timestamp"
+DEFAULT_MAX_PARTITION_COUNT = 128
+DEFAULT_PARTITION_RANGE_SIZE = "1d"
+# The service accepts between 1 and 2048 hash partitions
+MAX_PARTITION_COUNT_LIMIT = 2048
+HASH_PARTITION_SEED = 1
+RANGE_PARTITION_REFERENCE = "1970-01-01T00:00:00"
+
+# Mapping keys that configure the policies of a table
+TABLE_POLICY_KEYS = ("hot_cache", "partitioning")
+
+_TIMESPAN_LITERAL = re.compile(r"^(\d+)(d|h|m|s)$")
+_TIMESPAN_CLOCK = re.compile(r"^(?:(\d+)\.)?(\d{1,2}):(\d{2}):(\d{2})(?:\.\d+)?$")
+_TIMESPAN_UNITS = (("d", timedelta(days=1)), ("h", timedelta(hours=1)), ("m", timedelta(minutes=1)),
+                   ("s", timedelta(seconds=1)))
+
+
+class PartitioningSettings(NamedTuple):
+    """Hash partition count and range size of a partitioning policy."""
+    max_partition_count: int
+    range_size: str
+
+
+class TablePolicies(NamedTuple):
+    """Normalized caching and partitioning policies of an entity table; None turns a policy off."""
+    hot_cache: Optional[str] = None
+    partitioning: Optional[PartitioningSettings] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The policies in their YAML (and plan file) form, with only the enabled policies."""
+        policies = {}
+        if self.hot_cache:
+            policies["hot_cache"] = self.hot_cache
+        if self.partitioning:
+            policies["partitioning"] = self.partitioning._asdict()
+        return policies
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TablePolicies":
+        """Rebuild the policies from to_dict() output."""
+        partitioning = data.get("partitioning")
+        return cls(data.get("hot_cache"), PartitioningSettings(**partitioning) if partitioning else None)
+
+
+def parse_timespan(text: Any, allow_zero: bool = False) -> timedelta:
+    """
+    Parse a KQL timespan literal (7d, 12h, 30m, 90s) or a [d.]hh:mm:ss timespan.
+
+    Args:
+        text: The timespan
+        allow_zero: Accept a zero timespan, e.g. the 0d soft delete period of a retention policy
+
+    Raises:
+        ValueError: If the text is not a positive (or zero) timespan in one of these formats
+    """
+    text = str(text).strip()
+    match = _TIMESPAN_LITERAL.match(text)
+    if match:
+        value = int(match.group(1)) * dict(_TIMESPAN_UNITS)[match.group(2)]
+    else:
+        match = _TIMESPAN_CLOCK.match(text)
+        if not match:
+            raise ValueError(f"Invalid timespan '{text}'; expected e.g. 7d, 12h, 30m or 1.00:00:00")
+        days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+        value = timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+    if value < timedelta(0) or (value == timedelta(0) and not allow_zero):
+        raise ValueError(f"Timespan '{text}' must be positive")
+    return value
+
+
+def format_timespan_literal(value: timedelta) -> str:
+    """Shortest whole-unit KQL literal of a timespan, e.g. 7d or 36h."""
+    for unit, size in _TIMESPAN_UNITS:
+        if value % size == timedelta(0):
+            return f"{value // size}{unit}"
+    return f"{int(value.total_seconds())}s"
+
+
+def format_timespan(value: timedelta) -> str:
+    """Timespan in the d.hh:mm:ss form the service uses in policy objects."""
+    seconds = int(value.total_seconds())
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{days}.{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_table_policies(settings: Dict[str, Any],
+                         defaults: Optional[TablePolicies] = None) -> Optional[TablePolicies]:
+    """
+    Validate and normalize the table policy keys of a mapping.
+
+    Args:
+        settings: Mapping (or table_policies section) that may set hot_cache and partitioning
+        defaults: Normalized defaults for keys the settings do not set; a key set to
+            null or false in the settings turns the default off
+
+    Returns:
+        TablePolicies: The enabled policies, or None if no policy is enabled
+
+    Raises:
+        ValueError: If a value is invalid
+    """
+    if not isinstance(settings, dict):
+        raise ValueError(f"Table policies must be a mapping: {settings!r}")
+    resolved = defaults.to_dict() if defaults else {}
+    for key in TABLE_POLICY_KEYS:
+        if key in settings:
+            resolved[key] = settings[key]
+
+    hot_cache = resolved.get("hot_cache")
+    if hot_cache:
+        hot_cache = format_timespan_literal(parse_timespan(hot_cache))
+
+    partitioning = resolved.get("partitioning")
+    if partitioning is True:
+        partitioning = {}
+    if isinstance(partitioning, dict):
+        unknown = set(partitioning) - set(PartitioningSettings._fields)
+        if unknown:
+            raise ValueError(f"Unknown partitioning settings: {', '.join(sorted(unknown))}")
+        count = partitioning.get("max_partition_count", DEFAULT_MAX_PARTITION_COUNT)
+        if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_PARTITION_COUNT_LIMIT:
+            raise ValueError(f"max_partition_count must be an integer from 1 to {MAX_PARTITION_COUNT_LIMIT}: {count}")
+        range_size = parse_timespan(partitioning.get("range_size", DEFAULT_PARTITION_RANGE_SIZE))
+        partitioning = PartitioningSettings(count, format_timespan_literal(range_size))
+    elif partitioning not in (None, False):
+        raise ValueError(f"partitioning must be true, false or a mapping: {partitioning!r}")
+    else:
+        partitioning = None
+
+    if not hot_cache and not partitioning:
+        return None
+    return TablePolicies(hot_cache or None, partitioning)
+
+
+def build_caching_policy_command(table_name: str, hot_cache: str) -> str:
+    """Build the `.alter table policy caching` command that keeps hot_cache of data in the hot cache."""
+    return f".alter table {table_name} policy caching hot = {hot_cache}"
+
+
+def build_partitioning_policy(settings: PartitioningSettings, fields: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Build the partitioning policy object of an entity table.
+
+    The hash key needs a string Identifier column and the range key a datetime
+    Timestamp column; keys whose column the table lacks are left out.
+
+    Returns:
+        dict: The policy, or None if the table has neither column
+    """
+    columns = {name: kusto_type for name, kusto_type, _ in parse_schema(", ".join(fields))}
+    keys = []
+    if columns.get(HASH_PARTITION_COLUMN) == "string":
+        keys.append({
+            "ColumnName": HASH_PARTITION_COLUMN,
+            "Kind": "Hash",
+            "Properties": {
+                "Function": "XxHash64",
+                "MaxPartitionCount": settings.max_partition_count,
+                "Seed": HASH_PARTITION_SEED,
+                "PartitionAssignmentMode": "Uniform",
+            },
+        })
+    if columns.get(RANGE_PARTITION_COLUMN) == "datetime":
+        keys.append({
+            "ColumnName": RANGE_PARTITION_COLUMN,
+            "Kind": "UniformRange",
+            "Properties": {
+                "Reference": RANGE_PARTITION_REFERENCE,
+                "RangeSize": format_timespan(parse_timespan(settings.range_size)),
+                "OverrideCreationTime": False,
+            },
+        })
+    return {"PartitionKeys": keys} if keys else None
+
+
+def build_partitioning_policy_command(table_name: str, policy: Dict[str, Any]) -> str:
+    """Build the `.alter table policy partitioning` command for a table."""
+    return f".alter table {table_name} policy partitioning @'{json.dumps(policy, separators=(',', ':'))}'"
+
+
+def caching_policy_matches(existing: Optional[Dict[str, Any]], hot_cache: str) -> bool:
+    """Check whether a caching policy object keeps hot_cache of data hot."""
+    hot_span = (existing or {}).get("DataHotSpan")
+    if isinstance(hot_span, dict):
+        hot_span = hot_span.get("Value")
+    try:
+        return hot_span is not None and parse_timespan(hot_span) == parse_timespan(hot_cache)
+    except ValueError:
+        return False
+
+
+def partitioning_policy_matches(existing: Optional[Dict[str, Any]], policy: Dict[str, Any]) -> bool:
+    """Check whether a partitioning policy object has the desired partition keys."""
+    existing_keys = (existing or {}).get("PartitionKeys") or []
+    if len(existing_keys) != len(policy["PartitionKeys"]):
+        return False
+    for current, desired in zip(existing_keys, policy["PartitionKeys"]):
+        if (normalize_column_name(current.get("ColumnName", "")), current.get("Kind")) != \
+                (desired["ColumnName"], desired["Kind"]):
+            return False
+        properties = current.get("Properties") or {}
+        for key, value in desired["Properties"].items():
+            current_value = properties.get(key)
+            if key == "RangeSize":
+                try:
+                    current_value = format_timespan(parse_timespan(current_value))
+                except ValueError:
+                    return False
+            if key == "Reference":
+                current_value = str(current_value or "").rstrip("Z").split(".")[0]
+            if current_value != value:
+                return False
+    return True
+
+
+def compile_table_policy_commands(table_name: str, fields: List[str], policies: Optional[TablePolicies],
+                                  snapshot: Optional[DatabaseSnapshot] = None) -> List[KustoCommand]:
+    """
+    Compile the caching and partitioning policy commands of an entity table.
+
+    Args:
+        table_name: Name of the entity table
+        fields: Column specs of the table
+        policies: Normalized policies from parse_table_policies(), if any
+        snapshot: Catalog snapshot; policies that already match it are skipped
+
+    Returns:
+        list: The caching policy command and the partitioning policy command, for the
+        policies that are configured (and differ from the snapshot)
+    """
+    commands = []
+    if not policies:
+        return commands
+    hot_cache = policies.hot_cache
+    if hot_cache and not (snapshot and caching_policy_matches(snapshot.caching_policies.get(table_name), hot_cache)):
+        commands.append(KustoCommand(KIND_POLICY, table_name, build_caching_policy_command(table_name, hot_cache)))
+    policy = build_partitioning_policy(policies.partitioning, fields) if policies.partitioning else None
+    if policy and not (snapshot and partitioning_policy_matches(snapshot.partitioning_policies.get(table_name),
+                                                                policy)):
+        commands.append(KustoCommand(KIND_POLICY, table_name, build_partitioning_policy_command(table_name, policy)))
+    return commands
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Generator for per-table transform functions.
+
+The generic MoveDataByType function works for any entity type but expands every
+message into one row per telemetry key, re-aggregates the rows into a property bag
+and unpacks that bag again. When the columns of an entity table are known up front,
+a specialised function can instead project each column directly from the parsed
+message with a typed conversion.
+"""
+
+import re
+from typing import Optional, Sequence
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import AIO_RAW_DATA_TABLE, ROUTED_DATA_TABLE
+from digitaloperations.fabriceventhousehelperpyapp.database_state import parse_schema
+
+
+SPECIALIZED_FUNCTION_PREFIX = "MoveData_"
+SPECIALIZED_FUNCTION_FOLDER = "EntityTransforms"
+
+# Very wide entities produce function bodies that are slow to compile, so they keep
+# using the generic MoveDataByType function
+MAX_SPECIALIZED_COLUMNS = 1000
+
+# Kusto conversion function for each (normalized) column type; dynamic needs none
+KUSTO_CONVERSIONS = {
+    "string": "tostring",
+    "real": "todouble",
+    "bool": "tobool",
+    "datetime": "todatetime",
+    "long": "tolong",
+    "int": "toint",
+    "timespan": "totimespan",
+    "guid": "toguid",
+    "decimal": "todecimal",
+}
+
+IDENTIFIER_COLUMN = "Identifier"
+TIMESTAMP_COLUMN = "Timestamp"
+
+_PLAIN_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a column name with ['...'] unless it is a plain identifier."""
+    if _PLAIN_IDENTIFIER.match(name):
+        return name
+    return "['" + name.replace("\\", "\\\\").replace("'", "\\'") + "']"
+
+
+def quote_string(value: str) -> str:
+    """Quote a value as a double-quoted KQL string literal."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_specialized_function_name(table_name: str) -> str:
+    """Name of the specialised transform function for an entity table."""
+    return f"{SPECIALIZED_FUNCTION_PREFIX}{table_name}"
+
+
+def _convert(expression: str, kusto_type: str) -> str:
+    """Wrap an expression in the conversion for a column type."""
+    conversion = KUSTO_CONVERSIONS.get(kusto_type)
+    return f"{conversion}({expression})" if conversion else expression
+
+
+def build_specialized_function_body(type_ref: str, fields: Sequence[str], routed: bool = False) -> Optional[str]:
+    """
+    Build the body of a specialised transform function for an entity table.
+
+    Each column is projected directly from the message's "Value" with a typed
+    conversion, in table column order. Identifier comes from the first segment of the
+    subject and Timestamp from the ServerTimestamp of the message's first field, so
+    the function assumes that all fields of one message share a ServerTimestamp
+    (which holds for OPC UA dataset messages); the generic function instead emits one
+    row per distinct timestamp.
+
+    Args:
+        type_ref: Type reference used to select raw messages
+        fields: Table columns as "name:type" specs
+        routed: Read the routing staging table, filtering on its exact TypeRef column
+
+    Returns:
+        str: The function body, or None if the table should use the generic function
+    """
+    columns = parse_schema(", ".join(fields))
+    value_columns = [column for column in columns if column[0] not in (IDENTIFIER_COLUMN, TIMESTAMP_COLUMN)]
+    if not value_columns or len(columns) > MAX_SPECIALIZED_COLUMNS:
+        return None
+
+    projections = []
+    for name, kusto_type, _ in columns:
+        if name == IDENTIFIER_COLUMN:
+            expression = _convert(IDENTIFIER_COLUMN if routed else 'split(subject, "/")[0]', kusto_type)
+        elif name == TIMESTAMP_COLUMN:
+            expression = _convert('ParsedData[tostring(Keys[0])]["ServerTimestamp"]', kusto_type)
+        else:
+            expression = _convert(f'ParsedData[{quote_string(name)}]["Value"]', kusto_type)
+        projections.append(f"        {quote_identifier(name)} = {expression}")
+
+    if routed:
+        source = f"{ROUTED_DATA_TABLE}\n    | where TypeRef == {quote_string(type_ref)}"
+    else:
+        source = f"{AIO_RAW_DATA_TABLE}\n    | where type endswith {quote_string(type_ref)}"
+
+    return (
+        "{\n"
+        f"    {source}\n"
+        "    | extend ParsedData = parse_json(data)\n"
+        "    | extend Keys = bag_keys(ParsedData)\n"
+        "    | where array_length(Keys) > 0\n"
+        "    | project\n"
+        + ",\n".join(projections) + "\n"
+        "}"
+    )
+
+
+def build_specialized_function_command(table_name: str, body: str) -> str:
+    """Build the command that creates (or updates) a specialised transform function."""
+    return (f'.create-or-alter function with (folder="{SPECIALIZED_FUNCTION_FOLDER}") '
+            f"{build_specialized_function_name(table_name)}()\n{body}")
+
+
+def build_specialized_update_policy_query(table_name: str) -> str:
+    """Build the update policy query that invokes a table's specialised transform function."""
+    return f"{build_specialized_function_name(table_name)}()"
+
+
+def build_conforming_query(query: str, fields: Sequence[str]) -> str:
+    """
+    Project the output of an update policy query onto the columns of its table.
+
+    Each column is taken with column_ifexists() and converted to its type, in table
+    column order, so the output matches the table even when the query's columns
+    depend on the data (as with the bag_unpack of MoveDataByType) or the table has
+    columns the query does not produce.
+
+    Args:
+        query: Update policy query
+        fields: Table columns as "name:type" specs, in table column order
+    """
+    projections = [
+        f"{quote_identifier(name)} = {_convert(f'column_ifexists({quote_string(name)}, dynamic(null))', kusto_type)}"
+        for name, kusto_type, _ in parse_schema(", ".join(fields))
+    ]
+    return f"{query}\n| project " + ", ".join(projections)
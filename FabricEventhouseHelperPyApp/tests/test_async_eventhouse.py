@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import asyncio
+import sys
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.async_eventhouse import AsyncEventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import AsyncFakeKustoClient, FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, TypeMapping, parse_columns
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={
+           "ref1": TypeMapping("ref1", "Test", "Entity"),
+           "ref2": TypeMapping("ref2", "Test", "Other")
+       }))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "TimeseriesProperties": [{"name": "temp", "valueType": "Number"}]}
+       ]))
+class TestAsyncEventhouseManager(unittest.IsolatedAsyncioTestCase):
+    """Test cases for AsyncEventhouseManager against the async fake Kusto backend"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.cluster_url = "https://test-cluster.kusto.windows.net"
+        self.database = "test_database"
+        self.client = AsyncFakeKustoClient()
+
+    async def setup(self, database=None, **options):
+        """Run setup_tables_from_input with an async manager bound to the fake client"""
+        async with AsyncEventhouseManager(self.cluster_url, database or self.database,
+                                          definitions_cache=False, **options) as manager:
+            manager.client = self.client
+            return await manager.setup_tables_from_input(yaml_file="test.yaml")
+
+    def catalog(self, client=None, database=None):
+        """Tables, functions and update policies of a fake database"""
+        db = (client or self.client).database(database or self.database)
+        return db.tables, {name: f["Body"] for name, f in db.functions.items()}, db.update_policies
+
+    async def test_setup_matches_sync_manager(self):
+        """Test serial, parallel and batched async setups produce the sync manager's catalog"""
+        sync_client = FakeKustoClient()
+        with patch.object(EventhouseManager, 'authenticate', return_value=True):
+            manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False)
+            manager.client = sync_client
+            self.assertTrue(manager.setup_tables_from_input(yaml_file="test.yaml"))
+        expected = self.catalog(sync_client)
+
+        for options in ({}, {"max_parallel": 4}, {"batch": True}):
+            self.client = AsyncFakeKustoClient()
+            self.assertTrue(await self.setup(**options))
+            self.assertEqual(self.catalog(), expected, options)
+
+    async def test_parallel_tables_overlap(self):
+        """Test that entity tables are provisioned concurrently up to max_parallel"""
+        self.client = AsyncFakeKustoClient(latency=0.01)
+
+        self.assertTrue(await self.setup(max_parallel=2))
+
+        self.assertEqual(self.client.max_concurrency, 2)
+
+    async def test_many_databases_on_one_loop(self):
+        """Test concurrent setups of several databases sharing one client"""
+        self.client = AsyncFakeKustoClient(latency=0.01)
+        databases = [f"db{index}" for index in range(3)]
+
+        results = await asyncio.gather(*(self.setup(database) for database in databases))
+
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(self.client.max_concurrency, 3)
+        for database in databases:
+            self.assertEqual(set(self.catalog(database=database)[0]), {"AIORawData", "Test_Entity", "Test_Other"})
+
+    async def test_incremental_rerun_is_a_no_op(self):
+        """Test an incremental run after a full setup only reads the catalog"""
+        self.assertTrue(await self.setup(routing=True))
+        requests = len(self.client.requests)
+
+        self.assertTrue(await self.setup(incremental=True, routing=True))
+
+        self.assertEqual(sorted(query for _, query in self.client.requests[requests:]),
+                         [".show database schema as json", ".show table * policy retention",
+                          ".show table * policy update"])
+
+    async def test_ingestion_profile(self):
+        """Test the profile's policies are set on every table and an incremental rerun only reads the catalog"""
+        for options in ({}, {"max_parallel": 2}):
+            self.client = AsyncFakeKustoClient()
+            self.assertTrue(await self.setup(ingestion_profile="realtime", routing=True, **options), options)
+            db = self.client.database(self.database)
+            self.assertEqual(set(db.streaming_ingestion_policies), set(db.tables), options)
+            self.assertEqual(set(db.ingestion_batching_policies), set(db.tables), options)
+
+        requests = len(self.client.requests)
+        self.assertTrue(await self.setup(incremental=True, ingestion_profile="realtime", routing=True))
+        self.assertEqual(len(self.client.requests) - requests, 5)
+
+    async def test_latest_values(self):
+        """Test the declared view and the LatestValues function are created in serial and parallel mode"""
+        mappings = {"ref1": TypeMapping("ref1", "Test", "Entity", latest_values=True),
+                    "ref2": TypeMapping("ref2", "Test", "Other")}
+        for options in ({}, {"max_parallel": 2}):
+            self.client = AsyncFakeKustoClient()
+            with patch.object(EventhouseManager, "_load_yaml_mappings", Mock(return_value=mappings)):
+                self.assertTrue(await self.setup(**options), options)
+            db = self.client.database(self.database)
+            self.assertEqual(list(db.materialized_views), ["Test_Entity_Latest"], options)
+            self.assertIn("LatestValues", db.functions, options)
+
+    async def test_apply_plan_matches_setup(self):
+        """Test applying a compiled plan gives the same catalog as a direct setup"""
+        self.assertTrue(await self.setup(max_parallel=2))
+        expected = self.catalog()
+        plan = EventhouseManager("local", "local", definitions_cache=False).compile_plan(yaml_file="test.yaml")
+
+        self.client = AsyncFakeKustoClient(latency=0.01)
+        async with AsyncEventhouseManager(self.cluster_url, self.database, max_parallel=2) as manager:
+            manager.client = self.client
+            self.assertTrue(await manager.apply_plan(plan))
+
+        self.assertEqual(self.catalog(), expected)
+        self.assertEqual(self.client.max_concurrency, 2)
+
+    async def test_failed_policy_reported(self):
+        """Test a rejected update policy fails the setup but provisions the other tables"""
+        self.client = AsyncFakeKustoClient(fail_commands={r"^\.alter table Test_Other policy": "Boom"})
+
+        self.assertFalse(await self.setup(max_parallel=2))
+
+        self.assertEqual(set(self.catalog()[2]), {"Test_Entity"})
+
+    async def test_authentication_error_aborts_parallel_run(self):
+        """Test that authentication errors propagate out of concurrent tasks"""
+        manager = AsyncEventhouseManager(self.cluster_url, self.database, max_parallel=2)
+        manager.client = Mock()
+        manager.client.execute_mgmt = AsyncMock(side_effect=Exception("authentication failed"))
+        mappings = [EntityMapping("ref", f"T{index}", parse_columns(["a: string"])) for index in range(3)]
+
+        with self.assertRaises(Exception):
+            await manager.process_entity_mappings(mappings)
+
+    async def test_create_table_without_authentication(self):
+        """Test create_table when not authenticated"""
+        manager = AsyncEventhouseManager(self.cluster_url, self.database)
+
+        self.assertFalse(await manager.create_table("T", "a: string"))
+
+    async def test_authenticate_without_async_client(self):
+        """Test that a missing asyncio Kusto client fails authentication with guidance"""
+        manager = AsyncEventhouseManager(self.cluster_url, self.database)
+
+        with patch.dict(sys.modules, {"azure.kusto.data.aio": None}):
+            with self.assertLogs(manager.logger, level="ERROR") as logs:
+                self.assertFalse(await manager.authenticate())
+
+        self.assertIn("[async]", "\n".join(logs.output))
+
+    async def test_assigned_client_is_kept_open(self):
+        """Test that a client assigned by the caller is reused and not closed"""
+        client = Mock()
+        client.close = AsyncMock()
+        manager = AsyncEventhouseManager(self.cluster_url, self.database)
+        manager.client = client
+
+        self.assertTrue(await manager.authenticate())
+        await manager.close()
+
+        client.close.assert_not_called()
+        self.assertIsNone(manager.client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+
+from digitaloperations.fabriceventhousehelperpyapp.auth import (
+    AUTH_AZURE_CLI,
+    AUTH_DEVICE_CODE,
+    AUTHENTICATION_RECORD_FILE,
+    CachingTokenCredential,
+    azure_cli_account,
+    DeviceCodeSignInCredential,
+    FallbackTokenCredential,
+    build_credential,
+    clear_client_cache,
+    get_shared_client,
+    has_shared_client,
+)
+
+SCOPE = "https://test-cluster.kusto.windows.net/.default"
+
+
+class InMemoryPersistence:
+    """Stand-in for an msal-extensions persistence"""
+
+    def __init__(self, data=None):
+        self.data = data
+
+    def load(self):
+        return self.data
+
+    def save(self, data):
+        self.data = data
+
+
+class TestCachingTokenCredential(unittest.TestCase):
+    """Test cases for the token caching credential"""
+
+    def test_reuses_token_until_refresh_margin(self):
+        """Test that a token is only acquired once while it is valid"""
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+        credential = CachingTokenCredential(inner)
+
+        self.assertEqual(credential.get_token(SCOPE).token, "token")
+        self.assertEqual(credential.get_token(SCOPE).token, "token")
+        inner.get_token.assert_called_once_with(SCOPE)
+
+    def test_refreshes_token_close_to_expiry(self):
+        """Test that a token expiring within the refresh margin is replaced"""
+        inner = Mock()
+        inner.get_token.side_effect = [
+            AccessToken("old", int(time.time()) + 60),
+            AccessToken("new", int(time.time()) + 3600),
+        ]
+        credential = CachingTokenCredential(inner)
+
+        credential.get_token(SCOPE)
+        self.assertEqual(credential.get_token(SCOPE).token, "new")
+        self.assertEqual(inner.get_token.call_count, 2)
+
+    def test_persisted_tokens_are_shared_across_instances(self):
+        """Test that a later run reads the token saved by an earlier one"""
+        persistence = InMemoryPersistence()
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+        CachingTokenCredential(inner, persistence).get_token(SCOPE)
+
+        later = Mock()
+        token = CachingTokenCredential(later, persistence).get_token(SCOPE)
+
+        self.assertEqual(token.token, "token")
+        later.get_token.assert_not_called()
+
+    def test_expired_tokens_are_not_persisted(self):
+        """Test that expired tokens are dropped from the persisted cache"""
+        persistence = InMemoryPersistence(json.dumps({"|other": {"token": "stale", "expires_on": 1}}))
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+
+        CachingTokenCredential(inner, persistence).get_token(SCOPE)
+
+        self.assertEqual(list(json.loads(persistence.data)), [f"||{SCOPE}"])
+
+    def test_persisted_tokens_are_kept_per_account(self):
+        """Test that a token persisted for one account is not returned after switching accounts"""
+        persistence = InMemoryPersistence()
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("alice", int(time.time()) + 3600)
+        CachingTokenCredential(inner, persistence, lambda: "alice|tenant").get_token(SCOPE)
+
+        later = Mock()
+        later.get_token.return_value = AccessToken("bob", int(time.time()) + 3600)
+        account = Mock(return_value="bob|tenant")
+        credential = CachingTokenCredential(later, persistence, account)
+
+        self.assertEqual(credential.get_token(SCOPE).token, "bob")
+        account.return_value = "alice|tenant"
+        self.assertEqual(credential.get_token(SCOPE).token, "alice")
+        later.get_token.assert_called_once_with(SCOPE)
+
+    def test_unknown_account_ignores_persisted_tokens(self):
+        """Test that persisted tokens are neither read nor written while the account is unknown"""
+        persistence = InMemoryPersistence(json.dumps({f"||{SCOPE}": {"token": "cached", "expires_on": int(time.time()) + 3600}}))
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+        credential = CachingTokenCredential(inner, persistence, lambda: None)
+
+        self.assertEqual(credential.get_token(SCOPE).token, "token")
+        self.assertEqual(credential.get_token(SCOPE).token, "token")
+        inner.get_token.assert_called_once_with(SCOPE)
+        self.assertEqual(list(json.loads(persistence.data)), [f"||{SCOPE}"])
+
+    def test_azure_cli_account(self):
+        """Test that the account is read from the default subscription of the CLI profile"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            profile = {"subscriptions": [
+                {"isDefault": False, "tenantId": "other", "user": {"name": "other@contoso.com"}},
+                {"isDefault": True, "tenantId": "tenant", "user": {"name": "user@contoso.com"}},
+            ]}
+            with open(os.path.join(temp_dir, "azureProfile.json"), 'w', encoding='utf-8-sig') as f:
+                json.dump(profile, f)
+            with patch.dict(os.environ, {"AZURE_CONFIG_DIR": temp_dir}):
+                self.assertEqual(azure_cli_account(), "user@contoso.com|tenant")
+            with patch.dict(os.environ, {"AZURE_CONFIG_DIR": os.path.join(temp_dir, "missing")}):
+                self.assertIsNone(azure_cli_account())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_claims_bypass_cache(self):
+        """Test that claims challenges always acquire a fresh token"""
+        inner = Mock()
+        inner.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+        credential = CachingTokenCredential(inner)
+
+        credential.get_token(SCOPE)
+        credential.get_token(SCOPE, claims="challenge")
+
+        self.assertEqual(inner.get_token.call_count, 2)
+
+
+class TestDeviceCodeSignInCredential(unittest.TestCase):
+    """Test cases for the device code credential"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.record_path = os.path.join(self.temp_dir, AUTHENTICATION_RECORD_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_first_sign_in_saves_record(self):
+        """Test that the authentication record is saved after the first sign-in"""
+        inner = Mock()
+        inner.authenticate.return_value.serialize.return_value = '{"username": "user"}'
+        factory = Mock(return_value=inner)
+        credential = DeviceCodeSignInCredential(self.record_path, factory)
+
+        credential.get_token(SCOPE)
+        credential.get_token(SCOPE)
+
+        inner.authenticate.assert_called_once_with(scopes=[SCOPE])
+        self.assertEqual(inner.get_token.call_count, 2)
+        with open(self.record_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '{"username": "user"}')
+        self.assertIn("cache_persistence_options", factory.call_args.kwargs)
+
+    @patch('azure.identity.AuthenticationRecord.deserialize')
+    def test_saved_record_skips_sign_in(self, mock_deserialize):
+        """Test that a saved record is passed to the credential and no prompt is shown"""
+        with open(self.record_path, 'w', encoding='utf-8') as f:
+            f.write("{}")
+        inner = Mock()
+        factory = Mock(return_value=inner)
+
+        DeviceCodeSignInCredential(self.record_path, factory).get_token(SCOPE)
+
+        inner.authenticate.assert_not_called()
+        self.assertEqual(factory.call_args.kwargs["authentication_record"], mock_deserialize.return_value)
+
+    def test_without_record_path_nothing_is_persisted(self):
+        """Test that the credential is built without persistence when no record path is given"""
+        inner = Mock()
+        factory = Mock(return_value=inner)
+
+        DeviceCodeSignInCredential(None, factory).get_token(SCOPE)
+
+        factory.assert_called_once_with()
+        inner.authenticate.assert_not_called()
+
+
+class TestFallbackTokenCredential(unittest.TestCase):
+    """Test cases for the fallback credential"""
+
+    def test_falls_back_and_sticks_with_working_credential(self):
+        """Test that the credential that worked is used for later tokens"""
+        cli, device = Mock(), Mock()
+        cli.get_token.side_effect = Exception("Please run 'az login'")
+        credential = FallbackTokenCredential([(AUTH_AZURE_CLI, cli), (AUTH_DEVICE_CODE, device)])
+
+        credential.get_token(SCOPE)
+        credential.get_token(SCOPE)
+
+        self.assertEqual(credential.method, AUTH_DEVICE_CODE)
+        cli.get_token.assert_called_once()
+        self.assertEqual(device.get_token.call_count, 2)
+
+    def test_concurrent_first_use_runs_the_chain_once(self):
+        """Test that threads racing for the first token do not each try every method"""
+        def slow_failure(*scopes, **kwargs):
+            time.sleep(0.05)
+            raise Exception("Please run 'az login'")
+
+        cli, device = Mock(), Mock()
+        cli.get_token.side_effect = slow_failure
+        credential = FallbackTokenCredential([(AUTH_AZURE_CLI, cli), (AUTH_DEVICE_CODE, device)])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: credential.get_token(SCOPE), range(8)))
+
+        cli.get_token.assert_called_once()
+        self.assertEqual(device.get_token.call_count, 8)
+
+    def test_all_credentials_fail(self):
+        """Test that the error lists every failed method"""
+        cli, device = Mock(), Mock()
+        cli.get_token.side_effect = Exception("cli failed")
+        device.get_token.side_effect = Exception("device failed")
+        credential = FallbackTokenCredential([(AUTH_AZURE_CLI, cli), (AUTH_DEVICE_CODE, device)])
+
+        with self.assertRaises(ClientAuthenticationError) as context:
+            credential.get_token(SCOPE)
+        self.assertIn("cli failed", str(context.exception))
+        self.assertIn("device failed", str(context.exception))
+
+    @patch('digitaloperations.fabriceventhousehelperpyapp.auth.build_token_persistence', return_value=None)
+    def test_build_credential_without_encryption_is_memory_only(self, mock_persistence):
+        """Test that nothing is persisted when the cache cannot be encrypted"""
+        credential = build_credential(cache_dir=tempfile.gettempdir())
+
+        self.assertEqual([method for method, _ in credential.credentials], [AUTH_AZURE_CLI, AUTH_DEVICE_CODE])
+        self.assertIsNone(credential.credentials[0][1].persistence)
+        self.assertIsNone(credential.credentials[1][1].record_path)
+
+
+class TestSharedClients(unittest.TestCase):
+    """Test cases for the shared client cache"""
+
+    def setUp(self):
+        clear_client_cache()
+
+    def tearDown(self):
+        clear_client_cache()
+
+    def test_client_is_created_once_per_cluster(self):
+        """Test that cluster URLs are normalized and the factory runs once"""
+        factory = Mock(side_effect=[Mock(), Mock()])
+
+        first = get_shared_client("https://Cluster.kusto.windows.net/", factory)
+        second = get_shared_client("https://cluster.kusto.windows.net", factory)
+
+        self.assertIs(first, second)
+        factory.assert_called_once()
+        self.assertTrue(has_shared_client("https://cluster.kusto.windows.net"))
+
+    def test_clear_client_cache(self):
+        """Test that clearing the cache forgets clients"""
+        get_shared_client("https://cluster.kusto.windows.net", Mock)
+        clear_client_cache()
+
+        self.assertFalse(has_shared_client("https://cluster.kusto.windows.net"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock
+
+from digitaloperations.fabriceventhousehelperpyapp.async_eventhouse import AsyncEventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.backfill import (
+    BackfillCheckpoint,
+    BackfillError,
+    BackfillSlice,
+    build_backfill_command,
+    plan_backfill_slices,
+    split_range,
+)
+from digitaloperations.fabriceventhousehelperpyapp.commands import KIND_BACKFILL, build_move_data_by_type_function_body
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import (
+    AsyncFakeKustoClient,
+    FakeKustoClient,
+    FakeKustoResponse,
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, parse_columns
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+ENTITY = EntityMapping("ref1", "Test_Entity",
+                       parse_columns(["prop1:string", "Identifier:string", "Timestamp:datetime"]))
+OTHER = EntityMapping("ref2", "Test_Other", parse_columns(["temp:double", "Identifier:string", "Timestamp:datetime"]))
+
+
+class TestBackfillPlanning(unittest.TestCase):
+    """Test cases for the backfill slices and commands"""
+
+    def test_command_inlines_move_data_by_type(self):
+        """Test a slice runs the MoveDataByType pipeline over its ingestion time range"""
+        command = build_backfill_command(ENTITY, BackfillSlice("Test_Entity", utc(2024, 5, 1), utc(2024, 5, 2)))
+
+        key = "backfill:Test_Entity:2024-05-01T00:00:00Z:2024-05-02T00:00:00Z"
+        self.assertEqual((command.kind, command.target), (KIND_BACKFILL, "Test_Entity"))
+        self.assertTrue(command.text.startswith(
+            f".set-or-append Test_Entity with (tags='[\"ingest-by:{key}\"]', ingestIfNotExists='[\"{key}\"]') <|\n"
+            "AIORawData\n"
+            "    | where ingestion_time() >= datetime(2024-05-01T00:00:00Z) "
+            "and ingestion_time() < datetime(2024-05-02T00:00:00Z)\n"
+            '    | where type endswith "ref1"\n'))
+        pipeline = build_move_data_by_type_function_body().split("| extend Identifier", 1)[1].rsplit("\n}", 1)[0]
+        self.assertIn(pipeline + "\n| project prop1 = ", command.text)
+
+    def test_slices_are_aligned_to_the_slice_size(self):
+        """Test boundaries fall on multiples of the slice size and only the ends are cut"""
+        self.assertEqual(split_range(utc(2024, 5, 1, 6), utc(2024, 5, 2, 18), timedelta(days=1)),
+                         [(utc(2024, 5, 1, 6), utc(2024, 5, 2)), (utc(2024, 5, 2), utc(2024, 5, 2, 18))])
+        self.assertEqual(split_range(utc(2024, 5, 2), utc(2024, 5, 1), timedelta(days=1)), [])
+        with self.assertRaises(BackfillError):
+            split_range(utc(2024, 5, 1), utc(2024, 5, 2), timedelta(0))
+
+    def test_slices_of_a_period_are_adjacent(self):
+        """Test slices are ordered by start, then by table"""
+        ranges = {"A": (utc(2024, 5, 1), utc(2024, 5, 3)), "B": (utc(2024, 5, 2), utc(2024, 5, 3))}
+
+        slices = plan_backfill_slices(ranges, timedelta(days=1))
+
+        self.assertEqual([(s.table_name, s.start.day) for s in slices], [("A", 1), ("A", 2), ("B", 2)])
+
+
+class TestBackfillCheckpoint(unittest.TestCase):
+    """Test cases for the backfill checkpoint file"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "checkpoint.jsonl")
+
+    def test_round_trip_and_truncated_line(self):
+        """Test ranges and completed slices reload, and a torn last line is dropped"""
+        checkpoint = BackfillCheckpoint.load(self.path, "db")
+        checkpoint.add_range("Test_Entity", utc(2024, 5, 1), utc(2024, 5, 2, 12, 30))
+        done = BackfillSlice("Test_Entity", utc(2024, 5, 1), utc(2024, 5, 2))
+        checkpoint.mark_completed(done, 42)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"slice": "backfill:Test_')
+
+        loaded = BackfillCheckpoint.load(self.path, "db")
+        loaded.mark_completed(done._replace(start=utc(2024, 5, 2), end=utc(2024, 5, 2, 12, 30)), 7)
+
+        self.assertEqual(loaded.ranges, {"Test_Entity": (utc(2024, 5, 1), utc(2024, 5, 2, 12, 30))})
+        self.assertTrue(loaded.is_completed(done))
+        self.assertEqual(sorted(BackfillCheckpoint.load(self.path, "db").completed.values()), [7, 42])
+
+    def test_other_database_is_rejected(self):
+        """Test a checkpoint cannot be resumed against another database or when corrupted"""
+        BackfillCheckpoint(self.path, "db").add_range("T", utc(2024, 5, 1), utc(2024, 5, 2))
+
+        with self.assertRaises(BackfillError):
+            BackfillCheckpoint.load(self.path, "other")
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("not json\n{}\n")
+        with self.assertRaises(BackfillError):
+            BackfillCheckpoint.load(self.path, "db")
+
+
+class TestBackfill(unittest.TestCase):
+    """Test cases for backfilling entity tables against the fake Kusto backend"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.checkpoint = os.path.join(temp_dir.name, "checkpoint.jsonl")
+        self.database = "test_database"
+        self.client = self.provisioned_client()
+
+    def provisioned_client(self, **options):
+        client = FakeKustoClient(**options)
+        for mapping in (ENTITY, OTHER):
+            client.execute_mgmt(self.database, f".create table {mapping.table_name} ({mapping.schema})")
+        return client
+
+    def backfill(self, mappings=(ENTITY,), start=utc(2024, 5, 1), end=utc(2024, 5, 3), **options):
+        manager = EventhouseManager("https://test-cluster", self.database, definitions_cache=False, **options)
+        manager.client = self.client
+        success = manager.backfill(list(mappings), start, end, timedelta(hours=12), self.checkpoint)
+        return success, manager
+
+    def appends(self):
+        return [query for _, query in self.client.requests if query.startswith(".set-or-append")]
+
+    def extents(self, table_name="Test_Entity"):
+        return self.client.database(self.database).extents.get(table_name, [])
+
+    def test_parallel_backfill_and_resume(self):
+        """Test every slice is appended once and a rerun with the checkpoint sends nothing"""
+        self.client.latency = 0.01
+
+        success, manager = self.backfill((ENTITY, OTHER), max_parallel=4)
+
+        self.assertTrue(success)
+        self.assertEqual(manager.table_results, {"Test_Entity": True, "Test_Other": True})
+        self.assertEqual(len(self.extents()), 4)
+        self.assertEqual(len(self.extents("Test_Other")), 4)
+        self.assertEqual(self.client.max_concurrency, 4)
+
+        requests = len(self.client.requests)
+        self.assertTrue(self.backfill((ENTITY, OTHER))[0])
+        self.assertEqual(len(self.client.requests), requests)
+
+    def test_lost_checkpoint_does_not_duplicate_rows(self):
+        """Test slices sent again are skipped by their ingestIfNotExists tag"""
+        self.assertTrue(self.backfill()[0])
+        os.remove(self.checkpoint)
+
+        self.assertTrue(self.backfill()[0])
+
+        self.assertEqual(len(self.appends()), 8)
+        self.assertEqual(len(self.extents()), 4)
+
+    def test_failed_slice_is_retried_on_rerun(self):
+        """Test a failed slice fails its table and is the only slice sent again"""
+        self.client = self.provisioned_client(fail_commands={r"ingest-by:backfill:Test_Entity:2024-05-01T12": "Boom"})
+
+        with self.assertLogs(level="ERROR"):
+            success, manager = self.backfill((ENTITY, OTHER), max_retries=0)
+
+        self.assertFalse(success)
+        self.assertEqual(manager.table_results, {"Test_Entity": False, "Test_Other": True})
+        self.client.fail_commands.clear()
+        requests = len(self.appends())
+        self.assertTrue(self.backfill((ENTITY, OTHER))[0])
+        self.assertEqual(len(self.appends()) - requests, 1)
+        self.assertEqual(len(self.extents()), 4)
+
+    def test_range_is_resolved_from_the_data(self):
+        """Test the range runs from the first raw row to the first row the update policy delivered"""
+        self.client.execute = Mock(side_effect=[
+            FakeKustoResponse([{"Start": "2024-05-01T06:00:00Z"}]),
+            FakeKustoResponse([{"EntityTable": "Test_Entity", "Start": utc(2024, 5, 2, 6)}]),
+        ])
+
+        success, _ = self.backfill((ENTITY, OTHER), start=None, end=None)
+
+        self.assertTrue(success)
+        ranges = BackfillCheckpoint.load(self.checkpoint, self.database).ranges
+        self.assertEqual(ranges["Test_Entity"], (utc(2024, 5, 1, 6), utc(2024, 5, 2, 6)))
+        self.assertEqual(ranges["Test_Other"][0], utc(2024, 5, 1, 6))
+        self.assertLess(datetime.now(timezone.utc) - ranges["Test_Other"][1], timedelta(minutes=5))
+        self.assertEqual(len(self.extents()), 3)
+        self.assertIn("union withsource=EntityTable Test_Entity, Test_Other", self.client.execute.call_args[0][1])
+
+    def test_authentication_error_aborts_parallel_run(self):
+        """Test that authentication errors propagate out of the slice threads"""
+        self.client.execute_mgmt = Mock(side_effect=Exception("authentication failed"))
+
+        with self.assertRaises(Exception):
+            self.backfill(max_parallel=2)
+
+    def test_unprovisioned_table(self):
+        """Test a missing entity table fails the range query"""
+        self.client.execute = Mock(side_effect=Exception("'Test_Missing' could not be resolved"))
+        missing = ENTITY._replace(table_name="Test_Missing")
+
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(self.backfill((missing,), end=None)[0])
+
+
+class TestAsyncBackfill(unittest.IsolatedAsyncioTestCase):
+    """Test cases for backfilling with the asyncio manager against the async fake Kusto backend"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.checkpoint = os.path.join(temp_dir.name, "checkpoint.jsonl")
+        self.database = "test_database"
+        self.client = AsyncFakeKustoClient(latency=0.01)
+        for mapping in (ENTITY, OTHER):
+            FakeKustoClient.execute_mgmt(self.client, self.database,
+                                         f".create table {mapping.table_name} ({mapping.schema})")
+
+    async def backfill(self, start=utc(2024, 5, 1), end=utc(2024, 5, 3), **options):
+        async with AsyncEventhouseManager("https://test-cluster", self.database, definitions_cache=False,
+                                          **options) as manager:
+            manager.client = self.client
+            success = await manager.backfill([ENTITY, OTHER], start, end, timedelta(hours=12), self.checkpoint)
+            return success, manager
+
+    async def test_slices_are_appended_as_tasks(self):
+        """Test the async backfill appends every slice once, concurrently, and resumes"""
+        success, manager = await self.backfill(max_parallel=4)
+
+        self.assertTrue(success)
+        self.assertEqual(manager.table_results, {"Test_Entity": True, "Test_Other": True})
+        extents = self.client.database(self.database).extents
+        self.assertEqual((len(extents["Test_Entity"]), len(extents["Test_Other"])), (4, 4))
+        self.assertEqual(self.client.max_concurrency, 4)
+
+        requests = len(self.client.requests)
+        self.assertTrue((await self.backfill())[0])
+        self.assertEqual(len(self.client.requests), requests)
+
+    async def test_range_is_queried_with_the_async_client(self):
+        """Test the range queries are awaited"""
+        self.client.execute = AsyncMock(side_effect=[
+            FakeKustoResponse([{"Start": "2024-05-01T06:00:00Z"}]),
+            FakeKustoResponse([{"EntityTable": "Test_Entity", "Start": utc(2024, 5, 2, 6)},
+                               {"EntityTable": "Test_Other", "Start": utc(2024, 5, 2, 6)}]),
+        ])
+
+        success, _ = await self.backfill(start=None, end=None)
+
+        self.assertTrue(success)
+        ranges = BackfillCheckpoint.load(self.checkpoint, self.database).ranges
+        self.assertEqual(ranges["Test_Entity"], (utc(2024, 5, 1, 6), utc(2024, 5, 2, 6)))
+        self.assertEqual(len(self.client.database(self.database).extents["Test_Other"]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+
+BENCHMARK_SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'bench_provisioning.py')
+
+
+def load_benchmark():
+    """Import the benchmark script as a module"""
+    spec = importlib.util.spec_from_file_location("bench_provisioning", BENCHMARK_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestProvisioningBenchmark(unittest.TestCase):
+    """Smoke test for the provisioning benchmark"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.benchmark = load_benchmark()
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_benchmark_writes_results_for_every_mode(self):
+        """Test a small run succeeds in every mode and writes JSON results"""
+        output = os.path.join(self.temp_dir, "results.json")
+        with redirect_stdout(StringIO()):
+            exit_code = self.benchmark.main(["--sizes", "3", "--latency", "0", "--output", output])
+
+        self.assertEqual(exit_code, 0)
+        with open(output) as f:
+            report = json.load(f)
+        results = {result["mode"]: result for result in report["results"]}
+        self.assertEqual(set(results), set(self.benchmark.MODES))
+        self.assertTrue(all(result["success"] and result["entity_mappings"] == 3 for result in results.values()))
+        # AIORawData, MoveDataByType and a table and policy per entity
+        self.assertEqual(results["serial"]["commands"], 8)
+        self.assertEqual(results["batched"]["requests"], 1)
+        self.assertEqual(results["incremental"]["commands"], 2)
+
+    def test_benchmark_retries_throttled_requests(self):
+        """Test a throttled run still succeeds and reports its retries"""
+        output = os.path.join(self.temp_dir, "results.json")
+        with redirect_stdout(StringIO()):
+            exit_code = self.benchmark.main(["--sizes", "20", "--latency", "0", "--modes", "parallel",
+                                             "--throttle-rate", "0.2", "--no-memory", "--output", output])
+
+        self.assertEqual(exit_code, 0)
+        with open(output) as f:
+            result = json.load(f)["results"][0]
+        self.assertGreater(result["retries"], 0)
+        self.assertEqual(result["retries"], result["throttled"])
+
+
+if __name__ == '__main__':
+    unittest.main()
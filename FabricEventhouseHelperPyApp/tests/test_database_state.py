@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import json
+import unittest
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    DatabaseSnapshot, parse_schema, normalize_kusto_type
+)
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    build_move_data_by_type_function_body, build_update_policy
+)
+
+
+def make_schema_rows(database, tables, functions=None):
+    """Build `.show database schema as json` rows for the given {table: [(column, csl_type)]}"""
+    schema = {"Databases": {database: {
+        "Name": database,
+        "Tables": {
+            name: {"Name": name, "OrderedColumns": [
+                {"Name": column, "Type": "System.Object", "CslType": csl_type} for column, csl_type in columns
+            ]} for name, columns in tables.items()
+        },
+        "Functions": {
+            name: {"Name": name, "Body": body} for name, body in (functions or {}).items()
+        }
+    }}}
+    return [{"DatabaseSchema": json.dumps(schema)}]
+
+
+def make_policy_rows(database, policies):
+    """Build `.show table * policy update` rows for the given {table: policy}"""
+    return [{
+        "PolicyName": "UpdatePolicy",
+        "EntityName": f"[{database}].[{table}]",
+        "Policy": json.dumps(policy) if policy is not None else "null",
+        "ChildEntities": None,
+        "EntityType": "Table"
+    } for table, policy in policies.items()]
+
+
+class TestSchemaParsing(unittest.TestCase):
+    """Test cases for schema parsing helpers"""
+
+    def test_parse_schema_with_bracketed_names(self):
+        """Test parsing schemas that quote column names"""
+        columns = parse_schema("['key']: string, value: string, ['partition']: int")
+        self.assertEqual([(name, kusto_type) for name, kusto_type, _ in columns],
+                         [("key", "string"), ("value", "string"), ("partition", "int")])
+        self.assertEqual(columns[0][2], "['key']: string")
+
+    def test_normalize_kusto_type_aliases(self):
+        """Test type aliases are normalized to the names reported by Kusto"""
+        self.assertEqual(normalize_kusto_type("boolean"), "bool")
+        self.assertEqual(normalize_kusto_type("double"), "real")
+        self.assertEqual(normalize_kusto_type("string"), "string")
+
+
+class TestDatabaseSnapshot(unittest.TestCase):
+    """Test cases for DatabaseSnapshot"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.database = "test_database"
+        self.snapshot = DatabaseSnapshot.from_results(
+            self.database,
+            make_schema_rows(self.database, {
+                "Test_Entity": [("prop1", "string"), ("ts_prop1", "real"), ("Identifier", "string")]
+            }, {"MoveDataByType": build_move_data_by_type_function_body()}),
+            make_policy_rows(self.database, {
+                "Test_Entity": build_update_policy("Test_Entity", "test_ref"),
+                "Other": None
+            })
+        )
+
+    def test_from_results(self):
+        """Test tables, functions and policies are read from the catalog results"""
+        self.assertTrue(self.snapshot.has_table("Test_Entity"))
+        self.assertFalse(self.snapshot.has_table("Missing"))
+        self.assertIn("MoveDataByType", self.snapshot.functions)
+        self.assertEqual(list(self.snapshot.update_policies), ["Test_Entity"])
+
+    def test_diff_table_up_to_date(self):
+        """Test an unchanged table produces no diff"""
+        missing, conflicts = self.snapshot.diff_table(
+            "Test_Entity", "prop1:string, ts_prop1:double, Identifier:string")
+        self.assertEqual(missing, [])
+        self.assertEqual(conflicts, [])
+
+    def test_diff_table_missing_columns(self):
+        """Test new columns are reported as missing"""
+        missing, conflicts = self.snapshot.diff_table(
+            "Test_Entity", "prop1:string, ts_prop1:double, Identifier:string, Timestamp:datetime")
+        self.assertEqual(missing, ["Timestamp:datetime"])
+        self.assertEqual(conflicts, [])
+
+    def test_diff_table_type_conflict(self):
+        """Test changed column types are reported as conflicts"""
+        _, conflicts = self.snapshot.diff_table("Test_Entity", "prop1:double")
+        self.assertEqual(len(conflicts), 1)
+        self.assertIn("prop1", conflicts[0])
+
+    def test_function_matches_ignores_formatting(self):
+        """Test function comparison ignores whitespace differences"""
+        body = " ".join(build_move_data_by_type_function_body().split())
+        self.assertTrue(self.snapshot.function_matches("MoveDataByType", body))
+        self.assertFalse(self.snapshot.function_matches("MoveDataByType", "{ AIORawData }"))
+        self.assertFalse(self.snapshot.function_matches("Missing", body))
+
+    def test_update_policy_matches(self):
+        """Test update policy comparison"""
+        self.assertTrue(self.snapshot.update_policy_matches(
+            "Test_Entity", build_update_policy("Test_Entity", "test_ref")))
+        self.assertFalse(self.snapshot.update_policy_matches(
+            "Test_Entity", build_update_policy("Test_Entity", "other_ref")))
+        self.assertFalse(self.snapshot.update_policy_matches(
+            "Other", build_update_policy("Other", "test_ref")))
+
+
+if __name__ == '__main__':
+    unittest.main()
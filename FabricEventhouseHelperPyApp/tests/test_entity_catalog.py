@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from digitaloperations.fabriceventhousehelperpyapp.entity_catalog import (
+    DefinitionsFormatError, EntityCatalog, compile_entity_columns,
+    iter_entity_definitions, select_entity_definitions
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import Column, TypeMapping
+
+
+ENTITY_DEFINITIONS = [
+    {
+        "Namespace": "Test",
+        "Name": "Entity",
+        "TypeReference": "test_ref",
+        "Properties": [{"name": "prop1", "valueType": "String"}],
+        "TimeseriesProperties": [{"name": "ts_prop1", "valueType": "Number"}]
+    },
+    {
+        "Namespace": "Test",
+        "Name": "WithIdentifier",
+        "Properties": [{"name": "Identifier", "valueType": "String"}]
+    }
+]
+
+
+class TestEntityCatalog(unittest.TestCase):
+    """Test cases for EntityCatalog"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.json_path = os.path.join(self.temp_dir, "EntityTypeDefinitions.json")
+        with open(self.json_path, 'w') as f:
+            json.dump(ENTITY_DEFINITIONS, f)
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_compile_entity_columns(self):
+        """Test entity definitions compile into columns"""
+        self.assertEqual([column.spec for column in compile_entity_columns(ENTITY_DEFINITIONS[0])],
+                         ["prop1:string", "ts_prop1:double", "Identifier:string", "Timestamp:datetime"])
+        self.assertEqual(compile_entity_columns(ENTITY_DEFINITIONS[1]),
+                         (Column("Identifier", "string"), Column("Timestamp", "datetime")))
+
+    def test_identifier_is_matched_by_name(self):
+        """Test a column whose name only ends with Identifier does not replace the Identifier column"""
+        columns = compile_entity_columns({"Properties": [{"name": "MachineIdentifier", "valueType": "String"}]})
+
+        self.assertEqual([column.name for column in columns], ["MachineIdentifier", "Identifier", "Timestamp"])
+
+    def test_equal_columns_are_shared(self):
+        """Test entities share the column instances they have in common"""
+        catalog = EntityCatalog(ENTITY_DEFINITIONS)
+
+        entity = catalog.find("Test", "Entity").columns
+        with_identifier = catalog.find("Test", "WithIdentifier").columns
+        self.assertIs(entity[2], with_identifier[0])
+
+    def test_find_by_namespace_and_name(self):
+        """Test lookup by (Namespace, Name)"""
+        catalog = EntityCatalog(ENTITY_DEFINITIONS)
+        self.assertEqual(len(catalog), 2)
+        self.assertIn(("Test", "Entity"), catalog)
+        self.assertEqual(catalog.find("Test", "Entity").type_reference, "test_ref")
+        self.assertIsNone(catalog.find("Test", "Missing"))
+
+    def test_find_falls_back_to_type_reference(self):
+        """Test lookup by TypeReference when the name does not match"""
+        catalog = EntityCatalog(ENTITY_DEFINITIONS)
+        self.assertEqual(catalog.find("Other", "Name", "test_ref").name, "Entity")
+        self.assertIsNone(catalog.find("Other", "Name", "unknown_ref"))
+
+    def test_first_definition_wins(self):
+        """Test duplicate definitions resolve to the first one, as a linear scan would"""
+        catalog = EntityCatalog([
+            {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "first", "valueType": "String"}]},
+            {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "second", "valueType": "String"}]}
+        ])
+        self.assertIn(Column("first", "string"), catalog.find("Test", "Entity").columns)
+
+    def test_cache_round_trip(self):
+        """Test a saved catalog is loaded back from the cache"""
+        self.assertIsNone(EntityCatalog.load_cached(self.json_path, self.cache_dir))
+        self.assertTrue(EntityCatalog(ENTITY_DEFINITIONS).save_cache(self.json_path, self.cache_dir))
+
+        cached = EntityCatalog.load_cached(self.json_path, self.cache_dir)
+
+        self.assertIsNotNone(cached)
+        self.assertEqual(len(cached), 2)
+        self.assertEqual(cached.find("Other", "Name", "test_ref").name, "Entity")
+
+    def test_cache_survives_touch(self):
+        """Test an unchanged file with a new modification time still hits the cache"""
+        EntityCatalog(ENTITY_DEFINITIONS).save_cache(self.json_path, self.cache_dir)
+        stat = os.stat(self.json_path)
+        os.utime(self.json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertIsNotNone(EntityCatalog.load_cached(self.json_path, self.cache_dir))
+
+    def test_cache_invalidated_by_content_change(self):
+        """Test a modified definitions file invalidates the cache"""
+        EntityCatalog(ENTITY_DEFINITIONS).save_cache(self.json_path, self.cache_dir)
+        with open(self.json_path, 'w') as f:
+            json.dump(ENTITY_DEFINITIONS[:1], f)
+
+        self.assertIsNone(EntityCatalog.load_cached(self.json_path, self.cache_dir))
+
+    def test_selection_covers_only_mappings_found_by_name(self):
+        """Test a selection serves mappings by name and records whether it is complete"""
+        by_name = {"ref": TypeMapping("ref", "Test", "WithIdentifier")}
+        by_type_ref = {"test_ref": TypeMapping("test_ref", "Other", "Name")}
+        selection = EntityCatalog(ENTITY_DEFINITIONS[1:])
+        selection.save_cache(self.json_path, self.cache_dir)
+
+        cached = EntityCatalog.load_cached(self.json_path, self.cache_dir)
+        self.assertFalse(cached.complete)
+        self.assertTrue(cached.covers(by_name))
+        self.assertFalse(EntityCatalog(ENTITY_DEFINITIONS).covers(by_type_ref))
+        self.assertTrue(EntityCatalog(ENTITY_DEFINITIONS, complete=True).covers(by_type_ref))
+
+        selected = EntityCatalog(ENTITY_DEFINITIONS).select(by_type_ref)
+        self.assertEqual([entry.name for entry in selected], ["Entity"])
+        self.assertEqual(selected.find("Other", "Name", "test_ref").name, "Entity")
+
+    def test_save_cache_missing_source(self):
+        """Test saving a cache for a missing definitions file fails gracefully"""
+        missing = os.path.join(self.temp_dir, "missing.json")
+        self.assertFalse(EntityCatalog(ENTITY_DEFINITIONS).save_cache(missing, self.cache_dir))
+
+
+class TestEntityDefinitionStreaming(unittest.TestCase):
+    """Test cases for streaming and selective loading of entity definitions"""
+
+    def test_iter_entity_definitions(self):
+        """Test entity definitions are streamed from a JSON array"""
+        f = io.BytesIO(json.dumps(ENTITY_DEFINITIONS).encode('utf-8'))
+        self.assertEqual(list(iter_entity_definitions(f)), ENTITY_DEFINITIONS)
+
+    def test_iter_entity_definitions_numbers_are_floats(self):
+        """Test numbers are parsed as floats rather than decimals"""
+        f = io.BytesIO(b'[{"Name": "Entity", "Min": 1.5}]')
+        self.assertIsInstance(next(iter_entity_definitions(f))["Min"], float)
+
+    def test_iter_entity_definitions_rejects_objects(self):
+        """Test a top-level JSON object is rejected"""
+        with self.assertRaises(DefinitionsFormatError):
+            list(iter_entity_definitions(io.BytesIO(b'{"Name": "Entity"}')))
+
+    def test_iter_entity_definitions_rejects_text_streams(self):
+        """Test a file opened in text mode is rejected instead of being re-encoded"""
+        with self.assertRaises(TypeError):
+            list(iter_entity_definitions(io.StringIO(json.dumps(ENTITY_DEFINITIONS))))
+
+    def test_select_entity_definitions_by_name_and_type_reference(self):
+        """Test selection by (Namespace, Name) and by TypeReference"""
+        selected = select_entity_definitions(ENTITY_DEFINITIONS, {
+            "test_ref": TypeMapping("test_ref", "Alias", "Missing"),
+            "other_ref": TypeMapping("other_ref", "Test", "WithIdentifier")
+        })
+        self.assertEqual([entity["Name"] for entity in selected], ["Entity", "WithIdentifier"])
+
+    def test_select_entity_definitions_stops_early(self):
+        """Test the remaining definitions are not read once every mapping was found"""
+        def definitions():
+            yield {"Namespace": "Test", "Name": "Entity"}
+            raise AssertionError("read past the last requested entity")
+
+        selected = list(select_entity_definitions(definitions(), {
+            "test_ref": TypeMapping("test_ref", "Test", "Entity")
+        }))
+        self.assertEqual(len(selected), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
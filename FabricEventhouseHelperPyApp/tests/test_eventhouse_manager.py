@@ -1,14 +1,40 @@
 #!/usr/bin/env python3
 
+import io
 import unittest
 from unittest.mock import Mock, patch, mock_open
+import json
 import yaml
 import os
+import shutil
 import tempfile
-from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+import threading
+import warnings
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager, AIO_RAW_DATA_SCHEMA
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    KustoCommand, build_database_script, chunk_commands, SCRIPT_HEADER,
+    build_move_data_by_type_function_body, build_update_policy
+)
+from digitaloperations.fabriceventhousehelperpyapp.database_state import DatabaseSnapshot, parse_schema
+from digitaloperations.fabriceventhousehelperpyapp.entity_catalog import EntityCatalog
+from digitaloperations.fabriceventhousehelperpyapp.auth import clear_client_cache
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.routing import (
+    ROUTED_DATA_SCHEMA, build_routing_function_body, build_routing_update_policy, build_type_ref_expression
+)
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import CommandScheduler
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, TypeMapping, parse_columns
 from azure.kusto.data.exceptions import KustoServiceError
 
 
+def make_script_result(statuses):
+    """Build a mock `.execute database script` response with one row per status"""
+    rows = [{"Result": status, "Reason": "" if status == "Completed" else "Boom"} for status in statuses]
+    result = Mock()
+    result.primary_results = [rows]
+    return result
+
+
 class TestEventhouseManager(unittest.TestCase):
     """Test cases for EventhouseManager class"""
     
@@ -16,7 +42,11 @@ class TestEventhouseManager(unittest.TestCase):
         """Set up test fixtures"""
         self.cluster_url = "https://test-cluster.kusto.windows.net"
         self.database = "test_database"
-        self.manager = EventhouseManager(self.cluster_url, self.database)
+        self.manager = EventhouseManager(self.cluster_url, self.database, token_cache=False)
+        clear_client_cache()
+        
+    def tearDown(self):
+        clear_client_cache()
         
     def test_init_without_log_file(self):
         """Test EventhouseManager initialization without log file"""
@@ -140,6 +170,88 @@ class TestEventhouseManager(unittest.TestCase):
             azure_cli_guidance_logged = any("az login" in msg for msg in error_calls)
             self.assertTrue(azure_cli_guidance_logged)
         
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.get_shared_credential')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoClient')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoConnectionStringBuilder')
+    def test_authenticate_token_cache_is_lazy(self, mock_kcsb, mock_kusto_client, mock_shared_credential):
+        """Test that cached authentication builds a credential client without acquiring tokens"""
+        credential = Mock()
+        mock_shared_credential.return_value = credential
+        manager = EventhouseManager(self.cluster_url, self.database)
+        
+        self.assertTrue(manager.authenticate())
+        
+        self.assertEqual(manager.client, mock_kusto_client.return_value)
+        mock_kcsb.with_azure_token_credential.assert_called_once_with(self.cluster_url, credential)
+        mock_kcsb.with_az_cli_authentication.assert_not_called()
+        credential.get_token.assert_not_called()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.get_shared_credential')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoClient')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoConnectionStringBuilder')
+    def test_authenticate_token_cache_shares_client_per_cluster(self, mock_kcsb, mock_kusto_client,
+                                                                mock_shared_credential):
+        """Test that managers targeting the same cluster share one client"""
+        mock_kusto_client.side_effect = [Mock(), Mock()]
+        first = EventhouseManager(self.cluster_url, "db1")
+        second = EventhouseManager(self.cluster_url + "/", "db2")
+        other = EventhouseManager("https://other.kusto.windows.net", "db1")
+        
+        self.assertTrue(first.authenticate())
+        self.assertTrue(second.authenticate())
+        self.assertTrue(other.authenticate())
+        
+        self.assertIs(first.client, second.client)
+        self.assertIsNot(first.client, other.client)
+        self.assertEqual(mock_kusto_client.call_count, 2)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.get_shared_credential')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoClient')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoConnectionStringBuilder')
+    def test_authenticate_token_cache_after_clear(self, mock_kcsb, mock_kusto_client, mock_shared_credential):
+        """Test that a cluster whose client was cleared from the cache gets a new client, never None"""
+        mock_kusto_client.side_effect = [Mock(), Mock()]
+        first = EventhouseManager(self.cluster_url, "db1")
+        second = EventhouseManager(self.cluster_url, "db2")
+        
+        self.assertTrue(first.authenticate())
+        clear_client_cache()
+        self.assertTrue(second.authenticate())
+        
+        self.assertIsNotNone(second.client)
+        self.assertIsNot(first.client, second.client)
+        self.assertEqual(mock_kusto_client.call_count, 2)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.get_shared_credential')
+    def test_authenticate_token_cache_failure(self, mock_shared_credential):
+        """Test that a credential setup error fails authentication"""
+        mock_shared_credential.side_effect = Exception("no credential")
+        manager = EventhouseManager(self.cluster_url, self.database)
+        
+        self.assertFalse(manager.authenticate())
+        self.assertIsNone(manager.client)
+        
+    # A private lock, so a deadlocked thread cannot block the cache cleanup of later tests
+    @patch('digitaloperations.fabriceventhousehelperpyapp.auth._clients_lock', new_callable=threading.Lock)
+    @patch('digitaloperations.fabriceventhousehelperpyapp.auth.build_credential')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoClient')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.KustoConnectionStringBuilder')
+    def test_authenticate_token_cache_builds_shared_credential(self, mock_kcsb, mock_kusto_client,
+                                                               mock_build_credential, mock_lock):
+        """Test that cached authentication builds the shared credential without deadlocking"""
+        manager = EventhouseManager(self.cluster_url, self.database)
+        results = []
+        
+        thread = threading.Thread(target=lambda: results.append(manager.authenticate()), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        
+        self.assertFalse(thread.is_alive(), "authenticate() did not return")
+        self.assertEqual(results, [True])
+        mock_build_credential.assert_called_once_with()
+        mock_kcsb.with_azure_token_credential.assert_called_once_with(self.cluster_url,
+                                                                      mock_build_credential.return_value)
+        
     def test_create_table_without_authentication(self):
         """Test create_table when not authenticated"""
         result = self.manager.create_table("test_table", "col1:string, col2:int")
@@ -213,7 +325,7 @@ class TestEventhouseManager(unittest.TestCase):
         self.assertEqual(self.manager._get_kusto_data_type("DateTime"), "datetime")
         self.assertEqual(self.manager._get_kusto_data_type("Unknown"), "string")  # Default
         
-    @patch('builtins.open', new_callable=mock_open, read_data='[{"Name": "TestEntity", "Namespace": "Test"}]')
+    @patch('builtins.open', return_value=io.BytesIO(b'[{"Name": "TestEntity", "Namespace": "Test"}]'))
     def test_load_entity_type_definitions_success(self, mock_file):
         """Test successful loading of entity type definitions"""
         result = self.manager._load_entity_type_definitions("test.json")
@@ -226,12 +338,63 @@ class TestEventhouseManager(unittest.TestCase):
         result = self.manager._load_entity_type_definitions("nonexistent.json")
         self.assertEqual(result, [])
         
-    @patch('builtins.open', new_callable=mock_open, read_data='invalid json')
+    @patch('builtins.open', return_value=io.BytesIO(b'invalid json'))
     def test_load_entity_type_definitions_invalid_json(self, mock_file):
         """Test loading entity type definitions with invalid JSON"""
         result = self.manager._load_entity_type_definitions("invalid.json")
         self.assertEqual(result, [])
         
+    @patch('builtins.open', return_value=io.BytesIO(b'{"Name": "TestEntity"}'))
+    def test_load_entity_type_definitions_not_a_list(self, mock_file):
+        """Test loading entity type definitions that are not a JSON array"""
+        result = self.manager._load_entity_type_definitions("object.json")
+        self.assertEqual(result, [])
+        
+    def test_load_entity_type_definitions_reads_binary(self):
+        """Test the definitions file is streamed without ijson's text reader deprecation warning"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(temp_dir, "EntityTypeDefinitions.json")
+            with open(json_path, 'w') as f:
+                json.dump([{"Namespace": "NS", "Name": "Entity", "Properties": []}], f)
+            
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", DeprecationWarning)
+                result = self.manager._load_entity_type_definitions(json_path)
+            
+            self.assertEqual([entity["Name"] for entity in result], ["Entity"])
+        finally:
+            shutil.rmtree(temp_dir)
+        
+    def test_load_entity_type_definitions_selective(self):
+        """Test only entities referenced by the mappings are loaded"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(temp_dir, "EntityTypeDefinitions.json")
+            with open(json_path, 'w') as f:
+                json.dump([{"Namespace": "NS", "Name": f"Entity{i}", "Properties": []} for i in range(100)], f)
+            type_mappings = {"ref1": TypeMapping("ref1", "NS", "Entity3")}
+            
+            result = self.manager._load_entity_type_definitions(json_path, type_mappings)
+            
+            self.assertEqual([entity["Name"] for entity in result], ["Entity3"])
+        finally:
+            shutil.rmtree(temp_dir)
+        
+
+    def test_load_entity_catalog_without_cache_is_selective(self):
+        """Test that with the cache disabled only referenced entities are requested"""
+        manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False)
+        type_mappings = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
+        
+        with patch.object(manager, '_load_entity_type_definitions',
+                          return_value=[{"Namespace": "Test", "Name": "Entity"}]) as mock_load:
+            catalog = manager._load_entity_catalog("test.json", type_mappings)
+        
+        mock_load.assert_called_once_with("test.json", type_mappings)
+        self.assertEqual(len(catalog), 1)
+        
+
     def test_parse_type_mappings_valid_json(self):
         """Test parsing valid JSON type mappings"""
         mappings = [
@@ -242,8 +405,8 @@ class TestEventhouseManager(unittest.TestCase):
         
         self.assertEqual(len(result), 2)
         self.assertIn("test_ref", result)
-        self.assertEqual(result["test_ref"]["namespace"], "Test")
-        self.assertEqual(result["test_ref"]["entity_name"], "Entity")
+        self.assertEqual(result["test_ref"].namespace, "Test")
+        self.assertEqual(result["test_ref"].entity_name, "Entity")
         
     def test_parse_type_mappings_invalid_json(self):
         """Test parsing invalid JSON type mappings"""
@@ -260,17 +423,15 @@ class TestEventhouseManager(unittest.TestCase):
         result = self.manager._parse_type_mappings(mappings)
         self.assertEqual(result, {})
         
-    @patch('builtins.open', new_callable=mock_open)
-    def test_load_yaml_mappings_success(self, mock_file):
+    def test_load_yaml_mappings_success(self):
         """Test successful loading of YAML mappings"""
         yaml_content = {
             'type_mappings': [
                 {'typeRef': 'test_ref', 'namespace': 'Test', 'entity_name': 'Entity'}
             ]
         }
-        mock_file.return_value.read.return_value = yaml.dump(yaml_content)
         
-        with patch('yaml.safe_load', return_value=yaml_content):
+        with patch('builtins.open', mock_open(read_data=yaml.dump(yaml_content))):
             result = self.manager._load_yaml_mappings("test.yaml")
             
         self.assertEqual(len(result), 1)
@@ -285,7 +446,7 @@ class TestEventhouseManager(unittest.TestCase):
     def test_create_entity_mappings_from_input(self):
         """Test creating entity mappings from input"""
         type_mappings = {
-            "test_ref": {"namespace": "Test", "entity_name": "Entity"}
+            "test_ref": TypeMapping("test_ref", "Test", "Entity")
         }
         entity_definitions = [{
             "Namespace": "Test",
@@ -298,17 +459,17 @@ class TestEventhouseManager(unittest.TestCase):
         
         self.assertEqual(len(result), 1)
         mapping = result[0]
-        self.assertEqual(mapping["displayName"], "Test_Entity")
-        self.assertEqual(mapping["typeRef"], "test_ref")
-        self.assertIn("prop1:string", mapping["fields"])
-        self.assertIn("ts_prop1:double", mapping["fields"])
-        self.assertIn("Identifier:string", mapping["fields"])
-        self.assertIn("Timestamp:datetime", mapping["fields"])
+        self.assertEqual(mapping.table_name, "Test_Entity")
+        self.assertEqual(mapping.type_ref, "test_ref")
+        self.assertIn("prop1:string", mapping.fields)
+        self.assertIn("ts_prop1:double", mapping.fields)
+        self.assertIn("Identifier:string", mapping.fields)
+        self.assertIn("Timestamp:datetime", mapping.fields)
         
     def test_create_entity_mappings_no_matching_definition(self):
         """Test creating entity mappings when no matching definition found"""
         type_mappings = {
-            "test_ref": {"namespace": "NonExistent", "entity_name": "Entity"}
+            "test_ref": TypeMapping("test_ref", "NonExistent", "Entity")
         }
         entity_definitions = [{
             "Namespace": "Test",
@@ -320,17 +481,79 @@ class TestEventhouseManager(unittest.TestCase):
         
         self.assertEqual(len(result), 0)
         
+    def test_create_entity_mappings_matches_type_reference(self):
+        """Test entity definitions are matched by TypeReference when the name differs"""
+        type_mappings = {
+            "test_ref": TypeMapping("test_ref", "Alias", "Entity")
+        }
+        entity_definitions = [{
+            "Namespace": "Test",
+            "Name": "Entity",
+            "TypeReference": "test_ref",
+            "Properties": [{"name": "prop1", "valueType": "Boolean"}]
+        }]
+        
+        result = self.manager._create_entity_mappings_from_input(type_mappings, entity_definitions)
+        
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].table_name, "Alias_Entity")
+        self.assertIn("prop1:boolean", result[0].fields)
+        
+    def test_load_entity_catalog_uses_cache(self):
+        """Test the compiled catalog is cached and reused on the next load"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(temp_dir, "EntityTypeDefinitions.json")
+            with open(json_path, 'w') as f:
+                f.write('[{"Name": "Entity", "Namespace": "Test"}]')
+            manager = EventhouseManager(self.cluster_url, self.database,
+                                        definitions_cache_dir=os.path.join(temp_dir, "cache"))
+            
+            self.assertEqual(len(manager._load_entity_catalog(json_path)), 1)
+            with patch.object(manager, '_load_entity_type_definitions') as mock_load:
+                catalog = manager._load_entity_catalog(json_path)
+                mock_load.assert_not_called()
+            self.assertIn(("Test", "Entity"), catalog)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_load_entity_catalog_caches_selected_entities(self):
+        """Test the cache keeps the entities runs selected and a cached run parses nothing"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(temp_dir, "EntityTypeDefinitions.json")
+            with open(json_path, 'w') as f:
+                json.dump([{"Name": name, "Namespace": "Test"} for name in ("A", "B", "C")], f)
+            manager = EventhouseManager(self.cluster_url, self.database,
+                                        definitions_cache_dir=os.path.join(temp_dir, "cache"))
+            first = {"a": TypeMapping("a", "Test", "A")}
+            both = {"a": TypeMapping("a", "Test", "A"), "b": TypeMapping("b", "Test", "B")}
+            
+            self.assertEqual([entry.name for entry in manager._load_entity_catalog(json_path, first)], ["A"])
+            with patch.object(manager, '_load_entity_type_definitions') as mock_load:
+                catalog = manager._load_entity_catalog(json_path, first)
+                mock_load.assert_not_called()
+            self.assertEqual(len(catalog), 1)
+            
+            # A miss selects the run's entities from the file and adds them to the cache
+            load = manager._load_entity_type_definitions
+            with patch.object(manager, '_load_entity_type_definitions', side_effect=load) as mock_load:
+                self.assertEqual(len(manager._load_entity_catalog(json_path, both)), 2)
+                mock_load.assert_called_once_with(json_path, both)
+                self.assertEqual(len(manager._load_entity_catalog(json_path, both)), 2)
+                mock_load.assert_called_once()
+            cached = EntityCatalog.load_cached(json_path, os.path.join(temp_dir, "cache"))
+            self.assertEqual(sorted(entry.name for entry in cached), ["A", "B"])
+        finally:
+            shutil.rmtree(temp_dir)
+    
     def test_process_entity_mappings_success(self):
         """Test successful processing of entity mappings"""
         mock_client = Mock()
         self.manager.client = mock_client
         mock_client.execute_mgmt.return_value = Mock()
         
-        entity_mappings = [{
-            "displayName": "test_table",
-            "typeRef": "test_ref",
-            "fields": ["col1:string", "col2:int"]
-        }]
+        entity_mappings = [EntityMapping("test_ref", "test_table", parse_columns(["col1:string", "col2:int"]))]
         
         result = self.manager.process_entity_mappings(entity_mappings)
         
@@ -346,11 +569,7 @@ class TestEventhouseManager(unittest.TestCase):
         # First call (create table) fails, second call shouldn't happen
         mock_client.execute_mgmt.side_effect = [KustoServiceError("Failed")]
         
-        entity_mappings = [{
-            "displayName": "test_table",
-            "typeRef": "test_ref",
-            "fields": ["col1:string", "col2:int"]
-        }]
+        entity_mappings = [EntityMapping("test_ref", "test_table", parse_columns(["col1:string", "col2:int"]))]
         
         result = self.manager.process_entity_mappings(entity_mappings)
         
@@ -359,6 +578,258 @@ class TestEventhouseManager(unittest.TestCase):
         # Only create table should be called, not update policy
         self.assertEqual(mock_client.execute_mgmt.call_count, 1)
 
+    def test_init_invalid_max_parallel(self):
+        """Test that max_parallel below 1 is rejected"""
+        with self.assertRaises(ValueError):
+            EventhouseManager(self.cluster_url, self.database, max_parallel=0)
+        
+    def test_process_entity_mappings_parallel(self):
+        """Test parallel processing keeps per-table ordering and the results contract"""
+        manager = EventhouseManager(self.cluster_url, self.database, max_parallel=4)
+        mock_client = Mock()
+        manager.client = mock_client
+        mock_client.execute_mgmt.return_value = Mock()
+        
+        entity_mappings = [EntityMapping(f"ref_{i}", f"table_{i}", parse_columns(["col1:string"])) for i in range(10)]
+        
+        result = manager.process_entity_mappings(entity_mappings)
+        
+        self.assertEqual(list(result.keys()), [f"table_{i}" for i in range(10)])
+        self.assertTrue(all(result.values()))
+        self.assertEqual(mock_client.execute_mgmt.call_count, 20)
+        # Each table is created before its update policy is set
+        commands = [call.args[1] for call in mock_client.execute_mgmt.call_args_list]
+        for i in range(10):
+            create_index = commands.index(f".create table table_{i} (col1:string)")
+            policy_index = next(idx for idx, cmd in enumerate(commands)
+                                if cmd.startswith(f".alter table table_{i} policy update"))
+            self.assertLess(create_index, policy_index)
+        
+    def test_process_entity_mappings_parallel_partial_failure(self):
+        """Test parallel processing reports failures per table"""
+        mock_client = Mock()
+        self.manager.client = mock_client
+        
+        def execute_mgmt(database, command):
+            if "table_bad" in command:
+                raise KustoServiceError("Failed")
+            return Mock()
+        mock_client.execute_mgmt.side_effect = execute_mgmt
+        
+        entity_mappings = [
+            EntityMapping("ref_good", "table_good", parse_columns(["col1:string"])),
+            EntityMapping("ref_bad", "table_bad", parse_columns(["col1:string"]))
+        ]
+        
+        result = self.manager.process_entity_mappings(entity_mappings, max_parallel=2)
+        
+        self.assertEqual(result, {"table_good": True, "table_bad": False})
+        
+    def test_process_entity_mappings_parallel_authentication_error(self):
+        """Test that authentication errors propagate out of worker threads"""
+        mock_client = Mock()
+        self.manager.client = mock_client
+        mock_client.execute_mgmt.side_effect = Exception("authentication failed")
+        
+        entity_mappings = [EntityMapping(f"ref_{i}", f"table_{i}", parse_columns(["col1:string"])) for i in range(3)]
+        
+        with self.assertRaises(Exception):
+            self.manager.process_entity_mappings(entity_mappings, max_parallel=3)
+
+    def test_process_entity_mappings_specialized_transforms(self):
+        """Test entity tables are fed through their specialised transform function"""
+        manager = EventhouseManager(self.cluster_url, self.database, specialized_transforms=True)
+        mock_client = Mock()
+        manager.client = mock_client
+        mock_client.execute_mgmt.return_value = Mock()
+        
+        fields = ["col1:double", "Identifier:string", "Timestamp:datetime"]
+        result = manager.process_entity_mappings([EntityMapping("test_ref", "test_table", parse_columns(fields))])
+        
+        self.assertTrue(result["test_table"])
+        commands = [call.args[1] for call in mock_client.execute_mgmt.call_args_list]
+        self.assertEqual(len(commands), 3)
+        self.assertIn("MoveData_test_table()", commands[1].splitlines()[0])
+        self.assertIn('"Query":"MoveData_test_table()"', commands[2])
+        
+    def test_process_entity_mappings_specialized_transform_fallback(self):
+        """Test the generic function is used when the specialised function cannot be created"""
+        manager = EventhouseManager(self.cluster_url, self.database, specialized_transforms=True)
+        mock_client = Mock()
+        manager.client = mock_client
+        mock_client.execute_mgmt.side_effect = [Mock(), KustoServiceError("Failed"), Mock()]
+        
+        fields = ["col1:double", "Identifier:string", "Timestamp:datetime"]
+        result = manager.process_entity_mappings([EntityMapping("test_ref", "test_table", parse_columns(fields))])
+        
+        self.assertTrue(result["test_table"])
+        self.assertIn("MoveDataByType", mock_client.execute_mgmt.call_args_list[2].args[1])
+        
+    def test_compile_provisioning_commands_specialized_transforms(self):
+        """Test the specialised function is compiled between the table and its policy"""
+        manager = EventhouseManager(self.cluster_url, self.database, specialized_transforms=True)
+        
+        fields = ["col1:double", "Identifier:string", "Timestamp:datetime"]
+        commands = manager.compile_provisioning_commands([EntityMapping("test_ref", "test_table", parse_columns(fields))])
+        
+        self.assertEqual([c.kind for c in commands], ["table", "function", "table", "transform", "policy"])
+
+    def test_compile_provisioning_commands(self):
+        """Test compiling the provisioning set into ordered commands"""
+        entity_mappings = [EntityMapping("test_ref", "test_table", parse_columns(["col1:string", "col2:double"]))]
+        
+        commands = self.manager.compile_provisioning_commands(entity_mappings)
+        
+        self.assertEqual([(c.kind, c.target) for c in commands], [
+            ("table", "AIORawData"),
+            ("function", "MoveDataByType"),
+            ("table", "test_table"),
+            ("policy", "test_table"),
+        ])
+        self.assertEqual(commands[2].text, ".create table test_table (col1:string, col2:double)")
+        self.assertIn('MoveDataByType(\\"test_ref\\", \\"test_table\\")', commands[3].text)
+        
+    def test_compile_provisioning_commands_routing(self):
+        """Test the routing stage is compiled before MoveDataByType and feeds the entity policies"""
+        manager = EventhouseManager(self.cluster_url, self.database, routing=True)
+        
+        commands = manager.compile_provisioning_commands([EntityMapping("test_ref", "test_table", parse_columns(["col1:string"]))])
+        
+        self.assertEqual([(c.kind, c.target) for c in commands], [
+            ("table", "AIORawData"),
+            ("table", "AIORoutedData"),
+            ("policy", "AIORoutedData"),
+            ("transform", "AIORoutedData"),
+            ("policy", "AIORoutedData"),
+            ("function", "MoveDataByType"),
+            ("table", "test_table"),
+            ("policy", "test_table"),
+        ])
+        self.assertIn("policy retention softdelete = 0d", commands[2].text)
+        self.assertIn("where TypeRef == typeRef", commands[5].text)
+        self.assertNotIn("endswith", commands[5].text)
+        self.assertIn('"Source":"AIORoutedData"', commands[7].text)
+        
+    def test_chunk_commands_by_size(self):
+        """Test database scripts are split by size while preserving order"""
+        commands = [KustoCommand("table", f"t{i}", f".create table t{i} (c:string)") for i in range(10)]
+        
+        chunks = chunk_commands(commands, max_script_bytes=len(SCRIPT_HEADER) + 100)
+        
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([c for chunk in chunks for c in chunk], commands)
+        for chunk in chunks:
+            self.assertLessEqual(len(build_database_script(chunk)), len(SCRIPT_HEADER) + 100)
+        
+    def test_execute_database_scripts_reports_per_command_outcomes(self):
+        """Test per-command outcomes are read from the script result table"""
+        mock_client = Mock()
+        self.manager.client = mock_client
+        mock_client.execute_mgmt.return_value = make_script_result(["Completed", "Failed", "Completed"])
+        commands = [KustoCommand("table", f"t{i}", f".create table t{i} (c:string)") for i in range(3)]
+        
+        outcomes = self.manager.execute_database_scripts(commands)
+        
+        self.assertEqual(outcomes, [True, False, True])
+        mock_client.execute_mgmt.assert_called_once()
+        script = mock_client.execute_mgmt.call_args[0][1]
+        self.assertTrue(script.startswith(".execute database script"))
+        
+    def test_execute_database_scripts_script_error(self):
+        """Test a rejected script marks all of its commands as failed"""
+        mock_client = Mock()
+        self.manager.client = mock_client
+        mock_client.execute_mgmt.side_effect = KustoServiceError("Syntax error")
+        commands = [KustoCommand("table", f"t{i}", f".create table t{i} (c:string)") for i in range(2)]
+        
+        self.assertEqual(self.manager.execute_database_scripts(commands), [False, False])
+        
+    def test_execute_database_scripts_without_authentication(self):
+        """Test execute_database_scripts when not authenticated"""
+        commands = [KustoCommand("table", "t", ".create table t (c:string)")]
+        self.assertEqual(self.manager.execute_database_scripts(commands), [False])
+
+    def test_compile_incremental_commands_up_to_date(self):
+        """Test no commands are compiled when the database already matches"""
+        entity_mappings = [EntityMapping("test_ref", "test_table", parse_columns(["col1:string"]))]
+        snapshot = DatabaseSnapshot(
+            tables={
+                "AIORawData": {name: kusto_type for name, kusto_type, _ in parse_schema(AIO_RAW_DATA_SCHEMA)},
+                "test_table": {"col1": "string"}
+            },
+            functions={"MoveDataByType": build_move_data_by_type_function_body()},
+            update_policies={"test_table": build_update_policy("test_table", "test_ref")}
+        )
+        
+        commands, conflicts = self.manager.compile_incremental_commands(entity_mappings, snapshot)
+        
+        self.assertEqual(commands, [])
+        self.assertEqual(conflicts, {})
+        
+    def test_compile_incremental_commands_changes(self):
+        """Test only missing tables, columns, functions and policies are compiled"""
+        entity_mappings = [
+            EntityMapping("new_ref", "new_table", parse_columns(["col1:string"])),
+            EntityMapping("old_ref", "old_table", parse_columns(["col1:string", "col2:double"])),
+            EntityMapping("bad_ref", "bad_table", parse_columns(["col1:string"]))
+        ]
+        snapshot = DatabaseSnapshot(
+            tables={
+                "AIORawData": {name: kusto_type for name, kusto_type, _ in parse_schema(AIO_RAW_DATA_SCHEMA)},
+                "old_table": {"col1": "string"},
+                "bad_table": {"col1": "long"}
+            },
+            update_policies={"old_table": build_update_policy("old_table", "old_ref")}
+        )
+        
+        commands, conflicts = self.manager.compile_incremental_commands(entity_mappings, snapshot)
+        
+        self.assertEqual([(c.kind, c.target) for c in commands], [
+            ("function", "MoveDataByType"),
+            ("table", "new_table"),
+            ("policy", "new_table"),
+            ("table", "old_table"),
+        ])
+        self.assertEqual(commands[1].text, ".create table new_table (col1:string)")
+        self.assertEqual(commands[-1].text, ".alter-merge table old_table (col2:double)")
+        self.assertEqual(list(conflicts), ["bad_table"])
+        
+    def test_compile_incremental_commands_routing_up_to_date(self):
+        """Test an unchanged routing stage produces no commands"""
+        manager = EventhouseManager(self.cluster_url, self.database, routing=True)
+        entity_mappings = [EntityMapping("test_ref", "test_table", parse_columns(["col1:string"]))]
+        snapshot = DatabaseSnapshot(
+            tables={
+                "AIORawData": {name: kusto_type for name, kusto_type, _ in parse_schema(AIO_RAW_DATA_SCHEMA)},
+                "AIORoutedData": {name: kusto_type for name, kusto_type, _ in parse_schema(ROUTED_DATA_SCHEMA)},
+                "test_table": {"col1": "string"}
+            },
+            functions={
+                "MoveDataByType": build_move_data_by_type_function_body(routed=True),
+                "RouteRawData": build_routing_function_body(build_type_ref_expression(["test_ref"]))
+            },
+            update_policies={
+                "AIORoutedData": build_routing_update_policy(),
+                "test_table": build_update_policy("test_table", "test_ref", source="AIORoutedData")
+            },
+            retention_policies={"AIORoutedData": {"SoftDeletePeriod": "00:00:00", "Recoverability": "Disabled"}}
+        )
+        
+        commands, _ = manager.compile_incremental_commands(entity_mappings, snapshot)
+        self.assertEqual(commands, [])
+        
+        # A new type reference changes the routing function only
+        entity_mappings.append(EntityMapping("other_ref", "test_table", parse_columns(["col1:string"])))
+        commands, _ = manager.compile_incremental_commands(entity_mappings[1:], snapshot)
+        self.assertEqual([(c.kind, c.target) for c in commands],
+                         [("transform", "AIORoutedData"), ("policy", "test_table")])
+        
+        # A routing table that keeps its rows gets the retention policy again
+        snapshot.retention_policies.clear()
+        commands, _ = manager.compile_incremental_commands(entity_mappings[:1], snapshot)
+        self.assertEqual([command.text for command in commands],
+                         [".alter-merge table AIORoutedData policy retention softdelete = 0d recoverability = disabled"])
+
 
 class TestEventhouseManagerIntegration(unittest.TestCase):
     """Integration tests for EventhouseManager"""
@@ -382,7 +853,7 @@ class TestEventhouseManagerIntegration(unittest.TestCase):
         """Test successful setup from YAML input"""
         mock_auth.return_value = True
         mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
-        mock_load_yaml.return_value = {"test_ref": {"namespace": "Test", "entity_name": "Entity"}}
+        mock_load_yaml.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
         mock_create_table.return_value = True
         mock_function.return_value = True
         mock_process.return_value = {"Test_Entity": True}
@@ -402,11 +873,20 @@ class TestEventhouseManagerIntegration(unittest.TestCase):
         """Test setup when authentication fails"""
         mock_auth.return_value = False
         
-        result = self.manager.setup_tables_from_input(yaml_file="test.yaml")
+        with patch.object(self.manager, 'resolve_entity_mappings', return_value=[{"type_ref": "ref"}]):
+            result = self.manager.setup_tables_from_input(yaml_file="test.yaml")
         
         self.assertFalse(result)
         mock_auth.assert_called_once()
         
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    def test_setup_tables_from_input_invalid_input_skips_authentication(self, mock_auth):
+        """Test that mappings are resolved before authenticating"""
+        result = self.manager.setup_tables_from_input()
+        
+        self.assertFalse(result)
+        mock_auth.assert_not_called()
+        
     @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
     @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
     def test_setup_tables_from_input_no_entity_definitions(self, mock_load_entities, mock_auth):
@@ -442,7 +922,7 @@ class TestEventhouseManagerIntegration(unittest.TestCase):
         """Test successful setup from JSON command line input"""
         mock_auth.return_value = True
         mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
-        mock_parse_json.return_value = {"test_ref": {"namespace": "Test", "entity_name": "Entity"}}
+        mock_parse_json.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
         mock_create_table.return_value = True
         mock_function.return_value = True
         mock_process.return_value = {"Test_Entity": True}
@@ -453,6 +933,211 @@ class TestEventhouseManagerIntegration(unittest.TestCase):
         self.assertTrue(result)
         mock_parse_json.assert_called_once_with(type_mappings)
 
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    def test_setup_tables_from_input_batched(self, mock_load_yaml, mock_load_entities, mock_auth):
+        """Test batched setup runs the whole provisioning set as a single script"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [
+            {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+            {"Namespace": "Test", "Name": "Other", "Properties": []}
+        ]
+        mock_load_yaml.return_value = {
+            "ref1": TypeMapping("ref1", "Test", "Entity"),
+            "ref2": TypeMapping("ref2", "Test", "Other")
+        }
+        manager = EventhouseManager(self.cluster_url, self.database, batch=True)
+        manager.client = Mock()
+        # AIORawData, function, 2 x (table, policy)
+        manager.client.execute_mgmt.return_value = make_script_result(["Completed"] * 6)
+        
+        result = manager.setup_tables_from_input(yaml_file="test.yaml")
+        
+        self.assertTrue(result)
+        manager.client.execute_mgmt.assert_called_once()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    def test_setup_tables_from_input_batched_policy_failure(self, mock_load_yaml, mock_load_entities, mock_auth):
+        """Test batched setup fails when an update policy command fails"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
+        mock_load_yaml.return_value = {"ref1": TypeMapping("ref1", "Test", "Entity")}
+        manager = EventhouseManager(self.cluster_url, self.database, batch=True)
+        manager.client = Mock()
+        manager.client.execute_mgmt.return_value = make_script_result(["Completed", "Completed", "Completed", "Failed"])
+        
+        self.assertFalse(manager.setup_tables_from_input(yaml_file="test.yaml"))
+
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.fetch_database_snapshot')
+    def test_setup_tables_from_input_incremental_up_to_date(
+        self, mock_snapshot, mock_load_yaml, mock_load_entities, mock_auth
+    ):
+        """Test incremental setup issues no commands when nothing changed"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
+        mock_load_yaml.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
+        mock_snapshot.return_value = DatabaseSnapshot(
+            tables={
+                "AIORawData": {name: kusto_type for name, kusto_type, _ in parse_schema(AIO_RAW_DATA_SCHEMA)},
+                "Test_Entity": {"Identifier": "string", "Timestamp": "datetime"}
+            },
+            functions={"MoveDataByType": build_move_data_by_type_function_body()},
+            update_policies={"Test_Entity": build_update_policy("Test_Entity", "test_ref")}
+        )
+        manager = EventhouseManager(self.cluster_url, self.database, incremental=True)
+        manager.client = Mock()
+        
+        result = manager.setup_tables_from_input(yaml_file="test.yaml")
+        
+        self.assertTrue(result)
+        manager.client.execute_mgmt.assert_not_called()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.fetch_database_snapshot')
+    def test_setup_tables_from_input_incremental_snapshot_fails(
+        self, mock_snapshot, mock_load_yaml, mock_load_entities, mock_auth
+    ):
+        """Test incremental setup fails when the catalog cannot be fetched"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
+        mock_load_yaml.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
+        mock_snapshot.return_value = None
+        manager = EventhouseManager(self.cluster_url, self.database, incremental=True)
+        
+        self.assertFalse(manager.setup_tables_from_input(yaml_file="test.yaml"))
+
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    def test_setup_tables_from_input_routing(self, mock_load_yaml, mock_load_entities, mock_auth):
+        """Test serial setup creates the routing stage before MoveDataByType"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
+        mock_load_yaml.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
+        manager = EventhouseManager(self.cluster_url, self.database, routing=True)
+        manager.client = Mock()
+        
+        result = manager.setup_tables_from_input(yaml_file="test.yaml")
+        
+        self.assertTrue(result)
+        commands = [call.args[1] for call in manager.client.execute_mgmt.call_args_list]
+        # AIORawData, routing table, retention, function and policy, MoveDataByType, entity table and policy
+        self.assertEqual(len(commands), 8)
+        self.assertTrue(commands[1].startswith(".create table AIORoutedData"))
+        self.assertTrue(commands[5].startswith(".create-or-alter function MoveDataByType"))
+        self.assertIn('"Source":"AIORoutedData"', commands[7])
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings')
+    def test_setup_tables_from_input_routing_fails(self, mock_load_yaml, mock_load_entities, mock_auth):
+        """Test serial setup stops when the routing stage cannot be created"""
+        mock_auth.return_value = True
+        mock_load_entities.return_value = [{"Namespace": "Test", "Name": "Entity", "Properties": []}]
+        mock_load_yaml.return_value = {"test_ref": TypeMapping("test_ref", "Test", "Entity")}
+        manager = EventhouseManager(self.cluster_url, self.database, routing=True)
+        manager.client = Mock()
+        manager.client.execute_mgmt.side_effect = [Mock(), KustoServiceError("Failed")]
+        
+        self.assertFalse(manager.setup_tables_from_input(yaml_file="test.yaml"))
+        self.assertEqual(manager.client.execute_mgmt.call_count, 2)
+
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={
+           "ref1": TypeMapping("ref1", "Test", "Entity"),
+           "ref2": TypeMapping("ref2", "Test", "Other")
+       }))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "TimeseriesProperties": [{"name": "temp", "valueType": "Number"}]}
+       ]))
+class TestEventhouseManagerWithFakeKusto(unittest.TestCase):
+    """End-to-end provisioning against the in-process fake Kusto backend"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.cluster_url = "https://test-cluster.kusto.windows.net"
+        self.database = "test_database"
+        self.client = FakeKustoClient()
+        
+    def setup(self, **options):
+        """Run setup_tables_from_input with a manager bound to the fake client"""
+        manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False, **options)
+        manager.client = self.client
+        return manager.setup_tables_from_input(yaml_file="test.yaml")
+        
+    def catalog(self):
+        """Tables, functions and update policies of the fake database"""
+        db = self.client.database(self.database)
+        return db.tables, {name: f["Body"] for name, f in db.functions.items()}, db.update_policies
+        
+    def test_serial_provisioning(self):
+        """Test serial setup provisions every table, the function and the policies"""
+        self.assertTrue(self.setup())
+        
+        tables, functions, policies = self.catalog()
+        self.assertEqual(set(tables), {"AIORawData", "Test_Entity", "Test_Other"})
+        self.assertEqual(tables["Test_Other"], {"temp": "real", "Identifier": "string", "Timestamp": "datetime"})
+        self.assertEqual(set(functions), {"MoveDataByType"})
+        self.assertEqual(set(policies), {"Test_Entity", "Test_Other"})
+        
+    def test_batched_and_parallel_provisioning_match_serial(self):
+        """Test batched and parallel setup produce the same catalog as serial setup"""
+        self.assertTrue(self.setup())
+        expected = self.catalog()
+        
+        for options in ({"batch": True}, {"max_parallel": 4}):
+            self.client = FakeKustoClient()
+            self.assertTrue(self.setup(**options))
+            self.assertEqual(self.catalog(), expected, options)
+        
+    def test_incremental_rerun_is_a_no_op(self):
+        """Test an incremental run after a full setup only reads the catalog"""
+        self.assertTrue(self.setup(specialized_transforms=True, routing=True))
+        requests = len(self.client.requests)
+        
+        self.assertTrue(self.setup(incremental=True, specialized_transforms=True, routing=True))
+        
+        self.assertEqual([query for _, query in self.client.requests[requests:]],
+                         [".show database schema as json", ".show table * policy update",
+                          ".show table * policy retention"])
+        
+    def test_throttling_and_transient_failures_are_retried(self):
+        """Test a throttled, flaky backend still provisions everything in parallel"""
+        self.client = FakeKustoClient(throttle_rate=0.3, failure_rate=0.1, seed=7)
+        manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False, max_parallel=4)
+        manager.client = self.client
+        manager.scheduler = CommandScheduler(max_concurrency=4, max_retries=20, sleep=lambda delay: None)
+        
+        self.assertTrue(manager.setup_tables_from_input(yaml_file="test.yaml"))
+        
+        tables, _, policies = self.catalog()
+        self.assertEqual(set(tables), {"AIORawData", "Test_Entity", "Test_Other"})
+        self.assertEqual(set(policies), {"Test_Entity", "Test_Other"})
+        self.assertGreater(manager.scheduler.stats()["retries"], 0)
+        
+    def test_failed_policy_reported(self):
+        """Test a rejected update policy fails the setup but provisions the other tables"""
+        self.client = FakeKustoClient(fail_commands={r"^\.alter table Test_Other policy": "Boom"})
+        
+        self.assertFalse(self.setup())
+        
+        _, _, policies = self.catalog()
+        self.assertEqual(set(policies), {"Test_Entity"})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import json
+import unittest
+from azure.kusto.data.exceptions import KustoServiceError, KustoThrottlingError
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    KustoCommand, build_create_table_command, build_database_script,
+    build_move_data_by_type_function_command, build_update_policy_command
+)
+from digitaloperations.fabriceventhousehelperpyapp.database_state import (
+    DatabaseSnapshot, SHOW_DATABASE_SCHEMA_COMMAND, SHOW_UPDATE_POLICIES_COMMAND
+)
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import AIO_RAW_DATA_SCHEMA
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+
+
+class TestFakeKustoClient(unittest.TestCase):
+    """Test cases for the in-process fake Kusto backend"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.client = FakeKustoClient()
+        self.database = "test_database"
+
+    def provision_raw_data(self):
+        """Create AIORawData and MoveDataByType"""
+        self.client.execute_mgmt(self.database, build_create_table_command("AIORawData", AIO_RAW_DATA_SCHEMA))
+        self.client.execute_mgmt(self.database, build_move_data_by_type_function_command())
+
+    def test_create_and_alter_merge_table(self):
+        """Test tables are created and extended with normalized column names and types"""
+        self.provision_raw_data()
+        self.client.execute_mgmt(self.database, ".create table T (a:string, b:double)")
+        self.client.execute_mgmt(self.database, ".alter-merge table T (c:boolean)")
+
+        db = self.client.database(self.database)
+        self.assertEqual(db.tables["AIORawData"]["key"], "string")
+        self.assertEqual(db.tables["T"], {"a": "string", "b": "real", "c": "bool"})
+
+    def test_create_table_with_different_schema_fails(self):
+        """Test re-creating a table is only accepted with the same schema"""
+        self.client.execute_mgmt(self.database, ".create table T (a:string)")
+        self.client.execute_mgmt(self.database, ".create table T (a:string)")
+        with self.assertRaises(KustoServiceError):
+            self.client.execute_mgmt(self.database, ".create table T (a:long)")
+
+    def test_update_policy_requires_source_and_function(self):
+        """Test update policies are validated against the catalog"""
+        self.client.execute_mgmt(self.database, ".create table T (a:string)")
+        with self.assertRaises(KustoServiceError):
+            self.client.execute_mgmt(self.database, build_update_policy_command("T", "ref"))
+
+        self.provision_raw_data()
+        self.client.execute_mgmt(self.database, build_update_policy_command("T", "it's"))
+        policy = self.client.database(self.database).update_policies["T"]
+        self.assertEqual(policy[0]["Query"], 'MoveDataByType("it\'s", "T")')
+
+    def test_catalog_commands_round_trip_through_snapshot(self):
+        """Test the catalog commands produce what DatabaseSnapshot expects"""
+        self.provision_raw_data()
+        self.client.execute_mgmt(self.database, ".create table T (a:string)")
+        self.client.execute_mgmt(self.database, build_update_policy_command("T", "ref"))
+
+        snapshot = DatabaseSnapshot.from_results(
+            self.database,
+            self.client.execute_mgmt(self.database, SHOW_DATABASE_SCHEMA_COMMAND).primary_results[0],
+            self.client.execute_mgmt(self.database, SHOW_UPDATE_POLICIES_COMMAND).primary_results[0]
+        )
+
+        self.assertEqual(set(snapshot.tables), {"AIORawData", "T"})
+        self.assertIn("MoveDataByType", snapshot.functions)
+        self.assertEqual(list(snapshot.update_policies), ["T"])
+
+    def test_database_script_reports_each_command(self):
+        """Test database scripts apply every command and report failures per command"""
+        script = build_database_script([
+            KustoCommand("table", "A", ".create table A (a:string)"),
+            KustoCommand("policy", "Missing", build_update_policy_command("Missing", "ref")),
+            KustoCommand("table", "B", ".create table B (b:string)"),
+        ])
+
+        rows = self.client.execute_mgmt(self.database, script).primary_results[0]
+
+        self.assertEqual([row["Result"] for row in rows], ["Completed", "Failed", "Completed"])
+        self.assertIn("Missing", rows[1]["Reason"])
+        self.assertEqual(set(self.client.database(self.database).tables), {"A", "B"})
+
+    def test_database_script_stops_without_continue_on_errors(self):
+        """Test the remaining commands are skipped after a failure unless ContinueOnErrors is set"""
+        script = ".execute database script <|\n.alter-merge table Missing (a:string)\n\n.create table A (a:string)"
+
+        rows = self.client.execute_mgmt(self.database, script).primary_results[0]
+
+        self.assertEqual([row["Result"] for row in rows], ["Failed", "Skipped"])
+        self.assertEqual(self.client.database(self.database).tables, {})
+
+    def test_injected_failures_and_throttling(self):
+        """Test configured failures and throttling are raised"""
+        client = FakeKustoClient(fail_commands={r"^\.create table Bad": "Boom"})
+        with self.assertRaises(KustoServiceError):
+            client.execute_mgmt(self.database, ".create table Bad (a:string)")
+        client.execute_mgmt(self.database, ".create table Good (a:string)")
+
+        client = FakeKustoClient(throttle_rate=1.0, seed=1)
+        with self.assertRaises(KustoThrottlingError):
+            client.execute_mgmt(self.database, ".create table T (a:string)")
+        self.assertEqual(client.throttled_count, 1)
+        self.assertEqual(client.database(self.database).tables, {})
+
+    def test_unsupported_command(self):
+        """Test unknown commands are rejected like a syntax error"""
+        with self.assertRaises(KustoServiceError):
+            self.client.execute_mgmt(self.database, ".drop table T")
+        self.assertEqual(json.loads(self.client.execute(self.database, SHOW_DATABASE_SCHEMA_COMMAND)
+                                    .primary_results[0][0]["DatabaseSchema"])["Databases"][self.database]["Tables"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.fanout import (
+    Target,
+    TargetsFormatError,
+    build_fanout_report,
+    load_targets,
+    parse_targets,
+    run_fanout,
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import TypeMapping
+
+
+class TestTargets(unittest.TestCase):
+    """Test cases for targets files"""
+
+    def test_parse_targets(self):
+        """Test the 'targets' key and a top-level list are both accepted"""
+        entries = [{"cluster": "https://a.kusto.windows.net", "database": "PlantA"},
+                   {"cluster": "https://a.kusto.windows.net", "database": "PlantB"}]
+
+        self.assertEqual(parse_targets({"targets": entries}), parse_targets(entries))
+        self.assertEqual(parse_targets(entries)[1], Target("https://a.kusto.windows.net", "PlantB"))
+
+    def test_invalid_targets(self):
+        """Test empty lists, incomplete entries and duplicates are rejected"""
+        for data in (None, {"targets": []}, [{"cluster": "https://a"}],
+                     [{"cluster": "https://a/", "database": "D"}, {"cluster": "https://A", "database": "D"}]):
+            with self.assertRaises(TargetsFormatError, msg=data):
+                parse_targets(data)
+
+    def test_load_targets(self):
+        """Test loading a YAML targets file"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "targets.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("targets:\n  - cluster: https://a.kusto.windows.net\n    database: PlantA\n")
+
+            self.assertEqual(load_targets(path), [Target("https://a.kusto.windows.net", "PlantA")])
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={"ref1": TypeMapping("ref1", "Test", "Entity")}))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]}
+       ]))
+class TestRunFanout(unittest.TestCase):
+    """Test cases for provisioning several targets against fake Kusto clusters"""
+
+    def setUp(self):
+        self.clusters = {"https://a": FakeKustoClient(latency=0.01), "https://b": FakeKustoClient(latency=0.01)}
+        self.targets = [Target("https://a", "PlantA"), Target("https://a", "PlantB"), Target("https://b", "PlantC")]
+
+    def compile_plan(self):
+        """Plan compiled with the patched mappings and definitions"""
+        return EventhouseManager("local", "local", definitions_cache=False).compile_plan(yaml_file="test.yaml")
+
+    def create_manager(self, target):
+        manager = EventhouseManager(target.cluster, target.database, definitions_cache=False)
+        manager.client = self.clusters[target.cluster]
+        return manager
+
+    def test_targets_provisioned_concurrently(self):
+        """Test every target gets its tables and targets run at the same time"""
+        plan = self.compile_plan()
+
+        results = run_fanout(self.targets, lambda manager: manager.apply_plan(plan), self.create_manager,
+                             parallel_targets=3)
+
+        self.assertEqual([result.database for result in results], ["PlantA", "PlantB", "PlantC"])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual([(result.tables_succeeded, result.tables_total) for result in results], [(2, 2)] * 3)
+        self.assertEqual(self.clusters["https://a"].max_concurrency, 2)
+        for target in self.targets:
+            self.assertIn("Test_Entity", self.clusters[target.cluster].database(target.database).tables)
+
+    def test_targets_on_a_cluster_share_a_scheduler(self):
+        """Test that managers of one cluster share the throttling state"""
+        managers = []
+
+        def create_manager(target):
+            managers.append(self.create_manager(target))
+            return managers[-1]
+
+        run_fanout(self.targets, lambda manager: True, create_manager)
+
+        self.assertIs(managers[0].scheduler, managers[1].scheduler)
+        self.assertIsNot(managers[0].scheduler, managers[2].scheduler)
+
+    def test_failures_are_reported_per_target(self):
+        """Test a failing target does not stop the others"""
+        plan = self.compile_plan()
+
+        def provision(manager):
+            if manager.database == "PlantB":
+                raise RuntimeError("authentication failed")
+            return manager.apply_plan(plan)
+
+        results = run_fanout(self.targets, provision, self.create_manager, parallel_targets=2)
+        report = build_fanout_report(results, 1.0, plan=plan.content_hash)
+
+        self.assertEqual([result.success for result in results], [True, False, True])
+        self.assertEqual(results[1].error, "authentication failed")
+        self.assertEqual((report["succeeded"], report["failed"]), (2, 1))
+        self.assertEqual(report["results"][1]["database"], "PlantB")
+
+
+if __name__ == '__main__':
+    unittest.main()
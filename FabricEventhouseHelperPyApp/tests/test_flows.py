@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import asyncio
+import threading
+import time
+import unittest
+from functools import partial
+
+from digitaloperations.fabriceventhousehelperpyapp.flows import Parallel, run_flow, run_flow_async
+
+
+def add(a, b):
+    return a + b
+
+
+async def add_async(a, b):
+    await asyncio.sleep(0)
+    return a + b
+
+
+def failing():
+    raise ValueError("failed")
+
+
+def flow(add_step, log):
+    """Flow using every kind of step; add_step is add or add_async"""
+    total = yield partial(add_step, 1, 2)
+    try:
+        yield failing
+    except ValueError as e:
+        log.append(str(e))
+
+    def nested(value):
+        return (yield partial(add_step, value, total))
+
+    outcomes = yield Parallel([nested(value) for value in range(4)] + [partial(add_step, 10, 0)], 3)
+    return total, outcomes
+
+
+class TestFlows(unittest.TestCase):
+    """Test cases for running flows on threads and on an event loop"""
+
+    def test_run_flow(self):
+        """Test results are sent back, errors are raised at the yield and Parallel keeps input order"""
+        log = []
+
+        self.assertEqual(run_flow(flow(add, log)), (3, [3, 4, 5, 6, 10]))
+        self.assertEqual(log, ["failed"])
+
+    def test_run_flow_async(self):
+        """Test the same flow awaits coroutine steps to the same result"""
+        log = []
+
+        self.assertEqual(asyncio.run(run_flow_async(flow(add_async, log))), (3, [3, 4, 5, 6, 10]))
+        self.assertEqual(log, ["failed"])
+
+    def test_parallel_steps_overlap(self):
+        """Test up to workers steps run at once on threads"""
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def step():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+        def parallel():
+            return (yield Parallel([step] * 6, 3))
+
+        run_flow(parallel())
+        self.assertEqual(peak[0], 3)
+
+    def test_uncaught_error_aborts_the_flow(self):
+        """Test an error the flow does not handle is raised by the runner"""
+        def parallel():
+            yield Parallel([failing, partial(add, 1, 1)], 2)
+            return "finished"
+
+        with self.assertRaises(ValueError):
+            run_flow(parallel())
+        with self.assertRaises(ValueError):
+            asyncio.run(run_flow_async(parallel()))
+
+
+if __name__ == '__main__':
+    unittest.main()
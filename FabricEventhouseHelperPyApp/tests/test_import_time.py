@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+MAIN_MODULE = "digitaloperations.fabriceventhousehelperpyapp.main"
+# Modules the CLI must not import before a command needs them
+HEAVY_MODULES = ("azure", "yaml", "msal", "requests", "asyncio", "pyarrow")
+# Generous upper bound for importing the CLI module; the Azure SDK alone takes several times longer
+IMPORT_TIME_BUDGET_SECONDS = 0.3
+
+
+def run_python(*args):
+    """Run a Python subprocess with the package sources on the path"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, timeout=60)
+
+
+def parse_importtime(output):
+    """{module: cumulative microseconds} from `python -X importtime` output"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def is_heavy(module):
+    return any(module == heavy or module.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+
+
+class TestImportTime(unittest.TestCase):
+    """Budget checks for the CLI start-up cost"""
+
+    def test_cli_import_defers_heavy_modules(self):
+        """Test that importing the CLI does not import the Azure SDK or the YAML parser"""
+        result = run_python("-X", "importtime", "-c", f"import {MAIN_MODULE}")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        modules = parse_importtime(result.stderr)
+
+        self.assertIn(MAIN_MODULE, modules)
+        self.assertEqual([module for module in modules if is_heavy(module)], [])
+        self.assertLess(modules[MAIN_MODULE] / 1e6, IMPORT_TIME_BUDGET_SECONDS)
+
+    def test_help_does_not_import_heavy_modules(self):
+        """Test that --help and argument errors exit before the Azure SDK is imported"""
+        for argv in (["setup-eventhouse", "--help"], ["setup-eventhouse", "--max-parallel", "0"]):
+            script = (
+                "import sys\n"
+                f"from {MAIN_MODULE} import main\n"
+                f"sys.argv = ['main.py'] + {argv!r}\n"
+                "try:\n"
+                "    main()\n"
+                "except SystemExit:\n"
+                "    pass\n"
+                f"heavy = [m for m in sys.modules if m.split('.')[0] in {HEAVY_MODULES!r}]\n"
+                "print('heavy modules:', ','.join(sorted(heavy)))\n"
+            )
+            result = run_python("-c", script)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.splitlines()[-1], "heavy modules: ", argv)
+
+
+if __name__ == '__main__':
+    unittest.main()
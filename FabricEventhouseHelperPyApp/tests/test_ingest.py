@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import csv
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import AIO_RAW_DATA_SCHEMA, build_create_table_command
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeIngestSink, FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.ingest import (
+    DirectorySink,
+    IngestStats,
+    QueuedIngestSink,
+    build_chunk,
+    ingestion_uri,
+    map_raw_record,
+    read_raw_chunks,
+    run_ingest,
+)
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import CommandScheduler
+
+
+def raw_record(index, **fields):
+    """An Eventstream record of a pump with one telemetry value"""
+    record = {"id": f"id-{index}", "type": "dtmi:test:Pump;1", "subject": f"pump-{index % 3}/line-1",
+              "offset": index, "timestamp": "2024-05-01T06:00:00+02:00",
+              "data": {"temperature": {"Value": index, "ServerTimestamp": "2024-05-01T04:00:00Z"}}}
+    record.update(fields)
+    return record
+
+
+class TestRawDataFiles(unittest.TestCase):
+    """Test cases for reading raw data files and mapping them onto AIORawData"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = temp_dir.name
+
+    def test_record_is_mapped_by_column_name(self):
+        """Test conversions to the column types and that other fields are dropped"""
+        row = dict(zip(["key", "value", "topic", "partition", "offset", "timestamp", "timestampType", "headers",
+                        "id", "source", "type", "subject", "time", "data"],
+                       map_raw_record(raw_record(7, partition="x", headers=[{"k": "v"}], extra=1))))
+
+        self.assertEqual(row["offset"], "7")
+        self.assertIsNone(row["partition"])
+        self.assertIsNone(row["key"])
+        self.assertEqual(row["timestamp"], "2024-05-01T04:00:00Z")
+        self.assertEqual(row["headers"], '[{"k":"v"}]')
+        self.assertEqual(json.loads(row["data"])["temperature"]["Value"], 7)
+
+    def test_gzip_jsonl_and_csv_are_chunked(self):
+        """Test compressed JSON Lines skip invalid lines and CSV files use their header"""
+        jsonl = os.path.join(self.root, "dump.jsonl.gz")
+        with gzip.open(jsonl, "wt", encoding="utf-8") as f:
+            f.writelines(json.dumps(raw_record(index)) + "\n" for index in range(5))
+            f.write("[1, 2]\nnot json\n")
+        csv_path = os.path.join(self.root, "dump.csv")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            f.write('subject,type,offset,data\npump-1/line-1,dtmi:test:Pump;1,,"{""a"": 1}"\n')
+        stats = IngestStats()
+
+        chunks = list(read_raw_chunks(jsonl, stats, chunk_rows=2))
+        [(index, rows)] = list(read_raw_chunks(csv_path, stats))
+
+        self.assertEqual([(index, len(rows)) for index, rows in chunks], [(0, 2), (1, 2), (2, 1)])
+        self.assertEqual(stats.invalid_records, 2)
+        self.assertEqual((rows[0][4], rows[0][10], rows[0][13]), (None, "dtmi:test:Pump;1", '{"a": 1}'))
+
+
+class TestIngest(unittest.TestCase):
+    """Test cases for the ingestion pipeline against the fake Kusto backend"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = temp_dir.name
+        self.database = "test_database"
+        self.path = os.path.join(self.root, "dump.jsonl")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(raw_record(index)) + "\n" for index in range(10))
+            # Separators and line breaks in a value must survive the CSV round trip
+            f.write(json.dumps(raw_record(10, data='{"note": "a, \\"b\\"\\nc"}')) + "\n")
+
+    def client(self, **options):
+        client = FakeKustoClient(**options)
+        client.execute_mgmt(self.database, build_create_table_command("AIORawData", AIO_RAW_DATA_SCHEMA))
+        return client
+
+    def ingest(self, client, max_parallel=3, **options):
+        scheduler = CommandScheduler(max_concurrency=max_parallel, sleep=Mock(), seed=1)
+        return run_ingest([self.path], FakeIngestSink(client, self.database), chunk_rows=2,
+                          max_parallel=max_parallel, scheduler=scheduler, **options)
+
+    def test_chunks_are_ingested_concurrently(self):
+        """Test every row arrives once in table column order and workers overlap"""
+        client = self.client(latency=0.01)
+
+        stats = self.ingest(client)
+
+        rows = {row["id"]: row for row in client.database(self.database).ingested_rows["AIORawData"]}
+        self.assertEqual((stats.records, stats.rows, stats.chunks, stats.failed_chunks), (11, 11, 6, 0))
+        self.assertEqual(sorted(rows), sorted(f"id-{index}" for index in range(11)))
+        self.assertEqual(rows["id-10"]["data"], '{"note": "a, \\"b\\"\\nc"}')
+        self.assertEqual(client.max_concurrency, 3)
+        self.assertLess(stats.compressed_bytes, stats.raw_bytes)
+
+    def test_throttled_chunks_are_retried(self):
+        """Test throttling is retried and a rejected chunk is counted without stopping the run"""
+        client = self.client(throttle_rate=0.3, seed=7)
+
+        stats = self.ingest(client)
+
+        self.assertEqual(stats.rows, 11)
+        self.assertGreater(client.throttled_count, 0)
+
+        client = self.client(fail_commands={r"^\.ingest": "Stream_WrongDataFormat"})
+        with self.assertLogs(level="ERROR"):
+            stats = self.ingest(client)
+        self.assertEqual((stats.chunks, stats.failed_chunks), (0, 6))
+
+    def test_retried_and_rerun_chunks_are_ingested_once(self):
+        """Test a chunk retried after it was ingested, or ingested by an earlier run, is skipped"""
+        client = self.client()
+        fake_sink = FakeIngestSink(client, self.database)
+        failed = set()
+
+        def sink(table_name, chunk):
+            # The upload lands but the call fails, as a dropped connection would
+            fake_sink(table_name, chunk)
+            if chunk.index not in failed:
+                failed.add(chunk.index)
+                raise ConnectionError("Connection reset by peer")
+
+        scheduler = CommandScheduler(max_concurrency=2, sleep=Mock(), seed=1)
+        stats = run_ingest([self.path], sink, chunk_rows=2, max_parallel=2, scheduler=scheduler)
+        self.ingest(client)
+
+        ingested = client.database(self.database).ingested_rows["AIORawData"]
+        self.assertEqual(stats.chunks, 6)
+        self.assertEqual(sorted(row["id"] for row in ingested), sorted(f"id-{index}" for index in range(11)))
+
+        # The same rows in chunks of another size are new chunks
+        run_ingest([self.path], FakeIngestSink(client, self.database), chunk_rows=4, max_parallel=2)
+        self.assertEqual(len(client.database(self.database).ingested_rows["AIORawData"]), 22)
+
+    def test_authentication_error_stops_the_run(self):
+        """Test an authentication error is raised instead of failing every chunk"""
+        sink = Mock(side_effect=Exception("authentication failed"))
+
+        with self.assertRaises(Exception):
+            run_ingest([self.path], sink, chunk_rows=2, max_parallel=2)
+
+        self.assertLess(sink.call_count, 6)
+
+    def test_directory_sink(self):
+        """Test chunks are written as gzip CSV files named after their source"""
+        output_dir = os.path.join(self.root, "out")
+
+        run_ingest([self.path], DirectorySink(output_dir), chunk_rows=4, max_parallel=2)
+
+        names = sorted(os.listdir(os.path.join(output_dir, "AIORawData")))
+        self.assertEqual(names, [f"dump.jsonl-0000{index}.csv.gz" for index in range(3)])
+        with gzip.open(os.path.join(output_dir, "AIORawData", names[0]), "rt", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([len(row) for row in rows], [14] * 4)
+
+    def test_queued_ingest_sink(self):
+        """Test the ingestion URI and the guidance when azure-kusto-ingest is missing"""
+        self.assertEqual(ingestion_uri("https://abc.z1.kusto.fabric.microsoft.com/"),
+                         "https://ingest-abc.z1.kusto.fabric.microsoft.com")
+        self.assertEqual(ingestion_uri("https://ingest-abc.kusto.windows.net"), "https://ingest-abc.kusto.windows.net")
+
+        ingest_module = Mock()
+        with patch.dict(sys.modules, {"azure.kusto.ingest": ingest_module}):
+            sink = QueuedIngestSink("https://abc.kusto.windows.net", "db", client=Mock())
+            chunk = build_chunk("dump.jsonl", 3, [["a"]])
+            sink("AIORawData", chunk)
+        properties = ingest_module.IngestionProperties.call_args.kwargs
+        self.assertEqual(chunk.key, f"ingest:dump.jsonl-00003:{chunk.digest}")
+        self.assertEqual((properties["ingest_by_tags"], properties["ingest_if_not_exists"]), ([chunk.key], [chunk.key]))
+        sink.client.ingest_from_stream.assert_called_once()
+
+        with patch.dict(sys.modules, {"azure.kusto.ingest": None}):
+            with self.assertRaises(ImportError) as context:
+                QueuedIngestSink("https://abc.kusto.windows.net", "db", client=Mock())
+        self.assertIn("pip install azure-kusto-ingest", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.database_state import DatabaseSnapshot
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.ingestion_profiles import (
+    INGESTION_PROFILES,
+    build_ingestion_batching_policy_command,
+    compile_ingestion_policy_commands,
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import TypeMapping
+
+
+class TestIngestionProfiles(unittest.TestCase):
+    """Test cases for the ingestion policy builders"""
+
+    def test_compile_ingestion_policy_commands(self):
+        """Test a profile compiles to its streaming and batching policy commands"""
+        commands = compile_ingestion_policy_commands("AIORawData", "realtime")
+
+        self.assertEqual([(c.kind, c.target) for c in commands], [("policy", "AIORawData")] * 2)
+        self.assertEqual(commands[0].text, ".alter table AIORawData policy streamingingestion enable")
+        self.assertEqual(commands[1].text, build_ingestion_batching_policy_command(
+            "AIORawData", INGESTION_PROFILES["realtime"].batching_policy()))
+        self.assertIn('"MaximumBatchingTimeSpan":"00:00:10"', commands[1].text)
+        self.assertTrue(compile_ingestion_policy_commands("T", "bulk")[0].text.endswith("streamingingestion disable"))
+
+    def test_unknown_profile(self):
+        """Test an unknown profile is rejected by the builders and the manager"""
+        with self.assertRaises(ValueError):
+            compile_ingestion_policy_commands("T", "instant")
+        with self.assertRaises(ValueError):
+            EventhouseManager("cluster", "database", ingestion_profile="instant")
+
+    def test_snapshot_policy_matching(self):
+        """Test a table without its own policy never matches, as it inherits the database policy"""
+        batching = INGESTION_PROFILES["balanced"].batching_policy()
+        snapshot = DatabaseSnapshot(
+            tables={"T": {}, "U": {}},
+            streaming_ingestion_policies={"T": {"IsEnabled": False, "HintAllocatedRate": None}},
+            ingestion_batching_policies={"T": dict(batching)},
+        )
+
+        self.assertTrue(snapshot.streaming_ingestion_matches("T", False))
+        self.assertFalse(snapshot.streaming_ingestion_matches("T", True))
+        self.assertFalse(snapshot.streaming_ingestion_matches("U", False))
+        self.assertTrue(snapshot.ingestion_batching_matches("T", batching))
+        self.assertFalse(snapshot.ingestion_batching_matches("T", INGESTION_PROFILES["bulk"].batching_policy()))
+        self.assertFalse(snapshot.ingestion_batching_matches("U", batching))
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={"ref1": TypeMapping("ref1", "Test", "Entity")}))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]}
+       ]))
+class TestIngestionProfileProvisioning(unittest.TestCase):
+    """Test cases for applying ingestion profiles against the fake Kusto backend"""
+
+    def setUp(self):
+        self.cluster_url = "https://test-cluster.kusto.windows.net"
+        self.database = "test_database"
+
+    def setup(self, client, **options):
+        manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False, **options)
+        manager.client = client
+        return manager.setup_tables_from_input(yaml_file="test.yaml")
+
+    def test_profile_applied_to_every_table(self):
+        """Test that step-by-step, parallel and batched setups set the policies on all tables"""
+        for options in ({}, {"max_parallel": 2}, {"batch": True}, {"routing": True}):
+            client = FakeKustoClient()
+            self.assertTrue(self.setup(client, ingestion_profile="realtime", **options), options)
+
+            db = client.database(self.database)
+            tables = ["AIORawData", "Test_Entity"] + (["AIORoutedData"] if options.get("routing") else [])
+            for table in tables:
+                self.assertEqual(db.streaming_ingestion_policies[table]["IsEnabled"], True, (options, table))
+                self.assertEqual(db.ingestion_batching_policies[table]["MaximumBatchingTimeSpan"], "00:00:10")
+
+    def test_no_profile_sets_no_policies(self):
+        """Test that without a profile no ingestion policy command is sent"""
+        client = FakeKustoClient()
+        self.assertTrue(self.setup(client))
+
+        self.assertFalse(any("streamingingestion" in query or "ingestionbatching" in query
+                             for _, query in client.requests))
+
+    def test_incremental_profile_changes(self):
+        """Test an incremental rerun only sends the policies that differ from the database"""
+        client = FakeKustoClient()
+        self.assertTrue(self.setup(client, ingestion_profile="realtime"))
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, ingestion_profile="realtime", incremental=True))
+        self.assertEqual(len(client.requests) - requests, 4)
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, ingestion_profile="balanced", incremental=True))
+        changes = [query for _, query in client.requests[requests + 4:]]
+        self.assertEqual(len(changes), 4)
+        self.assertEqual(sum("streamingingestion disable" in query for query in changes), 2)
+        db = client.database(self.database)
+        self.assertEqual(db.ingestion_batching_policies["Test_Entity"]["MaximumBatchingTimeSpan"], "00:00:30")
+
+    def test_failed_policy_fails_the_table(self):
+        """Test that a rejected ingestion policy fails the table but its update policy is still set"""
+        client = FakeKustoClient(fail_commands={r"Test_Entity policy streamingingestion": "Forbidden"})
+
+        self.assertFalse(self.setup(client, ingestion_profile="realtime", max_retries=0))
+        self.assertIn("Test_Entity", client.database(self.database).update_policies)
+
+
+if __name__ == '__main__':
+    unittest.main()
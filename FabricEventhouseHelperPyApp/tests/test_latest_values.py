@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.database_state import DatabaseSnapshot
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.latest_values import (
+    LATEST_VALUES_FUNCTION,
+    build_latest_values_function_body,
+    build_latest_view_query,
+    compile_latest_values_function_commands,
+    compile_latest_view_commands,
+    parse_latest_values,
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, parse_columns
+
+
+def entity_mapping(table_name, latest_values=True, fields=("prop1:string", "Identifier:string", "Timestamp:datetime")):
+    return EntityMapping("ref", table_name, parse_columns(fields), latest_values=latest_values)
+
+
+class TestLatestValues(unittest.TestCase):
+    """Test cases for the last-known-value view builders"""
+
+    def test_parse_latest_values(self):
+        """Test only booleans are accepted"""
+        self.assertTrue(parse_latest_values(True))
+        self.assertFalse(parse_latest_values(False))
+        for invalid in ("yes", 1, None):
+            with self.assertRaises(ValueError, msg=invalid):
+                parse_latest_values(invalid)
+
+    def test_view_commands(self):
+        """Test views are only declared for mappings that ask for one and have the key columns"""
+        commands = compile_latest_view_commands(entity_mapping("T"))
+
+        self.assertEqual([(c.kind, c.target) for c in commands], [("view", "T")])
+        self.assertTrue(commands[0].text.startswith(
+            ".create ifnotexists materialized-view with (backfill=true, autoUpdateSchema=true) T_Latest on table T"))
+        self.assertIn("T | summarize arg_max(Timestamp, *) by Identifier", commands[0].text)
+        self.assertEqual(compile_latest_view_commands(entity_mapping("T", latest_values=False)), [])
+        self.assertEqual(compile_latest_view_commands(entity_mapping("T", fields=["prop1:string"])), [])
+
+    def test_view_diff(self):
+        """Test existing views are left alone, altered when their query differs"""
+        snapshot = DatabaseSnapshot(materialized_views={
+            "T_Latest": {"SourceTable": "T", "Query": build_latest_view_query("T")},
+            "U_Latest": {"SourceTable": "U", "Query": "U | summarize take_any(*) by Identifier"},
+        })
+
+        self.assertEqual(compile_latest_view_commands(entity_mapping("T"), snapshot), [])
+        commands = compile_latest_view_commands(entity_mapping("U"), snapshot)
+        self.assertTrue(commands[0].text.startswith(".alter materialized-view U_Latest on table U"))
+        self.assertTrue(compile_latest_view_commands(entity_mapping("V"), snapshot)[0].text.startswith(".create"))
+
+    def test_latest_values_function(self):
+        """Test the function unions the views of the declaring mappings only"""
+        mappings = [entity_mapping("A"), entity_mapping("B", latest_values=False), entity_mapping("C")]
+
+        commands = compile_latest_values_function_commands(mappings)
+        self.assertEqual([(c.kind, c.target) for c in commands], [("view", LATEST_VALUES_FUNCTION)])
+        self.assertIn("union withsource=EntityTable A_Latest, C_Latest", commands[0].text)
+        self.assertIn('skipvalidation="true"', commands[0].text)
+        self.assertEqual(compile_latest_values_function_commands(mappings[1:2]), [])
+
+        snapshot = DatabaseSnapshot(functions={LATEST_VALUES_FUNCTION: build_latest_values_function_body(["A", "C"])})
+        self.assertEqual(compile_latest_values_function_commands(mappings, snapshot), [])
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "TimeseriesProperties": [{"name": "temp", "valueType": "Number"}]}
+       ]))
+class TestLatestValueProvisioning(unittest.TestCase):
+    """Test cases for last-known-value views provisioned against the fake Kusto backend"""
+
+    def setUp(self):
+        self.database = "test_database"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def write_yaml(self, other_latest_values="false"):
+        path = os.path.join(self.temp_dir.name, "mappings.yaml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("latest_values: true\n"
+                    "type_mappings:\n"
+                    "  - typeRef: ref1\n"
+                    "    namespace: Test\n"
+                    "    entity_name: Entity\n"
+                    "  - typeRef: ref2\n"
+                    "    namespace: Test\n"
+                    "    entity_name: Other\n"
+                    f"    latest_values: {other_latest_values}\n")
+        return path
+
+    def setup(self, client, yaml_file, **options):
+        manager = EventhouseManager("https://test-cluster", self.database, definitions_cache=False, **options)
+        manager.client = client
+        return manager.setup_tables_from_input(yaml_file=yaml_file)
+
+    def test_yaml_default_and_override(self):
+        """Test the top-level default applies unless a mapping turns it off"""
+        manager = EventhouseManager("local", "local", definitions_cache=False)
+
+        mappings = {m.table_name: m for m in manager.resolve_entity_mappings(yaml_file=self.write_yaml())}
+
+        self.assertTrue(mappings["Test_Entity"].latest_values)
+        self.assertFalse(mappings["Test_Other"].latest_values)
+        self.assertEqual(manager.resolve_entity_mappings(yaml_file=self.write_yaml("sometimes"))[0].table_name,
+                         "Test_Entity")
+
+    def test_views_provisioned_in_every_mode(self):
+        """Test step-by-step, parallel and batched setups create the views and the function"""
+        yaml_file = self.write_yaml()
+        for options in ({}, {"max_parallel": 2}, {"batch": True}):
+            client = FakeKustoClient()
+            self.assertTrue(self.setup(client, yaml_file, **options), options)
+
+            db = client.database(self.database)
+            self.assertEqual(db.materialized_views["Test_Entity_Latest"]["SourceTable"], "Test_Entity", options)
+            self.assertTrue(db.materialized_views["Test_Entity_Latest"]["AutoUpdateSchema"], options)
+            self.assertNotIn("Test_Other_Latest", db.materialized_views, options)
+            self.assertIn("union withsource=EntityTable Test_Entity_Latest\n",
+                          db.functions[LATEST_VALUES_FUNCTION]["Body"], options)
+
+    def test_incremental_rerun_adds_new_views(self):
+        """Test an unchanged rerun sends nothing and a newly declared view is added to the function"""
+        client = FakeKustoClient()
+        self.assertTrue(self.setup(client, self.write_yaml()))
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, self.write_yaml(), incremental=True))
+        self.assertEqual(len(client.requests) - requests, 2)
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, self.write_yaml("true"), incremental=True))
+        changes = [query.split("\n", 1)[0] for _, query in client.requests[requests + 2:]]
+        self.assertEqual(len(changes), 2)
+        self.assertTrue(changes[0].startswith(".create ifnotexists materialized-view"))
+        self.assertIn("Test_Other_Latest on table Test_Other", changes[0])
+        self.assertIn(LATEST_VALUES_FUNCTION, changes[1])
+        self.assertIn("Test_Entity_Latest, Test_Other_Latest",
+                      client.database(self.database).functions[LATEST_VALUES_FUNCTION]["Body"])
+
+    def test_failed_view_fails_the_table(self):
+        """Test that a rejected view fails its table but the table is still fed"""
+        client = FakeKustoClient(fail_commands={r"materialized-view": "Materialized views are not supported"})
+
+        self.assertFalse(self.setup(client, self.write_yaml(), max_retries=0))
+        self.assertIn("Test_Entity", client.database(self.database).update_policies)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from digitaloperations.fabriceventhousehelperpyapp.local_transform import (
+    JsonlTableWriter, LocalTransform, parse_kusto_datetime, read_jsonl_batches, read_raw_batches
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, parse_columns
+
+
+ENTITY_MAPPINGS = [EntityMapping("opcfoundation.org/UA/Pumps;i=1043", "Test_Pump", parse_columns(
+    ["Speed:double", "Running:boolean", "Name:string", "Identifier:string", "Timestamp:datetime"]))]
+
+
+def raw_record(subject, fields, type_="nsu=http://opcfoundation.org/UA/Pumps;i=1043"):
+    """Build an AIORawData record whose data holds {name: (value, server timestamp)}"""
+    return {"type": type_, "subject": subject, "data": json.dumps({
+        name: {"Value": value, "ServerTimestamp": timestamp} for name, (value, timestamp) in fields.items()
+    })}
+
+
+def to_batch(records):
+    """Turn records into a column batch"""
+    return {column: [record.get(column) for record in records] for column in ("type", "subject", "data")}
+
+
+class TestParseKustoDatetime(unittest.TestCase):
+    """Test cases for todatetime() emulation"""
+
+    def test_parse_formats(self):
+        """Test ISO 8601 variants, 100ns fractions and offsets"""
+        expected = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.assertEqual(parse_kusto_datetime("2024-05-01T12:30:15.1234567Z"), expected)
+        self.assertEqual(parse_kusto_datetime("2024-05-01T14:30:15.123456+02:00"), expected)
+        self.assertEqual(parse_kusto_datetime("2024-05-01"), datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+    def test_parse_invalid(self):
+        """Test values that are not dates become null"""
+        self.assertIsNone(parse_kusto_datetime("yesterday"))
+        self.assertIsNone(parse_kusto_datetime("2024-13-01"))
+        self.assertIsNone(parse_kusto_datetime(None))
+
+
+class TestLocalTransform(unittest.TestCase):
+    """Test cases for the local MoveDataByType replica"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.transform = LocalTransform(ENTITY_MAPPINGS)
+
+    def test_pivot_by_identifier_and_timestamp(self):
+        """Test fields are pivoted into one row per Identifier and ServerTimestamp"""
+        t1, t2 = "2024-05-01T00:00:00Z", "2024-05-01T00:00:01Z"
+        batch = to_batch([
+            raw_record("pump1/line/a", {"Speed": (10.5, t1), "Running": (True, t1)}),
+            raw_record("pump1/line/b", {"Name": ("P-1", t1)}),
+            raw_record("pump1", {"Speed": ("11", t2)}),
+            raw_record("pump2", {"Speed": (3, t1)}),
+        ])
+
+        output = self.transform.transform_batch(batch)["Test_Pump"]
+
+        rows = list(zip(*output.values()))
+        self.assertEqual(list(output), ["Speed", "Running", "Name", "Identifier", "Timestamp"])
+        self.assertEqual(rows, [
+            (10.5, True, "P-1", "pump1", parse_kusto_datetime(t1)),
+            (11.0, None, None, "pump1", parse_kusto_datetime(t2)),
+            (3.0, None, None, "pump2", parse_kusto_datetime(t1)),
+        ])
+
+    def test_type_filter_is_case_insensitive_endswith(self):
+        """Test only records whose type ends with the type reference are transformed"""
+        batch = to_batch([
+            raw_record("pump1", {"Speed": (1, "2024-05-01T00:00:00Z")}, type_="X:OPCFOUNDATION.ORG/UA/PUMPS;I=1043"),
+            raw_record("pump1", {"Speed": (1, "2024-05-01T00:00:00Z")}, type_="opcfoundation.org/UA/Pumps;i=10430"),
+        ])
+        transform_stats = self.transform.run([batch])
+
+        self.assertEqual(transform_stats.raw_rows, 2)
+        self.assertEqual(transform_stats.matched_rows, 1)
+        self.assertEqual(transform_stats.output_rows, {"Test_Pump": 1})
+
+    def test_invalid_data_and_unknown_columns(self):
+        """Test rows without telemetry are dropped and keys outside the schema are reported"""
+        batch = to_batch([
+            {"type": ENTITY_MAPPINGS[0].type_ref, "subject": "pump1", "data": "not json"},
+            {"type": ENTITY_MAPPINGS[0].type_ref, "subject": "pump1", "data": "{}"},
+            raw_record("pump1", {"Extra": (1, "2024-05-01T00:00:00Z")}),
+        ])
+        transform_stats = self.transform.run([batch])
+
+        self.assertEqual(transform_stats.invalid_rows, 2)
+        self.assertEqual(transform_stats.to_dict()["unknown_columns"], {"Test_Pump": ["Extra"]})
+
+    def test_jsonl_round_trip(self):
+        """Test JSON Lines input is read in batches and output is written per table"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            input_file = os.path.join(temp_dir, "raw.jsonl")
+            with open(input_file, 'w') as f:
+                for index in range(5):
+                    f.write(json.dumps(raw_record(f"pump{index}", {"Speed": (index, "2024-05-01T00:00:00Z")})) + "\n")
+            self.assertEqual([len(batch["type"]) for batch in read_jsonl_batches(input_file, batch_size=2)], [2, 2, 1])
+
+            output_dir = os.path.join(temp_dir, "out")
+            with JsonlTableWriter(output_dir) as writer:
+                transform_stats = self.transform.run(read_raw_batches(input_file, batch_size=2), writer)
+
+            self.assertEqual(transform_stats.output_rows, {"Test_Pump": 5})
+            with open(os.path.join(output_dir, "Test_Pump.jsonl")) as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(rows[0], {"Speed": 0.0, "Running": None, "Name": None, "Identifier": "pump0",
+                                       "Timestamp": "2024-05-01T00:00:00Z"})
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 
 import unittest
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, patch
 from io import StringIO
-from digitaloperations.fabriceventhousehelperpyapp.main import setup_eventhouse, main
+from digitaloperations.fabriceventhousehelperpyapp.main import setup_eventhouse, setup_targets, main
+
+
+# Options passed by main() when no optional setup-eventhouse flags are given
+DEFAULT_MANAGER_OPTIONS = {
+    "max_parallel": 1,
+    "batch": False,
+    "incremental": False,
+    "evolve": False,
+    "definitions_cache": True,
+    "specialized_transforms": False,
+    "routing": False,
+    "type_ref_expression": None,
+    "token_cache": True,
+    "max_retries": 5,
+    "ingestion_profile": None,
+}
+# Options setup_eventhouse() handles itself instead of passing them to EventhouseManager
+DEFAULT_SETUP_OPTIONS = {
+    **DEFAULT_MANAGER_OPTIONS,
+    "metrics_out": None,
+    "otel_spans": False,
+}
 
 
 class TestMainFunctions(unittest.TestCase):
     """Test cases for main.py functions"""
     
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('builtins.print')
     def test_setup_eventhouse_with_yaml_success(self, mock_print, mock_manager_class):
         """Test successful setup with YAML file"""
@@ -20,10 +43,10 @@ class TestMainFunctions(unittest.TestCase):
         result = setup_eventhouse("test_db", "test_cluster", "test.log", yaml_file="test.yaml")
         
         self.assertTrue(result)
-        mock_manager_class.assert_called_once_with("test_cluster", "test_db", "test.log", False)
+        mock_manager_class.assert_called_once_with("test_cluster", "test_db", "test.log", False, **DEFAULT_MANAGER_OPTIONS)
         mock_manager.setup_tables_from_input.assert_called_once_with(None, "test.yaml")
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('builtins.print')
     def test_setup_eventhouse_with_type_mappings_success(self, mock_print, mock_manager_class):
         """Test successful setup with type mappings"""
@@ -37,7 +60,7 @@ class TestMainFunctions(unittest.TestCase):
         self.assertTrue(result)
         mock_manager.setup_tables_from_input.assert_called_once_with(type_mappings, None)
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('builtins.print')
     def test_setup_eventhouse_failure(self, mock_print, mock_manager_class):
         """Test setup failure"""
@@ -49,7 +72,43 @@ class TestMainFunctions(unittest.TestCase):
         
         self.assertFalse(result)
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
+    @patch('builtins.print')
+    def test_setup_eventhouse_writes_metrics_report(self, mock_print, mock_manager_class):
+        """Test that the run report is written even when the setup fails"""
+        mock_manager = Mock()
+        mock_manager_class.return_value = mock_manager
+        mock_manager.setup_tables_from_input.return_value = False
+        mock_manager.scheduler.stats.return_value = {"retries": 0}
+        
+        result = setup_eventhouse("test_db", "test_cluster", "test.log", yaml_file="test.yaml",
+                                  metrics_out="run.json")
+        
+        self.assertFalse(result)
+        mock_manager.metrics.write.assert_called_once()
+        args, kwargs = mock_manager.metrics.write.call_args
+        self.assertEqual(args, ("run.json",))
+        self.assertEqual((kwargs["cluster"], kwargs["success"], kwargs["scheduler"]),
+                         ("test_cluster", False, {"retries": 0}))
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.OpenTelemetrySpanExporter',
+           Mock(side_effect=ImportError("No module named 'opentelemetry'")))
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
+    @patch('builtins.print')
+    def test_setup_eventhouse_otel_spans_without_opentelemetry(self, mock_print, mock_manager_class):
+        """Test that a missing opentelemetry-api only disables span export"""
+        mock_manager = Mock()
+        mock_manager_class.return_value = mock_manager
+        mock_manager.metrics.exporters = []
+        mock_manager.setup_tables_from_input.return_value = True
+        
+        with self.assertLogs(level="WARNING"):
+            result = setup_eventhouse("test_db", "test_cluster", "test.log", yaml_file="test.yaml", otel_spans=True)
+        
+        self.assertTrue(result)
+        self.assertEqual(mock_manager.metrics.exporters, [])
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.logging')
     @patch('builtins.print')
     def test_setup_eventhouse_authentication_error(self, mock_print, mock_logging, mock_manager_class):
@@ -64,7 +123,7 @@ class TestMainFunctions(unittest.TestCase):
         mock_print.assert_any_call("\n🔧 To fix this:")
         mock_print.assert_any_call("   1. Run: az login")
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.logging')
     @patch('builtins.print')
     def test_setup_eventhouse_credential_error(self, mock_print, mock_logging, mock_manager_class):
@@ -78,7 +137,7 @@ class TestMainFunctions(unittest.TestCase):
         mock_print.assert_any_call("❌ Authentication failed: Invalid credentials provided")
         mock_print.assert_any_call("\n🔧 To fix this:")
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.logging')
     @patch('builtins.print')
     def test_setup_eventhouse_generic_error(self, mock_print, mock_logging, mock_manager_class):
@@ -92,7 +151,7 @@ class TestMainFunctions(unittest.TestCase):
         mock_print.assert_any_call("❌ Setup failed with error: Network timeout error")
         mock_print.assert_any_call("💡 Check the log file for detailed error information.")
         
-    @patch('digitaloperations.fabriceventhousehelperpyapp.main.EventhouseManager')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
     @patch('builtins.print')
     def test_setup_eventhouse_keyboard_interrupt(self, mock_print, mock_manager_class):
         """Test setup with keyboard interrupt"""
@@ -123,7 +182,7 @@ class TestMainFunctions(unittest.TestCase):
         main()
             
         mock_setup.assert_called_once_with('test-db', 'test-cluster', 'test.log',
-                                           None, 'test.yaml', False)
+                                           None, 'test.yaml', False, **DEFAULT_SETUP_OPTIONS)
         
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
     @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster', 
@@ -138,7 +197,7 @@ class TestMainFunctions(unittest.TestCase):
             
         expected_mappings = ['{"typeRef": "test", "namespace": "Test", "entity_name": "Entity"}']
         mock_setup.assert_called_once_with('test-db', 'test-cluster', 'test.log', 
-                                           expected_mappings, None, False)
+                                           expected_mappings, None, False, **DEFAULT_SETUP_OPTIONS)
         
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
     @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster', 
@@ -220,7 +279,7 @@ class TestMainFunctions(unittest.TestCase):
             '{"typeRef": "ref2", "namespace": "NS2", "entity_name": "Entity2"}'
         ]
         mock_setup.assert_called_once_with('test-db', 'test-cluster', 'test.log',
-                                           expected_mappings, None, False)
+                                           expected_mappings, None, False, **DEFAULT_SETUP_OPTIONS)
         
     @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
     @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster', 
@@ -237,7 +296,265 @@ class TestMainFunctions(unittest.TestCase):
         # Both should be passed to setup function
         expected_mappings = ['{"typeRef": "test", "namespace": "Test", "entity_name": "Entity"}']
         mock_setup.assert_called_once_with('test-db', 'test-cluster', 'test.log',
-                                           expected_mappings, 'test.yaml', False)
+                                           expected_mappings, 'test.yaml', False, **DEFAULT_SETUP_OPTIONS)
+
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml',
+                        '--max-parallel', '8'])
+    def test_main_max_parallel(self, mock_setup):
+        """Test main function passes --max-parallel through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None,
+                                           None, 'test.yaml', False, **{**DEFAULT_SETUP_OPTIONS, "max_parallel": 8})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--batch'])
+    def test_main_batch(self, mock_setup):
+        """Test main function passes --batch through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None,
+                                           None, 'test.yaml', False, **{**DEFAULT_SETUP_OPTIONS, "batch": True})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--incremental'])
+    def test_main_incremental(self, mock_setup):
+        """Test main function passes --incremental through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None,
+                                           None, 'test.yaml', False, **{**DEFAULT_SETUP_OPTIONS, "incremental": True})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--evolve'])
+    def test_main_evolve(self, mock_setup):
+        """Test main function passes --evolve through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None,
+                                           None, 'test.yaml', False, **{**DEFAULT_SETUP_OPTIONS, "evolve": True})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--routing',
+                        '--type-ref-expression', 'tostring(split(type, ":")[-1])'])
+    def test_main_routing(self, mock_setup):
+        """Test main function passes --routing and --type-ref-expression through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, None, 'test.yaml', False,
+                                           **{**DEFAULT_SETUP_OPTIONS, "routing": True,
+                                              "type_ref_expression": 'tostring(split(type, ":")[-1])'})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--ingestion-profile', 'realtime'])
+    def test_main_ingestion_profile(self, mock_setup):
+        """Test main function passes --ingestion-profile through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, None, 'test.yaml', False,
+                                           **{**DEFAULT_SETUP_OPTIONS, "ingestion_profile": "realtime"})
+        
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--ingestion-profile', 'instant'])
+    def test_main_invalid_ingestion_profile(self):
+        """Test main function rejects an unknown --ingestion-profile"""
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit) as context:
+                main()
+        
+        self.assertEqual(context.exception.code, 2)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--no-token-cache'])
+    def test_main_no_token_cache(self, mock_setup):
+        """Test main function passes --no-token-cache through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, None, 'test.yaml', False,
+                                           **{**DEFAULT_SETUP_OPTIONS, "token_cache": False})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml', '--max-retries', '0'])
+    def test_main_max_retries(self, mock_setup):
+        """Test main function passes --max-retries through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, None, 'test.yaml', False,
+                                           **{**DEFAULT_SETUP_OPTIONS, "max_retries": 0})
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml',
+                        '--metrics-out', 'run.json', '--otel-spans'])
+    def test_main_metrics_out(self, mock_setup):
+        """Test main function passes --metrics-out and --otel-spans through"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, None, 'test.yaml', False,
+                                           **{**DEFAULT_SETUP_OPTIONS, "metrics_out": "run.json",
+                                              "otel_spans": True})
+        
+    @patch('sys.argv', ['main.py', 'setup-eventhouse', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--yaml-file', 'test.yaml',
+                        '--max-parallel', '0'])
+    def test_main_invalid_max_parallel(self):
+        """Test main function rejects a non-positive --max-parallel"""
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit) as context:
+                main()
+        
+        self.assertEqual(context.exception.code, 2)
+
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.write_plan')
+    @patch('sys.argv', ['main.py', 'plan', '--yaml-file', 'test.yaml', '--routing', '--out', 'plans'])
+    def test_main_plan(self, mock_write_plan):
+        """Test main function dispatches the plan command"""
+        mock_write_plan.return_value = True
+        
+        main()
+        
+        mock_write_plan.assert_called_once_with('plans', None, None, 'test.yaml', False, definitions_cache=True,
+                                                specialized_transforms=False, routing=True, type_ref_expression=None,
+                                                ingestion_profile=None)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_eventhouse')
+    @patch('sys.argv', ['main.py', 'apply', '--plan', 'plan.json', '--cluster', 'test-cluster',
+                        '--database', 'test-db', '--batch'])
+    def test_main_apply(self, mock_setup):
+        """Test main function applies a plan through setup_eventhouse"""
+        mock_setup.return_value = True
+        
+        main()
+        
+        mock_setup.assert_called_once_with('test-db', 'test-cluster', None, verbose=False, max_parallel=1, batch=True,
+                                           incremental=False, evolve=False, token_cache=True, max_retries=5,
+                                           metrics_out=None, otel_spans=False, plan_file='plan.json')
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.ProvisioningPlan')
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
+    @patch('builtins.print')
+    def test_setup_eventhouse_applies_plan(self, mock_print, mock_manager_class, mock_plan_class):
+        """Test that a plan file is loaded and applied instead of input mappings"""
+        mock_manager = Mock()
+        mock_manager_class.return_value = mock_manager
+        mock_manager.apply_plan.return_value = True
+        
+        result = setup_eventhouse("test_db", "test_cluster", None, plan_file="plan.json")
+        
+        self.assertTrue(result)
+        mock_plan_class.load.assert_called_once_with("plan.json")
+        mock_manager.apply_plan.assert_called_once_with(mock_plan_class.load.return_value)
+        mock_manager.setup_tables_from_input.assert_not_called()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
+    @patch('builtins.print')
+    def test_setup_eventhouse_missing_plan(self, mock_print, mock_manager_class):
+        """Test that an unreadable plan file fails before connecting"""
+        result = setup_eventhouse("test_db", "test_cluster", None, plan_file="missing-plan.json")
+        
+        self.assertFalse(result)
+        mock_manager_class.assert_not_called()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.setup_targets')
+    @patch('sys.argv', ['main.py', 'fanout', '--targets', 'targets.yaml', '--yaml-file', 'test.yaml',
+                        '--parallel-targets', '8', '--report', 'report.json'])
+    def test_main_fanout(self, mock_setup_targets):
+        """Test main function dispatches the fanout command"""
+        mock_setup_targets.return_value = True
+        
+        main()
+        
+        mock_setup_targets.assert_called_once_with('targets.yaml', None, None, 'test.yaml', False, plan_file=None,
+                                                   parallel_targets=8, report='report.json', max_parallel=1,
+                                                   batch=False, incremental=False, evolve=False,
+                                                   definitions_cache=True,
+                                                   specialized_transforms=False, routing=False,
+                                                   type_ref_expression=None, token_cache=True, max_retries=5,
+                                                   ingestion_profile=None)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager')
+    @patch('builtins.print')
+    def test_setup_targets_missing_targets_file(self, mock_print, mock_manager_class):
+        """Test that an unreadable targets file fails before any manager is created"""
+        result = setup_targets("missing-targets.yaml", yaml_file="test.yaml")
+        
+        self.assertFalse(result)
+        mock_manager_class.assert_not_called()
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.run_local_transform')
+    @patch('sys.argv', ['main.py', 'transform-local', '--input', 'raw.jsonl', '--yaml-file', 'test.yaml',
+                        '--output-dir', 'out'])
+    def test_main_transform_local(self, mock_transform):
+        """Test main function dispatches the transform-local command"""
+        mock_transform.return_value = True
+        
+        main()
+        
+        mock_transform.assert_called_once_with(['raw.jsonl'], None, None, 'test.yaml', output_dir='out',
+                                               batch_size=100000, verbose=False)
+        
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.backfill_eventhouse')
+    @patch('sys.argv', ['main.py', 'backfill', '--cluster', 'test-cluster', '--database', 'test-db',
+                        '--yaml-file', 'test.yaml', '--start', '2024-05-01', '--slice', '6h', '--max-parallel', '4'])
+    def test_main_backfill(self, mock_backfill):
+        """Test main function parses the backfill range and slice"""
+        mock_backfill.return_value = True
+        
+        main()
+        
+        mock_backfill.assert_called_once_with(
+            'test-db', 'test-cluster', None, None, 'test.yaml', False,
+            start=datetime(2024, 5, 1, tzinfo=timezone.utc), end=None, slice_size=timedelta(hours=6),
+            checkpoint=None, max_parallel=4, token_cache=True, max_retries=5, metrics_out=None)
+    
+    @patch('sys.argv', ['main.py', 'backfill', '--cluster', 'test-cluster', '--database', 'test-db',
+                        '--yaml-file', 'test.yaml', '--slice', 'daily'])
+    def test_main_backfill_invalid_slice(self):
+        """Test an invalid --slice is rejected by the parser"""
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit) as context:
+                main()
+        
+        self.assertEqual(context.exception.code, 2)
+    
+    @patch('digitaloperations.fabriceventhousehelperpyapp.main.ingest_raw_data')
+    @patch('sys.argv', ['main.py', 'ingest', '--input', 'raw.jsonl', '--output-dir', 'out'])
+    def test_main_ingest(self, mock_ingest):
+        """Test main function dispatches the ingest command"""
+        mock_ingest.return_value = True
+        
+        main()
+        
+        mock_ingest.assert_called_once_with(['raw.jsonl'], None, None, output_dir='out', table_name='AIORawData',
+                                            chunk_rows=100000, max_parallel=4, compression_level=6,
+                                            ingest_uri=None, max_retries=5)
 
 
 class TestMainExceptionHandling(unittest.TestCase):
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import yaml
+
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.mapping_files import (
+    expand_mapping_paths,
+    load_yaml_files,
+    yaml_safe_loader,
+)
+
+
+def mapping_yaml(*mappings, defaults=""):
+    """YAML text of a mapping file with (typeRef, entity_name) mappings in the Test namespace"""
+    return defaults + "type_mappings:\n" + "".join(
+        f"  - typeRef: {type_ref}\n    namespace: Test\n    entity_name: {entity_name}\n"
+        for type_ref, entity_name in mappings)
+
+
+class MappingFilesTestCase(unittest.TestCase):
+    """Base class writing mapping files to a temporary directory"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.root = self.temp_dir.name
+
+    def write(self, relative_path, text):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+
+class TestMappingFiles(MappingFilesTestCase):
+    """Test cases for discovering and loading mapping files"""
+
+    def test_expand_directory_and_pattern(self):
+        """Test directories yield their YAML files and patterns their matches, both sorted"""
+        second = self.write("line-2/mappings.yml", mapping_yaml())
+        first = self.write("line-1/mappings.yaml", mapping_yaml())
+        self.write("line-1/README.md", "")
+
+        self.assertEqual(expand_mapping_paths(self.root), [first, second])
+        self.assertEqual(expand_mapping_paths(os.path.join(self.root, "**", "*.yaml")), [first])
+        self.assertEqual(expand_mapping_paths(os.path.join(self.root, "*.json")), [])
+        self.assertEqual(expand_mapping_paths("missing.yaml"), ["missing.yaml"])
+
+    def test_load_keeps_path_order_and_reports_errors(self):
+        """Test concurrent loading returns one result per path, in order"""
+        paths = [self.write(f"m{index:02}.yaml", mapping_yaml((f"ref{index}", "Entity"))) for index in range(20)]
+        invalid = self.write("invalid.yaml", "type_mappings: [")
+
+        files = load_yaml_files(paths + [invalid, "missing.yaml"], max_workers=4)
+
+        self.assertEqual([f.path for f in files], paths + [invalid, "missing.yaml"])
+        self.assertEqual([f.data["type_mappings"][0]["typeRef"] for f in files[:20]],
+                         [f"ref{index}" for index in range(20)])
+        self.assertIn("Invalid YAML in", files[20].error)
+        self.assertEqual(files[21].error, "YAML file not found: missing.yaml")
+
+    def test_pure_python_loader_fallback(self):
+        """Test the SafeLoader is used when PyYAML was built without libyaml"""
+        with patch.dict(yaml.__dict__):
+            del yaml.CSafeLoader
+            self.assertIs(yaml_safe_loader(), yaml.SafeLoader)
+            path = self.write("m.yaml", mapping_yaml(("ref1", "Entity")))
+            self.assertEqual(load_yaml_files([path])[0].data["type_mappings"][0]["entity_name"], "Entity")
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "Properties": [{"name": "prop2", "valueType": "Number"}]}
+       ]))
+class TestMultiFileMappings(MappingFilesTestCase):
+    """Test cases for merging mapping files and command line mappings"""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = EventhouseManager("local", "local", definitions_cache=False)
+
+    def test_directory_is_merged_in_path_order(self):
+        """Test each file keeps its own defaults and identical duplicates are accepted"""
+        self.write("b.yaml", mapping_yaml(("ref2", "Other"), ("ref1", "Entity")))
+        self.write("a.yaml", mapping_yaml(("ref1", "Entity"), defaults="latest_values: false\n"))
+        self.write("c/d.yaml", mapping_yaml(("ref3", "Other"), defaults="latest_values: true\n"))
+
+        mappings = self.manager._load_yaml_mappings(self.root)
+
+        self.assertEqual(list(mappings), ["ref1", "ref2", "ref3"])
+        self.assertFalse(mappings["ref2"].latest_values)
+        self.assertTrue(mappings["ref3"].latest_values)
+
+    def test_conflicting_duplicate_fails_the_load(self):
+        """Test a typeRef mapped to two entities is reported with both files"""
+        first = self.write("a.yaml", mapping_yaml(("ref1", "Entity")))
+        second = self.write("b.yaml", mapping_yaml(("ref1", "Other")))
+
+        with self.assertLogs(self.manager.logger, level="ERROR") as logs:
+            self.assertEqual(self.manager._load_yaml_mappings(os.path.join(self.root, "*.yaml")), {})
+
+        self.assertIn(f"'ref1' in {second} (first mapped in {first})", "\n".join(logs.output))
+
+    def test_invalid_file_fails_the_load(self):
+        """Test one unloadable file fails the whole directory"""
+        self.write("a.yaml", mapping_yaml(("ref1", "Entity")))
+        self.write("b.yaml", "targets: []\n")
+
+        with self.assertLogs(self.manager.logger, level="ERROR"):
+            self.assertEqual(self.manager._load_yaml_mappings(self.root), {})
+            self.assertEqual(self.manager._load_yaml_mappings(os.path.join(self.root, "none-*.yaml")), {})
+
+    def test_command_line_overrides_yaml(self):
+        """Test command line mappings replace YAML mappings of the same typeRef and add new ones"""
+        self.write("a.yaml", mapping_yaml(("ref1", "Entity"), ("ref2", "Entity")))
+
+        entity_mappings = self.manager.resolve_entity_mappings(
+            ['{"typeRef": "ref2", "namespace": "Test", "entity_name": "Other"}',
+             '{"typeRef": "ref3", "namespace": "Test", "entity_name": "Other"}'],
+            yaml_file=self.root)
+
+        self.assertEqual([(m.type_ref, m.table_name) for m in entity_mappings],
+                         [("ref1", "Test_Entity"), ("ref2", "Test_Other"), ("ref3", "Test_Other")])
+
+    def test_invalid_yaml_is_not_replaced_by_command_line(self):
+        """Test a failed YAML load fails the run even with command line mappings"""
+        with self.assertLogs(self.manager.logger, level="ERROR"):
+            self.assertIsNone(self.manager.resolve_entity_mappings(
+                ['{"typeRef": "ref1", "namespace": "Test", "entity_name": "Entity"}'],
+                yaml_file=os.path.join(self.root, "missing.yaml")))
+
+
+if __name__ == '__main__':
+    unittest.main()
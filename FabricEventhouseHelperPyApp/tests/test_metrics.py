@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.metrics import (
+    CommandMetric,
+    MetricsRecorder,
+    OpenTelemetrySpanExporter,
+    percentile,
+    summarize_latencies,
+)
+from digitaloperations.fabriceventhousehelperpyapp.models import TypeMapping
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import CommandScheduler
+
+
+def metric(kind="table", latency=0.1, attempts=1, outcome="succeeded"):
+    """Command metric with defaults for the fields a test does not care about"""
+    return CommandMetric(kind, "T", 1_000_000_000, latency, attempts, 10 * attempts, outcome)
+
+
+class TestLatencySummaries(unittest.TestCase):
+    """Test cases for percentiles and histogram buckets"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([3.0], 90), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary_buckets_are_cumulative(self):
+        """Test the histogram counts values at or below each bucket bound"""
+        summary = summarize_latencies([0.003, 0.2, 0.25, 100.0])
+        buckets = {bucket["le"]: bucket["count"] for bucket in summary["buckets"]}
+
+        self.assertEqual((summary["count"], summary["min"], summary["max"]), (4, 0.003, 100.0))
+        self.assertEqual(buckets[0.005], 1)
+        self.assertEqual(buckets[0.25], 3)
+        self.assertEqual(buckets[60.0], 3)
+        self.assertEqual(buckets["+Inf"], 4)
+
+    def test_empty_summary(self):
+        """Test a summary without values"""
+        summary = summarize_latencies([])
+        self.assertEqual(summary["count"], 0)
+        self.assertIsNone(summary["p50"])
+
+
+class TestMetricsRecorder(unittest.TestCase):
+    """Test cases for the metrics recorder and the run report"""
+
+    def test_report_aggregates_by_kind(self):
+        """Test totals, per-kind summaries and phases in the report"""
+        recorder = MetricsRecorder("db")
+        recorder.record(metric("table", 0.1))
+        recorder.record(metric("table", 0.3, attempts=3))
+        recorder.record(metric("policy", 0.2, outcome="permanent"))
+        with recorder.phase("provision"):
+            pass
+
+        report = recorder.report(cluster="https://cluster")
+
+        self.assertEqual(report["cluster"], "https://cluster")
+        self.assertEqual(report["totals"]["commands"], 3)
+        self.assertEqual(report["totals"]["retries"], 2)
+        self.assertEqual(report["totals"]["failed"], 1)
+        self.assertEqual(report["by_kind"]["table"]["latency"]["p99"], 0.3)
+        self.assertEqual(report["by_kind"]["table"]["bytes_sent"], 40)
+        self.assertIn("provision", report["phases"])
+        self.assertEqual(report["commands"][1]["retries"], 2)
+
+    def test_write(self):
+        """Test the report is written as JSON"""
+        recorder = MetricsRecorder("db")
+        recorder.record(metric())
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "run.json")
+            recorder.write(path, success=True)
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+
+        self.assertTrue(report["success"])
+        self.assertEqual(report["totals"]["commands"], 1)
+
+    def test_exporter_errors_are_ignored(self):
+        """Test that a failing exporter does not fail the command"""
+        exporter = Mock()
+        exporter.export.side_effect = RuntimeError("collector down")
+        recorder = MetricsRecorder("db", [exporter])
+
+        recorder.record(metric())
+
+        self.assertEqual(len(recorder.commands), 1)
+
+
+class TestOpenTelemetrySpanExporter(unittest.TestCase):
+    """Test cases for the OpenTelemetry span exporter"""
+
+    def test_export_span(self):
+        """Test a failed command becomes a span with its timing and error type"""
+        tracer = Mock()
+        exporter = OpenTelemetrySpanExporter(tracer)
+
+        exporter.export(metric(latency=0.5, attempts=2, outcome="throttled"), "db")
+
+        name = tracer.start_span.call_args.args[0]
+        kwargs = tracer.start_span.call_args.kwargs
+        self.assertEqual(name, "kusto.mgmt table")
+        self.assertEqual(kwargs["start_time"], 1_000_000_000)
+        self.assertEqual(kwargs["attributes"]["eventhouse.command.retries"], 1)
+        span = tracer.start_span.return_value
+        span.set_attribute.assert_called_once_with("error.type", "throttled")
+        span.end.assert_called_once_with(end_time=1_500_000_000)
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={"ref1": TypeMapping("ref1", "Test", "Entity")}))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]}
+       ]))
+class TestManagerMetrics(unittest.TestCase):
+    """Test cases for the metrics the manager records against the fake Kusto backend"""
+
+    def test_setup_records_every_command(self):
+        """Test that each management command and setup phase is recorded"""
+        client = FakeKustoClient(throttle_rate=0.3, seed=3)
+        manager = EventhouseManager("https://test-cluster.kusto.windows.net", "db", definitions_cache=False)
+        manager.client = client
+        manager.scheduler = CommandScheduler(max_retries=20, sleep=lambda delay: None)
+
+        self.assertTrue(manager.setup_tables_from_input(yaml_file="test.yaml"))
+
+        report = manager.metrics.report()
+        self.assertEqual(report["totals"]["commands"] + report["totals"]["retries"], len(client.requests))
+        self.assertEqual(report["totals"]["retries"], manager.scheduler.stats()["retries"])
+        self.assertEqual(report["by_kind"]["table"]["commands"], 2)
+        self.assertEqual(set(report["phases"]), {"resolve_mappings", "authenticate", "provision"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from digitaloperations.fabriceventhousehelperpyapp.models import Column, EntityMapping, TypeMapping, parse_columns
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import PartitioningSettings, TablePolicies
+
+
+class TestModels(unittest.TestCase):
+    """Test cases for the typed mapping model"""
+
+    def test_parse_column(self):
+        """Test plain and quoted names and invalid specs"""
+        self.assertEqual(Column.parse("prop1:double"), Column("prop1", "double"))
+        self.assertEqual(Column.parse("['a:b']:string"), Column("a:b", "string"))
+        self.assertEqual(Column("a b", "string").spec, "['a b']:string")
+        for invalid in ("prop1", ":string", "prop1:"):
+            with self.assertRaises(ValueError, msg=invalid):
+                Column.parse(invalid)
+
+    def test_entity_mapping_round_trip(self):
+        """Test the dictionary form converts back to an equal mapping"""
+        mapping = EntityMapping("ref", "NS_Entity", parse_columns(["prop1:double", "Identifier:string"]),
+                                TablePolicies("7d", PartitioningSettings(128, "1d")), latest_values=True)
+
+        data = mapping.to_dict()
+
+        self.assertEqual(data["fields"], ["prop1:double", "Identifier:string"])
+        self.assertEqual(EntityMapping.from_dict(data), mapping)
+        self.assertNotIn("policies", mapping._replace(policies=None).to_dict())
+        self.assertEqual(mapping.column_type("Identifier"), "string")
+        self.assertIsNone(mapping.column_type("Timestamp"))
+
+    def test_mappings_are_compact_and_hashable(self):
+        """Test records carry no instance dictionary and duplicates collapse in a set"""
+        mapping = TypeMapping("ref", "NS", "Entity")
+
+        self.assertFalse(hasattr(mapping, "__dict__"))
+        self.assertEqual(mapping.table_name, "NS_Entity")
+        self.assertEqual(len({mapping, TypeMapping("ref", "NS", "Entity")}), 1)
+        self.assertEqual(len({EntityMapping("ref", "T", parse_columns(["a:string"])),
+                              EntityMapping("ref", "T", parse_columns(["a:string"]))}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
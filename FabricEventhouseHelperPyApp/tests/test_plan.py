@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    KIND_FUNCTION,
+    KIND_POLICY,
+    KIND_TABLE,
+    KustoCommand,
+    group_commands_by_target,
+)
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.models import EntityMapping, TypeMapping, parse_columns
+from digitaloperations.fabriceventhousehelperpyapp.plan import PlanError, ProvisioningPlan
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import PartitioningSettings, TablePolicies
+
+
+MAPPINGS = [EntityMapping("ref1", "Test_Entity", parse_columns(["prop1:string", "Identifier:string",
+                                                                 "Timestamp:datetime"]),
+                          TablePolicies("7d", PartitioningSettings(128, "1d")), latest_values=True)]
+COMMANDS = [KustoCommand(KIND_TABLE, "Test_Entity", ".create table Test_Entity (prop1:string)")]
+
+
+class TestProvisioningPlan(unittest.TestCase):
+    """Test cases for plan files"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_write_and_load_round_trip(self):
+        """Test a written plan loads back with the same content and hash"""
+        plan = ProvisioningPlan(MAPPINGS, COMMANDS, {"routing": True})
+
+        path = plan.write(self.temp_dir.name)
+        loaded = ProvisioningPlan.load(path)
+
+        self.assertEqual(os.path.basename(path), f"eventhouse-plan-{plan.content_hash[:12]}.json")
+        self.assertEqual(loaded.content_hash, plan.content_hash)
+        self.assertEqual(loaded.commands, COMMANDS)
+        self.assertEqual(loaded.entity_mappings, MAPPINGS)
+        self.assertEqual(loaded.options, {"routing": True, "specialized_transforms": None, "type_ref_expression": None,
+                                          "ingestion_profile": None})
+
+    def test_hash_ignores_creation_time(self):
+        """Test that recompiling the same input gives the same hash"""
+        first = ProvisioningPlan(MAPPINGS, COMMANDS, {}, created_at="2024-01-01T00:00:00+00:00")
+        second = ProvisioningPlan(MAPPINGS, COMMANDS, {})
+
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertNotEqual(first.content_hash, ProvisioningPlan(MAPPINGS, [], {}).content_hash)
+
+    def test_modified_plan_is_rejected(self):
+        """Test that a plan edited after compilation fails its integrity check"""
+        path = ProvisioningPlan(MAPPINGS, COMMANDS, {}).write(os.path.join(self.temp_dir.name, "plan.json"))
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        data["commands"][0]["text"] = ".drop table Test_Entity"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        with self.assertRaises(PlanError):
+            ProvisioningPlan.load(path)
+
+    def test_invalid_plan_files(self):
+        """Test unsupported versions and invalid JSON"""
+        with self.assertRaises(PlanError):
+            ProvisioningPlan.from_dict({"version": 99})
+        path = os.path.join(self.temp_dir.name, "broken.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{")
+        with self.assertRaises(PlanError):
+            ProvisioningPlan.load(path)
+
+    def test_group_commands_by_target(self):
+        """Test that shared commands lead and entity table commands are grouped per table"""
+        commands = [
+            KustoCommand(KIND_TABLE, "AIORawData", "a"),
+            KustoCommand(KIND_FUNCTION, "MoveDataByType", "b"),
+            KustoCommand(KIND_TABLE, "T1", "c"),
+            KustoCommand(KIND_TABLE, "T2", "d"),
+            KustoCommand(KIND_POLICY, "T1", "e"),
+        ]
+
+        self.assertEqual(group_commands_by_target(commands), ([0, 1], [[2, 4], [3]]))
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={
+           "ref1": TypeMapping("ref1", "Test", "Entity"),
+           "ref2": TypeMapping("ref2", "Test", "Other")
+       }))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "TimeseriesProperties": [{"name": "temp", "valueType": "Number"}]}
+       ]))
+class TestPlanApply(unittest.TestCase):
+    """Test cases for compiling plans and applying them against the fake Kusto backend"""
+
+    def setUp(self):
+        self.cluster_url = "https://test-cluster.kusto.windows.net"
+        self.database = "test_database"
+
+    def manager(self, client, **options):
+        manager = EventhouseManager(self.cluster_url, self.database, definitions_cache=False, **options)
+        manager.client = client
+        return manager
+
+    def catalog(self, client):
+        db = client.database(self.database)
+        return db.tables, {name: f["Body"] for name, f in db.functions.items()}, db.update_policies
+
+    def test_apply_matches_setup(self):
+        """Test applying a plan serially, in parallel and batched matches a direct setup"""
+        setup_client = FakeKustoClient()
+        self.assertTrue(self.manager(setup_client, routing=True).setup_tables_from_input(yaml_file="test.yaml"))
+        plan = EventhouseManager("local", "local", definitions_cache=False, routing=True).compile_plan(
+            yaml_file="test.yaml")
+
+        for options in ({}, {"max_parallel": 4}, {"batch": True}):
+            client = FakeKustoClient()
+            # The plan's routing option applies even though the manager was created without it
+            self.assertTrue(self.manager(client, **options).apply_plan(plan), options)
+            self.assertEqual(self.catalog(client), self.catalog(setup_client), options)
+
+    def test_parallel_apply_overlaps_tables(self):
+        """Test that the commands of different entity tables run concurrently"""
+        client = FakeKustoClient(latency=0.01)
+        plan = EventhouseManager("local", "local", definitions_cache=False).compile_plan(yaml_file="test.yaml")
+
+        self.assertTrue(self.manager(client, max_parallel=2).apply_plan(plan))
+
+        self.assertEqual(client.max_concurrency, 2)
+
+    def test_apply_does_not_resolve_mappings(self):
+        """Test that applying a plan neither loads definitions nor mappings"""
+        plan = EventhouseManager("local", "local", definitions_cache=False).compile_plan(yaml_file="test.yaml")
+        manager = self.manager(FakeKustoClient())
+
+        with patch.object(manager, 'resolve_entity_mappings') as mock_resolve:
+            self.assertTrue(manager.apply_plan(plan))
+
+        mock_resolve.assert_not_called()
+
+    def test_incremental_apply(self):
+        """Test that an incremental apply only reads the catalog of a provisioned database"""
+        client = FakeKustoClient()
+        plan = EventhouseManager("local", "local", definitions_cache=False).compile_plan(yaml_file="test.yaml")
+        self.assertTrue(self.manager(client).apply_plan(plan))
+        requests = len(client.requests)
+
+        self.assertTrue(self.manager(client, incremental=True).apply_plan(plan))
+
+        self.assertEqual(sorted(query for _, query in client.requests[requests:]),
+                         [".show database schema as json", ".show table * policy update"])
+
+    def test_compile_plan_without_mappings(self):
+        """Test that unresolvable input produces no plan"""
+        manager = EventhouseManager("local", "local", definitions_cache=False)
+
+        self.assertIsNone(manager.compile_plan())
+
+
+if __name__ == '__main__':
+    unittest.main()
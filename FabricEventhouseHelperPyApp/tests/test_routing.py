@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+from digitaloperations.fabriceventhousehelperpyapp.routing import (
+    build_routing_function_body, build_routing_update_policy, build_type_ref_expression,
+    compile_routing_commands, routing_retention_policy_matches
+)
+
+
+class TestTypeRouting(unittest.TestCase):
+    """Test cases for the ingestion-time type routing stage"""
+
+    def test_type_ref_expression_tests_longer_references_first(self):
+        """Test a reference that is a suffix of another never shadows it"""
+        expression = build_type_ref_expression(["Pumps;i=1043", "UA/Pumps;i=1043", "Pumps;i=1043"])
+        self.assertLess(expression.index('"UA/Pumps;i=1043"'), expression.index('type endswith "Pumps;i=1043"'))
+        self.assertEqual(expression.count("type endswith"), 2)
+        self.assertTrue(expression.endswith("dynamic([]))"))
+
+    def test_type_ref_expression_routes_to_every_matching_reference(self):
+        """Test a message of a reference that ends with another is routed to both, as LocalTransform does"""
+        expression = build_type_ref_expression(["Pumps;i=1043", "UA/pumps;i=1043", "Valves;i=7"])
+        self.assertIn('type endswith "UA/pumps;i=1043", dynamic(["UA/pumps;i=1043", "Pumps;i=1043"])', expression)
+        self.assertIn('type endswith "Pumps;i=1043", dynamic(["Pumps;i=1043"])', expression)
+        self.assertTrue(expression.endswith("dynamic([]))"))
+
+        body = build_routing_function_body(expression)
+        self.assertIn(f"TypeRef = {expression},", body)
+        self.assertIn("mv-expand TypeRef to typeof(string)", body)
+        self.assertNotIn("mv-expand", build_routing_function_body(build_type_ref_expression(["ref1", "ref2"])))
+
+    def test_type_ref_expression_without_references(self):
+        """Test an empty mapping set routes nothing"""
+        self.assertEqual(build_type_ref_expression([]), '""')
+
+    def test_routing_function_body(self):
+        """Test the routing function resolves TypeRef and Identifier once per message"""
+        body = build_routing_function_body('tostring(split(type, ":")[-1])')
+        self.assertIn("AIORawData", body)
+        self.assertIn('TypeRef = tostring(tostring(split(type, ":")[-1]))', body)
+        self.assertIn('Identifier = tostring(split(subject, "/")[0])', body)
+        self.assertIn("where isnotempty(TypeRef)", body)
+
+    def test_compile_routing_commands(self):
+        """Test the staging table, its retention, routing function and update policy are compiled in order"""
+        commands = compile_routing_commands(["ref1", "ref2"])
+
+        self.assertEqual([(c.kind, c.target) for c in commands], [
+            ("table", "AIORoutedData"),
+            ("policy", "AIORoutedData"),
+            ("transform", "AIORoutedData"),
+            ("policy", "AIORoutedData"),
+        ])
+        self.assertEqual(commands[1].text,
+                         ".alter-merge table AIORoutedData policy retention softdelete = 0d recoverability = disabled")
+        self.assertIn('type endswith "ref1"', commands[2].text)
+        self.assertIn("RouteRawData()", commands[3].text)
+        self.assertEqual(build_routing_update_policy()[0]["Source"], "AIORawData")
+
+    def test_routing_retention_policy_matches(self):
+        """Test only an immediate, unrecoverable soft delete counts as applied"""
+        self.assertTrue(routing_retention_policy_matches({"SoftDeletePeriod": "00:00:00", "Recoverability": "Disabled"}))
+        self.assertFalse(routing_retention_policy_matches({"SoftDeletePeriod": "00:00:00", "Recoverability": "Enabled"}))
+        self.assertFalse(routing_retention_policy_matches({"SoftDeletePeriod": "36500.00:00:00",
+                                                           "Recoverability": "Disabled"}))
+        self.assertFalse(routing_retention_policy_matches(None))
+
+    def test_compile_routing_commands_with_expression(self):
+        """Test a configured expression replaces the per-reference matching"""
+        commands = compile_routing_commands(["ref1"], 'tostring(split(type, ":")[-1])')
+        self.assertNotIn("endswith", commands[2].text)
+
+
+if __name__ == '__main__':
+    unittest.main()
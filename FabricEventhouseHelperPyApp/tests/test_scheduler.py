@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from azure.kusto.data.exceptions import (
+    KustoApiError,
+    KustoAuthenticationError,
+    KustoNetworkError,
+    KustoServiceError,
+    KustoThrottlingError,
+)
+
+from digitaloperations.fabriceventhousehelperpyapp.scheduler import (
+    ERROR_AUTH,
+    ERROR_PERMANENT,
+    ERROR_THROTTLED,
+    ERROR_TRANSIENT,
+    AdaptiveConcurrencyLimiter,
+    CommandScheduler,
+    classify_error,
+    retry_after_seconds,
+)
+
+
+def http_response(status, headers=None):
+    """Mock HTTP response with a status code and headers"""
+    response = Mock()
+    response.status_code = status
+    response.headers = headers or {}
+    return response
+
+
+class TestClassifyError(unittest.TestCase):
+    """Test cases for error classification"""
+
+    def test_throttled(self):
+        """Test throttling errors and 429 responses"""
+        self.assertEqual(classify_error(KustoThrottlingError("throttled", http_response(429))), ERROR_THROTTLED)
+        self.assertEqual(classify_error(KustoServiceError("x", http_response(429))), ERROR_THROTTLED)
+        self.assertEqual(classify_error(KustoServiceError("Control command was throttled")), ERROR_THROTTLED)
+
+    def test_transient(self):
+        """Test network errors, 5xx responses and non-permanent API errors"""
+        self.assertEqual(classify_error(KustoNetworkError("https://cluster")), ERROR_TRANSIENT)
+        self.assertEqual(classify_error(KustoServiceError("x", http_response(503))), ERROR_TRANSIENT)
+        self.assertEqual(classify_error(ConnectionError("reset")), ERROR_TRANSIENT)
+        self.assertEqual(classify_error(KustoServiceError("Service temporarily unavailable")), ERROR_TRANSIENT)
+        api_error = KustoApiError({"error": {"code": "X", "message": "m", "@permanent": False}})
+        self.assertEqual(classify_error(api_error), ERROR_TRANSIENT)
+
+    def test_permanent(self):
+        """Test semantic errors and unknown failures"""
+        self.assertEqual(classify_error(KustoServiceError("Semantic error: bad column")), ERROR_PERMANENT)
+        api_error = KustoApiError({"error": {"code": "X", "message": "m", "@permanent": True}})
+        self.assertEqual(classify_error(api_error), ERROR_PERMANENT)
+        self.assertEqual(classify_error(ValueError("boom")), ERROR_PERMANENT)
+
+    def test_auth(self):
+        """Test authentication errors and 401/403 responses"""
+        self.assertEqual(classify_error(KustoAuthenticationError("az cli", Exception("expired"))), ERROR_AUTH)
+        self.assertEqual(classify_error(KustoServiceError("x", http_response(401))), ERROR_AUTH)
+        self.assertEqual(classify_error(Exception("authentication failed")), ERROR_AUTH)
+
+    def test_retry_after(self):
+        """Test the Retry-After header is read from the attached response"""
+        error = KustoThrottlingError("throttled", http_response(429, {"Retry-After": "7"}))
+        self.assertEqual(retry_after_seconds(error), 7.0)
+        self.assertIsNone(retry_after_seconds(KustoServiceError("x")))
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+    """Test cases for the AIMD concurrency limiter"""
+
+    def test_throttling_halves_once_per_generation(self):
+        """Test that a burst of throttled requests halves the limit only once"""
+        limiter = AdaptiveConcurrencyLimiter(8)
+        generations = [limiter.acquire() for _ in range(4)]
+
+        self.assertTrue(limiter.on_throttled(generations[0]))
+        self.assertFalse(limiter.on_throttled(generations[1]))
+        self.assertEqual(limiter.limit, 4)
+
+    def test_limit_grows_after_window_of_successes(self):
+        """Test the limit grows by one after `limit` successes, up to the maximum"""
+        limiter = AdaptiveConcurrencyLimiter(4)
+        limiter.on_throttled(0)
+        self.assertEqual(limiter.limit, 2)
+
+        for _ in range(2):
+            limiter.on_success()
+        self.assertEqual(limiter.limit, 3)
+        for _ in range(20):
+            limiter.on_success()
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.lowest_limit, 2)
+
+    def test_acquire_blocks_at_limit(self):
+        """Test that threads wait until a slot is released"""
+        limiter = AdaptiveConcurrencyLimiter(1)
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_expand(self):
+        """Test raising the upper bound"""
+        limiter = AdaptiveConcurrencyLimiter(1)
+        limiter.expand(4)
+        limiter.expand(2)
+        self.assertEqual((limiter.limit, limiter.max_limit), (4, 4))
+
+
+class TestCommandScheduler(unittest.TestCase):
+    """Test cases for the command scheduler"""
+
+    def setUp(self):
+        self.delays = []
+        self.scheduler = CommandScheduler(max_concurrency=4, max_retries=3, base_delay=1.0, max_delay=5.0,
+                                          seed=1, sleep=self.delays.append)
+
+    def test_retries_transient_errors(self):
+        """Test that transient errors are retried with backoff until success"""
+        operation = Mock(side_effect=[KustoNetworkError("https://cluster"), KustoNetworkError("https://cluster"), "ok"])
+
+        self.assertEqual(self.scheduler.run(operation), "ok")
+
+        self.assertEqual(operation.call_count, 3)
+        self.assertEqual(len(self.delays), 2)
+        self.assertTrue(0 <= self.delays[0] <= 1.0 and 0 <= self.delays[1] <= 2.0)
+        self.assertEqual(self.scheduler.stats()["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the last error is raised once retries are exhausted"""
+        operation = Mock(side_effect=KustoThrottlingError("throttled"))
+
+        with self.assertRaises(KustoThrottlingError):
+            self.scheduler.run(operation)
+
+        self.assertEqual(operation.call_count, 4)
+        self.assertEqual(self.scheduler.stats()["errors"][ERROR_THROTTLED], 4)
+        self.assertEqual(self.scheduler.limiter.limit, 1)
+
+    def test_permanent_and_auth_errors_are_not_retried(self):
+        """Test that permanent and authentication errors are raised at once"""
+        for error in (KustoServiceError("Semantic error: bad"), Exception("authentication failed")):
+            operation = Mock(side_effect=error)
+            with self.assertRaises(type(error)):
+                self.scheduler.run(operation)
+            operation.assert_called_once()
+        self.assertEqual(self.delays, [])
+
+    def test_retry_after_is_honoured(self):
+        """Test that the delay is at least the service's Retry-After (capped at max_delay)"""
+        operation = Mock(side_effect=[KustoThrottlingError("throttled", http_response(429, {"Retry-After": "3"})), "ok"])
+
+        self.scheduler.run(operation)
+
+        self.assertGreaterEqual(self.delays[0], 3.0)
+
+    def test_retries_disabled(self):
+        """Test max_retries=0 raises the first retryable error"""
+        scheduler = CommandScheduler(max_retries=0, sleep=self.delays.append)
+
+        with self.assertRaises(KustoNetworkError):
+            scheduler.run(Mock(side_effect=KustoNetworkError("https://cluster")))
+
+    def test_interrupted_operation_releases_its_slot(self):
+        """Test that BaseExceptions such as KeyboardInterrupt and cancellation do not leak a slot"""
+        scheduler = CommandScheduler(max_concurrency=1)
+
+        with self.assertRaises(KeyboardInterrupt):
+            scheduler.run(Mock(side_effect=KeyboardInterrupt))
+
+        async def cancelled():
+            task = asyncio.ensure_future(scheduler.run_async(lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled())
+        self.assertEqual(scheduler.limiter.in_flight, 0)
+        self.assertEqual(scheduler.run(Mock(return_value="ok")), "ok")
+
+    def test_concurrency_is_limited(self):
+        """Test that no more than the limit of operations run at once"""
+        scheduler = CommandScheduler(max_concurrency=2)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def operation():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=scheduler.run, args=(operation,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak[0], 2)
+
+    def test_run_async(self):
+        """Test the coroutine variant retries and limits concurrency"""
+        scheduler = CommandScheduler(max_concurrency=2, base_delay=0)
+        state = {"active": 0, "peak": 0, "calls": 0}
+
+        async def operation():
+            state["calls"] += 1
+            if state["calls"] == 1:
+                raise KustoThrottlingError("throttled")
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return "ok"
+
+        async def run_all():
+            return await asyncio.gather(*(scheduler.run_async(operation) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run_all()), ["ok"] * 5)
+        self.assertEqual(state["calls"], 6)
+        self.assertLessEqual(state["peak"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.async_eventhouse import AsyncEventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.commands import (
+    KIND_POLICY,
+    KIND_TABLE,
+    KIND_TABLE_SCRIPT,
+    KustoCommand,
+    build_table_script_command,
+    chunk_commands,
+)
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import AsyncFakeKustoClient, FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.models import TypeMapping
+from digitaloperations.fabriceventhousehelperpyapp.transforms import build_conforming_query
+
+
+def entity_definitions(*properties):
+    return [{"Namespace": "Test", "Name": "Entity",
+             "Properties": [{"name": name, "valueType": value_type} for name, value_type in properties]}]
+
+
+ORIGINAL = entity_definitions(("prop1", "String"))
+EVOLVED = entity_definitions(("prop1", "String"), ("prop2", "Number"))
+CONFLICTING = entity_definitions(("prop1", "Number"))
+
+
+class TestSchemaEvolutionCommands(unittest.TestCase):
+    """Test cases for the schema evolution command builders"""
+
+    def test_conforming_query(self):
+        """Test the query output is projected onto the table columns in order"""
+        query = build_conforming_query('MoveDataByType("ref", "T")', ["b:long", "['a b']:string"])
+
+        self.assertEqual(query, 'MoveDataByType("ref", "T")\n| project '
+                                'b = tolong(column_ifexists("b", dynamic(null))), '
+                                '[\'a b\'] = tostring(column_ifexists("a b", dynamic(null)))')
+
+    def test_table_scripts_are_chunked_alone(self):
+        """Test a table script is never nested in a database script"""
+        table = KustoCommand(KIND_TABLE, "A", ".create table A (a:string)")
+        script = build_table_script_command("B", [KustoCommand(KIND_TABLE, "B", ".create-merge table B (b:string)"),
+                                                  KustoCommand(KIND_POLICY, "B", ".alter table B policy update @'[]'")])
+
+        self.assertEqual(script.kind, KIND_TABLE_SCRIPT)
+        self.assertTrue(script.text.startswith(".execute database script with (ContinueOnErrors=false) <|\n"))
+        self.assertEqual(chunk_commands([table, script, table, table]), [[table], [script], [table, table]])
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={"ref1": TypeMapping("ref1", "Test", "Entity")}))
+class TestSchemaEvolution(unittest.TestCase):
+    """Test cases for evolving entity tables against the fake Kusto backend"""
+
+    def setUp(self):
+        self.database = "test_database"
+        self.client = FakeKustoClient()
+
+    def setup(self, definitions, **options):
+        with patch.object(EventhouseManager, "_load_entity_type_definitions", Mock(return_value=definitions)):
+            manager = EventhouseManager("https://test-cluster", self.database, definitions_cache=False, **options)
+            manager.client = self.client
+            return manager.setup_tables_from_input(yaml_file="test.yaml")
+
+    def changes(self, definitions, **options):
+        """Run an evolution and return its success and the commands it sent after reading the catalog"""
+        requests = len(self.client.requests)
+        success = self.setup(definitions, evolve=True, **options)
+        return success, [query for _, query in self.client.requests[requests:] if not query.startswith(".show")]
+
+    def test_new_columns_merged_with_the_update_policy(self):
+        """Test new columns and the regenerated update policy are sent as one table script"""
+        self.assertTrue(self.setup(ORIGINAL))
+
+        success, changes = self.changes(EVOLVED)
+
+        self.assertTrue(success)
+        self.assertEqual(len(changes), 1)
+        self.assertTrue(changes[0].startswith(".execute database script with (ContinueOnErrors=false) <|\n"
+                                              ".create-merge table Test_Entity (prop1:string, prop2:double"))
+        db = self.client.database(self.database)
+        self.assertEqual(list(db.tables["Test_Entity"]), ["prop1", "Identifier", "Timestamp", "prop2"])
+        self.assertTrue(db.update_policies["Test_Entity"][0]["Query"].endswith(
+            'prop2 = todouble(column_ifexists("prop2", dynamic(null)))'))
+        self.assertEqual(self.changes(EVOLVED), (True, []))
+
+    def test_specialized_transform_follows_the_merged_columns(self):
+        """Test the specialised transform projects onto the merged column order"""
+        self.assertTrue(self.setup(ORIGINAL, specialized_transforms=True))
+
+        success, changes = self.changes(EVOLVED, specialized_transforms=True)
+
+        self.assertTrue(success)
+        self.assertEqual(len(changes), 1)
+        self.assertIn(".create-or-alter function", changes[0])
+        body = self.client.database(self.database).functions["MoveData_Test_Entity"]["Body"]
+        self.assertLess(body.index("Timestamp ="), body.index("prop2 ="))
+
+    def test_type_conflict_stops_before_any_change(self):
+        """Test that a column type conflict fails the run without sending any change"""
+        self.assertTrue(self.setup(ORIGINAL))
+        tables = {name: dict(columns) for name, columns in self.client.database(self.database).tables.items()}
+
+        with self.assertLogs(level="ERROR") as logs:
+            success, changes = self.changes(entity_definitions(("prop1", "Number"), ("prop2", "Number")))
+
+        self.assertFalse(success)
+        self.assertEqual(changes, [])
+        self.assertEqual(self.client.database(self.database).tables, tables)
+        self.assertIn("Schema evolution stopped", "\n".join(logs.output))
+
+    def test_failed_merge_skips_the_update_policy(self):
+        """Test a rejected merge leaves the existing update policy in place"""
+        self.client = FakeKustoClient(fail_commands={r"^\.create-merge": "Too many columns"})
+        self.assertTrue(self.setup(ORIGINAL))
+        policy = self.client.database(self.database).update_policies["Test_Entity"]
+
+        with self.assertLogs(level="ERROR"):
+            success, changes = self.changes(EVOLVED, max_retries=0)
+
+        self.assertFalse(success)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(self.client.database(self.database).update_policies["Test_Entity"], policy)
+        self.assertNotIn("prop2", self.client.database(self.database).tables["Test_Entity"])
+
+    def test_batch_mode(self):
+        """Test the table script runs alone between the batched database scripts"""
+        self.assertTrue(self.setup(ORIGINAL, batch=True))
+
+        success, changes = self.changes(EVOLVED, batch=True)
+
+        self.assertTrue(success)
+        self.assertEqual([change.split("\n", 1)[0] for change in changes],
+                         [".execute database script with (ContinueOnErrors=false) <|"])
+        self.assertIn("prop2", self.client.database(self.database).tables["Test_Entity"])
+
+    def test_new_table_is_created_with_a_conforming_policy(self):
+        """Test evolution of an empty database creates the tables in definition order"""
+        success, changes = self.changes(EVOLVED)
+
+        self.assertTrue(success)
+        self.assertIn(".create table Test_Entity (prop1:string, prop2:double, Identifier:string, Timestamp:datetime)",
+                      changes)
+        self.assertIn("| project prop1 =", self.client.database(self.database).update_policies["Test_Entity"][0]["Query"])
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_yaml_mappings',
+       Mock(return_value={"ref1": TypeMapping("ref1", "Test", "Entity")}))
+class TestAsyncSchemaEvolution(unittest.IsolatedAsyncioTestCase):
+    """Test cases for schema evolution with the async manager"""
+
+    async def setup(self, client, definitions, **options):
+        with patch.object(EventhouseManager, "_load_entity_type_definitions", Mock(return_value=definitions)):
+            async with AsyncEventhouseManager("https://test-cluster", "test_database", definitions_cache=False,
+                                              **options) as manager:
+                manager.client = client
+                return await manager.setup_tables_from_input(yaml_file="test.yaml")
+
+    async def test_evolve_and_conflict(self):
+        """Test new columns are merged and a type conflict stops the run"""
+        client = AsyncFakeKustoClient()
+        self.assertTrue(await self.setup(client, ORIGINAL))
+
+        self.assertTrue(await self.setup(client, EVOLVED, evolve=True, max_parallel=2))
+        self.assertIn("prop2", client.database("test_database").tables["Test_Entity"])
+
+        requests = len(client.requests)
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(await self.setup(client, CONFLICTING, evolve=True))
+        self.assertTrue(all(query.startswith(".show") for _, query in client.requests[requests:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from digitaloperations.fabriceventhousehelperpyapp.eventhouse import EventhouseManager
+from digitaloperations.fabriceventhousehelperpyapp.fake_kusto import FakeKustoClient
+from digitaloperations.fabriceventhousehelperpyapp.table_policies import (
+    PartitioningSettings,
+    TablePolicies,
+    build_partitioning_policy,
+    caching_policy_matches,
+    compile_table_policy_commands,
+    parse_table_policies,
+    parse_timespan,
+    partitioning_policy_matches,
+)
+
+
+FIELDS = ["prop1:string", "Identifier:string", "Timestamp:datetime"]
+
+
+class TestTablePolicies(unittest.TestCase):
+    """Test cases for the caching and partitioning policy builders"""
+
+    def test_parse_timespan(self):
+        """Test KQL literals and d.hh:mm:ss timespans"""
+        self.assertEqual(parse_timespan("7d"), timedelta(days=7))
+        self.assertEqual(parse_timespan("36h"), parse_timespan("1.12:00:00"))
+        self.assertEqual(parse_timespan("00:30:00"), timedelta(minutes=30))
+        for invalid in ("7 days", "0d", "", "-1d"):
+            with self.assertRaises(ValueError, msg=invalid):
+                parse_timespan(invalid)
+
+    def test_parse_table_policies(self):
+        """Test mapping settings override the defaults and can turn them off"""
+        defaults = parse_table_policies({"hot_cache": "744h", "partitioning": True})
+
+        self.assertEqual(defaults, TablePolicies("31d", PartitioningSettings(128, "1d")))
+        self.assertEqual(parse_table_policies({}, defaults), defaults)
+        self.assertEqual(parse_table_policies({"hot_cache": None, "partitioning": {"range_size": "12h"}}, defaults),
+                         TablePolicies(partitioning=PartitioningSettings(128, "12h")))
+        self.assertEqual(parse_table_policies({"partitioning": False}, defaults), TablePolicies("31d"))
+        self.assertIsNone(parse_table_policies({"hot_cache": None, "partitioning": False}, defaults))
+        self.assertEqual(TablePolicies.from_dict(defaults.to_dict()), defaults)
+
+    def test_invalid_table_policies(self):
+        """Test invalid windows and partitioning settings are rejected"""
+        for settings in ({"hot_cache": "soon"}, {"partitioning": "yes"},
+                         {"partitioning": {"max_partition_count": 4096}}, {"partitioning": {"seed": 2}}):
+            with self.assertRaises(ValueError, msg=settings):
+                parse_table_policies(settings)
+
+    def test_partitioning_policy_needs_typed_columns(self):
+        """Test keys are only added for a string Identifier and a datetime Timestamp"""
+        settings = PartitioningSettings(64, "12h")
+
+        policy = build_partitioning_policy(settings, FIELDS)
+        self.assertEqual([(key["ColumnName"], key["Kind"]) for key in policy["PartitionKeys"]],
+                         [("Identifier", "Hash"), ("Timestamp", "UniformRange")])
+        self.assertEqual(policy["PartitionKeys"][0]["Properties"]["MaxPartitionCount"], 64)
+        self.assertEqual(policy["PartitionKeys"][1]["Properties"]["RangeSize"], "0.12:00:00")
+
+        policy = build_partitioning_policy(settings, ["Identifier:long", "Timestamp:datetime"])
+        self.assertEqual([key["Kind"] for key in policy["PartitionKeys"]], ["UniformRange"])
+        self.assertIsNone(build_partitioning_policy(settings, ["Identifier:long", "Timestamp:string"]))
+
+    def test_policy_matching(self):
+        """Test existing policies are compared after normalizing timespans"""
+        self.assertTrue(caching_policy_matches({"DataHotSpan": {"Value": "7.00:00:00"}}, "7d"))
+        self.assertTrue(caching_policy_matches({"DataHotSpan": "7.00:00:00"}, "168h"))
+        self.assertFalse(caching_policy_matches({"DataHotSpan": {"Value": "1.00:00:00"}}, "7d"))
+        self.assertFalse(caching_policy_matches(None, "7d"))
+
+        policy = build_partitioning_policy(PartitioningSettings(128, "1d"), FIELDS)
+        existing = build_partitioning_policy(PartitioningSettings(128, "1d"), FIELDS)
+        existing["PartitionKeys"][1]["Properties"]["Reference"] = "1970-01-01T00:00:00Z"
+        existing["EffectiveDateTime"] = "2024-01-01T00:00:00"
+        self.assertTrue(partitioning_policy_matches(existing, policy))
+        existing["PartitionKeys"][0]["Properties"]["MaxPartitionCount"] = 256
+        self.assertFalse(partitioning_policy_matches(existing, policy))
+        self.assertFalse(partitioning_policy_matches(None, policy))
+
+    def test_compile_table_policy_commands(self):
+        """Test the caching command precedes the partitioning command"""
+        commands = compile_table_policy_commands("T", FIELDS, parse_table_policies({"hot_cache": "7d",
+                                                                                    "partitioning": True}))
+
+        self.assertEqual([c.kind for c in commands], ["policy", "policy"])
+        self.assertEqual(commands[0].text, ".alter table T policy caching hot = 7d")
+        self.assertTrue(commands[1].text.startswith(".alter table T policy partitioning @'{\"PartitionKeys\""))
+        self.assertEqual(compile_table_policy_commands("T", FIELDS, None), [])
+
+
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager.authenticate',
+       Mock(return_value=True))
+@patch('digitaloperations.fabriceventhousehelperpyapp.eventhouse.EventhouseManager._load_entity_type_definitions',
+       Mock(return_value=[
+           {"Namespace": "Test", "Name": "Entity", "Properties": [{"name": "prop1", "valueType": "String"}]},
+           {"Namespace": "Test", "Name": "Other", "TimeseriesProperties": [{"name": "temp", "valueType": "Number"}]}
+       ]))
+class TestTablePolicyProvisioning(unittest.TestCase):
+    """Test cases for YAML table policies provisioned against the fake Kusto backend"""
+
+    def setUp(self):
+        self.database = "test_database"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def write_yaml(self, entity_hot_cache="7d"):
+        path = os.path.join(self.temp_dir.name, "mappings.yaml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("table_policies:\n"
+                    "  hot_cache: 31d\n"
+                    "  partitioning: true\n"
+                    "type_mappings:\n"
+                    "  - typeRef: ref1\n"
+                    "    namespace: Test\n"
+                    "    entity_name: Entity\n"
+                    f"    hot_cache: {entity_hot_cache}\n"
+                    "  - typeRef: ref2\n"
+                    "    namespace: Test\n"
+                    "    entity_name: Other\n"
+                    "    partitioning: false\n")
+        return path
+
+    def setup(self, client, yaml_file, **options):
+        manager = EventhouseManager("https://test-cluster", self.database, definitions_cache=False, **options)
+        manager.client = client
+        return manager.setup_tables_from_input(yaml_file=yaml_file)
+
+    def test_yaml_defaults_and_overrides(self):
+        """Test table_policies defaults apply unless a mapping overrides them"""
+        manager = EventhouseManager("local", "local", definitions_cache=False)
+
+        mappings = {m.table_name: m for m in manager.resolve_entity_mappings(yaml_file=self.write_yaml())}
+
+        self.assertEqual(mappings["Test_Entity"].policies, TablePolicies("7d", PartitioningSettings(128, "1d")))
+        self.assertEqual(mappings["Test_Other"].policies, TablePolicies("31d"))
+
+    def test_invalid_mapping_policies_skip_the_mapping(self):
+        """Test a mapping with an invalid window is skipped"""
+        manager = EventhouseManager("local", "local", definitions_cache=False)
+
+        mappings = manager.resolve_entity_mappings(yaml_file=self.write_yaml(entity_hot_cache="soon"))
+
+        self.assertEqual([m.table_name for m in mappings], ["Test_Other"])
+
+    def test_policies_provisioned_in_every_mode(self):
+        """Test step-by-step, parallel and batched setups set the configured policies"""
+        yaml_file = self.write_yaml()
+        for options in ({}, {"max_parallel": 2}, {"batch": True}):
+            client = FakeKustoClient()
+            self.assertTrue(self.setup(client, yaml_file, **options), options)
+
+            db = client.database(self.database)
+            self.assertEqual(db.caching_policies["Test_Entity"]["DataHotSpan"]["Value"], "7.00:00:00", options)
+            self.assertEqual(db.caching_policies["Test_Other"]["DataHotSpan"]["Value"], "31.00:00:00", options)
+            self.assertEqual(set(db.partitioning_policies), {"Test_Entity"}, options)
+            self.assertNotIn("AIORawData", db.caching_policies)
+
+    def test_incremental_rerun_diffs_policies(self):
+        """Test an unchanged rerun only reads the catalog and a changed window is the only change"""
+        client = FakeKustoClient()
+        self.assertTrue(self.setup(client, self.write_yaml()))
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, self.write_yaml(), incremental=True))
+        self.assertEqual(sorted(query for _, query in client.requests[requests:]), [
+            ".show database schema as json",
+            ".show table * policy caching",
+            ".show table * policy partitioning",
+            ".show table * policy update",
+        ])
+
+        requests = len(client.requests)
+        self.assertTrue(self.setup(client, self.write_yaml(entity_hot_cache="14d"), incremental=True))
+        self.assertEqual([query for _, query in client.requests[requests + 4:]],
+                         [".alter table Test_Entity policy caching hot = 14d"])
+
+    def test_failed_partitioning_fails_the_table(self):
+        """Test that a rejected partitioning policy fails only its table"""
+        client = FakeKustoClient(fail_commands={r"policy partitioning": "Partitioning is not supported"})
+
+        self.assertFalse(self.setup(client, self.write_yaml(), max_retries=0))
+        db = client.database(self.database)
+        self.assertEqual(set(db.update_policies), {"Test_Entity", "Test_Other"})
+        self.assertIn("Test_Entity", db.caching_policies)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import patch
+from digitaloperations.fabriceventhousehelperpyapp.transforms import (
+    build_specialized_function_body, build_specialized_function_command,
+    build_specialized_update_policy_query, quote_identifier, quote_string
+)
+
+
+class TestSpecializedTransforms(unittest.TestCase):
+    """Test cases for specialised transform generation"""
+
+    def test_function_body_projects_typed_columns_in_order(self):
+        """Test every column is projected with its typed conversion, in table order"""
+        body = build_specialized_function_body(
+            "test_ref", ["prop1:string", "ts_prop1:double", "flag:boolean", "meta:dynamic",
+                         "Identifier:string", "Timestamp:datetime"])
+
+        self.assertIn('| where type endswith "test_ref"', body)
+        self.assertNotIn("mv-expand", body)
+        self.assertNotIn("bag_unpack", body)
+        projections = [line.strip().rstrip(",") for line in body.split("| project\n")[1].splitlines()[:-1]]
+        self.assertEqual(projections, [
+            'prop1 = tostring(ParsedData["prop1"]["Value"])',
+            'ts_prop1 = todouble(ParsedData["ts_prop1"]["Value"])',
+            'flag = tobool(ParsedData["flag"]["Value"])',
+            'meta = ParsedData["meta"]["Value"]',
+            'Identifier = tostring(split(subject, "/")[0])',
+            'Timestamp = todatetime(ParsedData[tostring(Keys[0])]["ServerTimestamp"])',
+        ])
+
+    def test_function_body_routed(self):
+        """Test routed bodies filter the staging table on its exact TypeRef column"""
+        body = build_specialized_function_body("test_ref", ["prop1:string", "Identifier:string"], routed=True)
+        self.assertIn('AIORoutedData\n    | where TypeRef == "test_ref"', body)
+        self.assertNotIn("endswith", body)
+        self.assertIn("Identifier = tostring(Identifier)", body)
+
+    def test_function_body_quotes_special_names(self):
+        """Test column names that are not identifiers are quoted"""
+        body = build_specialized_function_body("ref", ["Flow Rate:double", "Identifier:string"])
+        self.assertIn("""['Flow Rate'] = todouble(ParsedData["Flow Rate"]["Value"])""", body)
+
+    def test_function_body_falls_back_without_value_columns(self):
+        """Test tables with only Identifier and Timestamp use the generic function"""
+        self.assertIsNone(build_specialized_function_body("ref", ["Identifier:string", "Timestamp:datetime"]))
+
+    def test_function_body_falls_back_for_wide_entities(self):
+        """Test very wide tables use the generic function"""
+        with patch('digitaloperations.fabriceventhousehelperpyapp.transforms.MAX_SPECIALIZED_COLUMNS', 2):
+            self.assertIsNone(build_specialized_function_body("ref", ["a:string", "b:string", "c:string"]))
+
+    def test_function_command_and_policy_query(self):
+        """Test the function command and the update policy query reference the same function"""
+        command = build_specialized_function_command("Test_Entity", "{ AIORawData }")
+        self.assertTrue(command.startswith('.create-or-alter function with (folder="EntityTransforms") '
+                                           'MoveData_Test_Entity()'))
+        self.assertEqual(build_specialized_update_policy_query("Test_Entity"), "MoveData_Test_Entity()")
+
+    def test_quoting(self):
+        """Test identifier and string quoting"""
+        self.assertEqual(quote_identifier("plain_name1"), "plain_name1")
+        self.assertEqual(quote_identifier("it's"), "['it\\'s']")
+        self.assertEqual(quote_string('say "hi"'), '"say \\"hi\\""')
+
+
+if __name__ == '__main__':
+    unittest.main()